@@ -1,19 +1,44 @@
 # accounts/middleware.py
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
 from django.shortcuts import redirect
 from django.utils import timezone
 from django.conf import settings
 
 class SessionSecurityMiddleware:
     """Force session timeout and block cached pages after logout."""
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        # Async views (terminal.async_db) stay on the event loop through here
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        # Block page cache on every request
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
         response = self.get_response(request)
-        response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-        response['Pragma'] = 'no-cache'
-        response['Expires'] = '0'
+        return self.process_response(request, response)
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        # Requests without a session cookie are anonymous: no DB access needed
+        if request.session.session_key is None:
+            return self._block_cache(response)
+        return await sync_to_async(self.process_response)(request, response)
+
+    def _block_cache(self, response):
+        # Block page cache on every request, except responses that opt in
+        # with `response.cacheable = True` (immutable assets such as QR images)
+        if not getattr(response, 'cacheable', False):
+            response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+            response['Pragma'] = 'no-cache'
+            response['Expires'] = '0'
+        return response
+
+    def process_response(self, request, response):
+        response = self._block_cache(response)
 
         # Skip checks for login or static requests
         if request.path.startswith('/static/') or request.path in ['/login/', '/logout/']:
@@ -29,8 +54,14 @@ class SessionSecurityMiddleware:
                 from django.contrib.auth import logout
                 logout(request)
                 request.session.flush()
-                return redirect('login')
+                return redirect('accounts:login')
 
-            request.session['last_activity'] = now
+            # Record activity at most once per interval, so sessions are not
+            # rewritten on every request; responses from @passive_session
+            # views (polling) never extend the session.
+            interval = getattr(settings, 'SESSION_ACTIVITY_WRITE_INTERVAL', 60)
+            passive = getattr(response, 'passive_session', False)
+            if not last_activity or (not passive and now - last_activity >= interval):
+                request.session['last_activity'] = now
 
         return response
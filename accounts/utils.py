@@ -1,4 +1,9 @@
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
 from django.contrib.auth.decorators import user_passes_test
+from django.contrib.auth.views import redirect_to_login
 
 # ✅ Allow both admin and staff_admin
 def is_staff_admin_or_admin(user):
@@ -11,3 +16,42 @@ def is_admin(user):
 # ✅ Strictly staff_admin only
 def is_staff_admin(user):
     return user.is_authenticated and user.role == 'staff_admin'
+
+# ✅ login_required for async views (Django 5.0's decorator is sync-only)
+def async_login_required(view_func):
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path(), settings.LOGIN_URL)
+        return await view_func(request, *args, **kwargs)
+    return wrapper
+
+# ✅ user_passes_test for async views; failing users go to the login page
+def async_user_passes_test(test_func):
+    def decorator(view_func):
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            user = await request.auser()
+            if not test_func(user):
+                return redirect_to_login(request.get_full_path(), settings.LOGIN_URL)
+            return await view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+# ✅ For polling endpoints: the inactivity timeout still applies, but the
+# request doesn't count as activity (see SessionSecurityMiddleware)
+def passive_session(view_func):
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            response = await view_func(request, *args, **kwargs)
+            response.passive_session = True
+            return response
+    else:
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            response = view_func(request, *args, **kwargs)
+            response.passive_session = True
+            return response
+    return wrapper
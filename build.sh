@@ -10,3 +10,10 @@ python manage.py collectstatic --no-input
 
 # Run migrations
 python manage.py migrate
+
+# Pre-create history partitions and apply the retention horizon
+python manage.py maintain_history_partitions
+
+# Queue vehicles without a QR image and run jobs the previous release left
+# behind (the web process's sweeper picks up whatever is over the limit)
+python manage.py process_qr_jobs --backfill --limit 200
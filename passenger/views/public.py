@@ -1,13 +1,18 @@
 import json
 
+from django.conf import settings
 from django.http import JsonResponse
 from django.shortcuts import render
 from django.utils import timezone
+from django.views.decorators.gzip import gzip_page
 from django.db.models import Q
 
+from terminal import snapshots
+from terminal.async_db import run_db
 from terminal.models import EntryLog
 from terminal.services import QueueService
 from terminal.shared_queue import build_public_queue_entries
+from terminal.utils import COMPACT_JSON, wants_compact
 from terminal.views.shared import maintenance_task
 from vehicles.models import Route
 
@@ -38,8 +43,8 @@ def public_queue_view(request):
         except (ValueError, TypeError):
             route_id = None
 
-    # Get queue state from service layer
-    queue_state = QueueService.get_queue_state(route_filter=route_id)
+    # Published snapshot first (terminal.snapshots); service layer if there is none
+    queue_state = snapshots.read(route_id) or QueueService.get_queue_state(route_filter=route_id)
 
     routes = Route.objects.filter(active=True).order_by("origin", "destination")
 
@@ -51,15 +56,19 @@ def public_queue_view(request):
         "server_now": timezone.localtime(timezone.now()),
         "countdown_duration": queue_state.get("countdown_duration", 30),
         "refresh_interval": queue_state.get("refresh_interval", 15),
+        "snapshot_url": settings.QUEUE_SNAPSHOT_URL if snapshots.enabled() else "",
     }
 
     return render(request, 'passenger/public_queue.html', context)
 
 
-def public_queue_data(request):
+@gzip_page
+async def public_queue_data(request):
     """
     API endpoint for queue data updates.
-    Returns JSON with all queue entries for partial DOM updates.
+    Returns JSON with all queue entries for partial DOM updates
+    (``?format=compact`` for the short-key encoding).
+    Async: polled by every public screen (see terminal.async_db).
     """
     route_filter = request.GET.get("route", "all")
     route_id = None
@@ -70,6 +79,8 @@ def public_queue_data(request):
         except (ValueError, TypeError):
             route_id = None
 
-    queue_state = QueueService.get_queue_state(route_filter=route_id)
+    queue_state = await run_db(
+        QueueService.get_queue_state, route_filter=route_id, compact=wants_compact(request.GET)
+    )
 
-    return JsonResponse(queue_state)
+    return JsonResponse(queue_state, json_dumps_params=COMPACT_JSON)
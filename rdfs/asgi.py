@@ -1,20 +1,30 @@
 import os
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
 from channels.security.websocket import AllowedHostsOriginValidator
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rdfs.settings')
 
+# Set up Django before importing consumers (they import models)
+django_asgi_app = get_asgi_application()
+
 import terminal.routing
+from vehicles import qr_jobs
+
+# Pick up QR jobs whose in-memory schedule died with the previous process
+if settings.QR_JOBS_RUN_IN_PROCESS:
+    qr_jobs.start_sweeper()
 
+# Public display sockets need no user: they skip the session/auth lookup.
+# Wrap individual routes in channels.auth.AuthMiddlewareStack when they do.
+# Every socket, gate devices included, must come from an ALLOWED_HOSTS
+# origin; scanner clients outside a browser send an Origin header for it.
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
+    "http": django_asgi_app,
     "websocket": AllowedHostsOriginValidator(
-        AuthMiddlewareStack(
-            URLRouter(
-                terminal.routing.websocket_urlpatterns
-            )
+        URLRouter(
+            terminal.routing.gate_websocket_urlpatterns + terminal.routing.websocket_urlpatterns
         )
     ),
 })
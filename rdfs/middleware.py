@@ -0,0 +1,110 @@
+"""
+Project Middleware
+==================
+Async-capable replacements for third-party middleware in ``MIDDLEWARE``,
+and the static passenger queue snapshot server.
+"""
+
+import os
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse, HttpResponseNotFound, HttpResponseNotModified
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise that can sit in an async middleware chain (6.6 is sync-only).
+
+    Static files are still served from a worker thread, but every other
+    request passes straight through on the event loop, so async views are
+    not forced through a sync thread by the middleware above them.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file, thread_sensitive=False)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+        return await self.get_response(request)
+
+
+class QueueSnapshotMiddleware:
+    """
+    Serves the published passenger queue files (terminal.snapshots) before
+    sessions, auth or any view run, so anonymous boards never touch the
+    database. A stale file is still served while a refresh runs in the
+    background; a missing one is a 404 and the page falls back to the API.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        from django.conf import settings
+
+        if not settings.QUEUE_SNAPSHOTS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = settings.QUEUE_SNAPSHOT_URL
+        self.max_age = settings.QUEUE_SNAPSHOT_MAX_AGE
+        self.refresh_after = settings.QUEUE_SNAPSHOT_REFRESH_SECONDS
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if request.path_info.startswith(self.prefix):
+            return self.serve(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if request.path_info.startswith(self.prefix):
+            # File reads block; keep them off the event loop, as AsyncWhiteNoiseMiddleware does
+            return await sync_to_async(self.serve, thread_sensitive=False)(request)
+        return await self.get_response(request)
+
+    def serve(self, request):
+        from terminal import snapshots
+
+        name = request.path_info[len(self.prefix):]
+        if request.method not in ('GET', 'HEAD') or not snapshots.FILE_NAME_RE.match(name):
+            return HttpResponseNotFound()
+        try:
+            with open(snapshots.path_for(name), 'rb') as handle:
+                stat = os.fstat(handle.fileno())
+                content = handle.read()
+        except FileNotFoundError:
+            snapshots.refresh_in_background()
+            response = HttpResponseNotFound()
+            response['Cache-Control'] = 'no-store'
+            return response
+
+        if time.time() - stat.st_mtime > self.refresh_after:
+            snapshots.refresh_in_background()
+
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        if request.headers.get('If-None-Match') == etag:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content if request.method == 'GET' else b'', content_type='application/json')
+            response['Content-Length'] = str(stat.st_size)
+        response['ETag'] = etag
+        response['Cache-Control'] = f'public, max-age={self.max_age}'
+        return response
@@ -18,6 +18,7 @@ environ.Env.read_env(os.path.join(BASE_DIR, '.env'))
 ENVIRONMENT = env('ENVIRONMENT', default='development')
 IS_PRODUCTION = ENVIRONMENT == 'production'
 USE_REDIS_CHANNEL_LAYER = env.bool('USE_REDIS_CHANNEL_LAYER', default=False)
+USE_POSTGRES_CHANNEL_LAYER = env.bool('USE_POSTGRES_CHANNEL_LAYER', default=False)
 
 # ======================================================
 # SECURITY
@@ -69,7 +70,10 @@ INSTALLED_APPS = [
 # ======================================================
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    # WhiteNoise that lets async views stay on the event loop
+    'rdfs.middleware.AsyncWhiteNoiseMiddleware',
+    # Static passenger queue boards, answered before sessions/auth
+    'rdfs.middleware.QueueSnapshotMiddleware',
 
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -191,6 +195,17 @@ if USE_REDIS_CHANNEL_LAYER:
             },
         },
     }
+elif USE_POSTGRES_CHANNEL_LAYER:
+    # Cross-process fan-out over the app database (LISTEN/NOTIFY), so
+    # several ASGI workers can run without Redis; see terminal.channel_layer.
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "terminal.channel_layer.PostgresChannelLayer",
+            "CONFIG": {
+                "database": "default",
+            },
+        },
+    }
 else:
     CHANNEL_LAYERS = {
         "default": {
@@ -203,11 +218,141 @@ else:
 # ======================================================
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
 SESSION_COOKIE_AGE = env.int('SESSION_COOKIE_AGE', default=900)  # 15 minutes default
-SESSION_SAVE_EVERY_REQUEST = True
+# Sessions are saved only when changed. SessionSecurityMiddleware records
+# activity at most once per SESSION_ACTIVITY_WRITE_INTERVAL seconds, and never
+# for polling endpoints marked @passive_session (accounts.utils).
+SESSION_SAVE_EVERY_REQUEST = env.bool('SESSION_SAVE_EVERY_REQUEST', default=False)
+SESSION_ACTIVITY_WRITE_INTERVAL = env.int('SESSION_ACTIVITY_WRITE_INTERVAL', default=60)
+
+# db | cached_db (reads served from CACHES) | signed_cookies (no session table)
+SESSION_BACKEND = env('SESSION_BACKEND', default='db')
+SESSION_ENGINE = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}[SESSION_BACKEND]
 
 CSRF_COOKIE_SECURE = env.bool('CSRF_COOKIE_SECURE', default=IS_PRODUCTION)
 SESSION_COOKIE_SECURE = env.bool('SESSION_COOKIE_SECURE', default=IS_PRODUCTION)
 
+# ======================================================
+# HISTORY PARTITIONING / RETENTION
+# ======================================================
+# QueueHistory and TerminalActivity are partitioned by month on PostgreSQL.
+# Run `python manage.py maintain_history_partitions` regularly (build.sh does).
+HISTORY_RETENTION_MONTHS = env.int('HISTORY_RETENTION_MONTHS', default=24)  # 0 = keep forever
+HISTORY_PARTITION_MONTHS_AHEAD = env.int('HISTORY_PARTITION_MONTHS_AHEAD', default=3)
+HISTORY_RETENTION_MODE = env('HISTORY_RETENTION_MODE', default='detach')  # detach | drop
+
+# ======================================================
+# TRANSACTION COLD STORAGE
+# ======================================================
+# Closed months older than this are moved to compressed files by
+# `python manage.py archive_transactions`. The directory must be persistent
+# (the rows are deleted from the database); archiving refuses to run unset.
+TRANSACTION_ARCHIVE_DIR = env('TRANSACTION_ARCHIVE_DIR', default=None)
+TRANSACTION_ARCHIVE_AFTER_MONTHS = env.int('TRANSACTION_ARCHIVE_AFTER_MONTHS', default=12)
+
+# ======================================================
+# FLEET SEARCH
+# ======================================================
+# Without PostgreSQL, search uses an in-process trigram index (vehicles.search).
+# It is rebuilt at once after writes in the same process; writes made by other
+# worker processes show up after at most this many seconds.
+SEARCH_NGRAM_INDEX_TTL_SECONDS = env.int('SEARCH_NGRAM_INDEX_TTL_SECONDS', default=60)
+
+# ======================================================
+# QR CODE JOBS
+# ======================================================
+# Vehicle QR images are rendered/uploaded in the background (vehicles.qr_jobs).
+# Set QR_JOBS_RUN_IN_PROCESS=False to leave them to `manage.py process_qr_jobs --loop`.
+QR_JOBS_RUN_IN_PROCESS = env.bool('QR_JOBS_RUN_IN_PROCESS', default=True)
+QR_JOBS_WORKERS = env.int('QR_JOBS_WORKERS', default=2)
+QR_JOBS_MAX_ATTEMPTS = env.int('QR_JOBS_MAX_ATTEMPTS', default=5)
+QR_JOBS_RETRY_BASE_SECONDS = env.int('QR_JOBS_RETRY_BASE_SECONDS', default=5)
+# How often the web process re-runs due/stale jobs (lost retries, restarts).
+QR_JOBS_SWEEP_SECONDS = env.int('QR_JOBS_SWEEP_SECONDS', default=60)
+
+# ======================================================
+# QR IMAGE RENDERING
+# ======================================================
+# In-process LRU of locally rendered QR images (vehicles.qr_render) and the
+# browser cache lifetime of /vehicles/qr/<qr_value>/ responses.
+QR_RENDER_CACHE_MAX_BYTES = env.int('QR_RENDER_CACHE_MAX_BYTES', default=16 * 1024 * 1024)
+QR_RENDER_CACHE_SECONDS = env.int('QR_RENDER_CACHE_SECONDS', default=365 * 24 * 60 * 60)
+
+# Printable QR sheets (vehicles.qr_sheets): render processes per sheet
+# (0 = one per CPU core) and the largest selection one sheet may hold.
+QR_SHEETS_PROCESSES = env.int('QR_SHEETS_PROCESSES', default=0)
+QR_SHEETS_MAX_VEHICLES = env.int('QR_SHEETS_MAX_VEHICLES', default=5000)
+
+# ======================================================
+# LICENSE OCR
+# ======================================================
+# License scans run in a process pool (vehicles.ocr). Scans beyond
+# OCR_PROCESSES + OCR_QUEUE_DEPTH get HTTP 429 until the pool catches up.
+TESSERACT_CMD = env('TESSERACT_CMD', default=r"C:\\Program Files\\Tesseract-OCR\\tesseract.exe")
+OCR_PROCESSES = env.int('OCR_PROCESSES', default=2)
+OCR_QUEUE_DEPTH = env.int('OCR_QUEUE_DEPTH', default=8)
+OCR_TIMEOUT_SECONDS = env.int('OCR_TIMEOUT_SECONDS', default=20)
+OCR_MAX_IMAGE_BYTES = env.int('OCR_MAX_IMAGE_BYTES', default=8 * 1024 * 1024)
+OCR_MAX_DIMENSION = env.int('OCR_MAX_DIMENSION', default=1600)
+OCR_RESULT_TTL_SECONDS = env.int('OCR_RESULT_TTL_SECONDS', default=300)
+# Extracted fields cached by image hash, for re-submitted photos.
+OCR_CACHE_MAX_ENTRIES = env.int('OCR_CACHE_MAX_ENTRIES', default=256)
+OCR_CACHE_TTL_SECONDS = env.int('OCR_CACHE_TTL_SECONDS', default=900)
+
+# ======================================================
+# STARTUP BUDGET
+# ======================================================
+# Checked by `python manage.py startup_benchmark` (import time and resident
+# memory of a fresh worker after django.setup()).
+STARTUP_IMPORT_BUDGET_SECONDS = env.float('STARTUP_IMPORT_BUDGET_SECONDS', default=1.5)
+STARTUP_RSS_BUDGET_MB = env.float('STARTUP_RSS_BUDGET_MB', default=120)
+
+# ======================================================
+# ASYNC VIEWS
+# ======================================================
+# Polled queue endpoints and QR scans are async views whose DB work runs on
+# this many threads (terminal.async_db), each keeping its connection open
+# for up to DB_POOL_CONN_MAX_AGE seconds.
+DB_THREAD_POOL_SIZE = env.int('DB_THREAD_POOL_SIZE', default=4)
+DB_POOL_CONN_MAX_AGE = env.int('DB_POOL_CONN_MAX_AGE', default=300)
+
+# ======================================================
+# WEBSOCKET FLOW CONTROL
+# ======================================================
+# Display sockets that opt in (terminal.ws_flow) get a heartbeat every
+# WS_HEARTBEAT_SECONDS and are closed after WS_IDLE_TIMEOUT_SECONDS without
+# an ack or pong.
+WS_HEARTBEAT_SECONDS = env.int('WS_HEARTBEAT_SECONDS', default=25)
+WS_IDLE_TIMEOUT_SECONDS = env.int('WS_IDLE_TIMEOUT_SECONDS', default=75)
+# Connecting sockets share one initial board (terminal.live_state), rebuilt
+# when older than this many seconds.
+WS_INITIAL_STATE_MAX_AGE = env.int('WS_INITIAL_STATE_MAX_AGE', default=10)
+
+# ======================================================
+# QUEUE SNAPSHOTS
+# ======================================================
+# Each queue change writes the public board as static JSON (terminal.snapshots)
+# to QUEUE_SNAPSHOT_ROOT, served at QUEUE_SNAPSHOT_URL without touching the
+# database. A front proxy may serve the directory directly instead.
+QUEUE_SNAPSHOTS_ENABLED = env.bool('QUEUE_SNAPSHOTS_ENABLED', default=True)
+QUEUE_SNAPSHOT_ROOT = env('QUEUE_SNAPSHOT_ROOT', default=str(BASE_DIR / 'snapshots' / 'queue'))
+QUEUE_SNAPSHOT_URL = '/snapshots/queue/'
+QUEUE_SNAPSHOT_MAX_AGE = env.int('QUEUE_SNAPSHOT_MAX_AGE', default=2)
+# Older snapshots are still served, but trigger a background republish.
+QUEUE_SNAPSHOT_REFRESH_SECONDS = env.int('QUEUE_SNAPSHOT_REFRESH_SECONDS', default=15)
+
+# ======================================================
+# TV HISTORY
+# ======================================================
+# TV history panels read per-route ring buffers (terminal.recent_history) of
+# the last RECENT_HISTORY_PER_ROUTE enter/exit events. Events from other
+# workers are picked up at most every RECENT_HISTORY_SYNC_SECONDS.
+RECENT_HISTORY_PER_ROUTE = env.int('RECENT_HISTORY_PER_ROUTE', default=3)
+RECENT_HISTORY_SYNC_SECONDS = env.float('RECENT_HISTORY_SYNC_SECONDS', default=1.0)
+
 # ======================================================
 # PRODUCTION SECURITY
 # ======================================================
@@ -280,19 +280,37 @@ document.addEventListener("DOMContentLoaded", function () {
   
   if (driverInput && suggestionBox && vehicleField) {
     
+    let suggestionTimer = null;
+    let suggestionRequest = 0;
+
+    // Ranked matches come from the shared search API (vehicles.search)
     function renderSuggestions(value) {
       suggestionBox.innerHTML = "";
-      const query = value.trim().toLowerCase();
+      const query = value.trim();
+      clearTimeout(suggestionTimer);
       if (!query) return;
 
-      const matches = driverOptions.filter(option => {
-        return (
-          option.driver_name.toLowerCase().includes(query) ||
-          option.license_plate.toLowerCase().includes(query) ||
-          (option.license_number || "").toLowerCase().includes(query)
-        );
-      }).slice(0, 6);
+      suggestionTimer = setTimeout(() => {
+        const requestId = ++suggestionRequest;
+        const url = new URL(vehicleSearchUrl, window.location.origin);
+        url.searchParams.set("q", query);
+        url.searchParams.set("type", "vehicle");
+        url.searchParams.set("limit", "6");
 
+        fetch(url)
+          .then(response => response.json())
+          .then(data => {
+            if (requestId !== suggestionRequest) return;  // a newer query is in flight
+            showSuggestions(data.success ? data.results : []);
+          })
+          .catch(() => {
+            if (requestId === suggestionRequest) showSuggestions([]);
+          });
+      }, 150);
+    }
+
+    function showSuggestions(matches) {
+      suggestionBox.innerHTML = "";
       if (!matches.length) {
         const item = document.createElement("div");
         item.className = "suggestion-item empty";
@@ -0,0 +1,193 @@
+/* =====================================================
+   GATE CHANNEL - token-authenticated scanner socket
+   ===================================================== */
+// A scan page opened as a registered gate device (once with
+// #gate-token=<token>; the token is then kept in localStorage) sends its
+// scans over one persistent WebSocket (terminal.gate) instead of a session
+// POST per vehicle. While the socket is down, scans go to the token HTTP
+// fallback. If the server cannot be reached at all, scans are kept in a
+// localStorage outbox (device time + idempotency key) and uploaded in
+// batches once it is back. Pages without a token keep posting to the staff view.
+
+const GATE_TOKEN_KEY = "rdfsGateToken";
+const GATE_AUTH_CLOSE_CODE = 4401;
+// The token travels as a subprotocol, never in the URL (terminal.gate)
+const GATE_SUBPROTOCOL = "rdfs.gate";
+const GATE_TOKEN_SUBPROTOCOL_PREFIX = "rdfs.gate.token.";
+const GATE_SCAN_TIMEOUT_MS = 10000;
+const GATE_OUTBOX_KEY = "rdfsGateOutbox";
+const GATE_OUTBOX_BATCH = 500;
+const GATE_OUTBOX_FLUSH_MS = 30000;
+
+class GateChannel {
+  static fromPage(fallbackUrl, batchUrl) {
+    const match = window.location.hash.match(/gate-token=([^&]+)/);
+    if (match) {
+      localStorage.setItem(GATE_TOKEN_KEY, decodeURIComponent(match[1]));
+      history.replaceState(null, "", window.location.pathname + window.location.search);
+    }
+    const token = localStorage.getItem(GATE_TOKEN_KEY);
+    return token && fallbackUrl ? new GateChannel(token, fallbackUrl, batchUrl) : null;
+  }
+
+  constructor(token, fallbackUrl, batchUrl) {
+    this.token = token;
+    this.fallbackUrl = fallbackUrl;
+    this.batchUrl = batchUrl;
+    this.flushing = false;
+    this.socket = null;
+    this.pending = new Map();
+    this.nextId = 1;
+    this.retryDelay = 1000;
+    this.queueDepth = 0;
+    this.connect();
+    if (batchUrl) {
+      setInterval(() => this.flushOutbox(), GATE_OUTBOX_FLUSH_MS);
+    }
+  }
+
+  connect() {
+    const protocol = window.location.protocol === "https:" ? "wss:" : "ws:";
+    const url = `${protocol}//${window.location.host}/ws/gate/`;
+    const socket = new WebSocket(url, [GATE_SUBPROTOCOL, GATE_TOKEN_SUBPROTOCOL_PREFIX + this.token]);
+    this.socket = socket;
+
+    socket.onopen = () => {
+      this.retryDelay = 1000;
+      this.flushOutbox();
+    };
+
+    socket.onmessage = (event) => {
+      let data;
+      try {
+        data = JSON.parse(event.data);
+      } catch (error) {
+        return;
+      }
+      if (data.type !== "result") return;
+      this.queueDepth = data.queue_depth || 0;
+      const waiting = this.pending.get(data.id);
+      if (waiting) {
+        clearTimeout(waiting.timer);
+        this.pending.delete(data.id);
+        waiting.resolve(data);
+      }
+    };
+
+    socket.onclose = (event) => {
+      // Scans in flight may or may not have been applied: ask for a rescan
+      // rather than resending them
+      this.failPending("Connection lost. Please scan again.");
+      if (event.code === GATE_AUTH_CLOSE_CODE) {
+        localStorage.removeItem(GATE_TOKEN_KEY);
+        return;
+      }
+      setTimeout(() => this.connect(), this.retryDelay);
+      this.retryDelay = Math.min(this.retryDelay * 2, 30000);
+    };
+  }
+
+  failPending(message) {
+    this.pending.forEach((waiting) => {
+      clearTimeout(waiting.timer);
+      waiting.reject(new Error(message));
+    });
+    this.pending.clear();
+  }
+
+  scan(fields) {
+    if (!this.socket || this.socket.readyState !== WebSocket.OPEN) {
+      return this.scanOverHttp(fields);
+    }
+    const id = String(this.nextId++);
+    return new Promise((resolve, reject) => {
+      const timer = setTimeout(() => {
+        this.pending.delete(id);
+        reject(new Error("Scan timed out."));
+      }, GATE_SCAN_TIMEOUT_MS);
+      this.pending.set(id, { resolve, reject, timer });
+      this.socket.send(JSON.stringify({ type: "scan", id, ...fields }));
+    });
+  }
+
+  async scanOverHttp(fields) {
+    let response;
+    try {
+      response = await this.post(this.fallbackUrl, fields);
+    } catch (error) {
+      // Server unreachable: keep the scan for the next batch upload
+      if (!this.batchUrl) throw error;
+      return this.saveOffline(fields);
+    }
+    return response.json();
+  }
+
+  async post(url, body) {
+    const response = await fetch(url, {
+      method: "POST",
+      credentials: "omit",
+      headers: {
+        "Authorization": `Token ${this.token}`,
+        "Content-Type": "application/json"
+      },
+      body: JSON.stringify(body)
+    });
+    if (response.status === 401) {
+      localStorage.removeItem(GATE_TOKEN_KEY);
+    }
+    return response;
+  }
+
+  /* ---------- offline outbox ---------- */
+  readOutbox() {
+    try {
+      return JSON.parse(localStorage.getItem(GATE_OUTBOX_KEY)) || [];
+    } catch (error) {
+      return [];
+    }
+  }
+
+  writeOutbox(scans) {
+    localStorage.setItem(GATE_OUTBOX_KEY, JSON.stringify(scans));
+  }
+
+  saveOffline(fields) {
+    const key = window.crypto && crypto.randomUUID
+      ? crypto.randomUUID()
+      : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 12)}`;
+    const scans = this.readOutbox();
+    scans.push({ ...fields, key, scanned_at: new Date().toISOString() });
+    this.writeOutbox(scans);
+    return {
+      status: "offline",
+      message: `📥 Saved offline (${scans.length} waiting). It will be applied when the server is back.`,
+      balance: null
+    };
+  }
+
+  async flushOutbox() {
+    if (!this.batchUrl || this.flushing) return;
+    this.flushing = true;
+    try {
+      let scans = this.readOutbox();
+      while (scans.length) {
+        const batch = scans.slice(0, GATE_OUTBOX_BATCH);
+        // A batch sent again after a lost response is answered from the
+        // server's stored results (same keys), not applied twice
+        const response = await this.post(this.batchUrl, { scans: batch });
+        if (!response.ok) break;
+        const { results = [] } = await response.json();
+        // Scans the server could not apply yet stay queued for the next flush
+        const retry = new Set(results.filter((result) => result.retry).map((result) => result.key));
+        const sent = new Set(batch.map((scan) => scan.key).filter((key) => !retry.has(key)));
+        scans = this.readOutbox().filter((scan) => !sent.has(scan.key));
+        this.writeOutbox(scans);
+        if (retry.size) break;
+      }
+    } catch (error) {
+      // Still offline; retried on the next socket open or timer tick
+    } finally {
+      this.flushing = false;
+    }
+  }
+}
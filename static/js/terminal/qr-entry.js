@@ -24,6 +24,9 @@ const resetOverlay = document.getElementById("rdfsQrResetCooldown");
 const scannerStatus = document.getElementById("scannerStatus");
 const container = document.querySelector(".qr-entry-container");
 
+// Gate device mode (gate-channel.js), or null for the staff session POST
+const gateChannel = GateChannel.fromPage(container.dataset.gateScanUrl, container.dataset.gateBatchUrl);
+
 /* =====================================================
    FEEDBACK DISPLAY
    ===================================================== */
@@ -136,26 +139,34 @@ async function processQRCode(qrCode) {
       return;
     }
     
-    // Prepare request payload
-    const payload = new URLSearchParams({ qr_code: qrCode });
-    if (awaitingReset && queuedQr === qrCode) {
-      payload.append("confirm_reset", "1");
-    }
-    
-    // Get CSRF token
-    const csrfToken = document.querySelector('[name=csrfmiddlewaretoken]').value;
-    
-    // Send request
-    const response = await fetch(window.location.href, {
-      method: "POST",
-      headers: {
-        "X-CSRFToken": csrfToken,
-        "X-Requested-With": "XMLHttpRequest"
-      },
-      body: payload
-    });
+    const confirmReset = awaitingReset && queuedQr === qrCode;
+    let data;
     
-    const data = await response.json();
+    if (gateChannel) {
+      // Registered gate device: persistent socket (HTTP fallback inside)
+      data = await gateChannel.scan({ qr_code: qrCode, confirm_reset: confirmReset });
+    } else {
+      // Prepare request payload
+      const payload = new URLSearchParams({ qr_code: qrCode });
+      if (confirmReset) {
+        payload.append("confirm_reset", "1");
+      }
+      
+      // Get CSRF token
+      const csrfToken = document.querySelector('[name=csrfmiddlewaretoken]').value;
+      
+      // Send request
+      const response = await fetch(window.location.href, {
+        method: "POST",
+        headers: {
+          "X-CSRFToken": csrfToken,
+          "X-Requested-With": "XMLHttpRequest"
+        },
+        body: payload
+      });
+      
+      data = await response.json();
+    }
     
     // Handle response
     if (data.status === "success") {
@@ -165,6 +176,13 @@ async function processQRCode(qrCode) {
       toggleResetCooldownOverlay(false);
       showFeedback(data.message, "success");
       pauseScanning(4000);
+    } else if (data.status === "offline") {
+      awaitingReset = false;
+      queuedQr = "";
+      toggleResetHint(false);
+      toggleResetCooldownOverlay(false);
+      showFeedback(data.message, "warning");
+      pauseScanning(3000);
     } else if (data.status === "queued") {
       awaitingReset = true;
       queuedQr = qrCode;
@@ -186,7 +204,7 @@ async function processQRCode(qrCode) {
     awaitingReset = false;
     queuedQr = "";
     toggleResetHint(false);
-    showFeedback("Network error. Please try again.", "error");
+    showFeedback(gateChannel ? error.message : "Network error. Please try again.", "error");
     pauseScanning(3000);
   }
 }
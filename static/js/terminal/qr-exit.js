@@ -19,6 +19,9 @@ const feedbackArea = document.getElementById("feedbackArea");
 const scannerStatus = document.getElementById("scannerStatus");
 const container = document.querySelector(".qr-exit-container");
 
+// Gate device mode (gate-channel.js), or null for the staff session POST
+const gateChannel = GateChannel.fromPage(container.dataset.gateScanUrl, container.dataset.gateBatchUrl);
+
 /* =====================================================
    FEEDBACK DISPLAY
    ===================================================== */
@@ -87,25 +90,35 @@ function playSound(audio) {
    ===================================================== */
 async function processQRCode(qrCode) {
   try {
-    // Get CSRF token
-    const csrfToken = document.querySelector('[name=csrfmiddlewaretoken]').value;
-    
-    // Send request
-    const response = await fetch(window.location.href, {
-      method: "POST",
-      headers: {
-        "X-CSRFToken": csrfToken,
-        "X-Requested-With": "XMLHttpRequest"
-      },
-      body: new URLSearchParams({ qr_code: qrCode })
-    });
+    let data;
     
-    const data = await response.json();
+    if (gateChannel) {
+      // Registered gate device: persistent socket (HTTP fallback inside)
+      data = await gateChannel.scan({ qr_code: qrCode });
+    } else {
+      // Get CSRF token
+      const csrfToken = document.querySelector('[name=csrfmiddlewaretoken]').value;
+      
+      // Send request
+      const response = await fetch(window.location.href, {
+        method: "POST",
+        headers: {
+          "X-CSRFToken": csrfToken,
+          "X-Requested-With": "XMLHttpRequest"
+        },
+        body: new URLSearchParams({ qr_code: qrCode })
+      });
+      
+      data = await response.json();
+    }
     
     // Handle response
     if (data.status === "success") {
       showFeedback(data.message, "success");
       pauseScanning(4000);
+    } else if (data.status === "offline") {
+      showFeedback(data.message, "warning");
+      pauseScanning(3000);
     } else {
       showFeedback(data.message, "error");
       pauseScanning(3000);
@@ -113,7 +126,7 @@ async function processQRCode(qrCode) {
     
   } catch (error) {
     console.error("QR processing error:", error);
-    showFeedback("Network error. Please try again.", "error");
+    showFeedback(gateChannel ? error.message : "Network error. Please try again.", "error");
     pauseScanning(3000);
   }
 }
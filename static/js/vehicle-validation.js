@@ -4,8 +4,11 @@
  */
 
 class VehicleFormValidator {
-    constructor(validationConfig) {
+    constructor(validationConfig, checkUrl = null) {
         this.config = validationConfig;
+        // Live duplicate check for fields with a `unique` message
+        this.checkUrl = checkUrl;
+        this.pendingChecks = {};
         this.form = document.querySelector('form.needs-validation');
         
         if (!this.form) {
@@ -22,8 +25,13 @@ class VehicleFormValidator {
             const input = document.getElementById(`id_${fieldName}`);
             if (!input) return;
             
-            // Validate on blur (when user leaves field)
-            input.addEventListener('blur', () => this.validateField(fieldName));
+            // Validate on blur (when user leaves field), then ask the
+            // server whether the value is already registered
+            input.addEventListener('blur', () => {
+                if (this.validateField(fieldName)) {
+                    this.checkUnique(fieldName);
+                }
+            });
             
             // Validate on input for immediate feedback (but silent for typing)
             input.addEventListener('input', () => {
@@ -144,6 +152,35 @@ class VehicleFormValidator {
         return true;
     }
     
+    /**
+     * Ask the server whether a unique identifier is already registered.
+     * Only the latest check per field is applied; the server still
+     * re-checks on submit.
+     */
+    checkUnique(fieldName) {
+        const rules = this.config[fieldName];
+        if (!this.checkUrl || !rules || !rules.errors || !rules.errors.unique) return;
+
+        const input = document.getElementById(`id_${fieldName}`);
+        const value = input ? input.value.trim() : '';
+        if (!value) return;
+
+        const token = (this.pendingChecks[fieldName] || 0) + 1;
+        this.pendingChecks[fieldName] = token;
+        const params = new URLSearchParams({ type: 'vehicle', field: fieldName, value });
+
+        fetch(`${this.checkUrl}?${params}`, { headers: { 'Accept': 'application/json' } })
+            .then(response => response.ok ? response.json() : null)
+            .then(data => {
+                if (!data || !data.success || this.pendingChecks[fieldName] !== token) return;
+                if (input.value.trim().toUpperCase() !== data.value) return;
+                if (!data.available) {
+                    this.showError(input, data.message || rules.errors.unique);
+                }
+            })
+            .catch(() => {});  // Best effort: submit validation still applies
+    }
+    
     validateForm() {
         let isValid = true;
         
@@ -205,7 +242,7 @@ document.addEventListener('DOMContentLoaded', () => {
     if (configElement) {
         try {
             const config = JSON.parse(configElement.textContent);
-            window.vehicleValidator = new VehicleFormValidator(config);
+            window.vehicleValidator = new VehicleFormValidator(config, configElement.dataset.checkUrl);
         } catch (e) {
             console.error('Failed to initialize vehicle validation:', e);
         }
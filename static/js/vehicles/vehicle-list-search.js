@@ -8,6 +8,7 @@ document.addEventListener('DOMContentLoaded', function() {
   const clearBtn = document.getElementById('clearSearch');
   const tableBody = document.getElementById('vehiclesTableBody');
   const resultsText = document.getElementById('resultsText');
+  const pager = document.getElementById('vehiclesPager');
   const loadingIndicator = document.getElementById('loadingIndicator');
   
   let searchTimeout;
@@ -72,6 +73,9 @@ document.addEventListener('DOMContentLoaded', function() {
     const sortBy = sortSelect ? sortSelect.value : 'newest';
     
     const url = new URL(window.location.href);
+
+    // A new search or sort starts again from the first page
+    url.searchParams.delete('cursor');
     
     if (query) {
       url.searchParams.set('q', query);
@@ -114,6 +118,12 @@ document.addEventListener('DOMContentLoaded', function() {
         resultsText.innerHTML = newResultsText.innerHTML;
       }
 
+      // Update pagination links
+      const newPager = doc.getElementById('vehiclesPager');
+      if (newPager && pager) {
+        pager.innerHTML = newPager.innerHTML;
+      }
+
       // Update URL without reload
       window.history.replaceState({}, '', url.toString());
 
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import TerminalFeeBalance, EntryLog, SystemSettings, TerminalActivity
+from .models import TerminalFeeBalance, EntryLog, GateDevice, GateScan, SystemSettings, TerminalActivity, TransactionArchive
 
 admin.site.register(SystemSettings)
 
@@ -31,3 +31,27 @@ class TerminalActivityAdmin(admin.ModelAdmin):
     list_filter = ("event_type",)
     search_fields = ("vehicle__license_plate", "driver__last_name")
     ordering = ("-timestamp",)
+
+
+@admin.register(TransactionArchive)
+class TransactionArchiveAdmin(admin.ModelAdmin):
+    list_display = ("year", "month", "row_count", "revenue_total", "file_name", "updated_at")
+    ordering = ("-year", "-month")
+    readonly_fields = ("year", "month", "file_name", "row_count", "revenue_total", "created_at", "updated_at")
+
+
+@admin.register(GateDevice)
+class GateDeviceAdmin(admin.ModelAdmin):
+    # Tokens are issued with `manage.py gate_device`; here devices can be revoked
+    list_display = ("name", "gate", "staff", "is_active", "last_seen_at")
+    list_filter = ("gate", "is_active")
+    search_fields = ("name", "staff__username")
+    readonly_fields = ("created_at", "last_seen_at")
+
+
+@admin.register(GateScan)
+class GateScanAdmin(admin.ModelAdmin):
+    list_display = ("device", "key", "qr_code", "scanned_at", "received_at")
+    list_filter = ("device",)
+    search_fields = ("key", "qr_code")
+    readonly_fields = ("device", "key", "qr_code", "confirm_reset", "scanned_at", "received_at", "result")
@@ -0,0 +1,69 @@
+"""
+Async DB Executor
+=================
+Runs the database work of async views (the polled queue endpoints and the
+QR scan endpoints) on a small dedicated thread pool.
+
+Under daphne, a sync view is entered through ``sync_to_async`` on a fresh
+per-request thread, which also opens a fresh database connection
+(``CONN_MAX_AGE`` is 0). Django 5.0's async ORM is the same
+``sync_to_async`` underneath.
+
+The pool instead keeps ``DB_THREAD_POOL_SIZE`` threads. Each thread reuses
+its connection for up to ``DB_POOL_CONN_MAX_AGE`` seconds (closed early if
+it errored and stopped being usable). The pool also caps how many of
+these requests hit the database at once.
+
+Calls go through ``sync_to_async(..., executor=...)``, so code inside can
+still use ``async_to_sync`` (the queue broadcasts in ``terminal.signals``).
+That call runs on the server's event loop, as it does from a sync view.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.DB_THREAD_POOL_SIZE,
+                thread_name_prefix="db-pool",
+            )
+        return _executor
+
+
+def _refresh_connections():
+    """Give new pool connections the pool's lifetime; drop broken or expired ones."""
+    for conn in connections.all(initialized_only=True):
+        if conn.connection is not None and getattr(conn, "_pool_connection_id", None) != id(conn.connection):
+            conn._pool_connection_id = id(conn.connection)
+            conn.close_at = time.monotonic() + settings.DB_POOL_CONN_MAX_AGE
+        conn.close_if_unusable_or_obsolete()
+
+
+def _call(func, args, kwargs):
+    _refresh_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _refresh_connections()
+
+
+async def run_db(func, *args, **kwargs):
+    """Await ``func(*args, **kwargs)`` run on the DB thread pool."""
+    return await sync_to_async(_call, thread_sensitive=False, executor=_get_executor())(func, args, kwargs)
+
+
+def submit(func, *args, **kwargs):
+    """Run ``func(*args, **kwargs)`` on the DB thread pool without waiting; returns the Future."""
+    return _get_executor().submit(_call, func, args, kwargs)
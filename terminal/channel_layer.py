@@ -0,0 +1,436 @@
+"""
+PostgreSQL Channel Layer
+========================
+A Channels layer on the application's own PostgreSQL database, so several
+ASGI worker processes can share queue/TV broadcasts without Redis.
+Enable with ``USE_POSTGRES_CHANNEL_LAYER=True``.
+
+Fan-out uses LISTEN/NOTIFY:
+
+- Group membership is kept per process. A process LISTENs on one PostgreSQL
+  channel per group it has local members in, so ``group_send()`` is a
+  single NOTIFY that every interested process receives and hands to its
+  own sockets.
+- Channel names embed the owning process (``specific.<process>!<id>``), so
+  ``send()`` to another process's channel is a NOTIFY on that process's
+  PostgreSQL channel.
+- NOTIFY payloads are limited to 8000 bytes. Larger messages are stored in
+  ``ChannelLayerPayload`` and only their id is notified. The rows are
+  deleted by later sends once older than ``expiry`` seconds.
+
+Only process-specific channels (the kind consumers use) are supported;
+there is no shared worker channel for ``runworker``. Messages must be
+JSON-serializable; the queue/TV payloads already are, since they are sent
+with ``send_json``. Like NOTIFY itself, delivery is best effort: a
+message arriving for a full or unknown channel is dropped, and messages
+sent while the listening connection is down are lost (consumers resync
+on the next update).
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import uuid
+
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# PostgreSQL rejects NOTIFY payloads of 8000 bytes or more.
+NOTIFY_PAYLOAD_LIMIT = 7900
+RECONNECT_DELAY_SECONDS = 1.0
+
+
+def connection_params(alias="default"):
+    """psycopg2.connect() keyword arguments for a Django database alias."""
+    database = settings.DATABASES[alias]
+    params = {
+        "dbname": database.get("NAME"),
+        "user": database.get("USER"),
+        "password": database.get("PASSWORD"),
+        "host": database.get("HOST"),
+        "port": database.get("PORT"),
+    }
+    params = {key: value for key, value in params.items() if value not in (None, "")}
+    params.update(database.get("OPTIONS", {}))
+    return params
+
+
+def _pg_channel(kind, name):
+    # PostgreSQL identifiers are at most 63 bytes; ours are [a-z0-9_].
+    return f"chl_{kind}_{hashlib.sha1(name.encode()).hexdigest()[:40]}"
+
+
+# =============================================================================
+# CONNECTIONS
+# =============================================================================
+class _Sender:
+    """One autocommit connection for NOTIFY and payload rows, used from executor threads."""
+
+    def __init__(self, params, payload_table, expiry):
+        self.params = params
+        self.payload_table = payload_table
+        self.expiry = expiry
+        self.lock = threading.Lock()
+        self.conn = None
+
+    def _cursor(self):
+        import psycopg2
+
+        if self.conn is None or self.conn.closed:
+            self.conn = psycopg2.connect(**self.params)
+            self.conn.autocommit = True
+        return self.conn.cursor()
+
+    def _run(self, work):
+        import psycopg2
+
+        with self.lock:
+            try:
+                with self._cursor() as cursor:
+                    return work(cursor)
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                # Stale connection (database restart, idle timeout): retry once.
+                self.conn = None
+                with self._cursor() as cursor:
+                    return work(cursor)
+
+    def notify(self, pg_channel, envelope):
+        data = json.dumps(envelope, separators=(",", ":"))
+
+        def work(cursor):
+            if len(data.encode()) > NOTIFY_PAYLOAD_LIMIT:
+                cursor.execute(
+                    f'DELETE FROM "{self.payload_table}" WHERE created_at < now() - %s * interval \'1 second\'',
+                    [self.expiry],
+                )
+                cursor.execute(
+                    f'INSERT INTO "{self.payload_table}" (created_at, payload) VALUES (now(), %s) RETURNING id',
+                    [data],
+                )
+                pointer = json.dumps({"payload_id": cursor.fetchone()[0]})
+                cursor.execute("SELECT pg_notify(%s, %s)", [pg_channel, pointer])
+            else:
+                cursor.execute("SELECT pg_notify(%s, %s)", [pg_channel, data])
+
+        self._run(work)
+
+    def fetch_payload(self, payload_id):
+        def work(cursor):
+            cursor.execute(f'SELECT payload FROM "{self.payload_table}" WHERE id = %s', [payload_id])
+            row = cursor.fetchone()
+            return row[0] if row else None
+
+        return self._run(work)
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+
+class _Listener:
+    """
+    A LISTEN connection read by the event loop it was started on.
+
+    Connecting and LISTEN/UNLISTEN block on the database, so they run in an
+    executor thread, one at a time and in the order they were requested.
+    The loop stops reading the connection meanwhile: a psycopg2 connection
+    cannot be polled while another thread runs a statement on it.
+    """
+
+    def __init__(self, layer, loop, channels=()):
+        self.layer = layer
+        self.loop = loop
+        self.conn = None
+        self.fd = None
+        self.channels = set(channels)
+        self.closed = False
+        self.lock = asyncio.Lock()
+        self.tasks = set()
+        self._start(self._connect())
+
+    def _start(self, coro):
+        # Tasks start in creation order, so they take the lock in that order.
+        task = self.loop.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    async def _connect(self):
+        async with self.lock:
+            if self.closed:
+                return
+            try:
+                conn = await self.loop.run_in_executor(None, _open_listen_connection,
+                                                       self.layer.params, tuple(self.channels))
+            except Exception:
+                logger.exception("Channel layer: opening the LISTEN connection failed; retrying")
+                self.loop.call_later(RECONNECT_DELAY_SECONDS, self._reconnect)
+                return
+            self.conn = conn
+            if self.closed:
+                self._drop_connection()
+                return
+            self._resume_reading()
+
+    def _reconnect(self):
+        if not self.closed and self.conn is None:
+            self._start(self._connect())
+
+    def _pause_reading(self):
+        if self.fd is not None:
+            try:
+                self.loop.remove_reader(self.fd)
+            except (ValueError, OSError, RuntimeError):
+                pass
+            self.fd = None
+
+    def _resume_reading(self):
+        if self.conn is not None and self.fd is None:
+            self.fd = self.conn.fileno()
+            self.loop.add_reader(self.fd, self._on_readable)
+            self._drain()
+
+    def _drop_connection(self):
+        self._pause_reading()
+        conn, self.conn = self.conn, None
+        if conn is not None:
+            try:
+                self.loop.run_in_executor(None, conn.close)
+            except RuntimeError:
+                conn.close()  # the loop is already closed
+
+    def _on_readable(self):
+        try:
+            self.conn.poll()
+        except Exception:
+            logger.warning("Channel layer: LISTEN connection lost; reconnecting")
+            self._drop_connection()
+            self.loop.call_later(RECONNECT_DELAY_SECONDS, self._reconnect)
+            return
+        self._drain()
+
+    def _drain(self):
+        while self.conn is not None and self.conn.notifies:
+            notify = self.conn.notifies.pop(0)
+            self.layer._on_notify(notify.channel, notify.payload)
+
+    async def _execute(self, sql):
+        import psycopg2
+
+        async with self.lock:
+            conn = self.conn
+            if conn is None:
+                return  # _connect() re-LISTENs from self.channels
+            self._pause_reading()
+            try:
+                await self.loop.run_in_executor(None, _run_statement, conn, sql)
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                # Reading again shows the lost connection and reconnects.
+                logger.warning("Channel layer: %s failed; the connection is down", sql)
+            finally:
+                if self.conn is conn:
+                    self._resume_reading()
+
+    async def _wait_turn(self):
+        async with self.lock:
+            pass
+
+    async def listen(self, pg_channel):
+        """LISTEN on ``pg_channel``; returns once it is active."""
+        if pg_channel not in self.channels:
+            self.channels.add(pg_channel)
+            job = self._start(self._execute(f'LISTEN "{pg_channel}"'))
+        else:
+            # Waits for a LISTEN on the channel that is still queued.
+            job = self._start(self._wait_turn())
+        await asyncio.shield(job)
+
+    def unlisten(self, pg_channel):
+        if pg_channel in self.channels:
+            self.channels.discard(pg_channel)
+            self._start(self._execute(f'UNLISTEN "{pg_channel}"'))
+
+    def close(self):
+        self.closed = True
+        self._drop_connection()
+        self.channels.clear()
+
+
+def _open_listen_connection(params, channels):
+    import psycopg2
+
+    conn = psycopg2.connect(**params)
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        for pg_channel in channels:
+            cursor.execute(f'LISTEN "{pg_channel}"')
+    return conn
+
+
+def _run_statement(conn, sql):
+    with conn.cursor() as cursor:
+        cursor.execute(sql)
+
+
+# =============================================================================
+# LAYER
+# =============================================================================
+class PostgresChannelLayer(BaseChannelLayer):
+    extensions = ["groups", "flush"]
+
+    def __init__(self, database="default", expiry=60, capacity=100, channel_capacity=None, **kwargs):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity, **kwargs)
+        from .models import ChannelLayerPayload
+
+        self.channel_capacity = self.compile_capacities(channel_capacity or {})
+        self.params = connection_params(database)
+        self.process_name = uuid.uuid4().hex[:12]
+        self.process_channel = _pg_channel("p", self.process_name)
+        self.sender = _Sender(self.params, ChannelLayerPayload._meta.db_table, expiry)
+        self.listener = None
+        self.queues = {}  # channel name -> asyncio.Queue
+        self.groups = {}  # group -> local channel names
+
+    # -------------------------------------------------------------------------
+    # Local state
+    # -------------------------------------------------------------------------
+    def _ensure_listener(self):
+        loop = asyncio.get_running_loop()
+        if self.listener is not None and self.listener.loop is not loop:
+            # The layer is reused by a new event loop (tests, async_to_sync in
+            # a script): start over rather than read from a dead loop.
+            self.listener.close()
+            self.listener = None
+            self.queues.clear()
+            self.groups.clear()
+        if self.listener is None:
+            self.listener = _Listener(self, loop, [self.process_channel])
+        return self.listener
+
+    def _queue(self, channel):
+        queue = self.queues.get(channel)
+        if queue is None:
+            queue = self.queues[channel] = asyncio.Queue(maxsize=self.get_capacity(channel))
+        return queue
+
+    def _deliver(self, channel, message):
+        queue = self.queues.get(channel)
+        if queue is None:
+            return
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            logger.warning("Channel layer: %s is full; dropping a %s message", channel, message.get("type"))
+
+    def _is_local(self, channel):
+        return "!" in channel and channel[:channel.index("!")].rsplit(".", 1)[-1] == self.process_name
+
+    def _on_notify(self, pg_channel, data):
+        envelope = json.loads(data)
+        if "payload_id" in envelope:
+            asyncio.ensure_future(self._deliver_stored(envelope["payload_id"]))
+        else:
+            self._dispatch(envelope)
+
+    async def _deliver_stored(self, payload_id):
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(None, self.sender.fetch_payload, payload_id)
+        if data is None:
+            logger.warning("Channel layer: stored payload %s expired before delivery", payload_id)
+            return
+        self._dispatch(json.loads(data))
+
+    def _dispatch(self, envelope):
+        if "group" in envelope:
+            for channel in list(self.groups.get(envelope["group"], ())):
+                self._deliver(channel, envelope["message"])
+        else:
+            self._deliver(envelope["channel"], envelope["message"])
+
+    async def _notify(self, pg_channel, envelope):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.sender.notify, pg_channel, envelope)
+
+    # -------------------------------------------------------------------------
+    # Channel layer API
+    # -------------------------------------------------------------------------
+    async def new_channel(self, prefix="specific"):
+        self._ensure_listener()
+        channel = f"{prefix}.{self.process_name}!{uuid.uuid4().hex}"
+        self._queue(channel)
+        return channel
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.valid_channel_name(channel)
+        if "!" not in channel:
+            raise ValueError("PostgresChannelLayer only supports process-specific channels.")
+        if self._is_local(channel):
+            queue = self.queues.get(channel)
+            if queue is not None:
+                if queue.full():
+                    raise ChannelFull(channel)
+                queue.put_nowait(message)
+            return
+        process_name = channel[:channel.index("!")].rsplit(".", 1)[-1]
+        await self._notify(_pg_channel("p", process_name), {"channel": channel, "message": message})
+
+    async def receive(self, channel):
+        self.valid_channel_name(channel)
+        self._ensure_listener()
+        queue = self._queue(channel)
+        try:
+            return await queue.get()
+        except asyncio.CancelledError:
+            # The consumer is shutting down: forget the channel.
+            if queue.empty():
+                self.queues.pop(channel, None)
+                for group in [group for group, members in self.groups.items() if channel in members]:
+                    self._remove_member(group, channel)
+            raise
+
+    async def group_add(self, group, channel):
+        self.valid_group_name(group)
+        self.valid_channel_name(channel)
+        listener = self._ensure_listener()
+        self.groups.setdefault(group, set()).add(channel)
+        self._queue(channel)
+        await listener.listen(_pg_channel("g", group))
+
+    def _remove_member(self, group, channel):
+        members = self.groups.get(group)
+        if not members:
+            return
+        members.discard(channel)
+        if not members:
+            del self.groups[group]
+            if self.listener is not None:
+                self.listener.unlisten(_pg_channel("g", group))
+
+    async def group_discard(self, group, channel):
+        self.valid_group_name(group)
+        self.valid_channel_name(channel)
+        self._remove_member(group, channel)
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.valid_group_name(group)
+        await self._notify(_pg_channel("g", group), {"group": group, "message": message})
+
+    async def flush(self):
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
+        self.queues.clear()
+        self.groups.clear()
+        self.sender.close()
+
+    async def close(self):
+        await self.flush()
@@ -1,2 +1,5 @@
 ﻿QUEUE_GROUP_NAME = "queue_updates"
 TV_DISPLAY_GROUP_NAME = "tv_display"
+# Clients that asked for the compact payload (?format=compact)
+QUEUE_COMPACT_GROUP_NAME = "queue_updates_compact"
+TV_DISPLAY_COMPACT_GROUP_NAME = "tv_display_compact"
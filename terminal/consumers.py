@@ -1,37 +1,85 @@
-from asgiref.sync import sync_to_async
+import asyncio
+import json
+import time
+from functools import cached_property
+from urllib.parse import parse_qsl
+
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 
-from .constants import QUEUE_GROUP_NAME, TV_DISPLAY_GROUP_NAME
+from . import gate, live_state
+from .async_db import run_db
+from .constants import (
+    QUEUE_COMPACT_GROUP_NAME,
+    QUEUE_GROUP_NAME,
+    TV_DISPLAY_COMPACT_GROUP_NAME,
+    TV_DISPLAY_GROUP_NAME,
+)
+from .utils import COMPACT_JSON, wants_compact
+from .ws_flow import REFRESH, FlowControlMixin
+
+
+class JsonCodecMixin:
+    """Whitespace-free JSON out; malformed client frames read as ``{}``."""
+
+    @classmethod
+    async def decode_json(cls, text_data):
+        try:
+            return json.loads(text_data)
+        except ValueError:
+            return {}
+
+    @classmethod
+    async def encode_json(cls, content):
+        return json.dumps(content, **COMPACT_JSON)
+
 
+class QueueFormatMixin(JsonCodecMixin):
+    """
+    Payload format negotiation: ``?format=compact`` on the socket URL picks
+    the short-key encoding (QueueService._compact_state) and the matching
+    broadcast groups. The verbose format stays the default.
+    """
+
+    @cached_property
+    def compact(self):
+        return wants_compact(dict(parse_qsl(self.scope.get("query_string", b"").decode())))
 
-class QueueConsumer(AsyncJsonWebsocketConsumer):
+
+class QueueConsumer(QueueFormatMixin, FlowControlMixin, AsyncJsonWebsocketConsumer):
     """
     WebSocket consumer for public queue display.
     Sends full queue state including queued, boarding, and departed vehicles.
+    Boards not yet sent are replaced by newer ones (terminal.ws_flow).
     """
 
     async def connect(self):
-        await self.channel_layer.group_add(QUEUE_GROUP_NAME, self.channel_name)
+        self.group_name = QUEUE_COMPACT_GROUP_NAME if self.compact else QUEUE_GROUP_NAME
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
         await self.accept()
-        await self.send_queue_state()
+        self.start_flow()
+        # Initial queue state on connection
+        self.offer(REFRESH)
 
     async def disconnect(self, code):
-        await self.channel_layer.group_discard(QUEUE_GROUP_NAME, self.channel_name)
+        self.stop_flow()
+        if hasattr(self, "group_name"):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        await self.handle_client_message(content)
 
     async def queue_update(self, event):
         """Handle queue update broadcast."""
         payload = event.get("payload")
         if payload:
-            await self.send_json(payload)
+            live_state.remember(live_state.QUEUE, self.compact, payload)
+            self.offer(payload)
 
-    async def send_queue_state(self):
-        """Send initial queue state on connection."""
-        from .services import QueueService
-        queue_state = await sync_to_async(QueueService.get_queue_state)()
-        await self.send_json(queue_state)
+    async def current_state(self):
+        return await live_state.get(live_state.QUEUE, self.compact)
 
 
-class TVDisplayConsumer(AsyncJsonWebsocketConsumer):
+class TVDisplayConsumer(QueueFormatMixin, FlowControlMixin, AsyncJsonWebsocketConsumer):
     """
     WebSocket consumer for terminal TV display.
     Shows boarding and departed only, with queued count as badge.
@@ -40,28 +88,83 @@ class TVDisplayConsumer(AsyncJsonWebsocketConsumer):
 
     async def connect(self):
         # Join both groups to receive all updates
-        await self.channel_layer.group_add(TV_DISPLAY_GROUP_NAME, self.channel_name)
-        await self.channel_layer.group_add(QUEUE_GROUP_NAME, self.channel_name)
+        if self.compact:
+            self.group_names = (TV_DISPLAY_COMPACT_GROUP_NAME, QUEUE_COMPACT_GROUP_NAME)
+        else:
+            self.group_names = (TV_DISPLAY_GROUP_NAME, QUEUE_GROUP_NAME)
+        for group_name in self.group_names:
+            await self.channel_layer.group_add(group_name, self.channel_name)
         await self.accept()
-        await self.send_tv_state()
+        self.start_flow()
+        self.offer(REFRESH)
 
     async def disconnect(self, code):
-        await self.channel_layer.group_discard(TV_DISPLAY_GROUP_NAME, self.channel_name)
-        await self.channel_layer.group_discard(QUEUE_GROUP_NAME, self.channel_name)
+        self.stop_flow()
+        for group_name in getattr(self, "group_names", ()):
+            await self.channel_layer.group_discard(group_name, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        await self.handle_client_message(content)
 
     async def tv_update(self, event):
         """Handle TV display update broadcast."""
         payload = event.get("payload")
         if payload:
-            await self.send_json(payload)
+            live_state.remember(live_state.TV, self.compact, payload)
+            self.offer(payload)
 
     async def queue_update(self, event):
         """Also listen to general queue updates."""
-        # Reformat for TV display
-        await self.send_tv_state()
-
-    async def send_tv_state(self):
-        """Send TV display state on connection or update."""
-        from .services import QueueService
-        tv_state = await sync_to_async(QueueService.get_tv_display_state)()
-        await self.send_json(tv_state)
+        # Reformat for TV display, once per burst of updates (shared build)
+        live_state.invalidate(live_state.TV)
+        self.offer(REFRESH)
+
+    async def current_state(self):
+        return await live_state.get(live_state.TV, self.compact)
+
+
+class GateScannerConsumer(JsonCodecMixin, AsyncJsonWebsocketConsumer):
+    """
+    Persistent channel for a gate scanner device (protocol in terminal.gate).
+    The device token is checked once, on connect, by GateTokenAuthMiddleware.
+    Scans are handled one at a time in arrival order.
+    """
+
+    async def connect(self):
+        self.device = self.scope.get("gate_device")
+        if self.device is None:
+            await self.close(code=gate.AUTH_CLOSE_CODE)
+            return
+        # Browsers drop the socket unless one of their subprotocols is picked
+        offered = gate.SUBPROTOCOL in self.scope.get("subprotocols", ())
+        await self.accept(subprotocol=gate.SUBPROTOCOL if offered else None)
+        self.stats = gate.GATES[self.channel_name] = gate.GateStats(self.device)
+        self.scans = asyncio.Queue()
+        self.worker = asyncio.ensure_future(self.scan_loop())
+        await self.send_json({"type": "ready", "device": self.device.name, "gate": self.device.gate})
+
+    async def disconnect(self, code):
+        if hasattr(self, "worker"):
+            self.worker.cancel()
+        gate.GATES.pop(self.channel_name, None)
+
+    async def receive_json(self, content, **kwargs):
+        kind = content.get("type") if isinstance(content, dict) else None
+        if kind == "scan":
+            self.stats.queued()
+            self.scans.put_nowait(content)
+        elif kind == "ping":
+            await self.send_json({"type": "pong"})
+
+    async def scan_loop(self):
+        while True:
+            content = await self.scans.get()
+            started = time.monotonic()
+            result = await run_db(gate.scan, self.device, content)
+            self.stats.done(round((time.monotonic() - started) * 1000, 1))
+            await self.send_json({
+                "type": "result",
+                "id": content.get("id"),
+                **result,
+                "queue_depth": self.stats.queue_depth,
+            })
@@ -0,0 +1,469 @@
+"""
+Gate Scanners
+=============
+Scan handling for the entry and exit gates, shared by the staff scan pages
+and by token-authenticated gate devices (``GateDevice``).
+
+Devices skip the session, CSRF and auth stack. They authenticate with an
+API token, sent once per connection on the persistent socket (``ws/gate/``)
+or per request on the HTTP fallback (``POST terminal:gate_scan_api``). The
+token never goes in a URL, where access logs would keep it: it is sent as an
+``Authorization: Token ...`` header, or by browsers (which cannot set socket
+headers) as the ``rdfs.gate.token.<token>`` WebSocket subprotocol next to
+``rdfs.gate``, the one the server accepts. Only the token's SHA-256 is
+stored; ``manage.py gate_device`` issues tokens.
+
+Socket protocol, JSON both ways:
+
+- server: ``{"type": "ready", "device", "gate"}`` once connected.
+- client: ``{"type": "scan", "id", "qr_code", "confirm_reset"}``.
+- server: ``{"type": "result", "id", "status", "message", "balance",
+  "queue_depth"}`` per scan, in arrival order. ``queue_depth`` counts the
+  device's scans still waiting behind it.
+- client ``{"type": "ping"}`` is answered with ``{"type": "pong"}``.
+
+Offline: a device that cannot reach the server keeps its scans, each with
+its device time and an idempotency key, and uploads them later in batches
+(``POST terminal:gate_scan_batch_api``, ``{"scans": [...]}``; see
+``apply_batch()``). Re-sending a batch does not apply or charge it again.
+Scans older than ``BATCH_KEY_RETENTION_DAYS``, or from a month whose
+transactions are archived, are rejected.
+
+Per-connection counters are kept in ``GATES`` for this process and reported
+by ``terminal:ws_metrics``.
+
+Scans do not run the full ``apply_entry_log_maintenance()`` each time. An
+entry past its departure time is closed when its vehicle is scanned.
+"""
+
+import hashlib
+import logging
+import secrets
+import time
+from datetime import timedelta
+
+from channels.middleware import BaseMiddleware
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from accounts.utils import is_staff_admin_or_admin
+from terminal.async_db import run_db
+from terminal.models import EntryLog, GateDevice, GateScan, SystemSettings, TransactionArchive, VehiclePresence
+from terminal.shared_queue import close_entries
+from terminal.signals import deferred_broadcasts
+from vehicles.models import QueueHistory, Vehicle, Wallet
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PREFIX = "gate_"
+LAST_SEEN_WRITE_SECONDS = 60
+
+# Close code for sockets whose device token is missing or revoked
+AUTH_CLOSE_CODE = 4401
+# Socket subprotocol accepted for gate devices, and the one carrying the token
+SUBPROTOCOL = "rdfs.gate"
+TOKEN_SUBPROTOCOL_PREFIX = "rdfs.gate.token."
+
+# Offline batches: scans per upload, and how long their keys are remembered
+BATCH_MAX_SCANS = 500
+BATCH_KEY_MAX_LENGTH = 64
+BATCH_KEY_RETENTION_DAYS = 7
+
+# channel name -> GateStats, for this process
+GATES = {}
+
+
+# =============================================================================
+# DEVICE TOKENS
+# =============================================================================
+def hash_token(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def issue_token(device):
+    """Give ``device`` a new token (the old one stops working); returns it, shown once."""
+    token = TOKEN_PREFIX + secrets.token_urlsafe(32)
+    device.token_hash = hash_token(token)
+    return token
+
+
+def authenticate(token):
+    """The active device for ``token``, whose staff member may still scan; otherwise None."""
+    if not token:
+        return None
+    device = (
+        GateDevice.objects
+        .select_related("staff")
+        .filter(token_hash=hash_token(token), is_active=True)
+        .first()
+    )
+    if device is None or not device.staff.is_active or not is_staff_admin_or_admin(device.staff):
+        return None
+
+    now = timezone.now()
+    if device.last_seen_at is None or (now - device.last_seen_at).total_seconds() >= LAST_SEEN_WRITE_SECONDS:
+        GateDevice.objects.filter(pk=device.pk).update(last_seen_at=now)
+        device.last_seen_at = now
+    return device
+
+
+def token_from_header(value):
+    """The token in an ``Authorization: Token <token>`` header value, or None."""
+    scheme, _, token = (value or "").partition(" ")
+    return token.strip() if scheme.lower() == "token" else None
+
+
+class GateTokenAuthMiddleware(BaseMiddleware):
+    """
+    Puts the authenticated ``GateDevice`` (or None) in ``scope["gate_device"]``.
+    The token comes from an ``Authorization: Token`` header or the token
+    subprotocol; a ``?token=`` query parameter is ignored.
+    """
+
+    async def __call__(self, scope, receive, send):
+        token = None
+        for protocol in scope.get("subprotocols", ()):
+            if protocol.startswith(TOKEN_SUBPROTOCOL_PREFIX):
+                token = protocol[len(TOKEN_SUBPROTOCOL_PREFIX):]
+        for name, value in scope.get("headers", ()):
+            if name == b"authorization":
+                token = token_from_header(value.decode("latin1")) or token
+        scope = dict(scope, gate_device=await run_db(authenticate, token))
+        return await super().__call__(scope, receive, send)
+
+
+# =============================================================================
+# SCANS
+# =============================================================================
+def scan_entry(qr_code, staff_user, confirm_reset=False, at=None, raise_errors=False):
+    """
+    Entry gate scan: enter the vehicle, or confirm a queue reset; returns the
+    JSON result. ``at`` is the scan time for scans uploaded later (default: now).
+    Unexpected errors become an error result unless ``raise_errors``.
+    """
+    settings = SystemSettings.get_solo()
+    entry_fee = settings.terminal_fee
+    cooldown_minutes = settings.entry_cooldown_minutes
+    min_deposit = settings.min_deposit_amount
+    departure_duration = int(getattr(settings, "departure_duration_minutes", 30))
+
+    try:
+        # 🔍 Validate vehicle
+        vehicle = Vehicle.objects.filter(qr_value__iexact=qr_code).first()
+        if not vehicle:
+            return {
+                "status": "error",
+                "message": "❌ Invalid QR code.",
+                "balance": None
+            }
+
+        now = at or timezone.now()
+
+        with transaction.atomic():
+            # 🚗 Check if vehicle already inside terminal (presence row locked until commit)
+            presence = VehiclePresence.for_vehicle(vehicle, lock=True)
+            if presence.active_entry_id and presence.last_entry_at <= now - timedelta(minutes=departure_duration):
+                # Past its departure time, not yet closed by housekeeping
+                close_entries([presence.active_entry_id], now)
+                presence.refresh_from_db()
+
+            # 🏦 Get or create wallet
+            wallet, _ = Wallet.objects.get_or_create(vehicle=vehicle)
+
+            # ========================
+            # 🔁 DEPARTURE LOGIC
+            # ========================
+            if presence.active_entry_id:
+                if confirm_reset:
+                    reset_message = (
+                        f"Queue position reset confirmed by '{staff_user.username}'. "
+                        f"Vehicle '{vehicle.license_plate}' moved to rejoin queue."
+                    )
+                    EntryLog.objects.filter(pk=presence.active_entry_id).update(
+                        created_at=now,
+                        message=reset_message
+                    )
+                    presence.last_entry_at = now
+                    presence.save(update_fields=["last_entry_at", "updated_at"])
+                    return {
+                        "status": "success",
+                        "message": "🔁 Queue reset confirmed. Please proceed back to the line.",
+                        "balance": float(wallet.balance)
+                    }
+
+                return {
+                    "status": "queued",
+                    "message": (
+                        "⚠️ You're already queued. Scan again to reset your position "
+                        "if you missed your turn or stepped out briefly."
+                    ),
+                    "balance": float(wallet.balance)
+                }
+
+            # ========================
+            # 🚘 ENTRY LOGIC
+            # ========================
+            if presence.last_entry_at and (now - presence.last_entry_at) < timedelta(minutes=cooldown_minutes):
+                return {
+                    "status": "error",
+                    "message": "⏳ Please wait before re-entry.",
+                    "balance": float(wallet.balance)
+                }
+
+            if wallet.balance < min_deposit:
+                return {
+                    "status": "error",
+                    "message": f"⚠️ Minimum ₱{min_deposit} required before entry.",
+                    "balance": float(wallet.balance)
+                }
+
+            if wallet.balance >= entry_fee:
+                wallet.balance -= entry_fee
+                wallet.save()
+
+                entry_log = EntryLog.objects.create(
+                    vehicle=vehicle,
+                    staff=staff_user,
+                    fee_charged=entry_fee,
+                    wallet_balance_snapshot=wallet.balance,
+                    status=EntryLog.STATUS_SUCCESS,
+                    message=f"Vehicle '{vehicle.license_plate}' entered terminal."
+                )
+                if at is not None:
+                    EntryLog.objects.filter(pk=entry_log.pk).update(created_at=now)
+                    entry_log.created_at = now
+                presence.enter(entry_log)
+                QueueHistory.objects.create(
+                    vehicle=vehicle,
+                    driver=getattr(vehicle, "assigned_driver", None),
+                    action="enter",
+                    timestamp=now,
+                    departure_time_snapshot=now + timedelta(minutes=departure_duration),
+                    wallet_balance_snapshot=wallet.balance,
+                    fee_charged=entry_fee,
+                )
+
+                return {
+                    "status": "success",
+                    "message": f"🚗 {vehicle.license_plate} entered terminal.",
+                    "balance": float(wallet.balance)
+                }
+
+            EntryLog.objects.create(
+                vehicle=vehicle,
+                staff=staff_user,
+                fee_charged=entry_fee,
+                wallet_balance_snapshot=wallet.balance,
+                status=EntryLog.STATUS_INSUFFICIENT,
+                message=f"Insufficient balance for '{vehicle.license_plate}'."
+            )
+            return {
+                "status": "error",
+                "message": f"❌ Insufficient balance for {vehicle.license_plate}.",
+                "balance": float(wallet.balance)
+            }
+
+    except Exception as e:
+        if raise_errors:
+            raise
+        return {
+            "status": "error",
+            "message": f"Unexpected error: {str(e)}",
+            "balance": None
+        }
+
+
+def scan_exit(qr_code, at=None, raise_errors=False):
+    """
+    Exit gate scan: mark the vehicle departed (at ``at``, default now); returns
+    the JSON result. Unexpected errors become an error result unless ``raise_errors``.
+    """
+    try:
+        vehicle = Vehicle.objects.filter(qr_value__iexact=qr_code).first()
+        if not vehicle:
+            return {"status": "error", "message": "❌ No vehicle found."}
+
+        with transaction.atomic():
+            presence = VehiclePresence.for_vehicle(vehicle, lock=True)
+            active_log = presence.active_entry
+            if not active_log:
+                return {"status": "error", "message": f"⚠️ {vehicle.license_plate} not inside terminal."}
+
+            active_log.is_active = False
+            active_log.departed_at = at or timezone.now()
+            active_log.save(update_fields=["is_active", "departed_at"])
+            VehiclePresence.release([active_log.pk], active_log.departed_at)
+            QueueHistory.objects.create(
+                vehicle=vehicle,
+                driver=getattr(vehicle, "assigned_driver", None),
+                action="exit",
+                timestamp=active_log.departed_at,
+                departure_time_snapshot=active_log.departed_at,
+                wallet_balance_snapshot=getattr(getattr(vehicle, "wallet", None), "balance", None),
+                fee_charged=None,
+            )
+        return {"status": "success", "message": f"✅ {vehicle.license_plate} departed."}
+    except Exception as e:
+        if raise_errors:
+            raise
+        return {"status": "error", "message": str(e)}
+
+
+def scan(device, content, at=None, raise_errors=False):
+    """Handle one scan message from ``device``: ``{"qr_code", "confirm_reset"}``."""
+    qr_code = str(content.get("qr_code") or "").strip()
+    if not qr_code:
+        return {"status": "error", "message": "QR code is empty.", "balance": None}
+    if device.gate == GateDevice.GATE_EXIT:
+        return scan_exit(qr_code, at, raise_errors)
+    confirm_reset = str(content.get("confirm_reset", "")).lower() in ("1", "true", "yes")
+    return scan_entry(qr_code, device.staff, confirm_reset, at, raise_errors)
+
+
+# =============================================================================
+# OFFLINE BATCHES
+# =============================================================================
+def _batch_scan(content, archived_months):
+    """
+    ``(key, scanned_at)`` for one uploaded scan, or an error message.
+    ``archived_months`` holds the archived ``(year, month)`` pairs.
+    """
+    key = str(content.get("key") or "").strip()
+    if not key or len(key) > BATCH_KEY_MAX_LENGTH:
+        return None, f"Scan key must be 1-{BATCH_KEY_MAX_LENGTH} characters."
+    if not str(content.get("qr_code") or "").strip():
+        return None, "QR code is empty."
+    try:
+        scanned_at = parse_datetime(str(content.get("scanned_at") or ""))
+    except ValueError:
+        scanned_at = None
+    if scanned_at is None:
+        return None, "scanned_at must be an ISO 8601 time."
+    if timezone.is_naive(scanned_at):
+        scanned_at = timezone.make_aware(scanned_at)
+    now = timezone.now()
+    # Older keys may be pruned already, so a re-sent scan could charge twice.
+    if scanned_at < now - timedelta(days=BATCH_KEY_RETENTION_DAYS):
+        return None, f"Scan is more than {BATCH_KEY_RETENTION_DAYS} days old; it can no longer be applied."
+    local = timezone.localtime(scanned_at)
+    if (local.year, local.month) in archived_months:
+        return None, f"Scan is in {local:%B %Y}, whose transactions are archived."
+    return (key, min(scanned_at, now)), None
+
+
+def _retry_result(key):
+    return {"key": key, "status": "error", "message": "Scan not applied yet; it will be sent again.",
+            "balance": None, "retry": True}
+
+
+def apply_batch(device, scans):
+    """
+    Apply scans ``device`` buffered while offline: ``[{"key", "scanned_at",
+    "qr_code", "confirm_reset"}, ...]``. Returns one result per scan, in the
+    order given.
+
+    The batch runs in one transaction, in ``scanned_at`` order, through the
+    same entry/exit rules as live scans, with the queue and TV broadcasts
+    sent once at the end. Each result is stored under the device's ``key``
+    (``GateScan``), so a re-sent batch gets the stored results back, marked
+    ``duplicate``, instead of charging again.
+
+    A scan that fails unexpectedly (deadlock, lock timeout, ...) is rolled
+    back and not stored; its result is marked ``retry`` so the device sends
+    it again. Later scans of the same QR code in the batch wait with it.
+    """
+    results = [None] * len(scans)
+    todo = []
+    archived_months = set(TransactionArchive.objects.values_list("year", "month"))
+    for index, content in enumerate(scans):
+        if isinstance(content, dict):
+            parsed, error = _batch_scan(content, archived_months)
+        else:
+            parsed, error = None, "Scan must be an object."
+        if error:
+            results[index] = {"key": content.get("key") if isinstance(content, dict) else None,
+                              "status": "error", "message": error, "balance": None}
+        else:
+            todo.append((parsed[1], index, parsed[0], content))
+    todo.sort(key=lambda item: item[:2])
+
+    with deferred_broadcasts(), transaction.atomic():
+        # One batch per device at a time, so a retry racing the original waits for it
+        GateDevice.objects.select_for_update().filter(pk=device.pk).first()
+        stored = dict(
+            GateScan.objects
+            .filter(device=device, key__in=[key for _, _, key, _ in todo])
+            .values_list("key", "result")
+        )
+        retry_codes = set()
+        for scanned_at, index, key, content in todo:
+            if key in stored:
+                results[index] = {**stored[key], "key": key, "duplicate": True}
+                continue
+            qr_code = str(content["qr_code"]).strip()
+            if qr_code.lower() in retry_codes:
+                results[index] = _retry_result(key)
+                continue
+            try:
+                with transaction.atomic():
+                    result = scan(device, content, at=scanned_at, raise_errors=True)
+                    GateScan.objects.create(
+                        device=device,
+                        key=key,
+                        qr_code=qr_code[:255],
+                        confirm_reset=str(content.get("confirm_reset", "")).lower() in ("1", "true", "yes"),
+                        scanned_at=scanned_at,
+                        result=result,
+                    )
+            except Exception:
+                logger.exception("Gate device %s: offline scan %s failed; left for retry", device.pk, key)
+                retry_codes.add(qr_code.lower())
+                results[index] = _retry_result(key)
+                continue
+            stored[key] = result
+            results[index] = {**result, "key": key}
+
+        GateScan.objects.filter(
+            device=device, received_at__lt=timezone.now() - timedelta(days=BATCH_KEY_RETENTION_DAYS)
+        ).delete()
+    return results
+
+
+# =============================================================================
+# METRICS
+# =============================================================================
+class GateStats:
+    def __init__(self, device):
+        self.device = device.name
+        self.gate = device.gate
+        self.connected_at = time.time()
+        self.scans = 0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.last_scan_ms = None
+
+    def queued(self):
+        self.queue_depth += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+
+    def done(self, elapsed_ms):
+        self.queue_depth -= 1
+        self.scans += 1
+        self.last_scan_ms = elapsed_ms
+
+    def as_dict(self):
+        return {
+            "device": self.device,
+            "gate": self.gate,
+            "connected_at": int(self.connected_at),
+            "scans": self.scans,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "last_scan_ms": self.last_scan_ms,
+        }
+
+
+def metrics():
+    """Connected gate devices in this process, with their scan queues."""
+    return [stats.as_dict() for stats in GATES.values()]
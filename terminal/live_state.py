@@ -0,0 +1,70 @@
+"""
+Live Queue State
+================
+A shared, versioned copy of the latest queue and TV boards for WebSocket
+initial state.
+
+When the terminal's power flickers, every screen reconnects at once. Each
+connect reads its first board from here instead of running
+``get_queue_state()``, with its housekeeping writes, per socket.
+
+- Broadcasts store the boards they build, in the sending process.
+  Consumers store the boards they receive from other processes.
+- A board older than ``WS_INITIAL_STATE_MAX_AGE`` seconds, or missing, is
+  rebuilt on the DB pool. Concurrent callers share that one build.
+"""
+
+import asyncio
+import itertools
+import threading
+import time
+
+from django.conf import settings
+
+from terminal.async_db import run_db
+
+QUEUE = "queue"
+TV = "tv"
+
+_lock = threading.Lock()
+_versions = itertools.count(1)
+_states = {}     # (kind, compact) -> (version, stored at, payload)
+_building = {}   # (kind, compact, loop) -> Future of the build in progress
+
+
+def remember(kind, compact, payload):
+    """Store the newest ``kind`` board; safe from any thread."""
+    with _lock:
+        _states[(kind, compact)] = (next(_versions), time.monotonic(), payload)
+
+
+def invalidate(kind):
+    with _lock:
+        for key in [key for key in _states if key[0] == kind]:
+            del _states[key]
+
+
+def _build(kind, compact):
+    from terminal.services import QueueService
+
+    if kind == TV:
+        payload = QueueService.get_tv_display_state(compact=compact)
+    else:
+        payload = QueueService.get_queue_state(compact=compact)
+    remember(kind, compact, payload)
+    return payload
+
+
+async def get(kind, compact=False):
+    """The current ``kind`` board, building it at most once at a time per event loop."""
+    entry = _states.get((kind, compact))
+    if entry is not None and time.monotonic() - entry[1] < settings.WS_INITIAL_STATE_MAX_AGE:
+        return entry[2]
+
+    key = (kind, compact, asyncio.get_running_loop())
+    future = _building.get(key)
+    if future is None:
+        future = _building[key] = asyncio.ensure_future(run_db(_build, kind, compact))
+        future.add_done_callback(lambda _: _building.pop(key, None))
+    # One slow caller going away must not cancel the build for the others
+    return await asyncio.shield(future)
@@ -0,0 +1,88 @@
+"""
+Local Workers
+=============
+Starts throwaway daphne processes on free local ports for the
+measurement commands (``check_channel_fanout``, ``benchmark_endpoints``,
+``benchmark_connect_storm``), with the same settings and environment as
+the calling process, plus a minimal WebSocket client for them.
+"""
+
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import CommandError
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_workers(count, env=None):
+    """``[(port, process, log_file)]`` for ``count`` daphne processes serving rdfs.asgi."""
+    workers = []
+    for _ in range(count):
+        port = free_port()
+        log = tempfile.TemporaryFile()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "daphne", "-b", "127.0.0.1", "-p", str(port), "rdfs.asgi:application"],
+            cwd=settings.BASE_DIR,
+            env={**os.environ, **(env or {})},
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+        workers.append((port, process, log))
+    return workers
+
+
+def stop_workers(workers, stderr=None):
+    """Stop the workers; with ``stderr``, write the log tail of any that crashed."""
+    for _, process, _ in workers:
+        process.terminate()
+    for port, process, log in workers:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        if stderr is not None and process.returncode not in (0, -15, None):
+            log.seek(0)
+            stderr.write(f"--- worker :{port} ---\n{log.read().decode(errors='replace')[-2000:]}")
+        log.close()
+
+
+async def wait_for_port(port, process, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise CommandError(f"Worker on port {port} exited with code {process.returncode}.")
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+        except OSError:
+            await asyncio.sleep(0.2)
+            continue
+        writer.close()
+        return
+    raise CommandError(f"Worker on port {port} did not start within {timeout}s.")
+
+
+async def open_socket(port, path, origin):
+    """Connect to a worker WebSocket; returns (transport, queue of (arrival time, text) messages)."""
+    from autobahn.asyncio.websocket import WebSocketClientFactory, WebSocketClientProtocol
+
+    received = asyncio.Queue()
+
+    class Client(WebSocketClientProtocol):
+        def onMessage(self, payload, is_binary):
+            received.put_nowait((time.monotonic(), payload.decode("utf-8", "replace")))
+
+    factory = WebSocketClientFactory(f"ws://127.0.0.1:{port}{path}", origin=origin)
+    factory.protocol = Client
+    transport, _ = await asyncio.get_running_loop().create_connection(factory, "127.0.0.1", port)
+    return transport, received
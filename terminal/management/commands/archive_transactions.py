@@ -0,0 +1,44 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from terminal import transaction_archive
+
+
+class Command(BaseCommand):
+    help = "Move closed months of transactions into compressed cold storage"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months",
+            type=int,
+            default=None,
+            help="Months to keep in the database (default: TRANSACTION_ARCHIVE_AFTER_MONTHS)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only list the months that would be archived",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = transaction_archive.archive_cutoff(months=options["months"])
+        months = transaction_archive.closed_months(cutoff)
+        if not months:
+            self.stdout.write(f"No transactions before {cutoff} to archive.")
+            return
+
+        if options["dry_run"]:
+            for year, month in months:
+                self.stdout.write(f"[dry run] would archive {year}-{month:02d}")
+            return
+
+        try:
+            transaction_archive.get_archive_dir()
+        except ImproperlyConfigured as exc:
+            raise CommandError(str(exc))
+
+        total = 0
+        for year, month, moved in transaction_archive.archive_closed_months(cutoff):
+            total += moved
+            self.stdout.write(f"{year}-{month:02d}: {moved} rows archived")
+        self.stdout.write(self.style.SUCCESS(f"Archived {total} transactions older than {cutoff}."))
@@ -0,0 +1,114 @@
+import asyncio
+import statistics
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from terminal.local_workers import open_socket, start_workers, stop_workers, wait_for_port
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def _database_activity():
+    """(transactions, rows read) for this database so far, or None off PostgreSQL."""
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_stat_clear_snapshot()")
+        cursor.execute(
+            "SELECT xact_commit + xact_rollback, tup_returned + tup_fetched "
+            "FROM pg_stat_database WHERE datname = current_database()"
+        )
+        return cursor.fetchone()
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconnect hundreds of display WebSockets to a local daphne worker at once, as after a "
+        "power flicker, and report time to first board and the database work it caused."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=300, help="Sockets per storm (default: 300)")
+        parser.add_argument("--rounds", type=int, default=3, help="Storms to run (default: 3)")
+        parser.add_argument(
+            "--paths",
+            nargs="+",
+            default=["/ws/queue/", "/ws/tv-display/"],
+            help="Socket paths, clients split evenly (default: /ws/queue/ /ws/tv-display/)",
+        )
+        parser.add_argument(
+            "--origin",
+            default="http://localhost",
+            help="Origin header; must match ALLOWED_HOSTS (default: http://localhost)",
+        )
+        parser.add_argument("--timeout", type=float, default=60.0, help="Seconds to wait per storm (default: 60)")
+
+    def handle(self, *args, **options):
+        if options["clients"] < 1 or options["rounds"] < 1:
+            raise CommandError("--clients and --rounds must be at least 1.")
+
+        workers = start_workers(1)
+        port, process, _ = workers[0]
+        try:
+            rows = asyncio.run(self._run(port, process, options))
+        finally:
+            stop_workers(workers, self.stderr if options["verbosity"] > 1 else None)
+
+        self.stdout.write(f"{options['clients']} sockets per storm on {', '.join(options['paths'])}, one daphne worker\n")
+        self.stdout.write(
+            f"{'round':<7}{'boards':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'db xacts':>10}{'db rows':>10}"
+        )
+        for number, row in enumerate(rows, 1):
+            xacts, tuples = row["db"] if row["db"] else ("n/a", "n/a")
+            self.stdout.write(
+                f"{number:<7}{row['received']:>10}{row['p50']:>10.0f}{row['p95']:>10.0f}{row['max']:>10.0f}"
+                f"{xacts:>10}{tuples:>10}"
+            )
+        if any(row["received"] < options["clients"] for row in rows):
+            raise CommandError("Some sockets got no initial board in time.")
+
+    async def _run(self, port, process, options):
+        await wait_for_port(port, process, 30)
+        # Warm up imports and the worker's connections
+        transport, received = await open_socket(port, options["paths"][0], options["origin"])
+        await asyncio.wait_for(received.get(), options["timeout"])
+        transport.close()
+
+        rows = []
+        for _ in range(options["rounds"]):
+            await asyncio.sleep(1.5)  # let PostgreSQL publish the previous round's stats
+            before = await sync_to_async(_database_activity)()
+            rows.append(await self._storm(port, options))
+            await asyncio.sleep(1.5)
+            after = await sync_to_async(_database_activity)()
+            rows[-1]["db"] = tuple(b - a for a, b in zip(before, after)) if before else None
+        return rows
+
+    async def _storm(self, port, options):
+        paths = options["paths"]
+
+        async def client(index):
+            started = time.monotonic()
+            transport, received = await open_socket(port, paths[index % len(paths)], options["origin"])
+            try:
+                arrived, _ = await asyncio.wait_for(received.get(), options["timeout"])
+                return (arrived - started) * 1000
+            except asyncio.TimeoutError:
+                return None
+            finally:
+                transport.close()
+
+        results = await asyncio.gather(*(client(index) for index in range(options["clients"])), return_exceptions=True)
+        latencies = [value for value in results if isinstance(value, float)]
+        return {
+            "received": len(latencies),
+            "p50": statistics.median(latencies) if latencies else 0.0,
+            "p95": _percentile(latencies, 0.95) if latencies else 0.0,
+            "max": max(latencies) if latencies else 0.0,
+        }
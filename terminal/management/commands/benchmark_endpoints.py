@@ -0,0 +1,158 @@
+import asyncio
+import json
+import statistics
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+from terminal.local_workers import start_workers, stop_workers, wait_for_port
+from vehicles.models import Vehicle
+
+# name -> (method, url name or path, needs a staff session)
+ENDPOINTS = {
+    "queue_snapshot": ("GET", "/snapshots/queue/all.json", False),
+    "public_queue_api": ("GET", "terminal:public_queue_api", False),
+    "tv_display_api": ("GET", "terminal:tv_display_api", False),
+    "queue_settings_api": ("GET", "terminal:queue_settings_api", False),
+    "public_queue_data": ("GET", "passenger:public_queue_data", False),
+    "queue_data": ("GET", "terminal:queue_data", True),
+    "qr_scan_entry": ("POST", "terminal:qr_scan_entry", True),
+    "qr_exit_validation": ("POST", "terminal:qr_exit_validation", True),
+}
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+async def _request(port, raw):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(raw)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return int(response.split(b" ", 2)[1])
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure concurrent throughput of the polled queue endpoints and the scan endpoints "
+        "against a local daphne worker: each endpoint alone, then all of them at once."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=20, help="Requests in flight (default: 20)")
+        parser.add_argument("--duration", type=float, default=5.0, help="Seconds per run (default: 5)")
+        parser.add_argument(
+            "--endpoints",
+            nargs="+",
+            choices=sorted(ENDPOINTS),
+            default=list(ENDPOINTS),
+            help="Endpoints to run (default: all)",
+        )
+        parser.add_argument("--user", help="Staff/admin username for the login-only endpoints (default: first admin)")
+        parser.add_argument("--qr", help="QR value to scan (default: first vehicle's)")
+        parser.add_argument("--json", action="store_true", help="Print the raw results as JSON")
+
+    def handle(self, *args, **options):
+        user = self._user(options["user"])
+        qr_value = options["qr"] or Vehicle.objects.exclude(qr_value__isnull=True).values_list("qr_value", flat=True).first()
+        if qr_value is None and {"qr_scan_entry", "qr_exit_validation"} & set(options["endpoints"]):
+            raise CommandError("No vehicle with a QR value to scan; pass --qr.")
+        requests = {name: self._raw_request(name, user, qr_value) for name in options["endpoints"]}
+
+        workers = start_workers(1)
+        port, process, _ = workers[0]
+        try:
+            results = asyncio.run(self._run_all(port, process, requests, options))
+        finally:
+            stop_workers(workers, self.stderr if options["verbosity"] > 1 else None)
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(
+            f"{options['concurrency']} in flight, {options['duration']:g}s per run, one daphne worker\n"
+        )
+        self.stdout.write(f"{'run':<22}{'requests':>10}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}")
+        for name, row in results.items():
+            self.stdout.write(
+                f"{name:<22}{row['requests']:>10}{row['rps']:>10.1f}{row['p50']:>10.1f}{row['p95']:>10.1f}{row['errors']:>8}"
+            )
+
+    def _user(self, username):
+        users = get_user_model().objects.filter(role__in=["admin", "staff_admin"], is_active=True)
+        user = users.filter(username=username).first() if username else users.order_by("pk").first()
+        if user is None:
+            raise CommandError("No active admin/staff user found; pass --user.")
+        return user
+
+    def _raw_request(self, name, user, qr_value):
+        from importlib import import_module
+
+        method, url_name, needs_login = ENDPOINTS[name]
+        headers = {"Host": "localhost", "Connection": "close"}
+        body = b""
+        if needs_login:
+            store = import_module(settings.SESSION_ENGINE).SessionStore()
+            store[SESSION_KEY] = str(user.pk)
+            store[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+            store[HASH_SESSION_KEY] = user.get_session_auth_hash()
+            store["last_activity"] = time.time()
+            store.create()
+            csrf = get_random_string(32)
+            headers["Cookie"] = f"{settings.SESSION_COOKIE_NAME}={store.session_key}; {settings.CSRF_COOKIE_NAME}={csrf}"
+            headers["X-CSRFToken"] = csrf
+        if method == "POST":
+            body = urlencode({"qr_code": qr_value}).encode()
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+            headers["Content-Length"] = str(len(body))
+        path = url_name if url_name.startswith("/") else reverse(url_name)
+        lines = [f"{method} {path} HTTP/1.1"] + [f"{key}: {value}" for key, value in headers.items()]
+        return ("\r\n".join(lines) + "\r\n\r\n").encode() + body
+
+    async def _run_all(self, port, process, requests, options):
+        await wait_for_port(port, process, 30)
+        for raw in requests.values():
+            await _request(port, raw)  # warm up imports and caches
+
+        results = {}
+        for name, raw in requests.items():
+            results[name] = await self._run(port, [raw], options)
+        if len(requests) > 1:
+            results["all (mixed)"] = await self._run(port, list(requests.values()), options)
+        return results
+
+    async def _run(self, port, raws, options):
+        latencies, errors = [], 0
+        deadline = time.monotonic() + options["duration"]
+
+        async def client(offset):
+            nonlocal errors
+            index = offset
+            while time.monotonic() < deadline:
+                started = time.monotonic()
+                try:
+                    status = await _request(port, raws[index % len(raws)])
+                except (OSError, IndexError, ValueError):
+                    status = 0
+                latencies.append((time.monotonic() - started) * 1000)
+                errors += not 200 <= status < 300
+                index += 1
+
+        started = time.monotonic()
+        await asyncio.gather(*(client(offset) for offset in range(options["concurrency"])))
+        elapsed = time.monotonic() - started
+        return {
+            "requests": len(latencies),
+            "rps": len(latencies) / elapsed,
+            "p50": statistics.median(latencies) if latencies else 0.0,
+            "p95": _percentile(latencies, 0.95) if latencies else 0.0,
+            "errors": errors,
+        }
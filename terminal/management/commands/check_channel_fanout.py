@@ -0,0 +1,109 @@
+import asyncio
+import json
+import time
+import uuid
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from terminal.constants import QUEUE_GROUP_NAME
+from terminal.local_workers import open_socket, start_workers, stop_workers, wait_for_port
+
+# Pads one message past the NOTIFY limit so the payload-table path runs too.
+LARGE_MESSAGE_PADDING = 20000
+
+
+class Command(BaseCommand):
+    help = (
+        "Start several daphne workers on this machine, connect a WebSocket client to each, "
+        "and check that every worker receives the last of a burst of queue updates sent through "
+        "the channel layer (use with USE_POSTGRES_CHANNEL_LAYER=True). Consumers conflate boards "
+        "a client has not yet taken, so earlier updates in the burst may be skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=3, help="daphne processes to start (default: 3)")
+        parser.add_argument("--messages", type=int, default=20, help="Queue updates to send (default: 20)")
+        parser.add_argument("--path", default="/ws/queue/", help="WebSocket path (default: /ws/queue/)")
+        parser.add_argument(
+            "--origin",
+            default="http://localhost",
+            help="Origin header; must match ALLOWED_HOSTS (default: http://localhost)",
+        )
+        parser.add_argument("--timeout", type=float, default=20.0, help="Seconds to wait at each step (default: 20)")
+
+    def handle(self, *args, **options):
+        backend = settings.CHANNEL_LAYERS["default"]["BACKEND"]
+        if backend == "channels.layers.InMemoryChannelLayer":
+            raise CommandError(
+                "The in-memory channel layer cannot reach other processes; "
+                "set USE_POSTGRES_CHANNEL_LAYER=True (or USE_REDIS_CHANNEL_LAYER=True)."
+            )
+        if options["workers"] < 1 or options["messages"] < 1:
+            raise CommandError("--workers and --messages must be at least 1.")
+
+        workers = start_workers(options["workers"])
+        try:
+            self.stdout.write(f"Started {len(workers)} daphne workers ({backend}).")
+            results = asyncio.run(self._check(workers, options))
+        finally:
+            stop_workers(workers, self.stderr if options["verbosity"] > 1 else None)
+
+        total = options["messages"] + 1
+        self.stdout.write(f"\n{'worker':<10}{'received':>10}{'last ms':>10}")
+        missing = []
+        for port, (received, latency) in results.items():
+            last = latency * 1000 if latency is not None else float("nan")
+            self.stdout.write(f":{port:<9}{f'{received}/{total}':>10}{last:>10.1f}")
+            if latency is None:
+                missing.append(f":{port}")
+        if missing:
+            raise CommandError("Fan-out incomplete: last update never reached " + ", ".join(missing))
+        self.stdout.write(self.style.SUCCESS(
+            f"\nEvery worker received the last of {total} updates (it is over the NOTIFY size limit)."
+        ))
+
+    async def _check(self, workers, options):
+        timeout = options["timeout"]
+        await asyncio.gather(*(wait_for_port(port, process, timeout) for port, process, _ in workers))
+
+        sockets = {}
+        for port, _, _ in workers:
+            transport, received = await open_socket(port, options["path"], options["origin"])
+            # The consumer joins the group before sending its initial state.
+            try:
+                await asyncio.wait_for(received.get(), timeout)
+            except asyncio.TimeoutError:
+                raise CommandError(f"No initial state from :{port}; check --origin against ALLOWED_HOSTS.")
+            sockets[port] = (transport, received)
+
+        token = uuid.uuid4().hex
+        sent_at = {}
+        layer = get_channel_layer()
+        for seq in range(options["messages"] + 1):
+            payload = {"fanout_check": token, "seq": seq}
+            if seq == options["messages"]:
+                payload["padding"] = "x" * LARGE_MESSAGE_PADDING
+            sent_at[seq] = time.monotonic()
+            await layer.group_send(QUEUE_GROUP_NAME, {"type": "queue.update", "payload": payload})
+
+        last = options["messages"]
+        results = {}
+        deadline = time.monotonic() + timeout
+        for port, (transport, received) in sockets.items():
+            seen = set()
+            latency = None
+            while latency is None and time.monotonic() < deadline:
+                try:
+                    arrived, text = await asyncio.wait_for(received.get(), deadline - time.monotonic())
+                except asyncio.TimeoutError:
+                    break
+                message = json.loads(text)
+                if message.get("fanout_check") == token:
+                    seen.add(message["seq"])
+                    if message["seq"] == last:
+                        latency = arrived - sent_at[last]
+            results[port] = (len(seen), latency)
+            transport.close()
+        return results
@@ -0,0 +1,66 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.utils import is_staff_admin_or_admin
+from terminal import gate
+from terminal.models import GateDevice
+
+
+class Command(BaseCommand):
+    help = "Register gate scanner devices and issue, rotate or revoke their API tokens (terminal.gate)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "action",
+            choices=["add", "rotate", "revoke", "list"],
+            help="add: register a device and print its token; rotate: print a new token; "
+                 "revoke: disable the device; list: show devices",
+        )
+        parser.add_argument("name", nargs="?", help="Device name, e.g. 'Entry lane 1'")
+        parser.add_argument(
+            "--gate",
+            choices=[GateDevice.GATE_ENTRY, GateDevice.GATE_EXIT],
+            default=GateDevice.GATE_ENTRY,
+            help="Gate the device scans at, with add (default: entry)",
+        )
+        parser.add_argument(
+            "--staff",
+            help="Username recorded as the staff member on the device's scans, with add",
+        )
+
+    def handle(self, *args, **options):
+        action, name = options["action"], options["name"]
+        if action == "list":
+            for device in GateDevice.objects.select_related("staff"):
+                state = "active" if device.is_active else "revoked"
+                seen = device.last_seen_at.isoformat() if device.last_seen_at else "never"
+                self.stdout.write(f"{device.name}\t{device.gate}\t{device.staff.username}\t{state}\tlast seen {seen}")
+            return
+
+        if not name:
+            raise CommandError(f"'{action}' needs a device name.")
+
+        if action == "add":
+            if GateDevice.objects.filter(name=name).exists():
+                raise CommandError(f"Gate device '{name}' already exists; use rotate for a new token.")
+            staff = get_user_model().objects.filter(username=options["staff"] or "").first()
+            if staff is None or not is_staff_admin_or_admin(staff):
+                raise CommandError("--staff must name an existing staff admin or admin.")
+            device = GateDevice(name=name, gate=options["gate"], staff=staff)
+            token = gate.issue_token(device)
+            device.save()
+        else:
+            device = GateDevice.objects.filter(name=name).first()
+            if device is None:
+                raise CommandError(f"No gate device named '{name}'.")
+            if action == "revoke":
+                device.is_active = False
+                device.save(update_fields=["is_active"])
+                self.stdout.write(self.style.SUCCESS(f"Revoked gate device '{name}'."))
+                return
+            token = gate.issue_token(device)
+            device.is_active = True
+            device.save(update_fields=["token_hash", "is_active"])
+
+        self.stdout.write(self.style.SUCCESS(f"Token for gate device '{name}' ({device.gate} gate), shown once:"))
+        self.stdout.write(token)
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+
+from terminal import partitioning
+
+
+class Command(BaseCommand):
+    help = "Pre-create monthly history partitions and enforce the retention horizon"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--ahead",
+            type=int,
+            default=None,
+            help="Future months to pre-create (default: HISTORY_PARTITION_MONTHS_AHEAD)",
+        )
+        parser.add_argument(
+            "--retain-months",
+            type=int,
+            default=None,
+            help="Months of history to keep, 0 keeps everything (default: HISTORY_RETENTION_MONTHS)",
+        )
+        parser.add_argument(
+            "--mode",
+            choices=[partitioning.RETENTION_MODE_DETACH, partitioning.RETENTION_MODE_DROP],
+            default=None,
+            help="Detach or drop expired months (default: HISTORY_RETENTION_MODE)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report what retention would do",
+        )
+
+    def handle(self, *args, **options):
+        if not partitioning.supports_partitioning():
+            self.stdout.write("Database does not support partitioning; only row retention applies.")
+        elif not options["dry_run"]:
+            created = partitioning.ensure_partitions(months_ahead=options["ahead"])
+            self.stdout.write(f"Partitions ready: {len(created)}")
+
+        actions = partitioning.apply_retention(
+            retention_months=options["retain_months"],
+            mode=options["mode"],
+            dry_run=options["dry_run"],
+        )
+        if not actions:
+            self.stdout.write("Nothing outside the retention horizon.")
+            return
+
+        prefix = "[dry run] " if options["dry_run"] else ""
+        for table, action, target in actions:
+            self.stdout.write(f"{prefix}{table}: {action} {target}")
+        if not options["dry_run"]:
+            self.stdout.write(self.style.SUCCESS("History retention applied."))
@@ -0,0 +1,35 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from terminal import snapshots
+
+
+class Command(BaseCommand):
+    help = "Write the static passenger queue snapshots (QUEUE_SNAPSHOT_ROOT) from the current queue state"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep republishing instead of exiting (time-based changes such as auto-departure)",
+        )
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=15,
+            help="Seconds between publishes with --loop (default: 15)",
+        )
+
+    def handle(self, *args, **options):
+        if not snapshots.enabled():
+            raise CommandError("Queue snapshots are disabled (QUEUE_SNAPSHOTS_ENABLED=False).")
+
+        while True:
+            snapshots.publish_current()
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+
+        self.stdout.write(self.style.SUCCESS(f"Published queue snapshots to {settings.QUEUE_SNAPSHOT_ROOT}."))
@@ -0,0 +1,94 @@
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from terminal.startup_probe import LAZY_MODULES
+
+IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def parse_importtime(stderr):
+    """``[(module, self_us, cumulative_us, depth)]`` from ``-X importtime`` output."""
+    rows = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append((module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure worker startup in a fresh interpreter: import time per module, "
+        "resident memory after django.setup(), and heavy modules that should load lazily. "
+        "Exits non-zero when a budget is exceeded."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=15, help="Modules to list (default: 15)")
+        parser.add_argument(
+            "--max-import-seconds",
+            type=float,
+            default=settings.STARTUP_IMPORT_BUDGET_SECONDS,
+            help="Budget for total import time (default: STARTUP_IMPORT_BUDGET_SECONDS)",
+        )
+        parser.add_argument(
+            "--max-rss-mb",
+            type=float,
+            default=settings.STARTUP_RSS_BUDGET_MB,
+            help="Budget for resident memory after setup (default: STARTUP_RSS_BUDGET_MB)",
+        )
+
+    def handle(self, *args, **options):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-m", "terminal.startup_probe"],
+            cwd=settings.BASE_DIR,
+            env=os.environ.copy(),
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise CommandError(f"Startup probe failed:\n{result.stderr[-2000:]}")
+        probe = json.loads(result.stdout.strip().splitlines()[-1])
+        rows = parse_importtime(result.stderr)
+
+        # Top-level entries' cumulative times add up to the whole import cost.
+        total_us = sum(cumulative for _, _, cumulative, depth in rows if depth == 0)
+        by_package = defaultdict(int)
+        for module, self_us, _, _ in rows:
+            by_package[module.split(".")[0]] += self_us
+
+        self.stdout.write(f"{'package':<32}{'import ms':>12}")
+        for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:options["top"]]:
+            self.stdout.write(f"{package:<32}{self_us / 1000:>12.1f}")
+
+        rss_mb = probe["rss_kb"] / 1024 if probe["rss_kb"] is not None else None
+        self.stdout.write(
+            f"\nImports: {total_us / 1e6:.2f}s over {len(rows)} modules; "
+            f"setup: {probe['seconds']:.2f}s; "
+            f"RSS: {f'{rss_mb:.1f} MB' if rss_mb is not None else 'n/a'}"
+        )
+
+        problems = []
+        if total_us / 1e6 > options["max_import_seconds"]:
+            problems.append(f"import time {total_us / 1e6:.2f}s > {options['max_import_seconds']}s")
+        if rss_mb is not None and rss_mb > options["max_rss_mb"]:
+            problems.append(f"RSS {rss_mb:.1f} MB > {options['max_rss_mb']} MB")
+        if probe["lazy_modules_loaded"]:
+            problems.append(
+                "loaded at startup but should be imported lazily: " + ", ".join(probe["lazy_modules_loaded"])
+            )
+        if problems:
+            raise CommandError("Startup budget exceeded: " + "; ".join(problems))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Within budget ({options['max_import_seconds']}s imports, {options['max_rss_mb']} MB RSS; "
+            f"lazy: {', '.join(LAZY_MODULES)})."
+        ))
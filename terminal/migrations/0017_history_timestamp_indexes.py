@@ -0,0 +1,22 @@
+# Generated by Django 5.0.7 on 2026-10-19 04:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('terminal', '0016_add_transaction_and_queue_settings'),
+        ('vehicles', '0020_history_timestamp_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='terminalactivity',
+            index=models.Index(fields=['timestamp'], name='terminal_te_timesta_b9d99d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='terminalactivity',
+            index=models.Index(fields=['event_type', 'timestamp'], name='terminal_te_event_t_cc3da4_idx'),
+        ),
+    ]
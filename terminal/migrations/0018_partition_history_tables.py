@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from terminal.partitioning import HISTORY_TABLES, convert_to_partitioned
+
+
+def partition_history_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for table in HISTORY_TABLES:
+        convert_to_partitioned(table, conn=schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('terminal', '0017_history_timestamp_indexes'),
+        ('vehicles', '0020_history_timestamp_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_history_tables, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.0.7 on 2026-10-19 04:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('terminal', '0018_partition_history_tables'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveIntegerField()),
+                ('month', models.PositiveIntegerField()),
+                ('file_name', models.CharField(max_length=255)),
+                ('row_count', models.PositiveIntegerField(default=0)),
+                ('revenue_total', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Transaction Archive',
+                'verbose_name_plural': 'Transaction Archives',
+                'ordering': ['-year', '-month'],
+                'unique_together': {('year', 'month')},
+            },
+        ),
+        migrations.CreateModel(
+            name='TransactionArchiveDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transaction_date', models.DateField()),
+                ('transaction_count', models.PositiveIntegerField(default=0)),
+                ('revenue_total', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('byte_offset', models.PositiveBigIntegerField()),
+                ('byte_length', models.PositiveBigIntegerField()),
+                ('archive', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='days', to='terminal.transactionarchive')),
+            ],
+            options={
+                'ordering': ['-transaction_date', '-byte_offset'],
+                'indexes': [models.Index(fields=['transaction_date'], name='terminal_tr_transac_b4004b_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-19 04:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('terminal', '0019_transaction_archive'),
+        ('vehicles', '0021_deposit_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['entry_timestamp', 'id'], name='terminal_tr_entry_t_e14871_idx'),
+        ),
+    ]
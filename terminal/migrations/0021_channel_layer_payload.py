@@ -0,0 +1,21 @@
+# Generated by Django 5.0.7 on 2026-10-19 04:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('terminal', '0020_transaction_keyset_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChannelLayerPayload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(db_index=True)),
+                ('payload', models.TextField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 5.0.7 on 2026-10-19 05:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Max
+from django.utils import timezone
+
+
+def close_duplicate_active_entries(apps, schema_editor):
+    """Keep only each vehicle's newest active successful entry so the unique constraint can be added."""
+    EntryLog = apps.get_model('terminal', 'EntryLog')
+    now = timezone.now()
+    seen = set()
+    stale_ids = []
+    active = (
+        EntryLog.objects
+        .filter(is_active=True, status='success', vehicle__isnull=False)
+        .order_by('vehicle_id', '-created_at', '-id')
+        .values_list('id', 'vehicle_id')
+    )
+    for entry_id, vehicle_id in active.iterator():
+        if vehicle_id in seen:
+            stale_ids.append(entry_id)
+        seen.add(vehicle_id)
+    if stale_ids:
+        EntryLog.objects.filter(id__in=stale_ids).update(is_active=False, departed_at=now)
+
+
+def backfill_presence(apps, schema_editor):
+    Vehicle = apps.get_model('vehicles', 'Vehicle')
+    EntryLog = apps.get_model('terminal', 'EntryLog')
+    VehiclePresence = apps.get_model('terminal', 'VehiclePresence')
+
+    active = dict(
+        EntryLog.objects.filter(is_active=True, status='success', vehicle__isnull=False)
+        .values_list('vehicle_id', 'id')
+    )
+    successes = {
+        row['vehicle_id']: row
+        for row in EntryLog.objects.filter(status='success', vehicle__isnull=False)
+        .values('vehicle_id')
+        .annotate(last_entry_at=Max('created_at'), last_exit_at=Max('departed_at'))
+    }
+    VehiclePresence.objects.bulk_create(
+        [
+            VehiclePresence(
+                vehicle_id=vehicle_id,
+                active_entry_id=active.get(vehicle_id),
+                last_entry_at=successes.get(vehicle_id, {}).get('last_entry_at'),
+                last_exit_at=successes.get(vehicle_id, {}).get('last_exit_at'),
+            )
+            for vehicle_id in Vehicle.objects.values_list('id', flat=True).iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('terminal', '0021_channel_layer_payload'),
+        ('vehicles', '0024_queuehistory_vehicle_timestamp_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(close_duplicate_active_entries, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='VehiclePresence',
+            fields=[
+                ('vehicle', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='presence', serialize=False, to='vehicles.vehicle')),
+                ('last_entry_at', models.DateTimeField(blank=True, null=True)),
+                ('last_exit_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Vehicle Presence',
+                'verbose_name_plural': 'Vehicle Presence',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='entrylog',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True), ('status', 'success')), fields=('vehicle',), name='terminal_entrylog_one_active_per_vehicle'),
+        ),
+        migrations.AddField(
+            model_name='vehiclepresence',
+            name='active_entry',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='presence', to='terminal.entrylog'),
+        ),
+        migrations.RunPython(backfill_presence, migrations.RunPython.noop),
+    ]
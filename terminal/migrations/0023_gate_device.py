@@ -0,0 +1,34 @@
+# Generated by Django 5.0.7 on 2026-10-19 05:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('terminal', '0022_vehicle_presence'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GateDevice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('gate', models.CharField(choices=[('entry', 'Entry'), ('exit', 'Exit')], max_length=10)),
+                ('token_hash', models.CharField(editable=False, max_length=64, unique=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_seen_at', models.DateTimeField(blank=True, null=True)),
+                ('staff', models.ForeignKey(help_text="Recorded as the staff member on this device's scans.", on_delete=django.db.models.deletion.CASCADE, related_name='gate_devices', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Gate Device',
+                'verbose_name_plural': 'Gate Devices',
+                'ordering': ['name'],
+            },
+        ),
+    ]
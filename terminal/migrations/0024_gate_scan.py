@@ -0,0 +1,34 @@
+# Generated by Django 5.0.7 on 2026-10-19 05:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('terminal', '0023_gate_device'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GateScan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='Idempotency key chosen by the device.', max_length=64)),
+                ('qr_code', models.CharField(max_length=255)),
+                ('confirm_reset', models.BooleanField(default=False)),
+                ('scanned_at', models.DateTimeField(help_text='Device time of the scan.')),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('result', models.JSONField(default=dict)),
+                ('device', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scans', to='terminal.gatedevice')),
+            ],
+            options={
+                'ordering': ['-scanned_at'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='gatescan',
+            constraint=models.UniqueConstraint(fields=('device', 'key'), name='terminal_gatescan_device_key'),
+        ),
+    ]
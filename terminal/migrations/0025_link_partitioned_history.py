@@ -0,0 +1,20 @@
+from django.db import migrations
+
+from terminal.partitioning import link_history_tables
+
+
+def link_partitioned_history(apps, schema_editor):
+    # Databases partitioned by 0018 before it kept this link lost the
+    # TerminalActivity -> QueueHistory foreign key; add it back.
+    link_history_tables(conn=schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('terminal', '0024_gate_scan'),
+    ]
+
+    operations = [
+        migrations.RunPython(link_partitioned_history, migrations.RunPython.noop),
+    ]
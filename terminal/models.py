@@ -1,8 +1,6 @@
 from django.db import models
 from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.db.models.signals import post_save
-from django.dispatch import receiver
 
 from vehicles.models import Vehicle, VehicleBalanceBase
 
@@ -69,6 +67,14 @@ class EntryLog(models.Model):
         ordering = ['-created_at']
         verbose_name = "Entry Log"
         verbose_name_plural = "Entry Logs"
+        constraints = [
+            # A vehicle is inside the terminal at most once (see VehiclePresence).
+            models.UniqueConstraint(
+                fields=['vehicle'],
+                condition=models.Q(is_active=True, status='success'),
+                name='terminal_entrylog_one_active_per_vehicle',
+            ),
+        ]
 
     def __str__(self):
         plate = getattr(self.vehicle, 'plate_number', None) or getattr(self.vehicle, 'license_plate', None)
@@ -76,6 +82,149 @@ class EntryLog(models.Model):
         return f"[{self.created_at:%Y-%m-%d %H:%M}] {plate or 'Unknown vehicle'} - {self.status} ({state})"
 
 
+class VehiclePresence(models.Model):
+    """
+    Authoritative current terminal state of one vehicle: its active entry
+    (None when outside) and the last successful entry, for the cooldown.
+
+    Scans read it by primary key, locked, instead of searching EntryLog.
+    Every entry and departure updates it in the same transaction as the
+    EntryLog row, through ``enter()`` and ``release()``. The legacy
+    ``Vehicle.status`` / ``last_enter_time`` / ``last_exit_time`` fields are
+    written from here as well.
+    """
+    STATE_INSIDE = 'inside'
+    STATE_OUTSIDE = 'outside'
+
+    vehicle = models.OneToOneField(
+        Vehicle,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='presence'
+    )
+    active_entry = models.OneToOneField(
+        EntryLog,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='presence'
+    )
+    last_entry_at = models.DateTimeField(null=True, blank=True)
+    last_exit_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Vehicle Presence"
+        verbose_name_plural = "Vehicle Presence"
+
+    def __str__(self):
+        return f"{self.vehicle} – {self.state}"
+
+    @property
+    def state(self):
+        return self.STATE_INSIDE if self.active_entry_id else self.STATE_OUTSIDE
+
+    @classmethod
+    def for_vehicle(cls, vehicle, lock=False):
+        """The vehicle's presence row; with ``lock=True`` (inside a transaction) held until commit."""
+        queryset = cls.objects.select_for_update() if lock else cls.objects.all()
+        try:
+            return queryset.get(pk=vehicle.pk)
+        except cls.DoesNotExist:
+            # Vehicles registered after the backfill: build the row from EntryLog once
+            successes = EntryLog.objects.filter(vehicle=vehicle, status=EntryLog.STATUS_SUCCESS)
+            last_entry = successes.order_by('-created_at').first()
+            cls.objects.get_or_create(vehicle=vehicle, defaults={
+                'active_entry': successes.filter(is_active=True).first(),
+                'last_entry_at': last_entry.created_at if last_entry else None,
+            })
+            return queryset.get(pk=vehicle.pk)
+
+    def enter(self, entry_log):
+        """Record ``entry_log`` (a successful entry) as the vehicle's active entry."""
+        self.active_entry = entry_log
+        self.last_entry_at = entry_log.created_at
+        self.save(update_fields=['active_entry', 'last_entry_at', 'updated_at'])
+        Vehicle.objects.filter(pk=self.vehicle_id).update(
+            status='queued', last_enter_time=entry_log.created_at
+        )
+
+    @classmethod
+    def release(cls, entry_log_ids, now):
+        """Mark the vehicles whose active entry is in ``entry_log_ids`` as outside, as of ``now``."""
+        vehicle_ids = list(
+            cls.objects.filter(active_entry_id__in=entry_log_ids).values_list('vehicle_id', flat=True)
+        )
+        if not vehicle_ids:
+            return
+        cls.objects.filter(pk__in=vehicle_ids).update(active_entry=None, last_exit_at=now, updated_at=now)
+        Vehicle.objects.filter(pk__in=vehicle_ids).update(status='departed', last_exit_time=now)
+
+
+class GateDevice(models.Model):
+    """
+    A gate scanner (phone or handheld at the entry or exit lane). Devices
+    authenticate with an API token instead of a staff session; only the
+    token's SHA-256 is stored (see terminal.gate).
+    """
+    GATE_ENTRY = 'entry'
+    GATE_EXIT = 'exit'
+
+    GATE_CHOICES = [
+        (GATE_ENTRY, 'Entry'),
+        (GATE_EXIT, 'Exit'),
+    ]
+
+    name = models.CharField(max_length=100, unique=True)
+    gate = models.CharField(max_length=10, choices=GATE_CHOICES)
+    staff = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='gate_devices',
+        help_text="Recorded as the staff member on this device's scans.",
+    )
+    token_hash = models.CharField(max_length=64, unique=True, editable=False)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_seen_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['name']
+        verbose_name = "Gate Device"
+        verbose_name_plural = "Gate Devices"
+
+    def __str__(self):
+        return f"{self.name} ({self.get_gate_display()} gate)"
+
+
+class GateScan(models.Model):
+    """
+    A scan uploaded by a gate device in an offline batch (terminal.gate).
+    It is stored with its result, so a re-sent batch gets the same answers
+    instead of being applied (and charged) again.
+    """
+    device = models.ForeignKey(
+        GateDevice,
+        on_delete=models.CASCADE,
+        related_name='scans'
+    )
+    key = models.CharField(max_length=64, help_text="Idempotency key chosen by the device.")
+    qr_code = models.CharField(max_length=255)
+    confirm_reset = models.BooleanField(default=False)
+    scanned_at = models.DateTimeField(help_text="Device time of the scan.")
+    received_at = models.DateTimeField(auto_now_add=True)
+    result = models.JSONField(default=dict)
+
+    class Meta:
+        ordering = ['-scanned_at']
+        constraints = [
+            models.UniqueConstraint(fields=['device', 'key'], name='terminal_gatescan_device_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.device.name} scan {self.key} @ {self.scanned_at}"
+
+
 class TerminalActivity(models.Model):
     EVENT_ENTRY = 'enter'
     EVENT_EXIT = 'exit'
@@ -124,6 +273,10 @@ class TerminalActivity(models.Model):
 
     class Meta:
         ordering = ["-timestamp"]
+        indexes = [
+            models.Index(fields=["timestamp"]),
+            models.Index(fields=["event_type", "timestamp"]),
+        ]
 
     def __str__(self):
         return f"{self.get_event_type_display()} – {self.route_name} @ {self.timestamp:%Y-%m-%d %H:%M}"
@@ -241,6 +394,7 @@ class Transaction(models.Model):
             models.Index(fields=['transaction_date']),
             models.Index(fields=['transaction_year', 'transaction_month']),
             models.Index(fields=['vehicle_plate']),
+            models.Index(fields=['entry_timestamp', 'id']),
         ]
 
     def __str__(self):
@@ -278,9 +432,63 @@ class Transaction(models.Model):
         )
 
 
-@receiver(post_save, sender=Vehicle)
-def create_terminal_fee_balance(sender, instance, created, **kwargs):
-    if created:
-        TerminalFeeBalance.objects.create(vehicle=instance)
-    else:
-        TerminalFeeBalance.objects.get_or_create(vehicle=instance)
+class TransactionArchive(models.Model):
+    """
+    One compressed cold-storage file holding a closed month of transactions.
+    The rows themselves live in ``file_name`` (gzip JSONL, relative to
+    TRANSACTION_ARCHIVE_DIR); only the summaries below stay in the database.
+    """
+    year = models.PositiveIntegerField()
+    month = models.PositiveIntegerField()
+    file_name = models.CharField(max_length=255)
+    row_count = models.PositiveIntegerField(default=0)
+    revenue_total = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-year', '-month']
+        unique_together = ('year', 'month')
+        verbose_name = "Transaction Archive"
+        verbose_name_plural = "Transaction Archives"
+
+    def __str__(self):
+        return f"Archive {self.year}-{self.month:02d} ({self.row_count} rows)"
+
+
+class TransactionArchiveDay(models.Model):
+    """
+    Per-day summary of archived transactions plus the byte range of the gzip
+    member that holds them. A day archived in several runs has several rows.
+    """
+    archive = models.ForeignKey(
+        TransactionArchive,
+        on_delete=models.CASCADE,
+        related_name='days'
+    )
+    transaction_date = models.DateField()
+    transaction_count = models.PositiveIntegerField(default=0)
+    revenue_total = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+    byte_offset = models.PositiveBigIntegerField()
+    byte_length = models.PositiveBigIntegerField()
+
+    class Meta:
+        ordering = ['-transaction_date', '-byte_offset']
+        indexes = [
+            models.Index(fields=['transaction_date']),
+        ]
+
+    def __str__(self):
+        return f"{self.transaction_date} – {self.transaction_count} archived"
+
+
+class ChannelLayerPayload(models.Model):
+    """
+    Messages too large for a PostgreSQL NOTIFY, written by the PostgreSQL
+    channel layer (terminal.channel_layer); the NOTIFY carries only the id.
+    """
+    created_at = models.DateTimeField(db_index=True)
+    payload = models.TextField()
+
+    def __str__(self):
+        return f"Channel payload {self.pk} @ {self.created_at}"
@@ -0,0 +1,188 @@
+"""
+Keyset Pagination
+=================
+Cursor-based paging for the long history lists (deposits, past transactions).
+
+Instead of ``OFFSET n`` (which re-reads every skipped row), each page ends
+with an opaque cursor holding the sort-key values of its last row; the next
+page filters ``(k1, k2, ..., id) < cursor`` in the list's own ordering, so any
+page costs the same as the first one when the ordering is indexed.
+
+``estimated_count`` replaces exact ``COUNT(*)`` for headline totals: on
+PostgreSQL it reads the planner's row estimate and only counts exactly when
+the estimate is small.
+"""
+
+import base64
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 50
+CURSOR_PARAM = "cursor"
+EXACT_COUNT_THRESHOLD = 5000
+
+
+# =============================================================================
+# CURSOR ENCODING
+# =============================================================================
+class _CursorEncoder(DjangoJSONEncoder):
+    # DjangoJSONEncoder rounds times to milliseconds; keys need full precision.
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, cls=_CursorEncoder, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token, ordering, queryset):
+    """
+    Return the cursor's key values, converted to the types of ``ordering``'s
+    fields on ``queryset``, or None for a missing/tampered cursor.
+    """
+    if not token:
+        return None
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or len(values) != len(ordering):
+        return None
+    query = queryset.query.chain()
+    try:
+        return [
+            query.resolve_ref(field).output_field.to_python(value)
+            for (field, _), value in zip(_split(ordering), values)
+        ]
+    except (ValidationError, TypeError, ValueError):
+        return None
+
+
+# =============================================================================
+# KEYSET PAGE
+# =============================================================================
+class KeysetPage:
+    """One page of a keyset-paginated list."""
+
+    def __init__(self, object_list, next_cursor, is_first):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.is_first = is_first
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return not self.is_first
+
+    def next_query(self, request, param=CURSOR_PARAM, **extra):
+        """Current query string with the cursor swapped for the next page's."""
+        query = _query_with(request, extra)
+        query[param] = self.next_cursor
+        return query.urlencode()
+
+    def first_query(self, request, param=CURSOR_PARAM, **extra):
+        query = _query_with(request, extra)
+        query.pop(param, None)
+        return query.urlencode()
+
+
+def _query_with(request, extra):
+    query = request.GET.copy()
+    for key, value in extra.items():
+        query[key] = value
+    return query
+
+
+def _split(ordering):
+    """``["-created_at", "id"]`` -> ``[("created_at", True), ("id", False)]``."""
+    return [(field.lstrip("-"), field.startswith("-")) for field in ordering]
+
+
+def keyset_filter(ordering, values):
+    """
+    Q object selecting rows strictly after ``values`` in ``ordering``:
+    ``(a < va) OR (a = va AND b < vb) OR ...`` with ``<``/``>`` per direction.
+
+    The OR alone does not bound an index scan, so it is ANDed with
+    ``a <= va`` (``>=`` ascending): the scan starts at the cursor instead of
+    filtering its way down from the top of the index.
+    """
+    keys = _split(ordering)
+    condition = Q()
+    for position, (field, descending) in enumerate(keys):
+        clause = Q(**{f"{field}__{'lt' if descending else 'gt'}": values[position]})
+        for prior_position, (prior_field, _) in enumerate(keys[:position]):
+            clause &= Q(**{prior_field: values[prior_position]})
+        condition |= clause
+    first_field, descending = keys[0]
+    return Q(**{f"{first_field}__{'lte' if descending else 'gte'}": values[0]}) & condition
+
+
+def cursor_values(obj, ordering):
+    return [getattr(obj, field) for field, _ in _split(ordering)]
+
+
+def paginate_keyset(queryset, ordering, cursor=None, per_page=DEFAULT_PAGE_SIZE):
+    """
+    Return a ``KeysetPage`` of ``queryset`` ordered by ``ordering``.
+
+    ``ordering`` must end with a unique column (``id``/``-id``) and contain
+    only non-null fields or annotations so the tuple comparison is total.
+    """
+    values = decode_cursor(cursor, ordering, queryset)
+    queryset = queryset.order_by(*ordering)
+    if values is not None:
+        queryset = queryset.filter(keyset_filter(ordering, values))
+
+    rows = list(queryset[:per_page + 1])
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(cursor_values(rows[-1], ordering))
+    return KeysetPage(rows, next_cursor, is_first=values is None)
+
+
+# =============================================================================
+# APPROXIMATE COUNTS
+# =============================================================================
+def estimated_count(queryset, threshold=EXACT_COUNT_THRESHOLD):
+    """
+    Return ``(count, is_estimate)`` for ``queryset``.
+
+    PostgreSQL: use the planner's row estimate and fall back to an exact
+    ``COUNT(*)`` only when the estimate is below ``threshold``. Other
+    backends always count exactly.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return queryset.count(), False
+
+    sql, params = queryset.order_by().values("pk").query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    estimate = int(plan[0]["Plan"]["Plan Rows"])
+
+    if estimate < threshold:
+        return queryset.count(), False
+    return estimate, True
@@ -0,0 +1,404 @@
+"""
+History Partitioning
+====================
+Monthly range partitioning and retention for the append-only history tables
+(``QueueHistory`` and ``TerminalActivity``).
+
+On PostgreSQL both tables are converted once (see migration 0018) into
+``PARTITION BY RANGE ("timestamp")`` parents with one child per UTC month,
+named ``<table>_pYYYYMM``, plus a ``<table>_default`` catch-all. Because
+PostgreSQL requires the partition key in every unique constraint, the primary
+key becomes ``(id, timestamp)``. Django still treats ``id`` as the key.
+
+A foreign key to a partitioned table must reference its whole key too, so the
+one-to-one link from ``TerminalActivity`` to ``QueueHistory`` becomes a
+composite foreign key ``(queue_history_id, timestamp)`` (both rows always share
+the same timestamp, see ``HISTORY_LINKS``). Together with the
+``(queue_history_id, timestamp)`` unique constraint it still allows one
+activity row per history row.
+
+On other backends (SQLite) partitions are not available: partition creation is
+a no-op and retention falls back to batched deletes.
+"""
+
+import re
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+
+HISTORY_TABLES = (
+    # Converted/trimmed in this order: TerminalActivity references QueueHistory.
+    "vehicles_queuehistory",
+    "terminal_terminalactivity",
+)
+PARTITION_COLUMN = "timestamp"
+
+# Foreign keys between history tables, recreated with the partition column:
+# (constraint name, table, column, referenced table)
+HISTORY_LINKS = (
+    ("terminal_terminalactivity_queue_history_fk",
+     "terminal_terminalactivity", "queue_history_id", "vehicles_queuehistory"),
+)
+RETENTION_MODE_DETACH = "detach"
+RETENTION_MODE_DROP = "drop"
+RETENTION_DELETE_BATCH_SIZE = 1000
+
+_PARTITION_NAME_RE = r"^{table}_p(\d{{4}})(\d{{2}})$"
+
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+def get_retention_months():
+    """Number of full months of history to keep (0 disables retention)."""
+    return int(getattr(settings, "HISTORY_RETENTION_MONTHS", 24))
+
+
+def get_months_ahead():
+    """How many future monthly partitions to keep pre-created."""
+    return int(getattr(settings, "HISTORY_PARTITION_MONTHS_AHEAD", 3))
+
+
+def get_retention_mode():
+    mode = getattr(settings, "HISTORY_RETENTION_MODE", RETENTION_MODE_DETACH)
+    return mode if mode in (RETENTION_MODE_DETACH, RETENTION_MODE_DROP) else RETENTION_MODE_DETACH
+
+
+def supports_partitioning(conn=None):
+    return (conn or connection).vendor == "postgresql"
+
+
+# =============================================================================
+# MONTH HELPERS
+# =============================================================================
+def month_start(value):
+    """First instant (UTC) of the month containing ``value``."""
+    value = value.astimezone(dt_timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(value, months):
+    index = value.year * 12 + (value.month - 1) + months
+    return value.replace(year=index // 12, month=index % 12 + 1, day=1)
+
+
+def partition_name(table, start):
+    return f"{table}_p{start.year:04d}{start.month:02d}"
+
+
+# =============================================================================
+# POSTGRESQL PARTITION MANAGEMENT
+# =============================================================================
+def _relkind(cursor, table):
+    cursor.execute("SELECT relkind FROM pg_class WHERE relname = %s AND relkind IN ('r', 'p')", [table])
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def is_partitioned(table, conn=None):
+    conn = conn or connection
+    if not supports_partitioning(conn):
+        return False
+    with conn.cursor() as cursor:
+        return _relkind(cursor, table) == "p"
+
+
+def list_partitions(table, conn=None):
+    """Return ``[(name, month_start)]`` for the monthly partitions of ``table``."""
+    conn = conn or connection
+    if not supports_partitioning(conn):
+        return []
+
+    pattern = re.compile(_PARTITION_NAME_RE.format(table=re.escape(table)))
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s
+            """,
+            [table],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = []
+    for name in names:
+        match = pattern.match(name)
+        if match:
+            start = datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=dt_timezone.utc)
+            partitions.append((name, start))
+    return sorted(partitions, key=lambda item: item[1])
+
+
+def _create_month_partition(conn, cursor, table, start):
+    qn = conn.ops.quote_name
+    end = add_months(start, 1)
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS {qn(partition_name(table, start))} "
+        f"PARTITION OF {qn(table)} FOR VALUES FROM (%s) TO (%s)",
+        [start, end],
+    )
+
+
+def ensure_partitions(now=None, months_ahead=None, conn=None):
+    """
+    Create the current month's partition and ``months_ahead`` future ones for
+    every history table. Returns the list of partition names that now exist
+    for the covered months. No-op on backends without partitioning.
+    """
+    conn = conn or connection
+    if not supports_partitioning(conn):
+        return []
+
+    now = now or datetime.now(dt_timezone.utc)
+    months_ahead = get_months_ahead() if months_ahead is None else months_ahead
+    current = month_start(now)
+
+    created = []
+    with conn.cursor() as cursor:
+        for table in HISTORY_TABLES:
+            if _relkind(cursor, table) != "p":
+                continue
+            for offset in range(months_ahead + 1):
+                start = add_months(current, offset)
+                _create_month_partition(conn, cursor, table, start)
+                created.append(partition_name(table, start))
+    return created
+
+
+def convert_to_partitioned(table, conn=None, now=None, months_ahead=None):
+    """
+    One-time conversion of a plain history table into a monthly partitioned
+    table, preserving data, Django's index/constraint names and the id
+    sequence. Safe to call repeatedly.
+    """
+    conn = conn or connection
+    if not supports_partitioning(conn):
+        return False
+
+    qn = conn.ops.quote_name
+    legacy = f"{table}_legacy"
+    sequence = f"{table}_part_id_seq"
+    now = now or datetime.now(dt_timezone.utc)
+    months_ahead = get_months_ahead() if months_ahead is None else months_ahead
+
+    with transaction.atomic(using=conn.alias), conn.cursor() as cursor:
+        if _relkind(cursor, table) != "r":
+            return False
+
+        # Capture secondary indexes and outgoing FKs so they can be recreated
+        # under their original (Django-generated) names.
+        cursor.execute(
+            """
+            SELECT indexname, indexdef FROM pg_indexes
+            WHERE tablename = %s
+              AND indexname NOT IN (
+                  SELECT conname FROM pg_constraint
+                  WHERE conrelid = %s::regclass AND contype = 'p'
+              )
+            """,
+            [table, table],
+        )
+        index_defs = cursor.fetchall()
+        cursor.execute(
+            """
+            SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+            WHERE conrelid = %s::regclass AND contype = 'f' AND conparentid = 0
+            """,
+            [table],
+        )
+        fk_defs = cursor.fetchall()
+        cursor.execute(
+            """
+            SELECT conrelid::regclass::text, conname FROM pg_constraint
+            WHERE confrelid = %s::regclass AND contype = 'f' AND conparentid = 0
+            """,
+            [table],
+        )
+        incoming_fks = cursor.fetchall()
+        cursor.execute(
+            """
+            SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+            WHERE conrelid = %s::regclass AND contype = 'u'
+            """,
+            [table],
+        )
+        unique_defs = cursor.fetchall()
+        cursor.execute(
+            f"SELECT MIN({qn(PARTITION_COLUMN)}), COALESCE(MAX(id), 0) FROM {qn(table)}"
+        )
+        oldest, max_id = cursor.fetchone()
+
+        # Foreign keys into this table cannot follow it to the partitioned
+        # copy; they are recreated by link_history_tables() below.
+        for referencing, name in incoming_fks:
+            cursor.execute(f"ALTER TABLE {qn(referencing)} DROP CONSTRAINT {qn(name)}")
+
+        cursor.execute(f"ALTER TABLE {qn(table)} RENAME TO {qn(legacy)}")
+        cursor.execute(
+            f"CREATE TABLE {qn(table)} (LIKE {qn(legacy)} INCLUDING DEFAULTS) "
+            f"PARTITION BY RANGE ({qn(PARTITION_COLUMN)})"
+        )
+        cursor.execute(f"CREATE SEQUENCE {qn(sequence)} OWNED BY {qn(table)}.id")
+        if max_id:
+            cursor.execute("SELECT setval(%s, %s)", [sequence, max_id])
+        cursor.execute(
+            f"ALTER TABLE {qn(table)} ALTER COLUMN id SET DEFAULT nextval(%s::regclass)",
+            [sequence],
+        )
+        cursor.execute(f"CREATE TABLE {qn(table + '_default')} PARTITION OF {qn(table)} DEFAULT")
+
+        first = month_start(oldest) if oldest else month_start(now)
+        last = add_months(month_start(now), months_ahead)
+        start = first
+        while start <= last:
+            _create_month_partition(conn, cursor, table, start)
+            start = add_months(start, 1)
+
+        cursor.execute(f"INSERT INTO {qn(table)} SELECT * FROM {qn(legacy)}")
+        cursor.execute(f"DROP TABLE {qn(legacy)}")
+        cursor.execute(f"ALTER TABLE {qn(table)} ADD PRIMARY KEY (id, {qn(PARTITION_COLUMN)})")
+
+        for name, definition in unique_defs:
+            # Unique constraints must include the partition key.
+            columns = definition[definition.index("(") + 1:definition.rindex(")")]
+            cursor.execute(
+                f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(name)} "
+                f"UNIQUE ({columns}, {qn(PARTITION_COLUMN)})"
+            )
+        unique_names = {name for name, _ in unique_defs}
+        for name, definition in index_defs:
+            if name in unique_names:
+                continue
+            definition = re.sub(rf" ON (\w+\.)?{re.escape(legacy)} ", rf" ON \g<1>{table} ", definition, count=1)
+            cursor.execute(definition)
+        for name, definition in fk_defs:
+            if any(link[0] == name for link in HISTORY_LINKS):
+                continue  # already references the partitioned table
+            cursor.execute(f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(name)} {definition}")
+
+        link_history_tables(conn=conn)
+
+    return True
+
+
+def link_history_tables(conn=None):
+    """
+    Add the ``HISTORY_LINKS`` foreign keys to partitioned history tables,
+    keyed on ``(column, timestamp)``. Safe to call repeatedly.
+
+    Activity rows are first given their history row's timestamp if they
+    drifted, and rows whose history row no longer exists are deleted, as
+    the CASCADE on the model would have done.
+    """
+    conn = conn or connection
+    if not supports_partitioning(conn):
+        return []
+
+    qn = conn.ops.quote_name
+    added = []
+    with transaction.atomic(using=conn.alias), conn.cursor() as cursor:
+        for name, table, column, referenced in HISTORY_LINKS:
+            if _relkind(cursor, referenced) != "p" or _relkind(cursor, table) is None:
+                continue
+            cursor.execute("SELECT 1 FROM pg_constraint WHERE conname = %s", [name])
+            if cursor.fetchone():
+                continue
+
+            cursor.execute(
+                f"UPDATE {qn(table)} AS child SET {qn(PARTITION_COLUMN)} = parent.{qn(PARTITION_COLUMN)} "
+                f"FROM {qn(referenced)} AS parent "
+                f"WHERE parent.id = child.{qn(column)} "
+                f"AND parent.{qn(PARTITION_COLUMN)} <> child.{qn(PARTITION_COLUMN)}"
+            )
+            cursor.execute(
+                f"DELETE FROM {qn(table)} AS child WHERE NOT EXISTS ("
+                f"SELECT 1 FROM {qn(referenced)} AS parent WHERE parent.id = child.{qn(column)})"
+            )
+            cursor.execute(
+                f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(name)} "
+                f"FOREIGN KEY ({qn(column)}, {qn(PARTITION_COLUMN)}) "
+                f"REFERENCES {qn(referenced)} (id, {qn(PARTITION_COLUMN)}) "
+                f"DEFERRABLE INITIALLY DEFERRED"
+            )
+            added.append(name)
+    return added
+
+
+# =============================================================================
+# RETENTION
+# =============================================================================
+def retention_cutoff(now=None, retention_months=None):
+    """Rows with a timestamp before this instant fall outside the horizon."""
+    now = now or datetime.now(dt_timezone.utc)
+    retention_months = get_retention_months() if retention_months is None else retention_months
+    if retention_months <= 0:
+        return None
+    return add_months(month_start(now), -retention_months)
+
+
+def apply_retention(now=None, retention_months=None, mode=None, dry_run=False, conn=None):
+    """
+    Enforce the retention horizon on every history table.
+
+    PostgreSQL: whole monthly partitions older than the cutoff are detached
+    (kept as standalone tables for archiving, without their ``HISTORY_LINKS``
+    foreign keys) or detached and dropped. Referenced partitions cannot be
+    dropped while attached.
+    Other backends: rows older than the cutoff are deleted in batches when
+    ``mode`` is ``drop``; ``detach`` has no equivalent and leaves data alone.
+
+    Returns a list of ``(table, action, target)`` tuples describing the work.
+    """
+    conn = conn or connection
+    cutoff = retention_cutoff(now=now, retention_months=retention_months)
+    if cutoff is None:
+        return []
+
+    mode = mode or get_retention_mode()
+    actions = []
+
+    if supports_partitioning(conn):
+        qn = conn.ops.quote_name
+        for table in reversed(HISTORY_TABLES):
+            for name, start in list_partitions(table, conn=conn):
+                if add_months(start, 1) > cutoff:
+                    continue
+                actions.append((table, mode, name))
+                if dry_run:
+                    continue
+                with conn.cursor() as cursor:
+                    cursor.execute(f"ALTER TABLE {qn(table)} DETACH PARTITION {qn(name)}")
+                    if mode == RETENTION_MODE_DROP:
+                        cursor.execute(f"DROP TABLE {qn(name)}")
+                        continue
+                    for link_name, link_table, _, _ in HISTORY_LINKS:
+                        if link_table == table:
+                            cursor.execute(f"ALTER TABLE {qn(name)} DROP CONSTRAINT IF EXISTS {qn(link_name)}")
+        return actions
+
+    if mode != RETENTION_MODE_DROP:
+        return actions
+
+    from terminal.models import TerminalActivity
+    from vehicles.models import QueueHistory
+
+    for model in (TerminalActivity, QueueHistory):
+        stale = model.objects.filter(timestamp__lt=cutoff)
+        if dry_run:
+            actions.append((model._meta.db_table, mode, stale.count()))
+            continue
+
+        deleted = 0
+        while True:
+            batch = list(stale.values_list("pk", flat=True)[:RETENTION_DELETE_BATCH_SIZE])
+            if not batch:
+                break
+            model.objects.filter(pk__in=batch).delete()
+            deleted += len(batch)
+        actions.append((model._meta.db_table, mode, deleted))
+
+    return actions
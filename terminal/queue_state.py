@@ -5,8 +5,8 @@ from django.db import transaction
 from django.db.models import Q
 from django.utils import timezone
 
-from terminal.models import EntryLog, SystemSettings
-from vehicles.models import QueueHistory
+from terminal import recent_history
+from terminal.models import EntryLog, SystemSettings, VehiclePresence
 
 DEPARTED_VISIBLE_SECONDS = 30
 DEPARTED_COUNTDOWN_SECONDS = DEPARTED_VISIBLE_SECONDS
@@ -26,6 +26,7 @@ def finalize_departure(entry_log, now=None):
         entry_log.is_active = False
         entry_log.departed_at = now
         entry_log.save(update_fields=["is_active", "departed_at"])
+        VehiclePresence.release([entry_log.pk], now)
 
     return entry_log
 
@@ -208,26 +209,12 @@ def get_queue_state(route_filter=None, persist_boarding_start=False):
 
 
 def _collect_history(route_filter=None):
-    queryset = (
-        QueueHistory.objects
-        .select_related("vehicle__route")
-        .order_by("-timestamp")
-    )
-
-    if route_filter:
-        queryset = queryset.filter(vehicle__route_id=route_filter)
-
+    # Per-route ring buffers: every route keeps its last events, O(routes) to read.
     history_by_route = OrderedDict()
-    for event in queryset:
-        route = getattr(event.vehicle, "route", None)
-        route_name = str(route) if route else "Unassigned Route"
-        entries = history_by_route.setdefault(route_name, [])
-        if len(entries) >= HISTORY_LIMIT_PER_ROUTE:
-            continue
-
-        vehicle_plate = getattr(event.vehicle, "license_plate", "—") if event.vehicle else "—"
-        entries.append({
-            "vehicle_plate": vehicle_plate,
+    for event in recent_history.recent(route_filter, limit_per_route=HISTORY_LIMIT_PER_ROUTE):
+        route_name = event.route_name if event.route_id else "Unassigned Route"
+        history_by_route.setdefault(route_name, []).append({
+            "vehicle_plate": event.plate,
             "action": event.get_action_display(),
             "timestamp": timezone.localtime(event.timestamp).strftime("%I:%M %p"),
         })
@@ -0,0 +1,157 @@
+"""
+Recent Queue History
+====================
+Per-route ring buffers of the last few enter/exit events, for the TV
+history panels.
+
+Reading a panel is O(routes), and every route shows its own last events
+however busy the others are. The old approach scanned the newest
+``QueueHistory`` rows and could miss quiet routes.
+
+- On first use, each process fills the buffers with one indexed query per
+  route for its last events (``QueueHistory`` vehicle/timestamp index),
+  however long ago they were.
+- Events written by this process are added when their transaction commits.
+- Events written by other workers are picked up by reading rows past the
+  highest id seen (and the last minute), at most once per
+  ``RECENT_HISTORY_SYNC_SECONDS``.
+"""
+
+import threading
+import time
+from collections import deque, namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+
+class HistoryEvent(namedtuple("HistoryEvent", "id route_id route_name plate action timestamp")):
+    __slots__ = ()
+
+    def get_action_display(self):
+        from vehicles.models import QueueHistory
+
+        return dict(QueueHistory.ACTION_CHOICES).get(self.action, self.action)
+
+
+UNASSIGNED_ROUTE_NAME = "Unassigned"
+CATCH_UP_OVERLAP = timedelta(minutes=1)
+
+_lock = threading.Lock()
+_buffers = {}        # route id (None = unassigned) -> deque of HistoryEvent, oldest first
+_last_id = None      # highest QueueHistory id seen; None until loaded
+_synced_at = 0.0
+
+
+def _event(history):
+    vehicle = history.vehicle
+    route = getattr(vehicle, "route", None) if vehicle else None
+    return HistoryEvent(
+        id=history.id,
+        route_id=route.id if route else None,
+        route_name=f"{route.origin} → {route.destination}" if route else UNASSIGNED_ROUTE_NAME,
+        plate=getattr(vehicle, "license_plate", "—") if vehicle else "—",
+        action=history.action,
+        timestamp=history.timestamp,
+    )
+
+
+def _push(event):
+    global _last_id
+    buffer = _buffers.get(event.route_id)
+    if buffer is None:
+        buffer = _buffers[event.route_id] = deque(maxlen=settings.RECENT_HISTORY_PER_ROUTE)
+    if any(existing.id == event.id for existing in buffer):
+        return
+    if buffer and event.timestamp < buffer[-1].timestamp:
+        # Late arrival from another worker: keep the buffer in time order
+        events = sorted([*buffer, event], key=lambda e: (e.timestamp, e.id))
+        buffer.clear()
+        buffer.extend(events)
+    else:
+        buffer.append(event)
+    _last_id = max(_last_id or 0, event.id)
+
+
+def _load():
+    """Fill every route's buffer from its own indexed query."""
+    global _last_id
+    from vehicles.models import QueueHistory, Route
+
+    all_history = QueueHistory.objects.all()
+    last_id = all_history.aggregate(last=Max("id"))["last"] or 0
+    per_route = settings.RECENT_HISTORY_PER_ROUTE
+
+    _buffers.clear()
+    route_ids = [*Route.objects.values_list("id", flat=True), None]
+    for route_id in route_ids:
+        if route_id is None:
+            events = all_history.filter(vehicle__route__isnull=True)
+        else:
+            events = all_history.filter(vehicle__route_id=route_id)
+        events = events.select_related("vehicle__route").order_by("-timestamp")[:per_route]
+        for history in reversed(events):
+            _push(_event(history))
+    _last_id = last_id
+
+
+def _catch_up():
+    from vehicles.models import QueueHistory
+
+    now = timezone.now()
+    # Ids can commit out of order, so also re-read the last moments; _push drops repeats.
+    new_events = (
+        QueueHistory.objects
+        .filter(Q(id__gt=_last_id) | Q(timestamp__gte=now - CATCH_UP_OVERLAP))
+        .select_related("vehicle__route")
+        .order_by("id")
+    )
+    for history in new_events:
+        _push(_event(history))
+
+
+def _sync():
+    global _synced_at
+    if _last_id is None:
+        _load()
+    elif time.monotonic() - _synced_at >= settings.RECENT_HISTORY_SYNC_SECONDS:
+        _catch_up()
+    else:
+        return
+    _synced_at = time.monotonic()
+
+
+def record(history):
+    """Add a new ``QueueHistory`` row once its transaction commits."""
+    event = _event(history)
+
+    def push():
+        with _lock:
+            if _last_id is not None:  # otherwise the first read loads it
+                _push(event)
+
+    transaction.on_commit(push)
+
+
+def recent(route_filter=None, limit_per_route=None):
+    """Each route's last events (all routes, or ``route_filter``), newest first overall."""
+    limit = limit_per_route or settings.RECENT_HISTORY_PER_ROUTE
+    with _lock:
+        _sync()
+        if route_filter:
+            buffers = [_buffers.get(route_filter, ())]
+        else:
+            buffers = list(_buffers.values())
+        events = [event for buffer in buffers for event in list(buffer)[-limit:]]
+    return sorted(events, key=lambda e: (e.timestamp, e.id), reverse=True)
+
+
+def reset():
+    """Forget the buffers; the next read reloads them."""
+    global _last_id
+    with _lock:
+        _buffers.clear()
+        _last_id = None
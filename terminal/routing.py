@@ -1,8 +1,15 @@
 from django.urls import re_path
 
-from .consumers import QueueConsumer, TVDisplayConsumer
+from .consumers import GateScannerConsumer, QueueConsumer, TVDisplayConsumer
+from .gate import GateTokenAuthMiddleware
 
+# Public display sockets: anonymous, no AuthMiddlewareStack (see rdfs.asgi)
 websocket_urlpatterns = [
     re_path(r"ws/queue/$", QueueConsumer.as_asgi()),
     re_path(r"ws/tv-display/$", TVDisplayConsumer.as_asgi()),
 ]
+
+# Gate devices: API token instead of a session (see terminal.gate)
+gate_websocket_urlpatterns = [
+    re_path(r"ws/gate/$", GateTokenAuthMiddleware(GateScannerConsumer.as_asgi())),
+]
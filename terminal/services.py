@@ -15,8 +15,15 @@ from django.db import transaction
 from django.db.models import Q
 from django.utils import timezone
 
-from terminal.constants import QUEUE_GROUP_NAME
-from terminal.models import EntryLog, SystemSettings, Transaction, TerminalActivity
+from terminal import live_state, recent_history, snapshots
+from terminal.constants import (
+    QUEUE_COMPACT_GROUP_NAME,
+    QUEUE_GROUP_NAME,
+    TV_DISPLAY_COMPACT_GROUP_NAME,
+    TV_DISPLAY_GROUP_NAME,
+)
+from terminal.models import EntryLog, SystemSettings, Transaction, TerminalActivity, VehiclePresence
+from terminal.pagination import estimated_count, paginate_keyset
 from vehicles.models import QueueHistory, Vehicle, Wallet
 
 
@@ -29,6 +36,11 @@ QUEUE_STATUS_DEPARTED = "Departed"
 
 DEPARTED_VISIBLE_SECONDS = 60  # How long departed vehicles stay visible
 
+# Compact payload encoding (QueueService._compact_state)
+COMPACT_FORMAT = "c1"
+COMPACT_STATUS = {QUEUE_STATUS_QUEUED: "Q", QUEUE_STATUS_BOARDING: "B", QUEUE_STATUS_DEPARTED: "D"}
+COMPACT_STATUS_INDEX = {QUEUE_STATUS_QUEUED: 0, QUEUE_STATUS_BOARDING: 1, QUEUE_STATUS_DEPARTED: 2}
+
 
 # =============================================================================
 # QUEUE STATE SERVICE
@@ -80,22 +92,16 @@ class QueueService:
 
         now = timezone.now()
 
-        # Check if already in queue
-        active_log = EntryLog.objects.filter(vehicle=vehicle, is_active=True).first()
-        if active_log:
-            return False, "Vehicle is already in the queue", active_log
+        # Check if already in queue (locks the vehicle's presence row until commit)
+        presence = VehiclePresence.for_vehicle(vehicle, lock=True)
+        if presence.active_entry_id:
+            return False, "Vehicle is already in the queue", presence.active_entry
 
         # Get or create wallet
         wallet, _ = Wallet.objects.get_or_create(vehicle=vehicle)
 
         # Check cooldown
-        recent_entry = (
-            EntryLog.objects
-            .filter(vehicle=vehicle, status=EntryLog.STATUS_SUCCESS)
-            .order_by("-created_at")
-            .first()
-        )
-        if recent_entry and (now - recent_entry.created_at) < timedelta(minutes=cooldown_minutes):
+        if presence.last_entry_at and (now - presence.last_entry_at) < timedelta(minutes=cooldown_minutes):
             return False, "Please wait before re-entry (cooldown active)", None
 
         # Check minimum deposit
@@ -126,6 +132,7 @@ class QueueService:
             status=EntryLog.STATUS_SUCCESS,
             message=f"Vehicle '{vehicle.license_plate}' entered terminal."
         )
+        presence.enter(entry_log)
 
         # Create queue history record
         departure_snapshot = now + timedelta(minutes=departure_duration)
@@ -152,7 +159,8 @@ class QueueService:
         """
         now = timezone.now()
 
-        active_log = EntryLog.objects.filter(vehicle=vehicle, is_active=True).first()
+        presence = VehiclePresence.for_vehicle(vehicle, lock=True)
+        active_log = presence.active_entry
         if not active_log:
             return False, "Vehicle is not in the queue", None
 
@@ -160,6 +168,7 @@ class QueueService:
         active_log.is_active = False
         active_log.departed_at = now
         active_log.save(update_fields=["is_active", "departed_at"])
+        VehiclePresence.release([active_log.pk], now)
 
         # Create queue history exit record
         wallet = getattr(vehicle, 'wallet', None)
@@ -203,6 +212,7 @@ class QueueService:
             log.is_active = False
             log.departed_at = now
             log.save(update_fields=["is_active", "departed_at"])
+            VehiclePresence.release([log.pk], now)
 
             # Create transaction record
             Transaction.create_from_entry_log(log, exit_timestamp=now)
@@ -231,11 +241,20 @@ class QueueService:
     # QUEUE STATE RETRIEVAL
     # -------------------------------------------------------------------------
     @staticmethod
-    def get_queue_state(route_filter=None, include_queued=True):
+    def get_queue_state(route_filter=None, include_queued=True, compact=False):
         """
         Get current queue state for display.
-        Returns structured data suitable for JSON serialization.
+        Returns structured data suitable for JSON serialization; with
+        ``compact=True``, the short-key encoding (see ``_compact_state``).
         """
+        queue = QueueService._collect_queue(route_filter, include_queued)
+        if compact:
+            return QueueService._compact_state(queue)
+        return QueueService._verbose_state(queue)
+
+    @staticmethod
+    def _collect_queue(route_filter=None, include_queued=True):
+        """Load the queue once: display settings plus (log, status, expiries) rows grouped by route."""
         now = timezone.now()
 
         # Run housekeeping first
@@ -275,12 +294,10 @@ class QueueService:
                 }
             route_groups[route_key]["logs"].append(log)
 
-        # Build entries for each route
-        all_entries = []
-        route_sections = []
+        # Rows for each route
+        sections = []
 
         for route_key, group in route_groups.items():
-            route_name = group["route_name"]
             route_logs = group["logs"]
 
             # Separate active and departed
@@ -297,7 +314,7 @@ class QueueService:
             # First active vehicle is boarding
             boarding_log = active_logs[0] if active_logs else None
 
-            route_entries = []
+            rows = []
             status_counts = {"Queued": 0, "Boarding": 0, "Departed": 0}
 
             # Process active vehicles
@@ -310,53 +327,35 @@ class QueueService:
                 if status == QUEUE_STATUS_QUEUED and not include_queued:
                     continue
 
-                entry = QueueService._format_entry(
-                    log, status, departure_duration, countdown_seconds, route_name, now
-                )
-                route_entries.append(entry)
-                all_entries.append(entry)
+                rows.append((log, status) + QueueService._expiries(
+                    log, status, departure_duration, countdown_seconds, now
+                ))
 
             # Process departed vehicles
             for log in departed_logs:
                 status_counts[QUEUE_STATUS_DEPARTED] += 1
-                entry = QueueService._format_entry(
-                    log, QUEUE_STATUS_DEPARTED, departure_duration, countdown_seconds, route_name, now
-                )
-                route_entries.append(entry)
-                all_entries.append(entry)
+                rows.append((log, QUEUE_STATUS_DEPARTED) + QueueService._expiries(
+                    log, QUEUE_STATUS_DEPARTED, departure_duration, countdown_seconds, now
+                ))
 
-            route_sections.append({
-                "name": route_name,
+            sections.append({
                 "route_id": route_key,
-                "entries": route_entries,
-                "status_summary": status_counts,
-                "queued_count": status_counts["Queued"],
+                "route_name": group["route_name"],
+                "rows": rows,
+                "status_counts": status_counts,
             })
 
-        # Count totals
-        counts = {
-            "queued": sum(1 for e in all_entries if e["status"] == QUEUE_STATUS_QUEUED),
-            "boarding": sum(1 for e in all_entries if e["status"] == QUEUE_STATUS_BOARDING),
-            "departed": sum(1 for e in all_entries if e["status"] == QUEUE_STATUS_DEPARTED),
-        }
-
         return {
-            "entries": all_entries,
-            "route_sections": route_sections,
-            "counts": counts,
-            "server_time": int(now.timestamp()),
+            "now": now,
+            "sections": sections,
             "countdown_duration": countdown_seconds,
             "refresh_interval": refresh_interval,
             "departure_duration_minutes": departure_duration,
         }
 
     @staticmethod
-    def _format_entry(log, status, departure_duration, countdown_seconds, route_name, now):
-        """Format a single queue entry for display."""
-        vehicle = getattr(log, "vehicle", None)
-        driver = getattr(vehicle, "assigned_driver", None) if vehicle else None
-
-        # Calculate expiry timestamps
+    def _expiries(log, status, departure_duration, countdown_seconds, now):
+        """(boarding expiry, departed countdown expiry) as epoch seconds; stamps boarding start."""
         expiry_timestamp = None
         departed_countdown_expiry = None
 
@@ -372,6 +371,54 @@ class QueueService:
             if departed_expiry > now:
                 departed_countdown_expiry = int(departed_expiry.timestamp())
 
+        return expiry_timestamp, departed_countdown_expiry
+
+    @staticmethod
+    def _verbose_state(queue):
+        """The default payload: full keys and server-formatted times."""
+        departure_duration = queue["departure_duration_minutes"]
+        all_entries = []
+        route_sections = []
+
+        for section in queue["sections"]:
+            route_entries = [
+                QueueService._format_entry(
+                    log, status, departure_duration, section["route_name"], expiry, departed_expiry
+                )
+                for log, status, expiry, departed_expiry in section["rows"]
+            ]
+            all_entries.extend(route_entries)
+            route_sections.append({
+                "name": section["route_name"],
+                "route_id": section["route_id"],
+                "entries": route_entries,
+                "status_summary": section["status_counts"],
+                "queued_count": section["status_counts"]["Queued"],
+            })
+
+        # Count totals
+        counts = {
+            "queued": sum(1 for e in all_entries if e["status"] == QUEUE_STATUS_QUEUED),
+            "boarding": sum(1 for e in all_entries if e["status"] == QUEUE_STATUS_BOARDING),
+            "departed": sum(1 for e in all_entries if e["status"] == QUEUE_STATUS_DEPARTED),
+        }
+
+        return {
+            "entries": all_entries,
+            "route_sections": route_sections,
+            "counts": counts,
+            "server_time": int(queue["now"].timestamp()),
+            "countdown_duration": queue["countdown_duration"],
+            "refresh_interval": queue["refresh_interval"],
+            "departure_duration_minutes": departure_duration,
+        }
+
+    @staticmethod
+    def _format_entry(log, status, departure_duration, route_name, expiry_timestamp, departed_countdown_expiry):
+        """Format a single queue entry for display."""
+        vehicle = getattr(log, "vehicle", None)
+        driver = getattr(vehicle, "assigned_driver", None) if vehicle else None
+
         entry_time = timezone.localtime(log.created_at)
         departure_time = log.created_at + timedelta(minutes=departure_duration)
 
@@ -393,16 +440,88 @@ class QueueService:
             "departed_countdown_expiry": departed_countdown_expiry,
         }
 
+    @staticmethod
+    def _compact_state(queue):
+        """
+        Opt-in payload for new clients (``?format=compact``): route names sent
+        once in ``rt``, short keys, epoch-second times the client formats.
+
+        Top level: ``f`` format tag, ``t`` server time, ``cd``/``ri``/``dd``
+        countdown seconds / refresh seconds / departure minutes, ``c`` totals
+        ``[queued, boarding, departed]``, ``sec`` per-route ``{"r", "c"}`` in
+        display order, ``e`` entries in display order. Entry keys: ``i`` id,
+        ``r`` route id (0 = unassigned), ``p`` plate, ``n`` vehicle name,
+        ``k`` vehicle type, ``d`` driver, ``s`` status (Q/B/D), ``t`` entry
+        time; ``x`` boarding expiry and ``dx`` departed countdown expiry only
+        when set. Departure time is ``t + dd * 60``.
+        """
+        routes = {}
+        sections = []
+        entries = []
+        counts = [0, 0, 0]
+
+        for section in queue["sections"]:
+            route_key = section["route_id"] or 0
+            routes[str(route_key)] = section["route_name"]
+            status_counts = section["status_counts"]
+            sections.append({
+                "r": route_key,
+                "c": [status_counts["Queued"], status_counts["Boarding"], status_counts["Departed"]],
+            })
+            for log, status, expiry, departed_expiry in section["rows"]:
+                vehicle = getattr(log, "vehicle", None)
+                driver = getattr(vehicle, "assigned_driver", None) if vehicle else None
+                entry = {
+                    "i": log.id,
+                    "r": route_key,
+                    "p": vehicle.license_plate if vehicle else "—",
+                    "n": vehicle.vehicle_name if vehicle else "—",
+                    "k": vehicle.vehicle_type if vehicle else "jeepney",
+                    "d": f"{driver.first_name} {driver.last_name}" if driver else "N/A",
+                    "s": COMPACT_STATUS[status],
+                    "t": int(log.created_at.timestamp()),
+                }
+                if expiry is not None:
+                    entry["x"] = expiry
+                if departed_expiry is not None:
+                    entry["dx"] = departed_expiry
+                entries.append(entry)
+                counts[COMPACT_STATUS_INDEX[status]] += 1
+
+        return {
+            "f": COMPACT_FORMAT,
+            "t": int(queue["now"].timestamp()),
+            "cd": queue["countdown_duration"],
+            "ri": queue["refresh_interval"],
+            "dd": queue["departure_duration_minutes"],
+            "rt": routes,
+            "c": counts,
+            "sec": sections,
+            "e": entries,
+        }
+
     # -------------------------------------------------------------------------
     # TV DISPLAY STATE (excludes queued from main list)
     # -------------------------------------------------------------------------
     @staticmethod
-    def get_tv_display_state(route_filter=None):
+    def get_tv_display_state(route_filter=None, compact=False):
         """
         Get queue state optimized for TV display.
         Shows all active vehicles (Queued and Boarding) with countdown timers.
+        With ``compact=True``: the compact queue state plus ``h`` history.
         """
-        full_state = QueueService.get_queue_state(route_filter=route_filter, include_queued=True)
+        queue = QueueService._collect_queue(route_filter=route_filter, include_queued=True)
+        history = QueueService._get_recent_history(route_filter)
+        return QueueService._tv_state(queue, history, compact)
+
+    @staticmethod
+    def _tv_state(queue, history, compact=False):
+        if compact:
+            tv_state = QueueService._compact_state(queue)
+            tv_state["h"] = QueueService._compact_history(history, tv_state["rt"])
+            return tv_state
+
+        full_state = QueueService._verbose_state(queue)
 
         # Don't filter - show all active vehicles (Queued and Boarding)
         # Departed vehicles are excluded by default in get_queue_state after visibility timeout
@@ -413,54 +532,64 @@ class QueueService:
             ]
 
         # Collect history events
-        history = QueueService._get_recent_history(route_filter)
-        full_state["history"] = history
+        history_by_route = OrderedDict()
+        for event in history:
+            history_by_route.setdefault(event.route_name, []).append({
+                "vehicle_plate": event.plate,
+                "action": event.get_action_display(),
+                "timestamp": timezone.localtime(event.timestamp).strftime("%I:%M %p"),
+            })
+        full_state["history"] = history_by_route
 
         return full_state
 
     @staticmethod
-    def _get_recent_history(route_filter=None, limit_per_route=3):
-        """Get recent queue history events."""
-        from vehicles.models import QueueHistory
-
-        queryset = (
-            QueueHistory.objects
-            .select_related("vehicle__route")
-            .order_by("-timestamp")
-        )
-
-        if route_filter:
-            queryset = queryset.filter(vehicle__route_id=route_filter)
+    def _get_recent_history(route_filter=None):
+        """Each route's last queue history events, newest first (``recent_history.HistoryEvent``)."""
+        return recent_history.recent(route_filter)
 
-        history_by_route = OrderedDict()
-        for event in queryset[:50]:
-            vehicle = event.vehicle
-            route = getattr(vehicle, "route", None) if vehicle else None
-            route_name = f"{route.origin} → {route.destination}" if route else "Unassigned"
-
-            entries = history_by_route.setdefault(route_name, [])
-            if len(entries) >= limit_per_route:
-                continue
-
-            entries.append({
-                "vehicle_plate": getattr(vehicle, "license_plate", "—") if vehicle else "—",
-                "action": event.get_action_display(),
-                "timestamp": timezone.localtime(event.timestamp).strftime("%I:%M %p"),
+    @staticmethod
+    def _compact_history(history, routes):
+        """``[{"r", "p", "a", "t"}]`` (route id, plate, raw action, epoch time); adds names to ``routes``."""
+        compact_history = []
+        for event in history:
+            route_key = event.route_id or 0
+            routes.setdefault(str(route_key), event.route_name)
+            compact_history.append({
+                "r": route_key,
+                "p": event.plate,
+                "a": event.action,
+                "t": int(event.timestamp.timestamp()),
             })
-
-        return history_by_route
+        return compact_history
 
     # -------------------------------------------------------------------------
     # WEBSOCKET BROADCASTING
     # -------------------------------------------------------------------------
     @staticmethod
     def broadcast_queue_update(route_filter=None):
-        """Broadcast queue update to all connected WebSocket clients."""
+        """
+        Broadcast queue update to all connected WebSocket clients (verbose and
+        compact groups), and republish the static passenger snapshots
+        (terminal.snapshots).
+        """
         channel_layer = get_channel_layer()
+        publish_snapshots = route_filter is None and snapshots.enabled()
+        if not channel_layer and not publish_snapshots:
+            return
+
+        queue = QueueService._collect_queue(route_filter=route_filter)
+        payload = QueueService._verbose_state(queue)
+        if publish_snapshots:
+            snapshots.publish_on_commit(payload)
         if not channel_layer:
             return
 
-        payload = QueueService.get_queue_state(route_filter=route_filter)
+        compact_payload = QueueService._compact_state(queue)
+        if route_filter is None:
+            # Initial state for sockets connecting from now on
+            live_state.remember(live_state.QUEUE, False, payload)
+            live_state.remember(live_state.QUEUE, True, compact_payload)
 
         async_to_sync(channel_layer.group_send)(
             QUEUE_GROUP_NAME,
@@ -469,23 +598,34 @@ class QueueService:
                 "payload": payload,
             },
         )
+        async_to_sync(channel_layer.group_send)(
+            QUEUE_COMPACT_GROUP_NAME,
+            {
+                "type": "queue.update",
+                "payload": compact_payload,
+            },
+        )
 
     @staticmethod
     def broadcast_tv_update(route_filter=None):
-        """Broadcast TV display update to all connected WebSocket clients."""
+        """Broadcast TV display update to all connected WebSocket clients (verbose and compact groups)."""
         channel_layer = get_channel_layer()
         if not channel_layer:
             return
 
-        payload = QueueService.get_tv_display_state(route_filter=route_filter)
-
-        async_to_sync(channel_layer.group_send)(
-            "tv_display",
-            {
-                "type": "tv.update",
-                "payload": payload,
-            },
-        )
+        queue = QueueService._collect_queue(route_filter=route_filter, include_queued=True)
+        history = QueueService._get_recent_history(route_filter)
+        for group, compact in ((TV_DISPLAY_GROUP_NAME, False), (TV_DISPLAY_COMPACT_GROUP_NAME, True)):
+            payload = QueueService._tv_state(queue, history, compact)
+            if route_filter is None:
+                live_state.remember(live_state.TV, compact, payload)
+            async_to_sync(channel_layer.group_send)(
+                group,
+                {
+                    "type": "tv.update",
+                    "payload": payload,
+                },
+            )
 
 
 # =============================================================================
@@ -519,16 +659,98 @@ class TransactionService:
 
     @staticmethod
     def get_transactions_in_range(start_date, end_date):
-        """Get transactions within a date range."""
+        """Get hot transactions within a date range (see iter_with_archive for cold rows)."""
         return (
             Transaction.objects
             .filter(transaction_date__gte=start_date, transaction_date__lte=end_date)
             .order_by('-entry_timestamp')
         )
 
+    @staticmethod
+    def filter_by_plate(queryset, plate):
+        """Hot rows for ``plate``, matched like the archive (ignoring case, spaces, hyphens)."""
+        from django.db.models import F, Value
+        from django.db.models.functions import Replace, Upper
+        from terminal.transaction_archive import normalize_plate
+
+        plate_key = Upper(Replace(Replace(F('vehicle_plate'), Value(' '), Value('')), Value('-'), Value('')))
+        return queryset.alias(plate_key=plate_key).filter(plate_key=normalize_plate(plate))
+
+    @staticmethod
+    def iter_with_archive(queryset, start_date=None, end_date=None, plate=None):
+        """
+        Iterate hot rows from ``queryset`` followed by cold-storage rows in the
+        same date range (and for ``plate``, if given; ``queryset`` should be
+        filtered the same way). Archived months are always older than any hot
+        row, so newest-first ordering is preserved.
+        """
+        from itertools import chain
+        from terminal.transaction_archive import iter_archived_transactions
+
+        return chain(
+            queryset.iterator(),
+            iter_archived_transactions(start_date=start_date, end_date=end_date, plate=plate),
+        )
+
+    @staticmethod
+    def get_range_totals(queryset, start_date=None, end_date=None, plate=None):
+        """Count and counted revenue across the hot queryset and the archive summaries."""
+        from django.db.models import Sum
+        from terminal.transaction_archive import archived_totals
+
+        archived = archived_totals(start_date=start_date, end_date=end_date, plate=plate)
+        hot_revenue = (
+            queryset.filter(is_revenue_counted=True).aggregate(total=Sum('fee_charged'))['total']
+            or Decimal('0.00')
+        )
+        hot_count, is_estimate = estimated_count(queryset)
+        return {
+            'count': hot_count + archived['count'],
+            'count_is_estimate': is_estimate,
+            'revenue': hot_revenue + archived['revenue'],
+        }
+
+    @staticmethod
+    def get_page_with_archive(queryset, start_date=None, end_date=None, cursor=None, per_page=50, plate=None):
+        """
+        One keyset page over (entry_timestamp, id), newest first. Hot rows are
+        paged in SQL; once they run out the page continues into cold storage,
+        reading only archive days at or before the cursor.
+        """
+        from itertools import dropwhile, islice
+        from terminal.pagination import cursor_values, decode_cursor, encode_cursor
+        from terminal.transaction_archive import iter_archived_transactions
+
+        ordering = ['-entry_timestamp', '-id']
+        page = paginate_keyset(queryset, ordering, cursor, per_page)
+        if page.has_next:
+            return page
+
+        rows = page.object_list
+        if rows:
+            after = cursor_values(rows[-1], ordering)
+        else:
+            after = decode_cursor(cursor, ordering, queryset)
+
+        archived_end = end_date
+        if after:
+            after_date = timezone.localtime(after[0]).date()
+            archived_end = min(archived_end, after_date) if archived_end else after_date
+        archived = iter_archived_transactions(start_date=start_date, end_date=archived_end, plate=plate)
+        if after:
+            archived = dropwhile(lambda tx: (tx.entry_timestamp, tx.id) >= tuple(after), archived)
+
+        remaining = per_page - len(rows)
+        extra = list(islice(archived, remaining + 1))
+        if len(extra) > remaining:
+            extra = extra[:remaining]
+            page.next_cursor = encode_cursor(cursor_values(extra[-1], ordering))
+        page.object_list = rows + extra
+        return page
+
     @staticmethod
     def export_transactions_csv(queryset):
-        """Generate CSV content for transactions."""
+        """Generate CSV content for transactions (any iterable of rows)."""
         import csv
         from io import StringIO
 
@@ -1,16 +1,26 @@
 from collections import OrderedDict
 from datetime import timedelta
 
+from django.db import transaction
 from django.db.models import Q
 from django.utils import timezone
 
-from terminal.models import EntryLog, SystemSettings
+from terminal.models import EntryLog, SystemSettings, VehiclePresence
 
 DEFAULT_DELETE_AFTER_MINUTES = 10
 PASSENGER_DELETE_AFTER_MINUTES = 1
 DEPARTED_VISIBLE_MINUTES = 1
 
 
+def close_entries(entry_ids, now):
+    """Auto-close the given active entries, with their vehicles' presence."""
+    entry_ids = list(entry_ids)
+    if entry_ids:
+        with transaction.atomic():
+            EntryLog.objects.filter(id__in=entry_ids, is_active=True).update(is_active=False, departed_at=now)
+            VehiclePresence.release(entry_ids, now)
+
+
 def apply_entry_log_maintenance(now=None, delete_after_minutes=None):
     """Unified entry log maintenance (auto close + expunge)."""
     now = now or timezone.now()
@@ -19,9 +29,7 @@ def apply_entry_log_maintenance(now=None, delete_after_minutes=None):
     departure_duration = int(getattr(settings, "departure_duration_minutes", 30))
 
     cutoff = now - timedelta(minutes=departure_duration)
-    active_to_close = EntryLog.objects.filter(is_active=True, created_at__lte=cutoff)
-    if active_to_close.exists():
-        active_to_close.update(is_active=False, departed_at=now)
+    close_entries(EntryLog.objects.filter(is_active=True, created_at__lte=cutoff).values_list("id", flat=True), now)
 
     delete_after_minutes = delete_after_minutes if delete_after_minutes is not None else DEFAULT_DELETE_AFTER_MINUTES
     delete_cutoff = now - timedelta(minutes=int(delete_after_minutes))
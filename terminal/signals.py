@@ -1,36 +1,66 @@
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
 from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
+from django.utils import timezone
 
-from .constants import QUEUE_GROUP_NAME, TV_DISPLAY_GROUP_NAME
-from .models import EntryLog, TerminalActivity, Transaction
+from . import recent_history
+from .models import EntryLog, TerminalActivity, TerminalFeeBalance, Transaction
+from .transaction_archive import is_month_archived
 from .utils import format_route_display
-from vehicles.models import QueueHistory
+from vehicles.models import QueueHistory, Vehicle
+
+
+_deferred = threading.local()
+
+
+def _defer(kind):
+    """Record ``kind`` as due if broadcasts are deferred in this thread."""
+    pending = getattr(_deferred, "pending", None)
+    if pending is None:
+        return False
+    pending.add(kind)
+    return True
+
+
+@contextmanager
+def deferred_broadcasts():
+    """
+    Hold the queue/TV broadcasts these signals send, in this thread, and send
+    each kind once on exit. For bulk writes such as gate scan batches, where
+    every saved row would otherwise rebuild and broadcast the whole queue.
+    """
+    if getattr(_deferred, "pending", None) is not None:
+        yield
+        return
+    _deferred.pending = set()
+    try:
+        yield
+        pending = _deferred.pending
+    finally:
+        _deferred.pending = None
+    if "queue" in pending:
+        publish_queue_update()
+    if "tv" in pending:
+        publish_tv_update()
 
 
 def publish_queue_update():
     """Broadcast queue update to all WebSocket clients."""
+    if _defer("queue"):
+        return
     from .services import QueueService
     QueueService.broadcast_queue_update()
 
 
 def publish_tv_update():
     """Broadcast TV display update to all WebSocket clients."""
-    from .services import QueueService
-    
-    channel_layer = get_channel_layer()
-    if not channel_layer:
+    if _defer("tv"):
         return
-
-    payload = QueueService.get_tv_display_state()
-    async_to_sync(channel_layer.group_send)(
-        TV_DISPLAY_GROUP_NAME,
-        {
-            "type": "tv.update",
-            "payload": payload,
-        },
-    )
+    from .services import QueueService
+    QueueService.broadcast_tv_update()
 
 
 @receiver(post_save, sender=EntryLog)
@@ -44,7 +74,10 @@ def handle_entrylog_save(sender, instance, created, **kwargs):
         # Check if transaction already exists
         existing = Transaction.objects.filter(entry_log=instance).exists()
         if not existing and instance.status == EntryLog.STATUS_SUCCESS:
-            Transaction.create_from_entry_log(instance)
+            # Months already moved to cold storage must not get hot duplicates.
+            entry_date = timezone.localtime(instance.created_at).date()
+            if not is_month_archived(entry_date.year, entry_date.month):
+                Transaction.create_from_entry_log(instance)
 
 
 @receiver(post_delete, sender=EntryLog)
@@ -74,6 +107,16 @@ def sync_terminal_activity_from_queue(sender, instance, created, **kwargs):
         },
     )
 
-    # Broadcast updates after activity sync
+    recent_history.record(instance)
+
+    # Broadcast updates after activity sync; the TV board waits for the
+    # commit so its history panel includes this event.
     publish_queue_update()
-    publish_tv_update()
+    transaction.on_commit(publish_tv_update)
+
+
+@receiver(post_save, sender=Vehicle)
+def create_terminal_fee_balance(sender, instance, created, raw=False, **kwargs):
+    """Every vehicle has a fee balance, however it was created (see vehicles.services)."""
+    if created and not raw:
+        TerminalFeeBalance.objects.create(vehicle=instance)
@@ -0,0 +1,164 @@
+"""
+Queue Snapshots
+===============
+Static JSON copies of the public queue state, for anonymous passenger
+screens.
+
+Every queue broadcast writes ``all.json`` plus one ``route-<id>.json`` per
+active route under ``QUEUE_SNAPSHOT_ROOT``. Each file is written to a
+temporary name in the same directory and renamed into place, so a reader
+always gets one complete board. Files carry a ``snapshot_version``
+(microseconds since the epoch) alongside the usual ``get_queue_state()``
+fields.
+
+``rdfs.middleware.QueueSnapshotMiddleware`` serves the files at
+``QUEUE_SNAPSHOT_URL`` before sessions and auth run, so passengers never
+reach a view or the database. A front proxy can serve the directory
+directly instead. If the database is slow or down, the last good board
+stays up.
+
+Time-based changes (auto-departure, the departed window) do not broadcast
+by themselves. A snapshot older than ``QUEUE_SNAPSHOT_REFRESH_SECONDS`` is
+still served, and a refresh is started on the DB pool at the same time.
+``manage.py publish_queue_snapshots`` does the same from the command line.
+"""
+
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+ALL_ROUTES_NAME = "all.json"
+FILE_NAME_RE = re.compile(r"^(all|route-\d+)\.json$")
+
+_refresh_lock = threading.Lock()
+
+
+def enabled():
+    return settings.QUEUE_SNAPSHOTS_ENABLED
+
+
+def file_name(route_id=None):
+    return f"route-{route_id}.json" if route_id else ALL_ROUTES_NAME
+
+
+def path_for(name):
+    return os.path.join(settings.QUEUE_SNAPSHOT_ROOT, name)
+
+
+def route_state(state, route_id):
+    """``state`` narrowed to one route, as ``get_queue_state(route_filter=route_id)`` returns it."""
+    entries = [entry for entry in state["entries"] if entry["route_id"] == route_id]
+    return {
+        **state,
+        "entries": entries,
+        "route_sections": [section for section in state["route_sections"] if section["route_id"] == route_id],
+        "counts": {
+            key: sum(1 for entry in entries if entry["status"] == status)
+            for key, status in (("queued", "Queued"), ("boarding", "Boarding"), ("departed", "Departed"))
+        },
+    }
+
+
+def _write(name, data):
+    directory = settings.QUEUE_SNAPSHOT_ROOT
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            handle.write(data)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, os.path.join(directory, name))
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def publish(state, route_ids):
+    """Write the full board and one file per route in ``route_ids``; drop files of other routes."""
+    os.makedirs(settings.QUEUE_SNAPSHOT_ROOT, exist_ok=True)
+    version = time.time_ns() // 1000
+    route_ids = set(route_ids) | {section["route_id"] for section in state["route_sections"] if section["route_id"]}
+
+    boards = {ALL_ROUTES_NAME: state}
+    boards.update((file_name(route_id), route_state(state, route_id)) for route_id in route_ids)
+    for name, board in boards.items():
+        data = json.dumps({**board, "snapshot_version": version}, cls=DjangoJSONEncoder, separators=(",", ":"))
+        _write(name, data.encode())
+
+    for name in os.listdir(settings.QUEUE_SNAPSHOT_ROOT):
+        if FILE_NAME_RE.match(name) and name not in boards:
+            os.unlink(path_for(name))
+
+
+def _active_route_ids():
+    from vehicles.models import Route
+
+    return Route.objects.filter(active=True).values_list("id", flat=True)
+
+
+def publish_on_commit(state):
+    """Publish ``state`` once the current transaction commits (immediately outside one)."""
+    if not enabled():
+        return
+
+    def write():
+        try:
+            publish(state, _active_route_ids())
+        except OSError:
+            logger.exception("Queue snapshots: writing %s failed", settings.QUEUE_SNAPSHOT_ROOT)
+
+    transaction.on_commit(write)
+
+
+def publish_current():
+    """Recompute the queue state and publish it."""
+    from terminal.services import QueueService
+
+    # get_queue_state() broadcasts (and so publishes) if housekeeping departed anyone.
+    publish(QueueService.get_queue_state(), _active_route_ids())
+
+
+def age_seconds(name=ALL_ROUTES_NAME):
+    """Seconds since ``name`` was written, or None if it does not exist."""
+    try:
+        return time.time() - os.stat(path_for(name)).st_mtime
+    except FileNotFoundError:
+        return None
+
+
+def refresh_in_background():
+    """Start ``publish_current()`` on the DB pool unless a refresh is already running."""
+    from terminal.async_db import submit
+
+    if not _refresh_lock.acquire(blocking=False):
+        return
+
+    def run():
+        try:
+            publish_current()
+        except Exception:
+            logger.exception("Queue snapshots: background refresh failed")
+        finally:
+            _refresh_lock.release()
+
+    submit(run)
+
+
+def read(route_id=None):
+    """The published board for ``route_id`` (all routes when None), or None."""
+    if not enabled():
+        return None
+    try:
+        with open(path_for(file_name(route_id)), "rb") as handle:
+            return json.loads(handle.read())
+    except (FileNotFoundError, ValueError):
+        return None
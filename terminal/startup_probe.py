@@ -0,0 +1,57 @@
+"""
+Startup Probe
+=============
+Run in a fresh interpreter by ``python manage.py startup_benchmark``
+(under ``python -X importtime``): loads Django, the URLconf and the ASGI
+application the way a daphne worker does, then prints one JSON line with
+the setup time, resident memory and which lazily-loaded heavy modules
+were imported anyway.
+"""
+
+import json
+import os
+import sys
+import time
+
+# Only needed by OCR, QR rendering and imports; must not load at startup.
+LAZY_MODULES = ("cv2", "numpy", "pytesseract", "qrcode", "PIL", "openpyxl")
+
+
+def resident_memory_kb():
+    """Current RSS in KiB, or None where it cannot be read cheaply."""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def main():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "rdfs.settings")
+    started = time.perf_counter()
+
+    import django
+
+    django.setup()
+    from django.urls import get_resolver
+
+    get_resolver().url_patterns
+    import rdfs.asgi  # noqa: F401
+
+    print(json.dumps({
+        "seconds": time.perf_counter() - started,
+        "rss_kb": resident_memory_kb(),
+        "lazy_modules_loaded": [name for name in LAZY_MODULES if name in sys.modules],
+    }))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,584 @@
-from django.test import TestCase
+import asyncio
+import os
+import tempfile
+import threading
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.db import OperationalError, connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from rdfs.middleware import QueueSnapshotMiddleware
+from terminal import gate, live_state, partitioning, transaction_archive, ws_flow
+from terminal.constants import QUEUE_GROUP_NAME
+from terminal.consumers import QueueConsumer, TVDisplayConsumer
+from terminal.models import (
+    EntryLog, GateDevice, GateScan, SystemSettings, TerminalActivity, Transaction, TransactionArchive,
+    VehiclePresence,
+)
+from terminal.pagination import decode_cursor, encode_cursor, keyset_filter, paginate_keyset
+from terminal.routing import gate_websocket_urlpatterns
+from terminal.services import TransactionService
+from vehicles.models import Driver, QueueHistory, Vehicle, Wallet
+
+
+class ApplyBatchTests(TestCase):
+    """Offline gate scan batches (``gate.apply_batch``)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        staff = CustomUser.objects.create_user(
+            "gate-staff", email="gate@example.com", password="unused", role="staff_admin",
+        )
+        cls.entry_gate = GateDevice.objects.create(
+            name="Entry 1", gate=GateDevice.GATE_ENTRY, staff=staff, token_hash=gate.hash_token("entry"),
+        )
+        cls.exit_gate = GateDevice.objects.create(
+            name="Exit 1", gate=GateDevice.GATE_EXIT, staff=staff, token_hash=gate.hash_token("exit"),
+        )
+        SystemSettings.objects.update_or_create(id=1, defaults={
+            "terminal_fee": Decimal("50.00"), "min_deposit_amount": Decimal("100.00"), "entry_cooldown_minutes": 5,
+        })
+        driver = Driver.objects.create(first_name="Ana", last_name="Cruz", license_number="N01-23-456789")
+        cls.vehicle = Vehicle.objects.create(
+            vehicle_type="van",
+            assigned_driver=driver,
+            cr_number="12345678",
+            or_number="87654321",
+            vin_number="1HGCM82633A004352",
+            year_model=2020,
+            registration_number="REG-0001",
+            license_plate="ABC 1234",
+        )
+        Wallet.objects.update_or_create(vehicle=cls.vehicle, defaults={"balance": Decimal("500.00")})
+
+    def scan(self, key, minutes_ago, **extra):
+        scanned_at = timezone.now() - timedelta(minutes=minutes_ago)
+        return {"key": key, "qr_code": self.vehicle.qr_value, "scanned_at": scanned_at.isoformat(), **extra}
+
+    def balance(self):
+        return Wallet.objects.get(vehicle=self.vehicle).balance
+
+    def test_applies_scans_in_scan_time_order(self):
+        results = gate.apply_batch(self.entry_gate, [self.scan("late", 1), self.scan("early", 20)])
+
+        # Results follow the request; the earlier scan entered the vehicle
+        self.assertEqual([result["key"] for result in results], ["late", "early"])
+        self.assertEqual(results[1]["status"], "success")
+        self.assertEqual(results[0]["status"], "queued")
+        self.assertEqual(self.balance(), Decimal("450.00"))
+
+        presence = VehiclePresence.objects.get(vehicle=self.vehicle)
+        self.assertIsNotNone(presence.active_entry_id)
+        self.assertAlmostEqual(
+            presence.active_entry.created_at, timezone.now() - timedelta(minutes=20), delta=timedelta(seconds=5),
+        )
+
+        results = gate.apply_batch(self.exit_gate, [self.scan("exit", 10)])
+        self.assertEqual(results[0]["status"], "success")
+        self.assertIsNone(VehiclePresence.objects.get(vehicle=self.vehicle).active_entry_id)
+
+    def test_history_is_recorded_at_scan_time(self):
+        gate.apply_batch(self.entry_gate, [self.scan("entry", 20)])
+        gate.apply_batch(self.exit_gate, [self.scan("exit", 10)])
+
+        entry = EntryLog.objects.get(vehicle=self.vehicle)
+        history = {row.action: row.timestamp for row in QueueHistory.objects.filter(vehicle=self.vehicle)}
+        activity = dict(TerminalActivity.objects.filter(vehicle=self.vehicle).values_list("event_type", "timestamp"))
+
+        self.assertEqual(history["enter"], entry.created_at)
+        self.assertEqual(history["exit"], entry.departed_at)
+        self.assertEqual(activity, history)
+
+    def test_resent_batch_is_not_applied_again(self):
+        batch = [self.scan("e1", 20)]
+        first = gate.apply_batch(self.entry_gate, batch)
+        again = gate.apply_batch(self.entry_gate, batch)
+
+        self.assertEqual(first[0]["status"], "success")
+        self.assertEqual(again[0]["status"], "success")
+        self.assertTrue(again[0]["duplicate"])
+        self.assertNotIn("duplicate", first[0])
+        self.assertEqual(self.balance(), Decimal("450.00"))
+        self.assertEqual(GateScan.objects.filter(device=self.entry_gate).count(), 1)
+
+    def test_rejects_invalid_scans_without_storing_them(self):
+        too_old = self.scan("old", (gate.BATCH_KEY_RETENTION_DAYS + 1) * 24 * 60)
+        results = gate.apply_batch(self.entry_gate, [
+            self.scan("", 5),
+            self.scan("bad-time", 5, scanned_at="yesterday"),
+            "not a scan",
+            too_old,
+        ])
+
+        self.assertEqual([result["status"] for result in results], ["error"] * 4)
+        self.assertIn("days old", results[3]["message"])
+        self.assertFalse(GateScan.objects.exists())
+        self.assertEqual(self.balance(), Decimal("500.00"))
+
+    def test_rejects_scans_in_archived_months(self):
+        today = timezone.localdate()
+        TransactionArchive.objects.create(year=today.year, month=today.month, file_name="archive.jsonl.gz")
+
+        results = gate.apply_batch(self.entry_gate, [self.scan("e1", 0)])
+
+        self.assertEqual(results[0]["status"], "error")
+        self.assertIn("archived", results[0]["message"])
+        self.assertEqual(self.balance(), Decimal("500.00"))
+
+    def test_unexpected_error_is_left_for_retry(self):
+        deadlock = OperationalError("deadlock detected")
+        with mock.patch.object(VehiclePresence, "for_vehicle", side_effect=deadlock), \
+                self.assertLogs("terminal.gate", "ERROR"):
+            results = gate.apply_batch(self.entry_gate, [self.scan("e1", 20), self.scan("e2", 10)])
+
+        # Neither is stored: the later scan of the same vehicle waits with it
+        self.assertTrue(all(result["retry"] for result in results))
+        self.assertFalse(GateScan.objects.exists())
+        self.assertEqual(self.balance(), Decimal("500.00"))
+
+        results = gate.apply_batch(self.entry_gate, [self.scan("e1", 20), self.scan("e2", 10)])
+        self.assertEqual([result["status"] for result in results], ["success", "queued"])
+        self.assertNotIn("duplicate", results[0])
+        self.assertEqual(GateScan.objects.filter(device=self.entry_gate).count(), 2)
+
+
+class KeysetPaginationTests(TestCase):
+    ordering = ["-date_joined", "-id"]
+
+    @classmethod
+    def setUpTestData(cls):
+        joined = timezone.now()
+        for index in range(7):
+            # Pairs share a timestamp, so pages must break ties on id
+            CustomUser.objects.create_user(
+                f"user{index}", email=f"user{index}@example.com", password="unused", role="staff_admin",
+                date_joined=joined - timedelta(minutes=index // 2),
+            )
+
+    def test_pages_cover_every_row_in_order(self):
+        queryset = CustomUser.objects.all()
+        seen, cursor = [], None
+        while True:
+            page = paginate_keyset(queryset, self.ordering, cursor, per_page=2)
+            seen += [user.pk for user in page]
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+
+        self.assertEqual(seen, list(queryset.order_by(*self.ordering).values_list("pk", flat=True)))
+
+    def test_cursor_values_keep_their_types(self):
+        user = CustomUser.objects.order_by(*self.ordering).first()
+        values = decode_cursor(encode_cursor([user.date_joined, user.pk]), self.ordering, CustomUser.objects.all())
+
+        self.assertEqual(values, [user.date_joined, user.pk])
+
+    def test_tampered_cursor_restarts_from_the_first_page(self):
+        queryset = CustomUser.objects.all()
+        for token in (encode_cursor(["x", 1]), encode_cursor([timezone.now(), "y"]), encode_cursor([1]), "%%%"):
+            self.assertIsNone(decode_cursor(token, self.ordering, queryset))
+            page = paginate_keyset(queryset, self.ordering, token, per_page=2)
+            self.assertFalse(page.has_previous)
+
+    def test_filter_bounds_the_leading_key(self):
+        joined = timezone.now()
+        condition = keyset_filter(self.ordering, [joined, 5])
+
+        self.assertEqual(condition.connector, "AND")
+        self.assertEqual(condition.children[0], ("date_joined__lte", joined))
+
+
+@skipUnless(connection.vendor == "postgresql", "history partitioning needs PostgreSQL")
+class HistoryPartitioningTests(TestCase):
+    """Monthly history partitions (``terminal.partitioning``); DDL rolls back with the test."""
+
+    now = datetime(2026, 6, 15, tzinfo=dt_timezone.utc)
+
+    @classmethod
+    def setUpTestData(cls):
+        driver = Driver.objects.create(first_name="Ana", last_name="Cruz", license_number="N01-23-456789")
+        cls.vehicle = Vehicle.objects.create(
+            vehicle_type="van",
+            assigned_driver=driver,
+            cr_number="12345678",
+            or_number="87654321",
+            vin_number="1HGCM82633A004352",
+            year_model=2020,
+            registration_number="REG-0001",
+            license_plate="ABC 1234",
+        )
+
+    def execute(self, sql, params=None):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall() if cursor.description else None
+
+    def record(self, timestamp):
+        # The post_save signal adds the TerminalActivity row
+        return QueueHistory.objects.create(vehicle=self.vehicle, action="enter", timestamp=timestamp)
+
+    def test_convert_populated_table(self):
+        self.execute(
+            "CREATE TABLE scratch_history (id serial PRIMARY KEY, code varchar(10) NOT NULL, "
+            "timestamp timestamptz NOT NULL, CONSTRAINT scratch_history_code_uniq UNIQUE (code))"
+        )
+        self.execute("CREATE INDEX scratch_history_ts_idx ON scratch_history (timestamp)")
+        for code, month in (("a", 1), ("b", 1), ("c", 3)):
+            self.execute(
+                "INSERT INTO scratch_history (code, timestamp) VALUES (%s, %s)", [code, self.now.replace(month=month)],
+            )
+
+        self.assertTrue(partitioning.convert_to_partitioned("scratch_history", now=self.now, months_ahead=1))
+        self.assertFalse(partitioning.convert_to_partitioned("scratch_history", now=self.now))
+
+        self.assertTrue(partitioning.is_partitioned("scratch_history"))
+        self.assertEqual(
+            [name for name, _ in partitioning.list_partitions("scratch_history")],
+            [f"scratch_history_p2026{month:02d}" for month in range(1, 8)],
+        )
+        self.assertEqual(self.execute("SELECT count(*) FROM scratch_history_p202601"), [(2,)])
+        self.assertEqual(self.execute("SELECT count(*) FROM scratch_history_p202603"), [(1,)])
+        self.assertEqual(
+            {row[0] for row in self.execute(
+                "SELECT indexname FROM pg_indexes WHERE tablename = 'scratch_history'"
+            )},
+            {"scratch_history_pkey", "scratch_history_code_uniq", "scratch_history_ts_idx"},
+        )
+        # New rows continue the id sequence and land in their month
+        self.execute("INSERT INTO scratch_history (code, timestamp) VALUES ('new', %s)", [self.now])
+        self.assertEqual(self.execute("SELECT id FROM scratch_history_p202606"), [(4,)])
+
+    def test_link_realigns_and_drops_orphaned_activity(self):
+        history = self.record(self.now)
+        drifted = TerminalActivity.objects.get(queue_history=history)
+        self.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        self.execute("ALTER TABLE terminal_terminalactivity DROP CONSTRAINT terminal_terminalactivity_queue_history_fk")
+        TerminalActivity.objects.filter(pk=drifted.pk).update(timestamp=self.now + timedelta(days=1))
+        orphan = TerminalActivity.objects.create(
+            queue_history_id=history.pk + 1000, event_type="enter", timestamp=self.now,
+        )
+
+        self.assertEqual(partitioning.link_history_tables(), ["terminal_terminalactivity_queue_history_fk"])
+        self.assertEqual(partitioning.link_history_tables(), [])
+
+        self.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        self.assertEqual(TerminalActivity.objects.get(pk=drifted.pk).timestamp, history.timestamp)
+        self.assertFalse(TerminalActivity.objects.filter(pk=orphan.pk).exists())
+
+    def expire_month(self, mode):
+        old = partitioning.add_months(partitioning.month_start(self.now), -25)
+        partitioning.ensure_partitions(now=old, months_ahead=0)
+        expired = self.record(old + timedelta(days=3))
+        kept = self.record(self.now)
+        # Retention runs in its own transaction; flush the deferred FK checks
+        # of the rows above as a commit would.
+        self.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+        actions = partitioning.apply_retention(now=self.now, retention_months=24, mode=mode)
+
+        self.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        month = f"p{old.year}{old.month:02d}"
+        self.assertEqual(actions, [
+            ("terminal_terminalactivity", mode, f"terminal_terminalactivity_{month}"),
+            ("vehicles_queuehistory", mode, f"vehicles_queuehistory_{month}"),
+        ])
+        self.assertEqual(list(QueueHistory.objects.values_list("pk", flat=True)), [kept.pk])
+        self.assertEqual(list(TerminalActivity.objects.values_list("queue_history_id", flat=True)), [kept.pk])
+        return expired, month
+
+    def test_retention_detaches_referenced_months(self):
+        expired, month = self.expire_month(partitioning.RETENTION_MODE_DETACH)
+
+        # Both months survive as standalone tables, without the cross-table FK
+        self.assertEqual(self.execute(f"SELECT id FROM vehicles_queuehistory_{month}"), [(expired.pk,)])
+        self.assertEqual(
+            self.execute(f"SELECT queue_history_id FROM terminal_terminalactivity_{month}"), [(expired.pk,)],
+        )
+        self.assertFalse(self.execute(
+            "SELECT 1 FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f' AND confrelid = %s::regclass",
+            [f"terminal_terminalactivity_{month}", "vehicles_queuehistory"],
+        ))
+
+    def test_retention_drops_referenced_months(self):
+        _, month = self.expire_month(partitioning.RETENTION_MODE_DROP)
+
+        self.assertFalse(self.execute("SELECT 1 FROM pg_class WHERE relname LIKE %s", [f"%\\_{month}"]))
+
+
+class TransactionArchiveTests(TestCase):
+    """Archived months read back exactly as they were while hot."""
+
+    @classmethod
+    def setUpTestData(cls):
+        rows = [
+            # (day, hour, plate, fee, counted); two rows share a timestamp
+            (date(2025, 1, 5), 8, "ABC 1234", "50.00", True),
+            (date(2025, 1, 5), 8, "abc-1234", "50.00", True),
+            (date(2025, 1, 5), 9, "XYZ 9876", "50.00", False),
+            (date(2025, 1, 20), 7, "XYZ 9876", "45.00", True),
+            (date(2025, 1, 31), 23, "ABC 1234", "50.00", True),
+            (date(2025, 2, 1), 0, "ABC 1234", "50.00", True),
+            (date(2025, 2, 3), 10, "XYZ 9876", "50.00", True),
+        ]
+        for day, hour, plate, fee, counted in rows:
+            Transaction.objects.create(
+                vehicle_plate=plate,
+                entry_timestamp=timezone.make_aware(datetime(day.year, day.month, day.day, hour)),
+                fee_charged=Decimal(fee),
+                transaction_date=day,
+                transaction_year=day.year,
+                transaction_month=day.month,
+                transaction_day=day.day,
+                is_revenue_counted=counted,
+            )
+
+    def setUp(self):
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        settings_override = override_settings(TRANSACTION_ARCHIVE_DIR=archive_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def hot(self, plate=None):
+        queryset = Transaction.objects.order_by("-entry_timestamp")
+        return TransactionService.filter_by_plate(queryset, plate) if plate else queryset
+
+    def read(self, start=None, end=None, plate=None):
+        """Totals and every page (3 rows each) as the past transactions view reads them."""
+        queryset = self.hot(plate)
+        if start:
+            queryset = queryset.filter(transaction_date__gte=start)
+        if end:
+            queryset = queryset.filter(transaction_date__lte=end)
+
+        totals = TransactionService.get_range_totals(queryset, start, end, plate)
+        pages, cursor = [], None
+        while True:
+            page = TransactionService.get_page_with_archive(queryset, start, end, cursor, per_page=3, plate=plate)
+            pages.append([(tx.pk, tx.entry_timestamp, tx.fee_charged, tx.vehicle_plate) for tx in page])
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        return totals, pages
+
+    def test_reads_match_before_and_after_archiving(self):
+        queries = [
+            {},
+            {"start": date(2025, 1, 6), "end": date(2025, 2, 1)},
+            {"plate": "ABC1234"},
+            {"plate": "xyz 9876", "end": date(2025, 1, 31)},
+        ]
+        before = [self.read(**query) for query in queries]
+        hot_january = [
+            (tx.pk, tx.entry_timestamp, tx.fee_charged, tx.is_revenue_counted)
+            for tx in self.hot().filter(transaction_month=1).order_by("-entry_timestamp", "-id")
+        ]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(transaction_archive.archive_month(2025, 1), 5)
+
+        self.assertFalse(Transaction.objects.filter(transaction_month=1).exists())
+        self.assertEqual(
+            [(tx.pk, tx.entry_timestamp, tx.fee_charged, tx.is_revenue_counted)
+             for tx in transaction_archive.iter_archived_transactions()],
+            hot_january,
+        )
+        for query, expected in zip(queries, before):
+            with self.subTest(**query):
+                self.assertEqual(self.read(**query), expected)
+
+
+@override_settings(
+    CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}},
+    WS_HEARTBEAT_SECONDS=60,
+    WS_IDLE_TIMEOUT_SECONDS=5,
+)
+class DisplayFlowControlTests(SimpleTestCase):
+    """The hello/ack/heartbeat protocol of the display sockets (``terminal.ws_flow``)."""
+
+    def setUp(self):
+        self.boards = 0
+        patcher = mock.patch.object(live_state, "get", side_effect=self.current_board)
+        self.current_state = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(live_state.invalidate, live_state.QUEUE)
+
+    async def current_board(self, kind, compact=False):
+        self.boards += 1
+        return {"board": f"built-{self.boards}"}
+
+    async def connect(self, consumer=QueueConsumer, path="/ws/queue/"):
+        communicator = WebsocketCommunicator(consumer.as_asgi(), path)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertEqual(await communicator.receive_json_from(), {"board": "built-1"})
+        await communicator.send_json_to({"type": "hello"})
+        # Client frames and group messages are read concurrently: let the
+        # hello land before anything is broadcast.
+        await asyncio.sleep(0.05)
+        return communicator
+
+    async def broadcast(self, *boards):
+        for board in boards:
+            await get_channel_layer().group_send(QUEUE_GROUP_NAME, {"type": "queue.update", "payload": board})
+
+    async def test_boards_wait_for_the_ack_and_conflate(self):
+        communicator = await self.connect()
+        await self.broadcast({"board": 1})
+        self.assertEqual(await communicator.receive_json_from(), {"board": 1})
+
+        # Not acked yet: later boards replace each other
+        await self.broadcast({"board": 2}, {"board": 3}, {"board": 4})
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.send_json_to({"type": "ack"})
+        self.assertEqual(await communicator.receive_json_from(), {"board": 4})
+        self.assertTrue(await communicator.receive_nothing())
+
+        stats = next(iter(ws_flow.CONNECTIONS.values()))
+        self.assertEqual((stats.sent, stats.conflated, stats.awaiting_ack), (3, 2, True))
+        await communicator.disconnect()
+        self.assertEqual(ws_flow.CONNECTIONS, {})
+
+    async def test_queued_refreshes_build_one_board(self):
+        communicator = await self.connect(TVDisplayConsumer, "/ws/tv-display/")
+        await self.broadcast({"board": 1})
+        self.assertEqual(await communicator.receive_json_from(), {"board": "built-2"})
+
+        await self.broadcast({"board": 2}, {"board": 3})
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.send_json_to({"type": "ack"})
+
+        self.assertEqual(await communicator.receive_json_from(), {"board": "built-3"})
+        self.assertEqual(self.current_state.call_count, 3)
+        await communicator.disconnect()
+
+    @override_settings(WS_HEARTBEAT_SECONDS=0.05, WS_IDLE_TIMEOUT_SECONDS=0.3)
+    async def test_heartbeats_then_idle_close(self):
+        communicator = await self.connect()
+        self.assertEqual((await communicator.receive_json_from())["type"], "heartbeat")
+
+        # Silent client: pruned with 4408
+        while (output := await communicator.receive_output(timeout=2))["type"] == "websocket.send":
+            pass
+        self.assertEqual(output, {"type": "websocket.close", "code": ws_flow.IDLE_CLOSE_CODE})
+
+    @override_settings(WS_IDLE_TIMEOUT_SECONDS=0.2)
+    async def test_unacked_board_closes_the_client(self):
+        communicator = await self.connect()
+        await self.broadcast({"board": 1})
+        self.assertEqual(await communicator.receive_json_from(), {"board": 1})
+
+        output = await communicator.receive_output(timeout=2)
+        self.assertEqual(output, {"type": "websocket.close", "code": ws_flow.IDLE_CLOSE_CODE})
+
+    async def test_failed_build_asks_the_client_to_reconnect(self):
+        communicator = await self.connect(TVDisplayConsumer, "/ws/tv-display/")
+        self.current_state.side_effect = RuntimeError("database unavailable")
+
+        with self.assertLogs("terminal.ws_flow", "ERROR"):
+            await self.broadcast({"board": 1})
+            output = await communicator.receive_output(timeout=2)
+        self.assertEqual(output, {"type": "websocket.close", "code": ws_flow.RECONNECT_CLOSE_CODE})
+
+
+class GateSocketAuthTests(TestCase):
+    """Gate device sockets: token by header or subprotocol only, same-site origin."""
+
+    def setUp(self):
+        # Look the token up on the test thread, inside the test transaction
+        patcher = mock.patch.object(gate, "run_db", lambda func, *args: sync_to_async(func)(*args))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        staff = CustomUser.objects.create_user(
+            "gate-staff", email="gate@example.com", password="unused", role="staff_admin",
+        )
+        self.device = GateDevice.objects.create(name="Entry 1", gate=GateDevice.GATE_ENTRY, staff=staff)
+        self.token = gate.issue_token(self.device)
+        self.device.save()
+
+    async def connect(self, application=None, path="/ws/gate/", **kwargs):
+        communicator = WebsocketCommunicator(application or URLRouter(gate_websocket_urlpatterns), path, **kwargs)
+        return communicator, await communicator.connect()
+
+    async def test_token_subprotocol(self):
+        communicator, (connected, subprotocol) = await self.connect(
+            subprotocols=[gate.SUBPROTOCOL, gate.TOKEN_SUBPROTOCOL_PREFIX + self.token],
+        )
+
+        self.assertTrue(connected)
+        self.assertEqual(subprotocol, gate.SUBPROTOCOL)
+        self.assertEqual((await communicator.receive_json_from())["type"], "ready")
+        await communicator.disconnect()
+
+    async def test_authorization_header(self):
+        communicator, (connected, _) = await self.connect(
+            headers=[(b"authorization", f"Token {self.token}".encode())],
+        )
+
+        self.assertTrue(connected)
+        await communicator.disconnect()
+
+    async def test_query_string_token_is_ignored(self):
+        _, (connected, code) = await self.connect(path=f"/ws/gate/?token={self.token}")
+
+        self.assertFalse(connected)
+        self.assertEqual(code, gate.AUTH_CLOSE_CODE)
+
+    async def test_foreign_origin_is_rejected(self):
+        with mock.patch("vehicles.qr_jobs.start_sweeper"):
+            from rdfs.asgi import application
+
+        auth = [(b"authorization", f"Token {self.token}".encode())]
+        _, (connected, _) = await self.connect(application, headers=[(b"origin", b"https://evil.example"), *auth])
+        self.assertFalse(connected)
+
+        communicator, (connected, _) = await self.connect(
+            application, headers=[(b"origin", b"http://testserver"), *auth],
+        )
+        self.assertTrue(connected)
+        await communicator.disconnect()
+
+
+@override_settings(QUEUE_SNAPSHOTS_ENABLED=True, QUEUE_SNAPSHOT_REFRESH_SECONDS=3600)
+class QueueSnapshotMiddlewareTests(SimpleTestCase):
+    """Published queue files served by ``rdfs.middleware.QueueSnapshotMiddleware``."""
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        settings_override = override_settings(QUEUE_SNAPSHOT_ROOT=root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        with open(os.path.join(root.name, "all.json"), "wb") as handle:
+            handle.write(b'{"entries":[]}')
+
+    async def get_response(self, request):
+        self.fail("Snapshot requests must not reach the view stack")
+
+    async def test_async_serving_reads_off_the_event_loop(self):
+        middleware = QueueSnapshotMiddleware(self.get_response)
+        serve, threads = middleware.serve, []
+
+        def recording_serve(request):
+            threads.append(threading.get_ident())
+            return serve(request)
+
+        middleware.serve = recording_serve
+        response = await middleware(RequestFactory().get("/snapshots/queue/all.json"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'{"entries":[]}')
+        self.assertNotEqual(threads, [threading.get_ident()])
+
+        response = await middleware(RequestFactory().get(
+            "/snapshots/queue/all.json", HTTP_IF_NONE_MATCH=response["ETag"],
+        ))
+        self.assertEqual(response.status_code, 304)
@@ -0,0 +1,375 @@
+"""
+Transaction Cold Storage
+========================
+Moves closed months of ``Transaction`` rows out of the hot table into
+append-only, compressed monthly files and reads them back transparently.
+
+Layout (under TRANSACTION_ARCHIVE_DIR)::
+
+    2024/transactions-2024-03.jsonl.gz   one gzip member per archived day
+    2024/transactions-2024-03.idx.json   sidecar index: day -> byte ranges,
+                                         plate -> days
+
+Concatenated gzip members form a valid gzip file, so each day can be read by
+seeking to its byte range without inflating the rest of the month. The
+database keeps a ``TransactionArchive`` row per month and a
+``TransactionArchiveDay`` row per archived day (count, revenue, byte range);
+those are authoritative, the sidecar only narrows plate lookups.
+
+Archived rows are deleted from the database, so nothing is archived until
+TRANSACTION_ARCHIVE_DIR points at persistent storage; there is no default.
+"""
+
+import gzip
+import json
+import os
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from terminal.models import Transaction, TransactionArchive, TransactionArchiveDay
+
+INDEX_VERSION = 1
+DELETE_BATCH_SIZE = 1000
+
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+def get_archive_dir():
+    """The configured archive directory; raises ImproperlyConfigured if unset."""
+    archive_dir = getattr(settings, "TRANSACTION_ARCHIVE_DIR", None)
+    if not archive_dir:
+        raise ImproperlyConfigured(
+            "TRANSACTION_ARCHIVE_DIR is not set. Point it at persistent storage "
+            "before archiving; archived rows are deleted from the database."
+        )
+    return Path(archive_dir)
+
+
+def get_archive_after_months():
+    """Months (before the current one) that stay in the hot table."""
+    return int(getattr(settings, "TRANSACTION_ARCHIVE_AFTER_MONTHS", 12))
+
+
+def _month_file_stem(year, month):
+    return f"{year:04d}/transactions-{year:04d}-{month:02d}"
+
+
+def _data_path(file_name):
+    return get_archive_dir() / file_name
+
+
+def _index_path(file_name):
+    return get_archive_dir() / file_name.replace(".jsonl.gz", ".idx.json")
+
+
+# =============================================================================
+# ROW (DE)SERIALIZATION
+# =============================================================================
+def _dt(value):
+    return value.isoformat() if value else None
+
+
+def _serialize(tx):
+    return {
+        "id": tx.id,
+        "vehicle_id": tx.vehicle_id,
+        "driver_id": tx.driver_id,
+        "entry_log_id": tx.entry_log_id,
+        "vehicle_plate": tx.vehicle_plate,
+        "driver_name": tx.driver_name,
+        "route_name": tx.route_name,
+        "entry_timestamp": _dt(tx.entry_timestamp),
+        "exit_timestamp": _dt(tx.exit_timestamp),
+        "fee_charged": str(tx.fee_charged),
+        "wallet_balance_snapshot": (
+            str(tx.wallet_balance_snapshot) if tx.wallet_balance_snapshot is not None else None
+        ),
+        "transaction_date": tx.transaction_date.isoformat(),
+        "is_revenue_counted": tx.is_revenue_counted,
+        "created_at": _dt(tx.created_at),
+    }
+
+
+class ArchivedTransaction:
+    """
+    Read-only stand-in for a ``Transaction`` row served from cold storage.
+    Exposes the same attributes the views, templates and CSV export use.
+    """
+    is_archived = True
+
+    def __init__(self, record):
+        self.id = self.pk = record["id"]
+        self.vehicle_id = record["vehicle_id"]
+        self.driver_id = record["driver_id"]
+        self.entry_log_id = record["entry_log_id"]
+        self.vehicle_plate = record["vehicle_plate"]
+        self.driver_name = record["driver_name"]
+        self.route_name = record["route_name"]
+        self.entry_timestamp = datetime.fromisoformat(record["entry_timestamp"])
+        self.exit_timestamp = (
+            datetime.fromisoformat(record["exit_timestamp"]) if record["exit_timestamp"] else None
+        )
+        self.fee_charged = Decimal(record["fee_charged"])
+        self.wallet_balance_snapshot = (
+            Decimal(record["wallet_balance_snapshot"])
+            if record["wallet_balance_snapshot"] is not None else None
+        )
+        self.transaction_date = date.fromisoformat(record["transaction_date"])
+        self.transaction_year = self.transaction_date.year
+        self.transaction_month = self.transaction_date.month
+        self.transaction_day = self.transaction_date.day
+        self.is_revenue_counted = record["is_revenue_counted"]
+        self.created_at = datetime.fromisoformat(record["created_at"]) if record["created_at"] else None
+
+    def __str__(self):
+        return f"[{self.entry_timestamp:%Y-%m-%d %H:%M}] {self.vehicle_plate} - ₱{self.fee_charged} (archived)"
+
+
+# =============================================================================
+# SIDECAR INDEX
+# =============================================================================
+def _load_index(file_name):
+    try:
+        with open(_index_path(file_name), encoding="utf-8") as fh:
+            index = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    return index if index.get("version") == INDEX_VERSION else None
+
+
+def _write_index(file_name, index):
+    path = _index_path(file_name)
+    tmp_path = path.with_suffix(".json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        json.dump(index, fh, separators=(",", ":"), sort_keys=True)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp_path, path)
+
+
+# =============================================================================
+# ARCHIVING
+# =============================================================================
+def archive_cutoff(today=None, months=None):
+    """First day that stays hot: the start of the month ``months`` back."""
+    today = today or timezone.localdate()
+    months = get_archive_after_months() if months is None else months
+    index = today.year * 12 + (today.month - 1) - months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def closed_months(cutoff=None):
+    """``(year, month)`` pairs with hot rows older than ``cutoff``."""
+    cutoff = cutoff or archive_cutoff()
+    return list(
+        Transaction.objects
+        .filter(transaction_date__lt=cutoff)
+        .values_list("transaction_year", "transaction_month")
+        .distinct()
+        .order_by("transaction_year", "transaction_month")
+    )
+
+
+def archive_month(year, month):
+    """
+    Append all hot rows of ``year``/``month`` to the month's archive file,
+    record the day summaries and delete the rows from ``Transaction``.
+    Returns the number of rows moved.
+
+    The gzip members are written and fsynced before the database transaction
+    commits. If the commit fails the orphaned bytes are simply never
+    referenced, so the data file stays append-only and consistent.
+    """
+    rows = list(
+        Transaction.objects
+        .filter(transaction_year=year, transaction_month=month)
+        .order_by("transaction_date", "-entry_timestamp", "-id")
+    )
+    if not rows:
+        return 0
+
+    get_archive_dir()  # refuse before anything is written or deleted
+
+    by_day = {}
+    for tx in rows:
+        by_day.setdefault(tx.transaction_date, []).append(tx)
+
+    file_name = f"{_month_file_stem(year, month)}.jsonl.gz"
+    data_path = _data_path(file_name)
+    data_path.parent.mkdir(parents=True, exist_ok=True)
+
+    segments = []
+    with open(data_path, "ab") as fh:
+        for day, day_rows in sorted(by_day.items()):
+            payload = "".join(
+                json.dumps(_serialize(tx), separators=(",", ":"), ensure_ascii=False) + "\n"
+                for tx in day_rows
+            ).encode("utf-8")
+            offset = fh.tell()
+            fh.write(gzip.compress(payload))
+            segments.append((day, day_rows, offset, fh.tell() - offset))
+        fh.flush()
+        os.fsync(fh.fileno())
+
+    with transaction.atomic():
+        archive, _ = TransactionArchive.objects.select_for_update().get_or_create(
+            year=year,
+            month=month,
+            defaults={"file_name": file_name},
+        )
+        day_summaries = []
+        month_revenue = Decimal("0.00")
+        for day, day_rows, offset, length in segments:
+            revenue = sum((tx.fee_charged for tx in day_rows if tx.is_revenue_counted), Decimal("0.00"))
+            month_revenue += revenue
+            day_summaries.append(TransactionArchiveDay(
+                archive=archive,
+                transaction_date=day,
+                transaction_count=len(day_rows),
+                revenue_total=revenue,
+                byte_offset=offset,
+                byte_length=length,
+            ))
+        TransactionArchiveDay.objects.bulk_create(day_summaries)
+
+        TransactionArchive.objects.filter(pk=archive.pk).update(
+            row_count=F("row_count") + len(rows),
+            revenue_total=F("revenue_total") + month_revenue,
+            updated_at=timezone.now(),
+        )
+
+        ids = [tx.id for tx in rows]
+        for start in range(0, len(ids), DELETE_BATCH_SIZE):
+            Transaction.objects.filter(id__in=ids[start:start + DELETE_BATCH_SIZE]).delete()
+
+        index = _load_index(file_name) or {
+            "version": INDEX_VERSION, "year": year, "month": month, "days": {}, "plates": {},
+        }
+        for day, day_rows, offset, length in segments:
+            index["days"].setdefault(day.isoformat(), []).append([offset, length, len(day_rows)])
+            for tx in day_rows:
+                days = index["plates"].setdefault(normalize_plate(tx.vehicle_plate), [])
+                if day.isoformat() not in days:
+                    days.append(day.isoformat())
+        transaction.on_commit(lambda: _write_index(file_name, index))
+
+    return len(rows)
+
+
+def archive_closed_months(cutoff=None):
+    """Archive every closed month older than ``cutoff``. Returns ``[(year, month, rows)]``."""
+    return [(year, month, archive_month(year, month)) for year, month in closed_months(cutoff)]
+
+
+def is_month_archived(year, month):
+    return TransactionArchive.objects.filter(year=year, month=month).exists()
+
+
+# =============================================================================
+# READING
+# =============================================================================
+def normalize_plate(plate):
+    """Plate key used by lookups: upper case, without spaces or hyphens."""
+    return (plate or "").replace(" ", "").replace("-", "").upper()
+
+
+def _filter_days(start_date=None, end_date=None):
+    days = TransactionArchiveDay.objects.all()
+    if start_date:
+        days = days.filter(transaction_date__gte=start_date)
+    if end_date:
+        days = days.filter(transaction_date__lte=end_date)
+    return days
+
+
+def archived_totals(start_date=None, end_date=None, plate=None):
+    """
+    Row count and counted revenue of archived rows, from the DB summaries only.
+    With ``plate`` the matching rows are read (only the days the sidecar lists).
+    """
+    if plate:
+        count, revenue = 0, Decimal("0.00")
+        for tx in iter_archived_transactions(start_date, end_date, plate=plate):
+            count += 1
+            if tx.is_revenue_counted:
+                revenue += tx.fee_charged
+        return {"count": count, "revenue": revenue}
+
+    totals = _filter_days(start_date, end_date).aggregate(
+        count=Sum("transaction_count"),
+        revenue=Sum("revenue_total"),
+    )
+    return {
+        "count": totals["count"] or 0,
+        "revenue": totals["revenue"] or Decimal("0.00"),
+    }
+
+
+def _read_segment(fh, offset, length):
+    fh.seek(offset)
+    for line in gzip.decompress(fh.read(length)).decode("utf-8").splitlines():
+        if line:
+            yield json.loads(line)
+
+
+def iter_archived_transactions(start_date=None, end_date=None, plate=None):
+    """
+    Yield ``ArchivedTransaction`` objects newest first, inflating only the
+    day segments inside the date range (and, with ``plate``, only the days the
+    sidecar lists for that plate).
+    """
+    plate_key = normalize_plate(plate) if plate else None
+    day_rows = (
+        _filter_days(start_date, end_date)
+        .select_related("archive")
+        .order_by("-transaction_date", "-byte_offset")
+    )
+
+    handles = {}
+    plate_days = {}
+    try:
+        current_day, buffered = None, []
+        for summary in day_rows.iterator():
+            file_name = summary.archive.file_name
+            if plate_key:
+                if file_name not in plate_days:
+                    index = _load_index(file_name)
+                    segments = (
+                        sum(len(ranges) for ranges in index["days"].values()) if index else None
+                    )
+                    # A stale sidecar (crash before it was rewritten) is ignored.
+                    if index and segments == summary.archive.days.count():
+                        plate_days[file_name] = set(index["plates"].get(plate_key, []))
+                    else:
+                        plate_days[file_name] = None
+                allowed = plate_days[file_name]
+                if allowed is not None and summary.transaction_date.isoformat() not in allowed:
+                    continue
+
+            if summary.transaction_date != current_day:
+                yield from _sorted_day(buffered)
+                current_day, buffered = summary.transaction_date, []
+
+            if file_name not in handles:
+                handles[file_name] = open(_data_path(file_name), "rb")
+            for record in _read_segment(handles[file_name], summary.byte_offset, summary.byte_length):
+                if plate_key and normalize_plate(record["vehicle_plate"]) != plate_key:
+                    continue
+                buffered.append(ArchivedTransaction(record))
+        yield from _sorted_day(buffered)
+    finally:
+        for fh in handles.values():
+            fh.close()
+
+
+def _sorted_day(rows):
+    return sorted(rows, key=lambda tx: (tx.entry_timestamp, tx.id), reverse=True)
+
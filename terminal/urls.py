@@ -33,6 +33,9 @@ urlpatterns = [
     path('api/queue/', views.public_queue_api, name='public_queue_api'),
     path('api/tv-display/', views.tv_display_api, name='tv_display_api'),
     path('api/settings/', views.queue_settings_api, name='queue_settings_api'),
+    path('api/ws-metrics/', views.ws_metrics_api, name='ws_metrics'),
+    path('api/gate/scan/', views.gate_scan_api, name='gate_scan_api'),
+    path('api/gate/scans/', views.gate_scan_batch_api, name='gate_scan_batch_api'),
 
     path("deposit-analytics/", views.deposit_analytics, name="deposit_analytics"),
     path("deposit-vs-revenue/", views.deposit_vs_revenue, name="deposit_vs_revenue"),
@@ -12,3 +12,12 @@ def format_route_display(route):
         return name
 
     return str(route)
+
+
+# json_dumps_params for polled JSON responses: no whitespace between tokens
+COMPACT_JSON = {"separators": (",", ":")}
+
+
+def wants_compact(params):
+    """True when a client asked for the compact queue payload (``?format=compact``)."""
+    return params.get("format") == "compact"
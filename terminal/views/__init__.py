@@ -1,4 +1,4 @@
 from .core import *
 from .deposits import *
 from .shared import maintenance_task
-from .api import public_queue_api, tv_display_api, queue_settings_api
\ No newline at end of file
+from .api import public_queue_api, tv_display_api, queue_settings_api, ws_metrics_api, gate_scan_api, gate_scan_batch_api
\ No newline at end of file
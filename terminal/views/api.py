@@ -1,24 +1,39 @@
 """
 API endpoints for partial page updates.
 These endpoints return JSON data for real-time queue display updates.
+They are polled by every open display, so they are async views with
+their DB work on the shared pool (terminal.async_db).
+
+Queue and TV endpoints take ``?format=compact`` for the short-key encoding
+(QueueService._compact_state); responses are gzipped when accepted.
 """
 
+import json
+
 from django.http import JsonResponse
 from django.views.decorators.cache import never_cache
-from django.views.decorators.http import require_GET
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_GET, require_POST
 
+from accounts.utils import async_login_required, async_user_passes_test, is_admin
+from terminal import gate, ws_flow
+from terminal.async_db import run_db
 from terminal.services import QueueService, TransactionService
+from terminal.utils import COMPACT_JSON, wants_compact
 
 
 @require_GET
 @never_cache
-def public_queue_api(request):
+@gzip_page
+async def public_queue_api(request):
     """
     API endpoint for public queue display partial updates.
     Returns JSON with all queue entries (queued, boarding, departed).
     
     Query params:
         - route: Optional route ID to filter by
+        - format: "compact" for the short-key encoding
     """
     route_filter = request.GET.get("route")
     if route_filter and route_filter != "all":
@@ -29,20 +44,24 @@ def public_queue_api(request):
     else:
         route_filter = None
 
-    queue_state = QueueService.get_queue_state(route_filter=route_filter)
-    
-    return JsonResponse(queue_state)
+    queue_state = await run_db(
+        QueueService.get_queue_state, route_filter=route_filter, compact=wants_compact(request.GET)
+    )
+
+    return JsonResponse(queue_state, json_dumps_params=COMPACT_JSON)
 
 
 @require_GET
 @never_cache
-def tv_display_api(request):
+@gzip_page
+async def tv_display_api(request):
     """
     API endpoint for TV display partial updates.
     Returns JSON with boarding/departed entries and queued count badge.
     
     Query params:
         - route: Optional route ID to filter by
+        - format: "compact" for the short-key encoding
     """
     route_filter = request.GET.get("route")
     if route_filter and route_filter != "all":
@@ -53,22 +72,99 @@ def tv_display_api(request):
     else:
         route_filter = None
 
-    tv_state = QueueService.get_tv_display_state(route_filter=route_filter)
-    
-    return JsonResponse(tv_state)
+    tv_state = await run_db(
+        QueueService.get_tv_display_state, route_filter=route_filter, compact=wants_compact(request.GET)
+    )
+
+    return JsonResponse(tv_state, json_dumps_params=COMPACT_JSON)
 
 
 @require_GET
 @never_cache
-def queue_settings_api(request):
+async def queue_settings_api(request):
     """
     API endpoint to get current queue display settings.
     Used by frontend to configure refresh intervals and countdown durations.
     """
-    settings = QueueService.get_settings()
-    
-    return JsonResponse({
-        "refresh_interval": QueueService.get_refresh_interval(),
-        "countdown_duration": QueueService.get_countdown_duration(),
-        "departure_duration_minutes": QueueService.get_departure_duration(),
-    })
+    def read_settings():
+        return {
+            "refresh_interval": QueueService.get_refresh_interval(),
+            "countdown_duration": QueueService.get_countdown_duration(),
+            "departure_duration_minutes": QueueService.get_departure_duration(),
+        }
+
+    return JsonResponse(await run_db(read_settings))
+
+
+@require_GET
+@never_cache
+@async_login_required
+@async_user_passes_test(is_admin)
+async def ws_metrics_api(request):
+    """
+    Display WebSocket counters for this worker process (terminal.ws_flow):
+    sends, conflated boards, acks outstanding and ack latency per client;
+    plus connected gate devices and their scan queues (terminal.gate).
+    """
+    return JsonResponse({**ws_flow.metrics(), "gates": gate.metrics()})
+
+
+@csrf_exempt
+@require_POST
+@never_cache
+async def gate_scan_api(request):
+    """
+    HTTP fallback for gate devices whose socket is down (terminal.gate).
+    Authenticated by ``Authorization: Token <device token>``, not a session.
+
+    Body: JSON or form fields ``qr_code``, ``confirm_reset`` and an optional
+    ``id`` echoed back in the result.
+    """
+    device = await run_db(gate.authenticate, gate.token_from_header(request.headers.get("Authorization")))
+    if device is None:
+        return JsonResponse({"status": "error", "message": "Invalid or revoked device token."}, status=401)
+
+    if request.content_type == "application/json":
+        try:
+            content = json.loads(request.body)
+        except ValueError:
+            content = None
+        if not isinstance(content, dict):
+            return JsonResponse({"status": "error", "message": "Invalid JSON body."}, status=400)
+    else:
+        content = request.POST.dict()
+
+    result = await run_db(gate.scan, device, content)
+    return JsonResponse({"type": "result", "id": content.get("id"), **result})
+
+
+@csrf_exempt
+@require_POST
+@never_cache
+async def gate_scan_batch_api(request):
+    """
+    Upload of the scans a gate device buffered while offline (terminal.gate).
+    Authenticated like ``gate_scan_api``.
+
+    Body: JSON ``{"scans": [{"key", "scanned_at", "qr_code", "confirm_reset"}, ...]}``,
+    at most ``gate.BATCH_MAX_SCANS``. Response: ``{"results": [...]}``, one per
+    scan in the same order, each carrying its ``key``.
+    """
+    device = await run_db(gate.authenticate, gate.token_from_header(request.headers.get("Authorization")))
+    if device is None:
+        return JsonResponse({"status": "error", "message": "Invalid or revoked device token."}, status=401)
+
+    try:
+        scans = json.loads(request.body).get("scans")
+    except (ValueError, AttributeError):
+        scans = None
+    if not isinstance(scans, list):
+        return JsonResponse({"status": "error", "message": "Body must be JSON with a 'scans' list."}, status=400)
+    if len(scans) > gate.BATCH_MAX_SCANS:
+        return JsonResponse(
+            {"status": "error", "message": f"At most {gate.BATCH_MAX_SCANS} scans per batch."},
+            status=400,
+        )
+
+    results = await run_db(gate.apply_batch, device, scans)
+    return JsonResponse({"results": results})
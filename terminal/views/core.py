@@ -2,12 +2,13 @@ import calendar
 import csv
 import json
 from collections import OrderedDict
-from datetime import datetime, timedelta, timezone as dt_timezone
+from datetime import datetime, timedelta
 from decimal import Decimal
 
 from django import forms
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
+from django.db import transaction
 from django.db.models import Count, F, Max, Q, Sum
 from django.http import JsonResponse, HttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
@@ -17,14 +18,23 @@ from django.views.decorators.cache import never_cache
 from pytz import timezone as pytz_timezone
 
 # Shared helpers
-from accounts.utils import is_staff_admin_or_admin, is_admin   # ✅ imported shared role checks
+from accounts.utils import (   # ✅ imported shared role checks
+    async_login_required,
+    async_user_passes_test,
+    is_admin,
+    is_staff_admin_or_admin,
+    passive_session,
+)
+from terminal import gate
+from terminal.async_db import run_db
 from terminal.shared_queue import (
     PASSENGER_DELETE_AFTER_MINUTES,
     apply_entry_log_maintenance,
     build_public_queue_entries,
 )
 from vehicles.models import Vehicle, Wallet, Deposit, Route, QueueHistory
-from terminal.models import EntryLog, SystemSettings, TerminalActivity
+from terminal.models import EntryLog, SystemSettings, TerminalActivity, VehiclePresence
+from terminal.pagination import paginate_keyset
 from terminal.utils import format_route_display
 
 
@@ -110,6 +120,9 @@ def build_export_filters(
     return start_filter, end_filter
 
 
+ACTIVITY_PAGE_SIZE = 100
+
+
 @login_required(login_url="accounts:login")
 @user_passes_test(is_staff_admin_or_admin)
 @never_cache
@@ -138,7 +151,6 @@ def transactions_view(request):
         TerminalActivity.objects
         .select_related("vehicle__assigned_driver", "driver")
         .filter(timestamp__gte=today_start, timestamp__lte=today_end)
-        .order_by("-timestamp")
     )
 
     # --------------------------------------------------
@@ -167,7 +179,10 @@ def transactions_view(request):
     # --------------------------------------------------
     # TODAY'S RECORDS ONLY
     # --------------------------------------------------
-    activity = [normalize(r) for r in activity_qs]
+    activity_page = paginate_keyset(
+        activity_qs, ["-timestamp", "-id"], request.GET.get("cursor"), ACTIVITY_PAGE_SIZE
+    )
+    activity = [normalize(r) for r in activity_page]
 
     # --------------------------------------------------
     # TODAY'S METRICS
@@ -214,7 +229,10 @@ def transactions_view(request):
         "active_queue": active_queue,
         "today_entry_logs": today_entry_logs,
         "today_queue_events": today_queue_events,
-        "activity_count": len(activity),
+        "activity_count": activity_qs.count(),
+        "activity_page": activity_page,
+        "next_query": activity_page.next_query(request) if activity_page.has_next else "",
+        "first_query": activity_page.first_query(request),
         "today_date": today.strftime("%B %d, %Y"),
         "today_date_short": today.strftime("%Y-%m-%d"),
     }
@@ -417,11 +435,16 @@ def tv_display_view(request, route_slug=None):
 # ===============================
 #   QUEUE DATA (AJAX endpoint)
 # ===============================
-@login_required(login_url='accounts:login')
-@user_passes_test(is_staff_admin_or_admin)
+@passive_session
+@async_login_required
+@async_user_passes_test(is_staff_admin_or_admin)
 @never_cache
-def queue_data(request):
-    """AJAX endpoint for live queue refresh."""
+async def queue_data(request):
+    """AJAX endpoint for live queue refresh (async: polled by staff screens)."""
+    return JsonResponse({"entries": await run_db(_live_queue_entries)})
+
+
+def _live_queue_entries():
     # maintenance
     apply_entry_log_maintenance()
 
@@ -447,16 +470,18 @@ def queue_data(request):
             "staff": log.staff.username if log.staff else "—",
             "time": entry_local.strftime("%Y-%m-%d %I:%M %p"),
         })
-    return JsonResponse({"entries": data})
+    return data
 
 
 # ===============================
 #   SIMPLE QUEUE (TV)
 # ===============================
+@passive_session
 @login_required(login_url='accounts:login')
 @user_passes_test(is_staff_admin_or_admin)
 @never_cache
 def simple_queue_view(request):
+    # Reloads itself every 10s: an open TV screen is not user activity
     # maintenance
     apply_entry_log_maintenance()
 
@@ -511,11 +536,16 @@ def manage_queue(request):
 # ===============================
 #   QR ENTRY / EXIT
 # ===============================
-@login_required(login_url='accounts:login')
-@user_passes_test(is_staff_admin_or_admin)
+@async_login_required
+@async_user_passes_test(is_staff_admin_or_admin)
 @never_cache
-def qr_scan_entry(request):
+async def qr_scan_entry(request):
     """Handles QR scan for both entry & departure validation with live balance feedback."""
+    # Async so gate scans are not queued behind other requests' threads
+    return await run_db(_qr_scan_entry, request)
+
+
+def _qr_scan_entry(request):
     # Run maintenance on entry routes too so state is consistent when scanning
     apply_entry_log_maintenance()
 
@@ -533,129 +563,8 @@ def qr_scan_entry(request):
                 "balance": None
             })
 
-        staff_user = request.user
-
-        try:
-            # 🔍 Validate vehicle
-            vehicle = Vehicle.objects.filter(qr_value__iexact=qr_code).first()
-            if not vehicle:
-                return JsonResponse({
-                    "status": "error",
-                    "message": "❌ Invalid QR code.",
-                    "balance": None
-                })
-
-            # 🏦 Get or create wallet
-            wallet, _ = Wallet.objects.get_or_create(vehicle=vehicle)
-
-            now = datetime.now(dt_timezone.utc)
-            confirm_reset = str(request.POST.get("confirm_reset", "")).lower() in ("1", "true", "yes")
-
-            # 🚗 Check if vehicle already inside terminal
-            active_log = EntryLog.objects.filter(vehicle=vehicle, is_active=True).first()
-
-            # ========================
-            # 🔁 DEPARTURE LOGIC
-            # ========================
-            if active_log:
-                if confirm_reset:
-                    reset_message = (
-                        f"Queue position reset confirmed by '{staff_user.username}'. "
-                        f"Vehicle '{vehicle.license_plate}' moved to rejoin queue."
-                    )
-                    EntryLog.objects.filter(pk=active_log.pk).update(
-                        created_at=now,
-                        message=reset_message
-                    )
-                    return JsonResponse({
-                        "status": "success",
-                        "message": "🔁 Queue reset confirmed. Please proceed back to the line.",
-                        "balance": float(wallet.balance)
-                    })
-
-                return JsonResponse({
-                    "status": "queued",
-                    "message": (
-                        "⚠️ You're already queued. Scan again to reset your position "
-                        "if you missed your turn or stepped out briefly."
-                    ),
-                    "balance": float(wallet.balance)
-                })
-
-            # ========================
-            # 🚘 ENTRY LOGIC
-            # ========================
-            recent_entry = EntryLog.objects.filter(
-                vehicle=vehicle,
-                status=EntryLog.STATUS_SUCCESS
-            ).order_by("-created_at").first()
-
-            if recent_entry and (now - recent_entry.created_at) < timedelta(minutes=cooldown_minutes):
-                return JsonResponse({
-                    "status": "error",
-                    "message": "⏳ Please wait before re-entry.",
-                    "balance": float(wallet.balance)
-                })
-
-            if wallet.balance < min_deposit:
-                return JsonResponse({
-                    "status": "error",
-                    "message": f"⚠️ Minimum ₱{min_deposit} required before entry.",
-                    "balance": float(wallet.balance)
-                })
-
-            if wallet.balance >= entry_fee:
-                wallet.balance -= entry_fee
-                wallet.save()
-
-                EntryLog.objects.create(
-                    vehicle=vehicle,
-                    staff=staff_user,
-                    fee_charged=entry_fee,
-                    wallet_balance_snapshot=wallet.balance,
-                    status=EntryLog.STATUS_SUCCESS,
-                    message=f"Vehicle '{vehicle.license_plate}' entered terminal."
-                )
-                if vehicle:
-                    departure_snapshot = timezone.now() + timedelta(
-                        minutes=getattr(settings, "departure_duration_minutes", 30)
-                    )
-                    QueueHistory.objects.create(
-                        vehicle=vehicle,
-                        driver=getattr(vehicle, "assigned_driver", None),
-                        action="enter",
-                        departure_time_snapshot=departure_snapshot,
-                        wallet_balance_snapshot=wallet.balance,
-                        fee_charged=entry_fee,
-                    )
-
-                return JsonResponse({
-                    "status": "success",
-                    "message": f"🚗 {vehicle.license_plate} entered terminal.",
-                    "balance": float(wallet.balance)
-                })
-            else:
-                EntryLog.objects.create(
-                    vehicle=vehicle,
-                    staff=staff_user,
-                    fee_charged=entry_fee,
-                    wallet_balance_snapshot=wallet.balance,
-                    status=EntryLog.STATUS_INSUFFICIENT,
-                    message=f"Insufficient balance for '{vehicle.license_plate}'."
-                )
-
-                return JsonResponse({
-                    "status": "error",
-                    "message": f"❌ Insufficient balance for {vehicle.license_plate}.",
-                    "balance": float(wallet.balance)
-                })
-
-        except Exception as e:
-            return JsonResponse({
-                "status": "error",
-                "message": f"Unexpected error: {str(e)}",
-                "balance": None
-            })
+        confirm_reset = str(request.POST.get("confirm_reset", "")).lower() in ("1", "true", "yes")
+        return JsonResponse(gate.scan_entry(qr_code, request.user, confirm_reset))
 
     # GET request → render scan page
     context = {
@@ -666,11 +575,15 @@ def qr_scan_entry(request):
     return render(request, "terminal/qr_scan_entry.html", context)
 
 
-@login_required(login_url='accounts:login')
-@user_passes_test(is_staff_admin_or_admin)
+@async_login_required
+@async_user_passes_test(is_staff_admin_or_admin)
 @never_cache
-def qr_exit_validation(request):
+async def qr_exit_validation(request):
     """Handles QR scan for exit validation only."""
+    return await run_db(_qr_exit_validation, request)
+
+
+def _qr_exit_validation(request):
     if request.method != "POST":
         return JsonResponse({"status": "error", "message": "Invalid request method."})
 
@@ -678,31 +591,7 @@ def qr_exit_validation(request):
     if not qr_code:
         return JsonResponse({"status": "error", "message": "QR missing."})
 
-    try:
-        vehicle = Vehicle.objects.filter(qr_value__iexact=qr_code).first()
-        if not vehicle:
-            return JsonResponse({"status": "error", "message": "❌ No vehicle found."})
-
-        active_log = EntryLog.objects.filter(vehicle=vehicle, is_active=True).first()
-        if not active_log:
-            return JsonResponse({"status": "error", "message": f"⚠️ {vehicle.license_plate} not inside terminal."})
-
-        active_log.is_active = False
-        active_log.departed_at = timezone.now()
-        active_log.save(update_fields=["is_active", "departed_at"])
-        vehicle = active_log.vehicle
-        if vehicle:
-            QueueHistory.objects.create(
-                vehicle=vehicle,
-                driver=getattr(vehicle, "assigned_driver", None),
-                action="exit",
-                departure_time_snapshot=active_log.departed_at,
-                wallet_balance_snapshot=getattr(getattr(vehicle, "wallet", None), "balance", None),
-                fee_charged=None,
-            )
-        return JsonResponse({"status": "success", "message": f"✅ {vehicle.license_plate} departed."})
-    except Exception as e:
-        return JsonResponse({"status": "error", "message": str(e)})
+    return JsonResponse(gate.scan_exit(qr_code))
 
 
 @login_required(login_url='accounts:login')
@@ -853,6 +742,9 @@ def _archive_past_activities(archive_date, tz):
 # ===============================
 #   PAST TRANSACTIONS (with date filtering & CSV export)
 # ===============================
+PAST_TRANSACTIONS_PAGE_SIZE = 50
+
+
 @login_required(login_url='accounts:login')
 @user_passes_test(is_staff_admin_or_admin)
 @never_cache
@@ -867,6 +759,7 @@ def past_transactions_view(request):
     """
     from terminal.models import Transaction
     from terminal.services import TransactionService
+    from terminal.transaction_archive import normalize_plate
 
     tz = timezone.get_current_timezone()
     today = timezone.localtime(timezone.now(), tz).date()
@@ -880,6 +773,7 @@ def past_transactions_view(request):
     # Get filter parameters
     start_date_str = request.GET.get("start_date", "")
     end_date_str = request.GET.get("end_date", "")
+    plate = request.GET.get("plate", "").strip()
     export_action = request.GET.get("export", "")
 
     # Parse dates
@@ -915,10 +809,18 @@ def past_transactions_view(request):
         if end_date >= today:
             end_date = yesterday
         transactions_qs = transactions_qs.filter(transaction_date__lte=end_date)
+    if plate:
+        transactions_qs = TransactionService.filter_by_plate(transactions_qs, plate)
+
+    # Rows older than TRANSACTION_ARCHIVE_AFTER_MONTHS live in cold storage;
+    # the hot queryset and the archive are read together from here on.
+    archive_end = end_date or yesterday
 
     # CSV Export
     if export_action == "csv":
-        csv_content = TransactionService.export_transactions_csv(transactions_qs)
+        csv_content = TransactionService.export_transactions_csv(
+            TransactionService.iter_with_archive(transactions_qs, start_date, archive_end, plate)
+        )
 
         label = "past"
         if start_date and end_date:
@@ -927,6 +829,8 @@ def past_transactions_view(request):
             label = f"from_{start_date}"
         elif end_date:
             label = f"until_{end_date}"
+        if plate:
+            label = f"{label}_{normalize_plate(plate)}"
 
         response = HttpResponse(content_type="text/csv; charset=utf-8")
         response["Content-Disposition"] = f'attachment; filename="past_transactions_{label}.csv"'
@@ -934,10 +838,10 @@ def past_transactions_view(request):
         return response
 
     # Calculate summary metrics for filtered past records
-    total_revenue = transactions_qs.filter(is_revenue_counted=True).aggregate(
-        total=Sum("fee_charged")
-    )["total"] or 0
-    total_transactions = transactions_qs.count()
+    totals = TransactionService.get_range_totals(transactions_qs, start_date, archive_end, plate)
+    total_revenue = totals["revenue"]
+    total_transactions = totals["count"]
+    total_is_estimate = totals["count_is_estimate"]
 
     # Yesterday's revenue specifically
     yesterday_revenue = (
@@ -947,16 +851,24 @@ def past_transactions_view(request):
         or 0
     )
 
-    # Paginate for display (limit to 200)
-    transactions = list(transactions_qs[:200])
+    # Keyset pagination: constant cost per page however deep the user browses
+    page = TransactionService.get_page_with_archive(
+        transactions_qs, start_date, archive_end, request.GET.get("cursor"), PAST_TRANSACTIONS_PAGE_SIZE, plate
+    )
+    transactions = page.object_list
 
     context = {
         "transactions": transactions,
         "total_revenue": total_revenue,
         "total_transactions": total_transactions,
+        "total_is_estimate": total_is_estimate,
+        "page": page,
+        "next_query": page.next_query(request) if page.has_next else "",
+        "first_query": page.first_query(request),
         "yesterday_revenue": yesterday_revenue,
         "start_date": start_date_str,
         "end_date": end_date_str,
+        "plate": plate,
         "today": today.strftime("%Y-%m-%d"),
         "yesterday": yesterday.strftime("%Y-%m-%d"),
         "yesterday_display": yesterday.strftime("%B %d, %Y"),
@@ -978,7 +890,9 @@ def mark_departed(request, entry_id):
         log = get_object_or_404(EntryLog, id=entry_id, is_active=True)
         log.is_active = False
         log.departed_at = timezone.now()
-        log.save(update_fields=["is_active", "departed_at"])
+        with transaction.atomic():
+            log.save(update_fields=["is_active", "departed_at"])
+            VehiclePresence.release([log.pk], log.departed_at)
         return JsonResponse({"success": True, "message": f"✅ {log.vehicle.license_plate} marked departed."})
     except Exception as e:
         return JsonResponse({"success": False, "message": str(e)})
@@ -2,13 +2,52 @@ from decimal import Decimal
 
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.db.models import Count, DecimalField, OuterRef, Q, Subquery, Sum
+from django.db.models import Count, DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.shortcuts import render, redirect
 from django.views.decorators.cache import never_cache
 
 from accounts.utils import is_staff_admin_or_admin
 from terminal.models import SystemSettings
-from vehicles.models import Deposit, Driver, Vehicle, Wallet
+from terminal.pagination import estimated_count, paginate_keyset
+from vehicles import search
+from vehicles.models import Deposit, Vehicle, Wallet
+
+
+HISTORY_PAGE_SIZE = 50
+
+
+def _deposit_history(history_query, history_sort):
+    """
+    Filtered deposit queryset and its keyset ordering for the history lists.
+    Every ordering ends with ``id`` and uses non-null keys so it can be paged
+    with a cursor; driver names are coalesced for deposits without a driver.
+    """
+    deposits = Deposit.objects.select_related("wallet__vehicle__assigned_driver")
+
+    if history_query:
+        deposits = deposits.filter(wallet__vehicle__in=search.filter_queryset("vehicle", history_query))
+
+    if history_sort == "largest":
+        ordering = ["-amount", "-created_at", "-id"]
+    elif history_sort == "smallest":
+        ordering = ["amount", "-created_at", "-id"]
+    elif history_sort in ("driver_asc", "driver_desc"):
+        deposits = deposits.annotate(
+            driver_last_sort=Coalesce("wallet__vehicle__assigned_driver__last_name", Value("")),
+            driver_first_sort=Coalesce("wallet__vehicle__assigned_driver__first_name", Value("")),
+        )
+        prefix = "" if history_sort == "driver_asc" else "-"
+        ordering = [
+            f"{prefix}driver_last_sort",
+            f"{prefix}driver_first_sort",
+            "-created_at",
+            "-id",
+        ]
+    else:
+        ordering = ["-created_at", "-id"]
+
+    return deposits, ordering
 
 
 @login_required(login_url='accounts:login')
@@ -22,21 +61,6 @@ def deposit_menu(request):
     if wallet_sort not in ("newest", "largest", "smallest", "driver_asc", "driver_desc"):
         wallet_sort = "newest"
 
-    driver_qs = Driver.objects.filter(vehicles__isnull=False).distinct().prefetch_related("vehicles").order_by("last_name", "first_name")
-
-    driver_options = []
-    for driver in driver_qs:
-        full_name = f"{driver.first_name} {driver.last_name}"
-        license_text = driver.license_number or driver.driver_id or ""
-        for vehicle in driver.vehicles.all():
-            driver_options.append({
-                "vehicle_id": vehicle.id,
-                "license_plate": vehicle.license_plate,
-                "driver_name": full_name,
-                "license_number": license_text,
-                "display": f"{full_name} · {vehicle.license_plate}",
-            })
-
     wallets_qs = Wallet.objects.select_related("vehicle__assigned_driver").annotate(
         last_deposit_amount=Subquery(
             Deposit.objects.filter(wallet=OuterRef("pk"))
@@ -53,13 +77,7 @@ def deposit_menu(request):
     )
 
     if wallet_search:
-        wallets_qs = wallets_qs.filter(
-            Q(vehicle__license_plate__icontains=wallet_search)
-            | Q(vehicle__assigned_driver__first_name__icontains=wallet_search)
-            | Q(vehicle__assigned_driver__last_name__icontains=wallet_search)
-            | Q(vehicle__assigned_driver__license_number__icontains=wallet_search)
-            | Q(vehicle__assigned_driver__driver_id__icontains=wallet_search)
-        )
+        wallets_qs = wallets_qs.filter(vehicle__in=search.filter_queryset("vehicle", wallet_search))
 
     if wallet_sort == "largest":
         ordering = ["-last_deposit_amount", "-last_deposit_at"]
@@ -121,7 +139,6 @@ def deposit_menu(request):
         "wallets_total": wallets_count,
         "wallet_sort": wallet_sort,
         "wallet_search": wallet_search,
-        "driver_options": driver_options,
         "toast_messages": toast_messages,
     }
     return render(request, "terminal/deposit_menu.html", context)
@@ -136,46 +153,21 @@ def deposit_history(request):
         history_sort = "newest"
     history_query = request.GET.get("history_query", "").strip()
 
-    deposits = Deposit.objects.select_related("wallet__vehicle__assigned_driver")
-
-    if history_query:
-        deposits = deposits.filter(
-            Q(wallet__vehicle__license_plate__icontains=history_query)
-            | Q(wallet__vehicle__assigned_driver__first_name__icontains=history_query)
-            | Q(wallet__vehicle__assigned_driver__last_name__icontains=history_query)
-            | Q(wallet__vehicle__assigned_driver__license_number__icontains=history_query)
-            | Q(wallet__vehicle__assigned_driver__driver_id__icontains=history_query)
-        )
-
-    if history_sort == "largest":
-        ordering = ["-amount", "-created_at"]
-    elif history_sort == "smallest":
-        ordering = ["amount", "-created_at"]
-    elif history_sort == "driver_asc":
-        ordering = [
-            "wallet__vehicle__assigned_driver__last_name",
-            "wallet__vehicle__assigned_driver__first_name",
-            "-created_at",
-        ]
-    elif history_sort == "driver_desc":
-        ordering = [
-            "-wallet__vehicle__assigned_driver__last_name",
-            "-wallet__vehicle__assigned_driver__first_name",
-            "-created_at",
-        ]
-    else:
-        ordering = ["-created_at"]
-
-    deposits = deposits.order_by(*ordering)
+    deposits, ordering = _deposit_history(history_query, history_sort)
     total_amount = deposits.aggregate(Sum("amount"))["amount__sum"] or 0
-    total_count = deposits.count()
+    total_count, total_is_estimate = estimated_count(deposits)
+    page = paginate_keyset(deposits, ordering, request.GET.get("cursor"), HISTORY_PAGE_SIZE)
 
     context = {
-        "history_deposits": deposits[:200],
+        "history_deposits": page.object_list,
+        "history_page": page,
+        "next_query": page.next_query(request) if page.has_next else "",
+        "first_query": page.first_query(request),
         "history_sort": history_sort,
         "history_query": history_query,
         "total_amount": total_amount,
         "total_count": total_count,
+        "total_is_estimate": total_is_estimate,
     }
     return render(request, "terminal/deposit_history.html", context)
 
@@ -185,29 +177,12 @@ def deposit_history(request):
 @never_cache
 def deposits(request):
     """Unified deposit management page with wallets and history."""
-    import json
-    
     settings = SystemSettings.get_solo()
     min_deposit = settings.min_deposit_amount
     
     # Get tab parameter
     active_tab = request.GET.get("tab", "wallets")
     
-    # Driver options for modal
-    driver_qs = Driver.objects.filter(vehicles__isnull=False).distinct().prefetch_related("vehicles").order_by("last_name", "first_name")
-    driver_options = []
-    for driver in driver_qs:
-        full_name = f"{driver.first_name} {driver.last_name}"
-        license_text = driver.license_number or driver.driver_id or ""
-        for vehicle in driver.vehicles.all():
-            driver_options.append({
-                "vehicle_id": vehicle.id,
-                "license_plate": vehicle.license_plate,
-                "driver_name": full_name,
-                "license_number": license_text,
-                "display": f"{full_name} · {vehicle.license_plate}",
-            })
-    
     # WALLETS TAB DATA
     wallet_search = request.GET.get("search_query", "").strip()
     wallet_sort = request.GET.get("wallet_sort", "newest").lower()
@@ -230,13 +205,7 @@ def deposits(request):
     )
     
     if wallet_search:
-        wallets_qs = wallets_qs.filter(
-            Q(vehicle__license_plate__icontains=wallet_search)
-            | Q(vehicle__assigned_driver__first_name__icontains=wallet_search)
-            | Q(vehicle__assigned_driver__last_name__icontains=wallet_search)
-            | Q(vehicle__assigned_driver__license_number__icontains=wallet_search)
-            | Q(vehicle__assigned_driver__driver_id__icontains=wallet_search)
-        )
+        wallets_qs = wallets_qs.filter(vehicle__in=search.filter_queryset("vehicle", wallet_search))
     
     if wallet_sort == "largest":
         ordering = ["-balance", "-last_deposit_at"]
@@ -264,7 +233,7 @@ def deposits(request):
     # Wallet stats
     total_balance = wallets_qs.aggregate(Sum("balance"))["balance__sum"] or 0
     low_balance_count = wallets_qs.filter(balance__lt=min_deposit).count()
-    total_deposits_count = Deposit.objects.count()
+    total_deposits_count, _ = estimated_count(Deposit.objects.all())
     
     # HISTORY TAB DATA
     history_sort = request.GET.get("history_sort", "newest").lower()
@@ -272,40 +241,12 @@ def deposits(request):
         history_sort = "newest"
     history_query = request.GET.get("history_query", "").strip()
     
-    deposits_qs = Deposit.objects.select_related("wallet__vehicle__assigned_driver")
-    
-    if history_query:
-        deposits_qs = deposits_qs.filter(
-            Q(wallet__vehicle__license_plate__icontains=history_query)
-            | Q(wallet__vehicle__assigned_driver__first_name__icontains=history_query)
-            | Q(wallet__vehicle__assigned_driver__last_name__icontains=history_query)
-            | Q(wallet__vehicle__assigned_driver__license_number__icontains=history_query)
-            | Q(wallet__vehicle__assigned_driver__driver_id__icontains=history_query)
-        )
-    
-    if history_sort == "largest":
-        ordering = ["-amount", "-created_at"]
-    elif history_sort == "smallest":
-        ordering = ["amount", "-created_at"]
-    elif history_sort == "driver_asc":
-        ordering = [
-            "wallet__vehicle__assigned_driver__last_name",
-            "wallet__vehicle__assigned_driver__first_name",
-            "-created_at",
-        ]
-    elif history_sort == "driver_desc":
-        ordering = [
-            "-wallet__vehicle__assigned_driver__last_name",
-            "-wallet__vehicle__assigned_driver__first_name",
-            "-created_at",
-        ]
-    else:
-        ordering = ["-created_at"]
-    
-    deposits_sorted = deposits_qs.order_by(*ordering)
-    history_total = deposits_sorted.aggregate(Sum("amount"))["amount__sum"] or 0
-    history_count = deposits_sorted.count()
-    history_deposits = deposits_sorted[:200]
+    deposits_qs, history_ordering = _deposit_history(history_query, history_sort)
+    history_total = deposits_qs.aggregate(Sum("amount"))["amount__sum"] or 0
+    history_count, history_count_is_estimate = estimated_count(deposits_qs)
+    history_page = paginate_keyset(
+        deposits_qs, history_ordering, request.GET.get("cursor"), HISTORY_PAGE_SIZE
+    )
     
     # HANDLE POST (Add Deposit)
     if request.method == "POST":
@@ -346,12 +287,15 @@ def deposits(request):
         "total_balance": total_balance,
         "low_balance_count": low_balance_count,
         "total_deposits": total_deposits_count,
-        "driver_options": json.dumps(driver_options),
-        "history_deposits": history_deposits,
+        "history_deposits": history_page.object_list,
+        "history_page": history_page,
+        "history_next_query": history_page.next_query(request, tab="history") if history_page.has_next else "",
+        "history_first_query": history_page.first_query(request, tab="history"),
         "history_sort": history_sort,
         "history_query": history_query,
         "history_total": history_total,
         "history_count": history_count,
+        "history_count_is_estimate": history_count_is_estimate,
         "active_tab": active_tab,
     }
     return render(request, "terminal/deposits.html", context)
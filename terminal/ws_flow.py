@@ -0,0 +1,179 @@
+"""
+WebSocket Flow Control
+======================
+Keeps slow display clients (TV sticks on weak Wi-Fi) from building up a
+backlog of stale queue boards.
+
+Every connection holds at most one pending board. Channel-layer handlers
+only replace it (latest state wins), so the layer's per-channel queue
+drains at once instead of filling up and dropping messages. A single
+sender task per connection sends whatever is pending.
+
+Clients that send ``{"type": "hello"}`` after connecting also get:
+
+- ack-based flow control: after each board the sender waits for
+  ``{"type": "ack"}``. Boards that arrive meanwhile are conflated.
+- a ``{"type": "heartbeat"}`` every ``WS_HEARTBEAT_SECONDS``, answered
+  with ``{"type": "pong"}``.
+- pruning: a client silent (no ack, pong or other message) for
+  ``WS_IDLE_TIMEOUT_SECONDS`` is closed with code 4408 and reconnects.
+
+If building or sending a board fails, the error is logged and the client
+is closed with code 1012 so it reconnects and starts from a fresh state.
+
+Other clients keep the old behaviour, apart from conflation. Dead
+connections are still caught by daphne's protocol pings.
+
+Per-connection counters are kept in ``CONNECTIONS`` for this process;
+``metrics()`` summarizes them (see ``terminal:ws_metrics``).
+"""
+
+import asyncio
+import logging
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Close code for clients pruned as idle or stuck
+IDLE_CLOSE_CODE = 4408
+# Close code after a server-side error ("service restart": reconnect)
+RECONNECT_CLOSE_CODE = 1012
+
+# Pending marker: rebuild the state when it is next sent
+REFRESH = object()
+
+# channel name -> ConnectionStats, for this process
+CONNECTIONS = {}
+
+
+class ConnectionStats:
+    def __init__(self, path, compact):
+        self.path = path
+        self.compact = compact
+        self.connected_at = time.time()
+        self.flow_control = False
+        self.sent = 0
+        self.conflated = 0
+        self.pending = False
+        self.awaiting_ack = False
+        self.last_seen = time.monotonic()
+        self.last_ack_ms = None
+        self.max_ack_ms = None
+
+    def as_dict(self):
+        return {
+            "path": self.path,
+            "format": "compact" if self.compact else "verbose",
+            "connected_at": int(self.connected_at),
+            "flow_control": self.flow_control,
+            "sent": self.sent,
+            "conflated": self.conflated,
+            "pending": self.pending,
+            "awaiting_ack": self.awaiting_ack,
+            "idle_seconds": round(time.monotonic() - self.last_seen, 1),
+            "last_ack_ms": self.last_ack_ms,
+            "max_ack_ms": self.max_ack_ms,
+        }
+
+
+def metrics():
+    """Totals and per-connection counters for this process's WebSocket clients."""
+    connections = [stats.as_dict() for stats in CONNECTIONS.values()]
+    return {
+        "connections": len(connections),
+        "flow_controlled": sum(1 for c in connections if c["flow_control"]),
+        "awaiting_ack": sum(1 for c in connections if c["awaiting_ack"]),
+        "sent": sum(c["sent"] for c in connections),
+        "conflated": sum(c["conflated"] for c in connections),
+        "clients": connections,
+    }
+
+
+class FlowControlMixin:
+    """
+    For AsyncJsonWebsocketConsumer subclasses: call ``start_flow()`` once
+    accepted, ``stop_flow()`` on disconnect, ``offer()`` for every board and
+    ``handle_client_message()`` from ``receive_json``.
+
+    Subclasses must define ``async def current_state(self)``, returning the
+    board sent for ``offer(REFRESH)``.
+    """
+
+    def start_flow(self):
+        self.stats = CONNECTIONS[self.channel_name] = ConnectionStats(self.scope["path"], self.compact)
+        self._pending = None
+        self._wake = asyncio.Event()
+        self._acked = asyncio.Event()
+        self._flow_tasks = [asyncio.ensure_future(self._guard(self._send_loop()))]
+
+    def stop_flow(self):
+        for task in getattr(self, "_flow_tasks", ()):
+            task.cancel()
+        CONNECTIONS.pop(self.channel_name, None)
+
+    def offer(self, payload):
+        """Queue ``payload`` (or REFRESH) to send, replacing any board not yet sent."""
+        if self._pending is not None:
+            self.stats.conflated += 1
+        self._pending = payload
+        self.stats.pending = True
+        self._wake.set()
+
+    async def handle_client_message(self, content):
+        self.stats.last_seen = time.monotonic()
+        kind = content.get("type") if isinstance(content, dict) else None
+        if kind == "hello" and not self.stats.flow_control:
+            self.stats.flow_control = True
+            self._flow_tasks.append(asyncio.ensure_future(self._guard(self._heartbeat_loop())))
+        elif kind == "ack":
+            self._acked.set()
+
+    async def _guard(self, loop):
+        """Run a flow task; on error, log it and make the client reconnect."""
+        try:
+            await loop
+        except Exception:
+            logger.exception("WebSocket %s: flow task failed for %s", self.stats.path, self.channel_name)
+            await self.close(code=RECONNECT_CLOSE_CODE)
+
+    async def _send_loop(self):
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            payload, self._pending = self._pending, None
+            self.stats.pending = False
+            if payload is None:
+                continue
+            if payload is REFRESH:
+                payload = await self.current_state()
+            await self.send_json(payload)
+            self.stats.sent += 1
+
+            if self.stats.flow_control:
+                # One board in flight: wait for the client to apply it
+                self._acked.clear()
+                self.stats.awaiting_ack = True
+                started = time.monotonic()
+                try:
+                    await asyncio.wait_for(self._acked.wait(), settings.WS_IDLE_TIMEOUT_SECONDS)
+                except asyncio.TimeoutError:
+                    await self._prune("no ack")
+                    return
+                self.stats.awaiting_ack = False
+                elapsed = round((time.monotonic() - started) * 1000, 1)
+                self.stats.last_ack_ms = elapsed
+                self.stats.max_ack_ms = max(self.stats.max_ack_ms or 0, elapsed)
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(settings.WS_HEARTBEAT_SECONDS)
+            if time.monotonic() - self.stats.last_seen > settings.WS_IDLE_TIMEOUT_SECONDS:
+                await self._prune("idle")
+                return
+            await self.send_json({"type": "heartbeat", "t": int(time.time())})
+
+    async def _prune(self, reason):
+        logger.info("WebSocket %s: closing %s client (%s)", self.stats.path, reason, self.channel_name)
+        await self.close(code=IDLE_CLOSE_CODE)
@@ -1,5 +1,10 @@
-from django.contrib import admin
-from .models import Driver, Vehicle, Wallet, Deposit
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import render
+from django.urls import path
+from .models import Driver, Vehicle, Wallet, Deposit, QRCodeJob
+from .forms import FleetImportForm
+from . import fleet_import, services
 from django.utils.html import format_html
 
 # Inline for Deposit model
@@ -51,6 +56,61 @@ class VehicleAdmin(admin.ModelAdmin):
     readonly_fields = ('qr_code_preview',)
     exclude = ('qr_code',)
     list_per_page = 20
+    change_list_template = "admin/vehicles/vehicle/change_list.html"
+
+    def get_urls(self):
+        urls = [
+            path(
+                'import/',
+                self.admin_site.admin_view(self.import_fleet_view),
+                name='vehicles_vehicle_import',
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def save_model(self, request, obj, form, change):
+        # Same single-pass writes as the staff registration/edit views.
+        if change:
+            services.update_vehicle(obj)
+        else:
+            services.register_vehicle(obj)
+
+    def import_fleet_view(self, request):
+        """Bulk CSV/XLSX registration; QR images are queued in the background."""
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+
+        result = None
+        form = FleetImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                result = fleet_import.import_fleet(
+                    upload,
+                    upload.name,
+                    partial=form.cleaned_data['partial'],
+                    dry_run=form.cleaned_data['dry_run'],
+                )
+            except ValueError as exc:
+                form.add_error('file', str(exc))
+            else:
+                if result.committed:
+                    self.message_user(
+                        request,
+                        f"Imported {result.drivers_created} drivers and {result.vehicles_created} vehicles. "
+                        "QR codes are being generated in the background.",
+                        messages.SUCCESS,
+                    )
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': "Import fleet",
+            'form': form,
+            'result': result,
+            'columns': fleet_import.COLUMNS,
+        }
+        return render(request, "admin/vehicles/vehicle/import_fleet.html", context)
 
     def qr_code_display(self, obj):
         if obj.qr_code:
@@ -61,7 +121,7 @@ class VehicleAdmin(admin.ModelAdmin):
     def qr_code_preview(self, obj):
         if obj.qr_code:
             return format_html('<img src="{}" width="150" height="150" />', obj.qr_code.url)
-        return "QR code will be generated after saving."
+        return "QR code is generated in the background after saving."
     qr_code_preview.short_description = "QR Code Preview"
 
     
@@ -85,3 +145,12 @@ class DepositAdmin(admin.ModelAdmin):
     def amount_display(self, obj):
         return f"{obj.amount:,.2f} {obj.wallet.currency}"
     amount_display.short_description = 'Amount'
+
+
+@admin.register(QRCodeJob)
+class QRCodeJobAdmin(admin.ModelAdmin):
+    list_display = ('qr_value', 'vehicle', 'status', 'attempts', 'next_attempt_at', 'updated_at')
+    list_filter = ('status',)
+    search_fields = ('qr_value', 'vehicle__license_plate')
+    readonly_fields = ('vehicle', 'qr_value', 'attempts', 'last_error', 'created_at', 'updated_at')
+    list_per_page = 20
@@ -4,6 +4,8 @@ Centralized expiry calculation utilities for vehicles and drivers.
 Single source of truth for expiry status across all views.
 """
 from datetime import date, timedelta
+from django.db.models import Case, CharField, DateField, DurationField, ExpressionWrapper, F, IntegerField, Q, Value, When
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
 
@@ -23,6 +25,14 @@ class ExpiryStatus:
     NO_DATE = 'no_date'
 
 
+EXPIRY_MESSAGES = {
+    ExpiryStatus.VALID: "Valid",
+    ExpiryStatus.NEAR_EXPIRY: "Near Expiry – Renew Soon",
+    ExpiryStatus.EXPIRED: "Expired – Renew Required",
+    ExpiryStatus.NO_DATE: "No expiry date",
+}
+
+
 # =====================================================
 # CORE EXPIRY CALCULATION
 # =====================================================
@@ -40,29 +50,18 @@ def get_expiry_status(expiry_date):
         - message: str (user-friendly message)
     """
     if not expiry_date:
-        return (ExpiryStatus.NO_DATE, None, "No expiry date")
+        return (ExpiryStatus.NO_DATE, None, EXPIRY_MESSAGES[ExpiryStatus.NO_DATE])
     
     today = date.today()
     days_remaining = (expiry_date - today).days
     
     if days_remaining < 0:
-        return (
-            ExpiryStatus.EXPIRED,
-            days_remaining,
-            "Expired – Renew Required"
-        )
+        status = ExpiryStatus.EXPIRED
     elif days_remaining <= EXPIRY_WARNING_DAYS:
-        return (
-            ExpiryStatus.NEAR_EXPIRY,
-            days_remaining,
-            "Near Expiry – Renew Soon"
-        )
+        status = ExpiryStatus.NEAR_EXPIRY
     else:
-        return (
-            ExpiryStatus.VALID,
-            days_remaining,
-            "Valid"
-        )
+        status = ExpiryStatus.VALID
+    return (status, days_remaining, EXPIRY_MESSAGES[status])
 
 
 # =====================================================
@@ -88,16 +87,7 @@ def get_vehicle_expiry_info(vehicle):
         }
     """
     status, days_remaining, message = get_expiry_status(vehicle.registration_expiry)
-    
-    return {
-        'status': status,
-        'days_remaining': days_remaining,
-        'message': message,
-        'expiry_date': vehicle.registration_expiry,
-        'is_expired': status == ExpiryStatus.EXPIRED,
-        'is_near_expiry': status == ExpiryStatus.NEAR_EXPIRY,
-        'needs_alert': status in [ExpiryStatus.EXPIRED, ExpiryStatus.NEAR_EXPIRY]
-    }
+    return _build_expiry_info(status, days_remaining, message, vehicle.registration_expiry)
 
 
 # =====================================================
@@ -123,12 +113,15 @@ def get_driver_expiry_info(driver):
         }
     """
     status, days_remaining, message = get_expiry_status(driver.license_expiry)
-    
+    return _build_expiry_info(status, days_remaining, message, driver.license_expiry)
+
+
+def _build_expiry_info(status, days_remaining, message, expiry_date):
     return {
         'status': status,
         'days_remaining': days_remaining,
         'message': message,
-        'expiry_date': driver.license_expiry,
+        'expiry_date': expiry_date,
         'is_expired': status == ExpiryStatus.EXPIRED,
         'is_near_expiry': status == ExpiryStatus.NEAR_EXPIRY,
         'needs_alert': status in [ExpiryStatus.EXPIRED, ExpiryStatus.NEAR_EXPIRY]
@@ -150,7 +143,10 @@ def annotate_vehicles_with_expiry(vehicles):
     """
     result = []
     for vehicle in vehicles:
-        vehicle.expiry_info = get_vehicle_expiry_info(vehicle)
+        if hasattr(vehicle, 'expiry_status'):
+            vehicle.expiry_info = _expiry_info_from_annotations(vehicle, vehicle.registration_expiry)
+        else:
+            vehicle.expiry_info = get_vehicle_expiry_info(vehicle)
         result.append(vehicle)
     return result
 
@@ -167,11 +163,81 @@ def annotate_drivers_with_expiry(drivers):
     """
     result = []
     for driver in drivers:
-        driver.expiry_info = get_driver_expiry_info(driver)
+        if hasattr(driver, 'expiry_status'):
+            driver.expiry_info = _expiry_info_from_annotations(driver, driver.license_expiry)
+        else:
+            driver.expiry_info = get_driver_expiry_info(driver)
         result.append(driver)
     return result
 
 
+# =====================================================
+# DATABASE-SIDE ANNOTATIONS
+# =====================================================
+# Keyset-safe orderings (non-null keys ending in id) for the expiry sort
+# modes of the registered vehicle/driver lists; see expiry_annotations().
+EXPIRY_SORT_ORDERINGS = {
+    'expiry-near': ['expiry_near_rank', 'expiry_sort_asc', 'id'],
+    'expiry-expired': ['expiry_expired_rank', 'expiry_sort_asc', 'id'],
+    'expiry-longest': ['-expiry_sort_desc', '-id'],
+    'expiry-shortest': ['expiry_sort_asc', 'id'],
+}
+
+
+def expiry_annotations(field, today=None):
+    """
+    ORM equivalent of get_expiry_status() for the date column ``field``.
+
+    Returns annotations for ``QuerySet.annotate()``:
+        - expiry_status: ExpiryStatus constant
+        - expiry_remaining: expiry date minus today (timedelta) or None
+        - expiry_near_rank: 0 expired/near expiry, 1 valid, 2 no date
+        - expiry_expired_rank: 0 expired, 1 not expired, 2 no date
+        - expiry_sort_asc / expiry_sort_desc: the expiry date with missing
+          dates pushed last for ascending / descending sorts
+    """
+    today = today or date.today()
+    warning_date = today + timedelta(days=EXPIRY_WARNING_DAYS)
+    missing = Q(**{f'{field}__isnull': True})
+    expired = Q(**{f'{field}__lt': today})
+    near = Q(**{f'{field}__lte': warning_date})
+
+    return {
+        'expiry_status': Case(
+            When(missing, then=Value(ExpiryStatus.NO_DATE)),
+            When(expired, then=Value(ExpiryStatus.EXPIRED)),
+            When(near, then=Value(ExpiryStatus.NEAR_EXPIRY)),
+            default=Value(ExpiryStatus.VALID),
+            output_field=CharField(),
+        ),
+        'expiry_remaining': ExpressionWrapper(
+            F(field) - Value(today, output_field=DateField()),
+            output_field=DurationField(),
+        ),
+        'expiry_near_rank': Case(
+            When(missing, then=Value(2)),
+            When(near, then=Value(0)),
+            default=Value(1),
+            output_field=IntegerField(),
+        ),
+        'expiry_expired_rank': Case(
+            When(missing, then=Value(2)),
+            When(expired, then=Value(0)),
+            default=Value(1),
+            output_field=IntegerField(),
+        ),
+        'expiry_sort_asc': Coalesce(F(field), Value(date.max, output_field=DateField())),
+        'expiry_sort_desc': Coalesce(F(field), Value(date.min, output_field=DateField())),
+    }
+
+
+def _expiry_info_from_annotations(obj, expiry_date):
+    remaining = obj.expiry_remaining
+    days_remaining = remaining.days if remaining is not None else None
+    status = obj.expiry_status
+    return _build_expiry_info(status, days_remaining, EXPIRY_MESSAGES[status], expiry_date)
+
+
 # =====================================================
 # TEMPLATE FILTERS (Optional - for direct use in templates)
 # =====================================================
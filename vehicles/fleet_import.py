@@ -0,0 +1,483 @@
+"""
+Fleet Import
+============
+Bulk registration of drivers and their vehicles from a CSV or XLSX sheet:
+one row per vehicle, with the driver's columns alongside. Used by
+``python manage.py import_fleet`` and the "Import fleet" admin page.
+
+Rows are checked against the same rule tables as the registration forms
+(``validation_rules`` / ``vehicle_validation_rules``) and against
+``Vehicle.clean()`` (plate and VIN formats). Uniqueness costs one ``__in``
+query per unique column, plus duplicate detection inside the file, instead
+of one ``exists()`` per field per row.
+
+A driver with several vehicles is written on several rows with the same
+license number and the same driver columns; one driver is created for them.
+
+Valid rows are written in one transaction with ``bulk_create``: drivers,
+vehicles, wallets, terminal fee balances and QR jobs. The QR images are
+rendered afterwards, by the caller's choice of ``qr_jobs`` path.
+"""
+
+import csv
+import io
+import re
+import uuid
+from collections import defaultdict, namedtuple
+from datetime import date, datetime
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+
+from . import identifiers, qr_jobs, search
+from .validation_rules import DRIVER_VALIDATION_RULES
+from .vehicle_validation_rules import VEHICLE_VALIDATION_RULES
+
+MAX_ROWS = 5000
+BULK_BATCH_SIZE = 500
+# Keeps every `__in` lookup under the bound-parameter limits of all backends.
+UNIQUE_LOOKUP_CHUNK = 1000
+
+DRIVER_COLUMNS = [
+    'first_name', 'middle_name', 'last_name', 'suffix',
+    'birth_date', 'birth_place', 'blood_type',
+    'mobile_number', 'email',
+    'street', 'barangay', 'zip_code', 'city_municipality', 'province',
+    'license_number', 'license_expiry',
+    'emergency_contact_name', 'emergency_contact_number', 'emergency_contact_relationship',
+    'driver_photo',
+]
+
+VEHICLE_COLUMNS = [
+    'vehicle_name', 'vehicle_type', 'ownership_type',
+    'cr_number', 'or_number', 'vin_number', 'year_model',
+    'registration_number', 'registration_expiry', 'license_plate',
+    'seat_capacity', 'route',
+]
+
+COLUMNS = DRIVER_COLUMNS + VEHICLE_COLUMNS
+
+# Stored upper-cased, as the registration forms do.
+UPPERCASE_COLUMNS = {
+    'license_number', 'cr_number', 'or_number', 'vin_number',
+    'registration_number', 'license_plate',
+}
+
+UNIQUE_DRIVER_COLUMNS = list(identifiers.UNIQUE_FIELDS['driver'])
+UNIQUE_VEHICLE_COLUMNS = list(identifiers.UNIQUE_FIELDS['vehicle'])
+
+# Photos cannot travel in a sheet: the column optionally holds an existing
+# Cloudinary public id, and the photo can otherwise be added later.
+OPTIONAL_COLUMNS = {'driver_photo'}
+
+DATE_FORMATS = ('%Y-%m-%d', '%m/%d/%Y', '%d/%m/%Y', '%Y/%m/%d')
+
+RowError = namedtuple('RowError', 'row column value message')
+
+
+# =============================================================================
+# RESULT
+# =============================================================================
+class ImportResult:
+    """Outcome of one import: counts, created vehicle ids and row errors."""
+
+    def __init__(self):
+        self.rows = 0
+        self.valid_rows = 0
+        self.drivers_created = 0
+        self.vehicles_created = 0
+        self.vehicle_ids = []
+        self.qr_job_ids = []
+        self.errors = []
+        self.committed = False
+
+    @property
+    def error_rows(self):
+        return sorted({error.row for error in self.errors})
+
+    def write_error_report(self, stream):
+        writer = csv.writer(stream)
+        writer.writerow(['row', 'column', 'value', 'message'])
+        for error in self.errors:
+            writer.writerow([error.row, error.column, error.value, error.message])
+
+
+# =============================================================================
+# READING
+# =============================================================================
+def _header(name):
+    return re.sub(r'[^a-z0-9]+', '_', str(name or '').strip().lower()).strip('_')
+
+
+def read_rows(file_obj, filename):
+    """Return ``[(sheet_row_number, {column: raw_value})]`` from a CSV/XLSX file."""
+    name = (filename or '').lower()
+    if name.endswith('.xlsx'):
+        table = _read_xlsx(file_obj)
+    elif name.endswith('.csv'):
+        table = _read_csv(file_obj)
+    else:
+        raise ValueError("Unsupported file type. Upload a .csv or .xlsx file.")
+
+    try:
+        header = [_header(cell) for cell in next(table)]
+    except StopIteration:
+        raise ValueError("The file is empty.")
+
+    missing = [column for column in COLUMNS
+               if column not in header and column not in OPTIONAL_COLUMNS and _rules(column).get('required')]
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(missing)}")
+
+    rows = []
+    for row_number, values in enumerate(table, start=2):
+        if not any(value not in (None, '') for value in values):
+            continue
+        rows.append((row_number, dict(zip(header, values))))
+        if len(rows) > MAX_ROWS:
+            raise ValueError(f"Too many rows. Import at most {MAX_ROWS} vehicles per file.")
+    return rows
+
+
+def _read_csv(file_obj):
+    data = file_obj.read()
+    if isinstance(data, bytes):
+        data = data.decode('utf-8-sig')
+    yield from csv.reader(io.StringIO(data))
+
+
+def _read_xlsx(file_obj):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError("Reading .xlsx files requires the openpyxl package.")
+
+    workbook = load_workbook(file_obj, read_only=True, data_only=True)
+    try:
+        for values in workbook.worksheets[0].iter_rows(values_only=True):
+            yield list(values)
+    finally:
+        workbook.close()
+
+
+# =============================================================================
+# FIELD VALIDATION
+# =============================================================================
+def _rules(column):
+    if column in DRIVER_COLUMNS:
+        return DRIVER_VALIDATION_RULES.get(column, {})
+    return VEHICLE_VALIDATION_RULES.get(column, {})
+
+
+def _message(rules, key, column):
+    return rules.get('error_messages', {}).get(key) or f"❌ Invalid {column.replace('_', ' ')}."
+
+
+def _parse_date(raw):
+    if isinstance(raw, datetime):
+        return raw.date()
+    if isinstance(raw, date):
+        return raw
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(str(raw).strip(), fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(raw)
+
+
+def _age_on(birth_date, today):
+    return today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
+
+
+def _choice(raw, choices):
+    """Match a value or its label, case-insensitively, to the stored value."""
+    text = str(raw).strip().lower()
+    for value, label in choices:
+        if text in (str(value).lower(), str(label).lower()):
+            return value
+    raise ValueError(raw)
+
+
+def clean_value(column, raw, today, choices=None):
+    """Validate one cell. Returns the cleaned value or raises ValidationError."""
+    rules = _rules(column)
+    if isinstance(raw, str):
+        raw = raw.strip()
+    if raw is None or raw == '':
+        if rules.get('required') and column not in OPTIONAL_COLUMNS:
+            raise ValidationError(_message(rules, 'required', column))
+        return None
+
+    field_type = rules.get('type', 'text')
+
+    if field_type == 'date':
+        try:
+            value = _parse_date(raw)
+        except ValueError:
+            raise ValidationError(_message(rules, 'invalid', column))
+        if rules.get('min_date') == 'today' and value < today:
+            raise ValidationError(_message(rules, 'expired', column))
+        if rules.get('min_age') and _age_on(value, today) < rules['min_age']:
+            raise ValidationError(_message(rules, 'min_age', column))
+        if rules.get('max_age') and _age_on(value, today) > rules['max_age']:
+            raise ValidationError(_message(rules, 'max_age', column))
+        return value
+
+    if field_type == 'number':
+        try:
+            value = int(float(raw))
+        except (TypeError, ValueError):
+            raise ValidationError(_message(rules, 'invalid', column))
+        max_value = rules.get('max_value')
+        if column == 'year_model' and max_value is None:
+            max_value = today.year + 1
+        if rules.get('min_value') is not None and value < rules['min_value']:
+            raise ValidationError(_message(rules, 'min_value', column))
+        if max_value is not None and value > max_value:
+            raise ValidationError(_message(rules, 'max_value', column))
+        return value
+
+    if choices is not None or rules.get('choices'):
+        options = choices or [(choice, choice) for choice in rules['choices']]
+        try:
+            return _choice(raw, options)
+        except ValueError:
+            raise ValidationError(_message(rules, 'invalid_choice', column))
+
+    # Spreadsheet cells holding numbers (CR/OR, ZIP) arrive as int/float.
+    if isinstance(raw, float) and raw.is_integer():
+        raw = int(raw)
+    value = str(raw).strip()
+    if column in UPPERCASE_COLUMNS:
+        value = value.upper()
+
+    if field_type == 'email':
+        try:
+            validate_email(value)
+        except ValidationError:
+            raise ValidationError(_message(rules, 'invalid', column))
+    if rules.get('length') and len(value) != rules['length']:
+        raise ValidationError(_message(rules, 'invalid', column))
+    if rules.get('min_length') and len(value) < rules['min_length']:
+        raise ValidationError(_message(rules, 'min_length', column))
+    if rules.get('max_length') and len(value) > rules['max_length']:
+        raise ValidationError(_message(rules, 'max_length', column))
+    if rules.get('pattern') and not re.match(rules['pattern'], value):
+        raise ValidationError(_message(rules, 'invalid', column))
+    return value
+
+
+# =============================================================================
+# ROW VALIDATION
+# =============================================================================
+def validate_rows(rows, today=None):
+    """
+    Clean every row and check uniqueness set-wise.
+    Returns ``(cleaned, errors)``: ``cleaned`` maps row number to the row's
+    values for rows without errors.
+    """
+    from .models import Route, Vehicle
+
+    today = today or date.today()
+    choices = {
+        'vehicle_type': Vehicle.VEHICLE_TYPES,
+        'ownership_type': Vehicle.OWNERSHIP_TYPES,
+    }
+    routes = {route.name.strip().lower(): route for route in Route.objects.filter(active=True)}
+
+    cleaned = {}
+    errors = []
+    for row_number, raw in rows:
+        values = {}
+        row_errors = []
+        for column in COLUMNS:
+            if column == 'route':
+                continue
+            try:
+                values[column] = clean_value(column, raw.get(column), today, choices.get(column))
+            except ValidationError as exc:
+                row_errors.append(RowError(row_number, column, raw.get(column), exc.messages[0]))
+
+        values['vehicle_name'] = values.get('vehicle_name') or "Unnamed Vehicle"
+        values['ownership_type'] = values.get('ownership_type') or 'owned'
+
+        route_name = str(raw.get('route') or '').strip()
+        values['route'] = None
+        if route_name:
+            values['route'] = routes.get(route_name.lower())
+            if values['route'] is None:
+                row_errors.append(RowError(row_number, 'route', route_name,
+                                           VEHICLE_VALIDATION_RULES['route']['error_messages']['invalid_choice']))
+
+        if not any(error.column in VEHICLE_COLUMNS for error in row_errors):
+            row_errors.extend(_model_errors(row_number, raw, values))
+
+        mobile, emergency = values.get('mobile_number'), values.get('emergency_contact_number')
+        if mobile and emergency and re.sub(r'\D', '', mobile) == re.sub(r'\D', '', emergency):
+            row_errors.append(RowError(row_number, 'emergency_contact_number', emergency,
+                                       _message(_rules('emergency_contact_number'), 'same_as_driver', 'emergency_contact_number')))
+
+        if row_errors:
+            errors.extend(row_errors)
+        else:
+            cleaned[row_number] = values
+
+    errors.extend(_uniqueness_errors(cleaned, rows))
+    for error in errors:
+        cleaned.pop(error.row, None)
+    return cleaned, sorted(errors, key=lambda error: (error.row, COLUMNS.index(error.column)))
+
+
+def _model_errors(row_number, raw, values):
+    """Vehicle.clean() on the row, so imported plates follow the same format as registered ones."""
+    from .models import Vehicle
+
+    vehicle = Vehicle(**{column: values[column] for column in VEHICLE_COLUMNS if column != 'route'})
+    try:
+        vehicle.clean()
+    except ValidationError as exc:
+        return [
+            RowError(row_number, column, raw.get(column), f"❌ {messages[0]}")
+            for column, messages in exc.message_dict.items()
+        ]
+    return []
+
+
+def _driver_key(values):
+    return values['license_number']
+
+
+def _uniqueness_errors(cleaned, rows):
+    from .models import Driver, Vehicle
+
+    errors = []
+    for model, columns in ((Driver, UNIQUE_DRIVER_COLUMNS), (Vehicle, UNIQUE_VEHICLE_COLUMNS)):
+        for column in columns:
+            rows_by_value = defaultdict(list)
+            for row_number, values in cleaned.items():
+                if values.get(column):
+                    rows_by_value[values[column]].append(row_number)
+
+            for value, row_numbers in rows_by_value.items():
+                if len(row_numbers) < 2:
+                    continue
+                if model is Driver:
+                    errors.extend(_shared_driver_errors(cleaned, column, row_numbers))
+                    continue
+                for row_number in row_numbers:
+                    others = ", ".join(str(n) for n in row_numbers if n != row_number)
+                    errors.append(RowError(row_number, column, value,
+                                           f"❌ Duplicate {column.replace('_', ' ')} in this file (also on row {others})."))
+
+            existing = _existing_values(model, column, list(rows_by_value))
+            unique_message = _message(_rules(column), 'unique', column)
+            for value in existing:
+                for row_number in rows_by_value[value]:
+                    errors.append(RowError(row_number, column, value, unique_message))
+    return errors
+
+
+def _shared_driver_errors(cleaned, column, row_numbers):
+    """Rows naming the same driver must agree on every driver column."""
+    first = row_numbers[0]
+    errors = []
+    for row_number in row_numbers[1:]:
+        for driver_column in DRIVER_COLUMNS:
+            if cleaned[row_number].get(driver_column) != cleaned[first].get(driver_column):
+                errors.append(RowError(
+                    row_number, driver_column, cleaned[row_number].get(driver_column),
+                    f"❌ Differs from row {first}, which has the same {column.replace('_', ' ')}.",
+                ))
+    return errors
+
+
+def _existing_values(model, column, values):
+    """One set-based lookup per column (chunked only for very large files)."""
+    existing = set()
+    for start in range(0, len(values), UNIQUE_LOOKUP_CHUNK):
+        chunk = values[start:start + UNIQUE_LOOKUP_CHUNK]
+        existing.update(model.objects.filter(**{f'{column}__in': chunk}).values_list(column, flat=True))
+    return existing
+
+
+# =============================================================================
+# IMPORT
+# =============================================================================
+def import_fleet(file_obj, filename, partial=False, dry_run=False, schedule_qr=True):
+    """
+    Validate and import a fleet sheet.
+
+    Nothing is written if any row fails, unless ``partial`` is set, in which
+    case the valid rows are imported and the rest reported. QR jobs are queued
+    for every new vehicle; ``schedule_qr=False`` leaves them for the caller
+    (e.g. ``qr_jobs.run_many`` across a process pool).
+    """
+    result = ImportResult()
+    rows = read_rows(file_obj, filename)
+    result.rows = len(rows)
+
+    cleaned, result.errors = validate_rows(rows)
+    result.valid_rows = len(cleaned)
+    if dry_run or not cleaned or (result.errors and not partial):
+        return result
+
+    with transaction.atomic():
+        _create_records(cleaned, result, schedule_qr)
+    result.committed = True
+    search.invalidate()
+    identifiers.invalidate()
+    return result
+
+
+def _create_records(cleaned, result, schedule_qr):
+    from terminal.models import TerminalFeeBalance
+
+    from .models import Driver, Vehicle, Wallet
+
+    drivers = {}
+    plates = defaultdict(list)
+    vehicles = []
+    for row_number in sorted(cleaned):
+        values = cleaned[row_number]
+        key = _driver_key(values)
+        driver = drivers.get(key)
+        if driver is None:
+            driver = drivers[key] = Driver(
+                driver_id=f"DRV-{uuid.uuid4().hex[:8].upper()}",
+                driver_photo=values['driver_photo'] or '',
+                **{column: values[column] for column in DRIVER_COLUMNS if column != 'driver_photo'},
+            )
+        vehicle = Vehicle(
+            assigned_driver=driver,
+            **{column: values[column] for column in VEHICLE_COLUMNS},
+        )
+        plates[key].append(vehicle.license_plate)
+        vehicles.append(vehicle)
+
+    for key, driver in drivers.items():
+        driver.search_document = search.driver_document(driver, plates[key])
+
+    # Signals do not fire for bulk_create: documents, wallets, fee balances
+    # and QR jobs are created here explicitly.
+    drivers = list(drivers.values())
+    Driver.objects.bulk_create(drivers, batch_size=BULK_BATCH_SIZE)
+    for vehicle in vehicles:
+        vehicle.search_document = search.vehicle_document(vehicle)
+    Vehicle.objects.bulk_create(vehicles, batch_size=BULK_BATCH_SIZE)
+
+    for vehicle in vehicles:
+        vehicle.qr_value = vehicle.build_qr_value()
+    Vehicle.objects.bulk_update(vehicles, ['qr_value'], batch_size=BULK_BATCH_SIZE)
+
+    Wallet.objects.bulk_create([Wallet(vehicle=vehicle) for vehicle in vehicles], batch_size=BULK_BATCH_SIZE)
+    TerminalFeeBalance.objects.bulk_create(
+        [TerminalFeeBalance(vehicle=vehicle) for vehicle in vehicles], batch_size=BULK_BATCH_SIZE
+    )
+    jobs = qr_jobs.enqueue_many(vehicles, schedule=schedule_qr)
+
+    result.drivers_created = len(drivers)
+    result.vehicles_created = len(vehicles)
+    result.vehicle_ids = [vehicle.pk for vehicle in vehicles]
+    result.qr_job_ids = [job.pk for job in jobs]
@@ -4,13 +4,49 @@ from django.core.exceptions import ValidationError
 from django.utils import timezone
 from datetime import date
 import re
+from . import identifiers
 from .models import Driver, Vehicle, Deposit, Wallet, Route
 
 
+class CombinedUniquenessMixin:
+    """
+    Checks every unique identifier of the form with one query
+    (``identifiers.taken_fields``) instead of one ``exists()`` per field;
+    the model's per-field unique checks are skipped for those fields.
+    """
+    identifier_kind = None
+
+    def unique_error(self, field, value):
+        """Message for a taken ``field``; forms override it for friendlier wording."""
+        label = self.fields[field].label or field.replace('_', ' ').capitalize()
+        return f"❌ {label} '{value}' is already registered."
+
+    def validate_unique(self):
+        fields = identifiers.UNIQUE_FIELDS[self.identifier_kind]
+        values = {field: self.cleaned_data.get(field) for field in fields if field not in self.errors}
+        for field in sorted(identifiers.taken_fields(self.identifier_kind, values, self.instance.pk)):
+            self.add_error(field, self.unique_error(field, values[field]))
+
+        exclude = self._get_validation_exclusions() | set(fields)
+        try:
+            self.instance.validate_unique(exclude=exclude)
+        except ValidationError as e:
+            self._update_errors(e)
+
+
 # ======================================================
 # VEHICLE REGISTRATION FORM - WITH SPECIFIC ERROR MESSAGES
 # ======================================================
-class VehicleRegistrationForm(forms.ModelForm):
+class VehicleRegistrationForm(CombinedUniquenessMixin, forms.ModelForm):
+    identifier_kind = 'vehicle'
+    IDENTIFIER_LABELS = {
+        'cr_number': 'CR number',
+        'or_number': 'OR number',
+        'vin_number': 'VIN',
+        'registration_number': 'Registration number',
+        'license_plate': 'License plate',
+    }
+
     class Meta:
         model = Vehicle
         fields = [
@@ -185,18 +221,6 @@ class VehicleRegistrationForm(forms.ModelForm):
         if not value.isdigit():
             raise ValidationError("❌ CR number must contain digits only (no spaces or special characters).")
         
-        # Check uniqueness excluding current instance
-        if self.instance.pk:
-            if Vehicle.objects.exclude(pk=self.instance.pk).filter(cr_number=value).exists():
-                raise ValidationError(
-                    f"❌ CR number '{value}' is already registered to another vehicle."
-                )
-        else:
-            if Vehicle.objects.filter(cr_number=value).exists():
-                raise ValidationError(
-                    f"❌ CR number '{value}' is already registered in the system."
-                )
-        
         return value
 
     def clean_or_number(self):
@@ -219,18 +243,6 @@ class VehicleRegistrationForm(forms.ModelForm):
         if not value.isdigit():
             raise ValidationError("❌ OR number must contain digits only (no spaces or special characters).")
         
-        # Check uniqueness
-        if self.instance.pk:
-            if Vehicle.objects.exclude(pk=self.instance.pk).filter(or_number=value).exists():
-                raise ValidationError(
-                    f"❌ OR number '{value}' is already registered to another vehicle."
-                )
-        else:
-            if Vehicle.objects.filter(or_number=value).exists():
-                raise ValidationError(
-                    f"❌ OR number '{value}' is already registered in the system."
-                )
-        
         return value
 
     def clean_vin_number(self):
@@ -251,18 +263,6 @@ class VehicleRegistrationForm(forms.ModelForm):
                 "❌ Invalid VIN format. VIN must contain 17 alphanumeric characters (excluding I, O, Q)."
             )
         
-        # Check uniqueness
-        if self.instance.pk:
-            if Vehicle.objects.exclude(pk=self.instance.pk).filter(vin_number=value).exists():
-                raise ValidationError(
-                    f"❌ VIN '{value}' is already registered to another vehicle."
-                )
-        else:
-            if Vehicle.objects.filter(vin_number=value).exists():
-                raise ValidationError(
-                    f"❌ VIN '{value}' is already registered in the system."
-                )
-        
         return value
 
     def clean_year_model(self):
@@ -365,18 +365,6 @@ class VehicleRegistrationForm(forms.ModelForm):
         
         # No pattern validation - accept any characters
         
-        # Check uniqueness
-        if self.instance.pk:
-            if Vehicle.objects.exclude(pk=self.instance.pk).filter(license_plate=value).exists():
-                raise ValidationError(
-                    f"❌ License plate '{value}' is already registered to another vehicle."
-                )
-        else:
-            if Vehicle.objects.filter(license_plate=value).exists():
-                raise ValidationError(
-                    f"❌ License plate '{value}' is already registered in the system."
-                )
-        
         return value
 
     def clean_registration_number(self):
@@ -398,20 +386,14 @@ class VehicleRegistrationForm(forms.ModelForm):
 
         # No pattern validation - accept any characters
         
-        # Check uniqueness
-        if self.instance.pk:
-            if Vehicle.objects.exclude(pk=self.instance.pk).filter(registration_number=value).exists():
-                raise ValidationError(
-                    f"❌ Registration number '{value}' is already registered to another vehicle."
-                )
-        else:
-            if Vehicle.objects.filter(registration_number=value).exists():
-                raise ValidationError(
-                    f"❌ Registration number '{value}' is already registered in the system."
-                )
-        
         return value
 
+    def unique_error(self, field, value):
+        label = self.IDENTIFIER_LABELS[field]
+        if self.instance.pk:
+            return f"❌ {label} '{value}' is already registered to another vehicle."
+        return f"❌ {label} '{value}' is already registered in the system."
+
     def clean(self):
         cleaned_data = super().clean()
         
@@ -435,7 +417,9 @@ class VehicleRegistrationForm(forms.ModelForm):
 # ======================================================
 # DRIVER REGISTRATION FORM - WITH SPECIFIC ERROR MESSAGES
 # ======================================================
-class DriverRegistrationForm(forms.ModelForm):
+class DriverRegistrationForm(CombinedUniquenessMixin, forms.ModelForm):
+    identifier_kind = 'driver'
+
     BLOOD_TYPE_CHOICES = [
         ('', 'Select Blood Type'),
         ('A+', 'A+'), ('A-', 'A-'),
@@ -585,12 +569,11 @@ class DriverRegistrationForm(forms.ModelForm):
         if len(normalized) < 5 or len(normalized) > 25:
             raise ValidationError("❌ License number must be between 5 and 25 characters long.")
     
-        exists = Driver.objects.exclude(pk=self.instance.pk).filter(license_number=normalized).exists() if self.instance.pk else Driver.objects.filter(license_number=normalized).exists()
-        if exists:
-            raise ValidationError("❌ Driver license number is already registered.")
-    
         return normalized
 
+    def unique_error(self, field, value):
+        return "❌ Driver license number is already registered."
+
     def clean(self):
         cleaned_data = super().clean()
         mobile = cleaned_data.get('mobile_number')
@@ -637,4 +620,28 @@ class DepositForm(forms.ModelForm):
 
     class Meta:
         model = Deposit
-        fields = ['amount']
\ No newline at end of file
+        fields = ['amount']
+
+
+# ======================================================
+# FLEET IMPORT FORM (admin upload, see vehicles.fleet_import)
+# ======================================================
+class FleetImportForm(forms.Form):
+    file = forms.FileField(
+        label="Fleet sheet (.csv or .xlsx)",
+        help_text="One vehicle per row, with its driver's columns on the same row.",
+    )
+    partial = forms.BooleanField(
+        required=False,
+        label="Import the valid rows even if some rows fail",
+    )
+    dry_run = forms.BooleanField(
+        required=False,
+        label="Validate only (do not import)",
+    )
+
+    def clean_file(self):
+        upload = self.cleaned_data['file']
+        if not upload.name.lower().endswith(('.csv', '.xlsx')):
+            raise ValidationError("❌ Upload a .csv or .xlsx file.")
+        return upload
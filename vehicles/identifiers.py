@@ -0,0 +1,122 @@
+"""
+Identifier Registry
+===================
+Uniqueness checks for the registration identifiers: CR, OR, VIN,
+registration number and plate for vehicles, and license number for
+drivers.
+
+``taken_fields()`` checks every identifier of a form in one query (an OR of
+the fields) instead of one ``exists()`` per field. It is used by the
+registration forms, and is authoritative.
+
+``is_taken()`` answers the live "already registered?" check the forms make
+on blur (``vehicles:check_identifier``). It reads an in-process registry of
+the normalized identifiers, so a check is a dict lookup. The registry is
+rebuilt with one query after ``invalidate()`` (called by
+``vehicles.signals``, ``services.update_vehicle`` and the fleet import) or
+after ``REGISTRY_TTL_SECONDS``, which bounds how stale it can get when
+another worker made the change. A stale answer is only a hint: the form
+check and the unique constraints still decide on submit.
+"""
+
+import time
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+
+REGISTRY_TTL_SECONDS = 60
+
+# Stored upper-cased by the registration forms.
+UNIQUE_FIELDS = {
+    'vehicle': ('cr_number', 'or_number', 'vin_number', 'registration_number', 'license_plate'),
+    'driver': ('license_number',),
+}
+
+
+def normalize(value):
+    return str(value or '').strip().upper()
+
+
+def _model(kind):
+    from .models import Driver, Vehicle
+
+    return {'vehicle': Vehicle, 'driver': Driver}[kind]
+
+
+# =============================================================================
+# FORM CHECK (one query)
+# =============================================================================
+def taken_fields(kind, values, exclude_pk=None):
+    """
+    Names of the fields in ``values`` (``{field: normalized value}``) whose
+    value already belongs to another record.
+    """
+    values = {field: value for field, value in values.items() if value and field in UNIQUE_FIELDS[kind]}
+    if not values:
+        return set()
+    matches = _model(kind).objects.filter(reduce(or_, (Q(**{field: value}) for field, value in values.items())))
+    if exclude_pk is not None:
+        matches = matches.exclude(pk=exclude_pk)
+
+    taken = set()
+    for row in matches.values_list(*values):
+        taken.update(field for field, existing in zip(values, row) if existing == values[field])
+    return taken
+
+
+# =============================================================================
+# LIVE CHECK (cached registry)
+# =============================================================================
+class IdentifierRegistry:
+    """``{field: {normalized value: pk}}`` for one model."""
+
+    def __init__(self, kind):
+        fields = UNIQUE_FIELDS[kind]
+        self.values = {field: {} for field in fields}
+        for pk, *row in _model(kind).objects.values_list('pk', *fields).iterator():
+            for field, value in zip(fields, row):
+                if value:
+                    self.values[field][normalize(value)] = pk
+        self.built_at = time.monotonic()
+
+    def owner(self, field, value):
+        return self.values[field].get(normalize(value))
+
+
+_registries = {}
+_registry_version = 0
+
+
+def invalidate():
+    """Called whenever an identifier may have changed."""
+    global _registry_version
+    _registry_version += 1
+
+
+def cached_registry(kind):
+    """The current registry for ``kind``, or None when it must be (re)built."""
+    cached = _registries.get(kind)
+    if (
+        cached
+        and cached[0] == _registry_version
+        and time.monotonic() - cached[1].built_at < REGISTRY_TTL_SECONDS
+    ):
+        return cached[1]
+    return None
+
+
+def registry(kind):
+    """The registry for ``kind``, rebuilt with one query if needed."""
+    current = cached_registry(kind)
+    if current is None:
+        version = _registry_version
+        current = IdentifierRegistry(kind)
+        _registries[kind] = (version, current)
+    return current
+
+
+def is_taken(kind, field, value, exclude_pk=None, current=None):
+    """Whether ``value`` is registered to a record other than ``exclude_pk``."""
+    owner = (current or registry(kind)).owner(field, value)
+    return owner is not None and owner != exclude_pk
@@ -0,0 +1,60 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from vehicles import ocr_benchmark
+
+
+class Command(BaseCommand):
+    help = "Time each license OCR stage and score field extraction on a synthetic corpus"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=50, help="Synthetic images to generate (default: 50)")
+        parser.add_argument("--seed", type=int, default=1, help="Corpus seed (default: 1)")
+        parser.add_argument("--corpus-dir", help="Use the corpus saved in this directory instead of generating one")
+        parser.add_argument("--save-corpus", help="Also write the generated corpus to this directory")
+        parser.add_argument(
+            "--max-dimension",
+            type=int,
+            default=None,
+            help="Override OCR_MAX_DIMENSION for this run",
+        )
+        parser.add_argument("--json", action="store_true", help="Print the raw report as JSON")
+
+    def handle(self, *args, **options):
+        if options["corpus_dir"]:
+            corpus = ocr_benchmark.load_corpus(options["corpus_dir"])
+        else:
+            corpus = ocr_benchmark.generate_corpus(options["count"], options["seed"])
+            if options["save_corpus"]:
+                ocr_benchmark.save_corpus(corpus, options["save_corpus"])
+                self.stdout.write(f"Saved {len(corpus)} images to {options['save_corpus']}.")
+
+        try:
+            import pytesseract
+        except ImportError:
+            raise CommandError("pytesseract is not installed.")
+        try:
+            report = ocr_benchmark.run_benchmark(
+                corpus,
+                max_dimension=options["max_dimension"] or settings.OCR_MAX_DIMENSION,
+                timeout=settings.OCR_TIMEOUT_SECONDS,
+                tesseract_cmd=settings.TESSERACT_CMD,
+            )
+        except pytesseract.TesseractNotFoundError:
+            raise CommandError(f"Tesseract not found at {settings.TESSERACT_CMD!r}; set TESSERACT_CMD.")
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(f"{report['images']} images, {report['failures']} failed\n")
+        self.stdout.write(f"{'stage':<12}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+        for stage, times in list(report["stages"].items()) + [("total", report["total"])]:
+            self.stdout.write(f"{stage:<12}{times['mean']:>10.1f}{times['p50']:>10.1f}{times['p95']:>10.1f}")
+
+        self.stdout.write(f"\n{'field':<16}{'accuracy':>10}")
+        for field, accuracy in report["fields"].items():
+            self.stdout.write(f"{field:<16}{accuracy:>10.0%}")
+        self.stdout.write(self.style.SUCCESS(f"\nAll fields correct on {report['exact']:.0%} of images."))
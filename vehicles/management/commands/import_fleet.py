@@ -0,0 +1,78 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from vehicles import fleet_import, qr_jobs
+
+
+class Command(BaseCommand):
+    help = "Register drivers and vehicles in bulk from a CSV or XLSX sheet"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or XLSX file, one vehicle (with its driver) per row")
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Validate only; write nothing",
+        )
+        parser.add_argument(
+            "--partial",
+            action="store_true",
+            help="Import the valid rows even if some rows fail",
+        )
+        parser.add_argument(
+            "--report",
+            default=None,
+            help="Write the per-row error report to this CSV file",
+        )
+        parser.add_argument(
+            "--qr-processes",
+            type=int,
+            default=None,
+            help="Processes for QR rendering (default: one per CPU)",
+        )
+        parser.add_argument(
+            "--no-qr",
+            action="store_true",
+            help="Leave the QR jobs pending for `manage.py process_qr_jobs`",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        try:
+            with open(path, "rb") as handle:
+                result = fleet_import.import_fleet(
+                    handle,
+                    os.path.basename(path),
+                    partial=options["partial"],
+                    dry_run=options["dry_run"],
+                    schedule_qr=False,
+                )
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+
+        for error in result.errors:
+            self.stdout.write(f"row {error.row} · {error.column}: {error.message}")
+        if options["report"]:
+            with open(options["report"], "w", newline="", encoding="utf-8") as report:
+                result.write_error_report(report)
+            self.stdout.write(f"Error report written to {options['report']}")
+
+        self.stdout.write(
+            f"{result.rows} rows read, {result.valid_rows} valid, "
+            f"{len(result.error_rows)} with errors."
+        )
+        if not result.committed:
+            if options["dry_run"]:
+                self.stdout.write("[dry run] nothing imported.")
+            elif result.errors:
+                self.stdout.write(self.style.WARNING("Nothing imported; fix the rows above or use --partial."))
+            return
+
+        if not options["no_qr"] and result.qr_job_ids:
+            rendered = qr_jobs.run_many(result.qr_job_ids, processes=options["qr_processes"])
+            self.stdout.write(f"Rendered and uploaded {rendered} QR codes.")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result.drivers_created} drivers and {result.vehicles_created} vehicles."
+        ))
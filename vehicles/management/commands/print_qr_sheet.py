@@ -0,0 +1,81 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from vehicles import qr_sheets
+from vehicles.models import Route
+
+
+class Command(BaseCommand):
+    help = "Write a printable sheet of vehicle QR stickers (PDF, or a ZIP of PNG pages)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="File to write, e.g. route-a.pdf")
+        parser.add_argument("--route", help="Route id or name")
+        parser.add_argument(
+            "--driver",
+            type=int,
+            action="append",
+            default=[],
+            help="Driver id (repeatable)",
+        )
+        parser.add_argument(
+            "--vehicle",
+            type=int,
+            action="append",
+            default=[],
+            help="Vehicle id (repeatable)",
+        )
+        parser.add_argument(
+            "--format",
+            choices=sorted(qr_sheets.FORMATS),
+            default=qr_sheets.DEFAULT_FORMAT,
+        )
+        parser.add_argument(
+            "--page",
+            choices=sorted(qr_sheets.PAGE_SIZES),
+            default=qr_sheets.DEFAULT_PAGE,
+        )
+        parser.add_argument("--columns", type=int, default=qr_sheets.DEFAULT_COLUMNS)
+        parser.add_argument("--rows", type=int, default=qr_sheets.DEFAULT_ROWS)
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=None,
+            help="Render processes (default: QR_SHEETS_PROCESSES, or one per CPU core)",
+        )
+
+    def _route_id(self, value):
+        if not value:
+            return None
+        if value.isdigit():
+            return int(value)
+        route = Route.objects.filter(name__iexact=value.strip()).first()
+        if route is None:
+            raise CommandError(f"Unknown route: {value}")
+        return route.pk
+
+    def handle(self, *args, **options):
+        try:
+            layout = qr_sheets.SheetLayout.build(options["page"], options["columns"], options["rows"])
+            selection = qr_sheets.select_stickers(
+                route_id=self._route_id(options["route"]),
+                driver_ids=options["driver"],
+                vehicle_ids=options["vehicle"],
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        stats = {}
+        with open(options["output"], "wb") as output:
+            for chunk in qr_sheets.generate(
+                qr_sheets.iter_stickers(selection),
+                options["format"],
+                layout,
+                processes=options["processes"],
+                stats=stats,
+            ):
+                output.write(chunk)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {stats['stickers']} QR stickers on {stats['pages']} pages to "
+            f"{options['output']} in {stats['seconds']:.2f}s."
+        ))
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from vehicles import qr_jobs
+
+
+class Command(BaseCommand):
+    help = "Render and upload pending vehicle QR images"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep polling for due jobs instead of exiting",
+        )
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=5,
+            help="Seconds between polls with --loop (default: 5)",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=None,
+            help="Maximum jobs to run per poll",
+        )
+        parser.add_argument(
+            "--backfill",
+            action="store_true",
+            help="First queue vehicles that have no QR image yet",
+        )
+
+    def handle(self, *args, **options):
+        if options["backfill"]:
+            queued = qr_jobs.enqueue_missing(schedule=False)
+            self.stdout.write(f"Queued {queued} vehicles without a QR image.")
+
+        while True:
+            processed = qr_jobs.process_due(limit=options["limit"])
+            if processed:
+                self.stdout.write(f"Processed {processed} QR jobs.")
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+
+        self.stdout.write(self.style.SUCCESS("QR job queue drained."))
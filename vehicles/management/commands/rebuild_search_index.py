@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from vehicles import search
+
+
+class Command(BaseCommand):
+    help = "Recompute the search documents of every vehicle and driver"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        updated = search.rebuild_all(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Search index rebuilt ({updated} documents changed)."))
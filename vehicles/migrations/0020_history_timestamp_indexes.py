@@ -0,0 +1,17 @@
+# Generated by Django 5.0.7 on 2026-10-19 04:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0019_alter_driver_driver_photo_alter_vehicle_qr_code'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='queuehistory',
+            index=models.Index(fields=['timestamp'], name='vehicles_qu_timesta_5c6b4d_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.7 on 2026-10-19 04:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0020_history_timestamp_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='deposit',
+            index=models.Index(fields=['created_at', 'id'], name='vehicles_de_created_07f3c4_idx'),
+        ),
+    ]
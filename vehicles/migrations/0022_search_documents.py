@@ -0,0 +1,81 @@
+# Generated by Django 5.0.7 on 2026-10-19 04:24
+
+from django.db import migrations, models
+
+
+TRIGRAM_INDEXES = (
+    ("vehicles_vehicle_search_trgm", "vehicles_vehicle"),
+    ("vehicles_driver_search_trgm", "vehicles_driver"),
+)
+
+
+def populate_search_documents(apps, schema_editor):
+    from vehicles.search import driver_document, vehicle_document
+
+    Vehicle = apps.get_model("vehicles", "Vehicle")
+    Driver = apps.get_model("vehicles", "Driver")
+
+    vehicles = list(Vehicle.objects.select_related("assigned_driver"))
+    for vehicle in vehicles:
+        vehicle.search_document = vehicle_document(vehicle)
+    Vehicle.objects.bulk_update(vehicles, ["search_document"], batch_size=500)
+
+    drivers = list(Driver.objects.prefetch_related("vehicles"))
+    for driver in drivers:
+        driver.search_document = driver_document(
+            driver, [vehicle.license_plate for vehicle in driver.vehicles.all()]
+        )
+    Driver.objects.bulk_update(drivers, ["search_document"], batch_size=500)
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """GIN trigram indexes on PostgreSQL; skipped if pg_trgm cannot be enabled."""
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+
+    from django.db import DatabaseError, transaction
+
+    try:
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except DatabaseError:
+        return
+
+    with connection.cursor() as cursor:
+        for index_name, table in TRIGRAM_INDEXES:
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {index_name} "
+                f"ON {table} USING gin (search_document gin_trgm_ops)"
+            )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+    with connection.cursor() as cursor:
+        for index_name, _ in TRIGRAM_INDEXES:
+            cursor.execute(f"DROP INDEX IF EXISTS {index_name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0021_deposit_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='driver',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='vehicle',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(populate_search_documents, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
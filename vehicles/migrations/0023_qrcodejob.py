@@ -0,0 +1,34 @@
+# Generated by Django 5.0.7 on 2026-10-19 04:31
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0022_search_documents'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QRCodeJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('qr_value', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('vehicle', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='qr_job', to='vehicles.vehicle')),
+            ],
+            options={
+                'verbose_name': 'QR Code Job',
+                'verbose_name_plural': 'QR Code Jobs',
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='vehicles_qr_status_07d26e_idx')],
+            },
+        ),
+    ]
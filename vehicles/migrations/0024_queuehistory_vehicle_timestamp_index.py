@@ -0,0 +1,17 @@
+# Generated by Django 5.0.7 on 2026-10-19 05:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0023_qrcodejob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='queuehistory',
+            index=models.Index(fields=['vehicle', '-timestamp'], name='vehicles_qu_vehicle_f6173a_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.7 on 2026-10-19 06:06
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0024_queuehistory_vehicle_timestamp_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='queuehistory',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -1,20 +1,18 @@
 import re
 import uuid
-import qrcode
 from decimal import Decimal
-from io import BytesIO
 
 from django.core.files import File
 from django.core.exceptions import ValidationError
 from django.db import models, transaction
 from django.db.models import F
-from django.db.models.signals import post_save
-from django.dispatch import receiver
+from django.urls import reverse
 from django.utils import timezone
 
 from django.core.files.base import ContentFile
 from cloudinary.models import CloudinaryField
-import cloudinary.uploader
+
+from . import qr_jobs, search
 
 # ======================================================
 # ROUTE MODEL
@@ -97,6 +95,9 @@ class Driver(models.Model):
     emergency_contact_number = models.CharField(max_length=20, blank=True, null=True)
     emergency_contact_relationship = models.CharField(max_length=50, blank=True, null=True)
 
+    # Normalized name/license/plate text for vehicles.search (kept by signals)
+    search_document = models.TextField(blank=True, default="", editable=False)
+
     # -----------------------------
     # VALIDATION
     # -----------------------------
@@ -199,6 +200,9 @@ class Vehicle(models.Model):
     date_registered = models.DateTimeField(auto_now_add=True)
     last_updated = models.DateTimeField(auto_now=True)
 
+    # Normalized plate/VIN/driver text for vehicles.search (kept by signals)
+    search_document = models.TextField(blank=True, default="", editable=False)
+
     # --------------------------------------------------
     # VALIDATION
     # --------------------------------------------------
@@ -229,30 +233,42 @@ class Vehicle(models.Model):
     # --------------------------------------------------
     # SAVE & QR GENERATION
     # --------------------------------------------------
-    def save(self, *args, **kwargs):
-        creating = self.pk is None
-        super().save(*args, **kwargs)
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Remember the loaded values so edits can write only what changed
+        # (vehicles.services.update_vehicle) and signals can skip lookups.
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
 
-        expected_qr_value = f"VEH-{self.id}-{self.license_plate}".replace(" ", "-").upper()
+    def build_qr_value(self):
+        return f"VEH-{self.id}-{self.license_plate}".replace(" ", "-").upper()
 
-        if creating or self.qr_value != expected_qr_value:
-            self.qr_value = expected_qr_value
+    def save(self, *args, **kwargs):
+        creating = self.pk is None
+        qr_changed = False
+        if not creating:
+            previous_qr_value = self.qr_value
+            self.qr_value = self.build_qr_value()
+            qr_changed = self.qr_value != previous_qr_value
+            if qr_changed and kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "qr_value"}
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None and not search.VEHICLE_DOCUMENT_FIELDS.isdisjoint(update_fields):
+                # Recomputed by the pre_save receiver (vehicles.signals)
+                kwargs["update_fields"] = {*update_fields, "search_document"}
 
-            qr_img = qrcode.make(self.qr_value)
-            buffer = BytesIO()
-            qr_img.save(buffer, format="PNG")
+        super().save(*args, **kwargs)
 
-            upload_result = cloudinary.uploader.upload(
-                buffer.getvalue(),
-                folder="vehicles/qrcodes",
-                public_id=f"vehicle_{self.id}_qr",
-                overwrite=True,
-                resource_type="image",
-                format="png",
-            )
+        if creating:
+            # The value embeds the new id: write it with a plain UPDATE rather
+            # than a second save(), so post_save receivers fire only once.
+            self.qr_value = self.build_qr_value()
+            Vehicle.objects.filter(pk=self.pk).update(qr_value=self.qr_value)
 
-            self.qr_code = upload_result.get("public_id")
-            super().save(update_fields=["qr_code", "qr_value"])
+        if creating or qr_changed:
+            # Image rendering/upload happens in the background (vehicles.qr_jobs)
+            qr_jobs.enqueue(self)
 
     @property
     def qr_code_url(self):
@@ -267,11 +283,56 @@ class Vehicle(models.Model):
             return qr_value
         return None
 
+    @property
+    def qr_image_url(self):
+        """Locally rendered QR (vehicles.qr_render); available as soon as qr_value is set."""
+        if not self.qr_value:
+            return None
+        return reverse('vehicles:qr_image', args=[self.qr_value])
+
     def __str__(self):
         route_display = str(self.route) if self.route else "No Route"
         return f"{self.vehicle_name} ({self.license_plate}) – {route_display}"
 
 
+# ======================================================
+# QR CODE JOBS
+# ======================================================
+class QRCodeJob(models.Model):
+    """Pending render/upload of a vehicle's QR image (see vehicles.qr_jobs)."""
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    vehicle = models.OneToOneField(Vehicle, on_delete=models.CASCADE, related_name='qr_job')
+    qr_value = models.CharField(max_length=255)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "QR Code Job"
+        verbose_name_plural = "QR Code Jobs"
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"QR for {self.qr_value} – {self.get_status_display()}"
+
+
 # ======================================================
 # WALLET MODEL
 # ======================================================
@@ -329,6 +390,12 @@ class Deposit(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of deposit history: (created_at, id)
+            models.Index(fields=['created_at', 'id']),
+        ]
+
     def save(self, *args, **kwargs):
         is_new = self.pk is None
 
@@ -359,23 +426,17 @@ class QueueHistory(models.Model):
     action = models.CharField(max_length=10, choices=ACTION_CHOICES)
     fee_charged = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
 
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: offline gate scans are recorded at their scan time.
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     departure_time_snapshot = models.DateTimeField(blank=True, null=True)
     wallet_balance_snapshot = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['timestamp']),
+            models.Index(fields=['vehicle', '-timestamp']),
+        ]
 
     def __str__(self):
         return f"{self.vehicle} – {self.get_action_display()} @ {self.timestamp}"
-
-
-# ======================================================
-# SIGNALS
-# ======================================================
-@receiver(post_save, sender=Vehicle)
-def create_wallet_for_vehicle(sender, instance, created, **kwargs):
-    if created:
-        Wallet.objects.create(vehicle=instance)
-    else:
-        Wallet.objects.get_or_create(vehicle=instance)
\ No newline at end of file
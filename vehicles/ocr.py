@@ -0,0 +1,375 @@
+"""
+License OCR
+===========
+Reads driver's license fields from a camera frame without tying up the web
+server. Each scan runs in a bounded process pool (OCR_PROCESSES):
+
+- Oversized frames are cropped to the card's aspect ratio and downscaled
+  to OCR_MAX_DIMENSION before any filtering, so filter cost is bounded.
+- Tesseract is killed after OCR_TIMEOUT_SECONDS.
+- At most OCR_QUEUE_DEPTH scans wait behind the running ones; ``submit()``
+  returns None beyond that and the API answers 429.
+- Results are cached by a hash of the image bytes (OCR_CACHE_MAX_ENTRIES,
+  OCR_CACHE_TTL_SECONDS), so a re-submitted photo skips the pipeline.
+
+``python manage.py benchmark_ocr`` times each pipeline stage and scores
+field extraction on a synthetic license corpus (see ``ocr_benchmark``).
+
+Jobs live in this process's memory: ``submit()`` returns a job id,
+``get_job()`` reports on it until OCR_RESULT_TTL_SECONDS after it ends.
+This suits the single daphne process the app runs as (see Procfile).
+"""
+
+import base64
+import binascii
+import hashlib
+import logging
+import multiprocessing
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# ID-1 card (85.60 x 53.98 mm), the size of a Philippine driver's license.
+CARD_ASPECT = 85.60 / 53.98
+# Frames within this ratio of the card aspect are not cropped.
+CROP_TOLERANCE = 1.1
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+# =============================================================================
+# INPUT
+# =============================================================================
+def decode_image_data(image_data):
+    """Image bytes from a ``data:image/...;base64,`` URL (or bare base64)."""
+    if not image_data:
+        raise ValueError("No image data provided.")
+    _, _, encoded = image_data.rpartition(";base64,")
+    # Reject oversized uploads before decoding them.
+    if len(encoded) * 3 // 4 > settings.OCR_MAX_IMAGE_BYTES:
+        raise ValueError("Image is too large.")
+    try:
+        return base64.b64decode(encoded, validate=True)
+    except (binascii.Error, ValueError):
+        raise ValueError("Image data is not valid base64.")
+
+
+# =============================================================================
+# WORKER SIDE
+# =============================================================================
+def crop_and_downscale(image, max_dimension):
+    """Centre-crop a camera frame to the card's aspect ratio, then shrink it."""
+    import cv2
+
+    height, width = image.shape[:2]
+    aspect = width / height
+    if aspect > CARD_ASPECT * CROP_TOLERANCE:
+        crop_width = int(height * CARD_ASPECT)
+        left = (width - crop_width) // 2
+        image = image[:, left:left + crop_width]
+    elif aspect < CARD_ASPECT / CROP_TOLERANCE:
+        crop_height = int(width / CARD_ASPECT)
+        top = (height - crop_height) // 2
+        image = image[top:top + crop_height, :]
+
+    height, width = image.shape[:2]
+    scale = max_dimension / max(height, width)
+    if scale < 1:
+        image = cv2.resize(image, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+    return image
+
+
+def extract_fields(raw_text):
+    """License fields parsed from Tesseract's raw text."""
+    text = re.sub(r'[^A-Za-z0-9\s:/-]', ' ', raw_text).upper()
+
+    license_number = re.search(r'([A-Z]{1,2}\d{2,3}-\d{2}-\d{6,7})', text)
+    if not license_number:
+        license_number = re.search(r'(?:[A-Z]{3}-?\d{6,7})', text)
+
+    name_match = re.search(r'([A-Z]+),\s*([A-Z]+)\s*([A-Z]*)', text)
+    birthdate = re.search(r'(\d{4}/\d{2}/\d{2})', text)
+    expiry = re.search(r'(\d{4}/\d{2}/\d{2})', text)
+
+    return {
+        'license_number': license_number.group(0) if license_number else '',
+        'last_name': name_match.group(1).title() if name_match else '',
+        'first_name': name_match.group(2).title() if name_match else '',
+        'middle_name': name_match.group(3).title() if name_match and name_match.group(3) else '',
+        'birth_date': birthdate.group(0) if birthdate else '',
+        'license_expiry': expiry.group(0) if expiry else '',
+    }
+
+
+STAGES = ("decode", "crop", "filter", "threshold", "tesseract", "extract")
+
+
+class _StageTimer:
+    """Adds each stage's wall time (seconds) to ``timings`` when given one."""
+
+    def __init__(self, timings):
+        self.timings = timings
+        self.started = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        if self.timings is not None:
+            self.timings[stage] = self.timings.get(stage, 0.0) + now - self.started
+        self.started = now
+
+
+def run_ocr(image_bytes, max_dimension, timeout, tesseract_cmd, timings=None):
+    """
+    Decode, crop/downscale, threshold and OCR one frame (runs in a worker).
+    ``timings``, if given, receives the seconds spent in each of ``STAGES``.
+    """
+    import cv2
+    import numpy as np
+    import pytesseract
+
+    timer = _StageTimer(timings)
+    image = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Could not read the image.")
+    timer.lap("decode")
+
+    image = crop_and_downscale(image, max_dimension)
+    timer.lap("crop")
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    gray = cv2.bilateralFilter(gray, 11, 17, 17)
+    timer.lap("filter")
+    _, thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY)
+    timer.lap("threshold")
+
+    if tesseract_cmd:
+        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+    try:
+        raw_text = pytesseract.image_to_string(thresh, timeout=timeout)
+    except RuntimeError as exc:  # pytesseract's timeout error
+        raise ValueError(f"OCR timed out after {timeout}s.") from exc
+    timer.lap("tesseract")
+
+    fields = extract_fields(raw_text)
+    timer.lap("extract")
+    return fields
+
+
+# =============================================================================
+# RESULT CACHE
+# =============================================================================
+def image_key(image_bytes):
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+class ResultCache:
+    """
+    Thread-safe LRU of extracted fields keyed by the image's SHA-256,
+    bounded by entry count and age. Re-submitting the same photo (e.g.
+    after a form error) returns the earlier fields without rerunning OCR.
+    """
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and time.monotonic() - item[0] > self.ttl_seconds:
+                del self._items[key]
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return dict(item[1])
+
+    def put(self, key, result):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._items.pop(key, None)
+            self._items[key] = (time.monotonic(), dict(result))
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+_cache = None
+
+
+def get_cache():
+    global _cache
+    with _lock:
+        if _cache is None:
+            _cache = ResultCache(settings.OCR_CACHE_MAX_ENTRIES, settings.OCR_CACHE_TTL_SECONDS)
+        return _cache
+
+
+# =============================================================================
+# JOB QUEUE (web process side)
+# =============================================================================
+class OCRJob:
+    def __init__(self, future, owner_id=None):
+        self.id = uuid.uuid4().hex
+        self.future = future
+        self.owner_id = owner_id
+        self.submitted_at = time.monotonic()
+        self.finished_at = None
+
+    @property
+    def status(self):
+        if not self.future.done():
+            return STATUS_RUNNING if self.future.running() else STATUS_PENDING
+        if self.future.cancelled() or self.future.exception() is not None:
+            return STATUS_FAILED
+        return STATUS_DONE
+
+    def as_dict(self):
+        data = {'job_id': self.id, 'status': self.status}
+        if data['status'] == STATUS_DONE:
+            data['result'] = self.future.result()
+        elif data['status'] == STATUS_FAILED:
+            data['error'] = error_message(self.future)
+        return data
+
+
+def error_message(future):
+    try:
+        exc = future.exception()
+    except CancelledError:
+        return "OCR was cancelled."
+    if isinstance(exc, ValueError):
+        return str(exc)
+    if isinstance(exc, BrokenProcessPool):
+        return "OCR worker stopped unexpectedly. Please try again."
+    logger.error("License OCR failed", exc_info=exc)
+    return "OCR failed. Please try again."
+
+
+_executor = None
+_jobs = {}
+# Image key -> future of the scan already running for that image.
+_in_flight = {}
+_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        # "spawn": workers must not inherit the web server's threads/sockets.
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.OCR_PROCESSES,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def _on_done(key):
+    def callback(future):
+        finished_at = time.monotonic()
+        with _lock:
+            _in_flight.pop(key, None)
+            for job in _jobs.values():
+                if job.future is future:
+                    job.finished_at = finished_at
+        if future.cancelled():
+            return
+        exc = future.exception()
+        if exc is None:
+            get_cache().put(key, future.result())
+        elif isinstance(exc, BrokenProcessPool):
+            _reset_executor()
+    return callback
+
+
+def _reset_executor():
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def _prune():
+    """Forget finished jobs whose results have expired."""
+    cutoff = time.monotonic() - settings.OCR_RESULT_TTL_SECONDS
+    for job_id in [job_id for job_id, job in _jobs.items()
+                   if job.finished_at is not None and job.finished_at < cutoff]:
+        del _jobs[job_id]
+
+
+def queue_depth():
+    """Scans submitted but not finished (running + waiting)."""
+    return len(_in_flight)
+
+
+def _add_job(future, owner_id):
+    job = OCRJob(future, owner_id)
+    if future.done():
+        job.finished_at = time.monotonic()
+    _jobs[job.id] = job
+    return job
+
+
+def submit(image_bytes, owner_id=None):
+    """
+    Queue one scan. Returns the ``OCRJob``, or None when the pool is saturated.
+    A cached result comes back as an already finished job, and an image
+    that is being scanned right now shares that scan.
+    """
+    key = image_key(image_bytes)
+    cached = get_cache().get(key)
+    with _lock:
+        _prune()
+        if cached is not None:
+            future = Future()
+            future.set_result(cached)
+            return _add_job(future, owner_id)
+        if key in _in_flight:
+            return _add_job(_in_flight[key], owner_id)
+        if queue_depth() >= settings.OCR_PROCESSES + settings.OCR_QUEUE_DEPTH:
+            return None
+        future = _get_executor().submit(
+            run_ocr,
+            image_bytes,
+            settings.OCR_MAX_DIMENSION,
+            settings.OCR_TIMEOUT_SECONDS,
+            settings.TESSERACT_CMD,
+        )
+        _in_flight[key] = future
+        job = _add_job(future, owner_id)
+    future.add_done_callback(_on_done(key))
+    return job
+
+
+def get_job(job_id, owner_id=None):
+    """The job, if it exists and was submitted by ``owner_id``."""
+    with _lock:
+        _prune()
+        job = _jobs.get(job_id)
+    if job is None or job.owner_id != owner_id:
+        return None
+    return job
@@ -0,0 +1,191 @@
+"""
+OCR Benchmark Corpus
+====================
+Synthetic driver's license photos with known field values, for judging
+changes to the OCR pipeline (``vehicles.ocr``) on speed and accuracy.
+
+``generate_corpus()`` draws license cards with random names, license
+numbers and dates. Each card is placed in a camera-sized frame with a
+slight tilt, blur and sensor noise, then JPEG-encoded. The same seed always
+gives the same corpus. ``save_corpus()`` / ``load_corpus()`` keep a corpus
+on disk so several runs see identical images.
+
+``run_benchmark()`` sends every image through ``ocr.run_ocr`` in-process.
+It reports the time spent in each stage, and per-field and whole-card
+accuracy of the existing extraction regexes against the known values.
+Used by ``python manage.py benchmark_ocr``.
+"""
+
+import json
+import os
+import random
+import statistics
+from datetime import date, timedelta
+from io import BytesIO
+
+from . import ocr
+
+CARD_SIZE = (1012, 638)  # ID-1 card at ~300 DPI
+FRAME_SIZE = (1920, 1080)  # typical webcam/phone frame
+JPEG_QUALITY = 85
+FIELDS = ('license_number', 'last_name', 'first_name', 'middle_name', 'birth_date', 'license_expiry')
+
+LAST_NAMES = ['Cruz', 'Santos', 'Reyes', 'Garcia', 'Mendoza', 'Torres', 'Flores', 'Ramos', 'Aquino', 'Bautista']
+FIRST_NAMES = ['Juan', 'Maria', 'Jose', 'Ana', 'Mark', 'Grace', 'Paolo', 'Liza', 'Ramon', 'Joy']
+MIDDLE_NAMES = ['Lopez', 'Diaz', 'Castro', 'Rivera', 'Navarro', 'Villanueva', 'Dela', 'Gomez']
+
+
+# =============================================================================
+# CORPUS
+# =============================================================================
+def _random_truth(rng):
+    birth = date(1960, 1, 1) + timedelta(days=rng.randrange(365 * 45))
+    expiry = date(2025, 1, 1) + timedelta(days=rng.randrange(365 * 10))
+    letter = rng.choice('ABCDEFGHJKLMNPR')
+    return {
+        'license_number': f"{letter}{rng.randrange(100):02d}-{rng.randrange(100):02d}-{rng.randrange(10 ** 6):06d}",
+        'last_name': rng.choice(LAST_NAMES),
+        'first_name': rng.choice(FIRST_NAMES),
+        'middle_name': rng.choice(MIDDLE_NAMES),
+        'birth_date': birth.strftime('%Y/%m/%d'),
+        'license_expiry': expiry.strftime('%Y/%m/%d'),
+    }
+
+
+def _draw_card(truth, rng):
+    from PIL import Image, ImageDraw, ImageFont
+
+    card = Image.new("RGB", CARD_SIZE, (236, 240, 232))
+    draw = ImageDraw.Draw(card)
+    draw.rectangle([0, 0, CARD_SIZE[0], 110], fill=(30, 64, 140))
+    header = ImageFont.load_default(size=30)
+    label = ImageFont.load_default(size=18)
+    value = ImageFont.load_default(size=34)
+
+    draw.text((40, 18), "REPUBLIC OF THE PHILIPPINES", fill=(255, 255, 255), font=header)
+    draw.text((40, 60), "LAND TRANSPORTATION OFFICE", fill=(255, 255, 255), font=header)
+    draw.rectangle([40, 140, 250, 400], outline=(120, 120, 120), width=3)  # photo box
+
+    rows = [
+        ("Last Name, First Name, Middle Name",
+         f"{truth['last_name']}, {truth['first_name']} {truth['middle_name']}".upper()),
+        ("Date of Birth", truth['birth_date']),
+        ("License No.", truth['license_number']),
+        ("Expiration Date", truth['license_expiry']),
+    ]
+    top = 140
+    for caption, text in rows:
+        draw.text((290, top), caption, fill=(90, 90, 90), font=label)
+        draw.text((290, top + 22), text, fill=(15, 15, 15), font=value)
+        top += 110 + rng.randrange(-6, 7)
+    return card
+
+
+def _photograph(card, rng):
+    """Place the card in a camera frame with tilt, blur and noise."""
+    from PIL import Image, ImageFilter
+
+    frame = Image.new("RGB", FRAME_SIZE, tuple(rng.randrange(60, 120) for _ in range(3)))
+    tilted = card.rotate(rng.uniform(-2.5, 2.5), expand=True, fillcolor=frame.getpixel((0, 0)))
+    scale = rng.uniform(0.85, 1.0) * FRAME_SIZE[1] * 0.8 / card.height
+    tilted = tilted.resize((int(tilted.width * scale), int(tilted.height * scale)), Image.BILINEAR)
+    frame.paste(tilted, ((frame.width - tilted.width) // 2 + rng.randrange(-40, 41),
+                         (frame.height - tilted.height) // 2 + rng.randrange(-30, 31)))
+    frame = frame.filter(ImageFilter.GaussianBlur(rng.uniform(0.3, 1.2)))
+    noise = Image.effect_noise(frame.size, rng.uniform(4, 12)).convert("RGB")
+    frame = Image.blend(frame, noise, 0.06)
+
+    buffer = BytesIO()
+    frame.save(buffer, format="JPEG", quality=JPEG_QUALITY)
+    return buffer.getvalue()
+
+
+def generate_corpus(count=50, seed=1):
+    """``[(jpeg_bytes, truth_fields)]``; deterministic for a given seed."""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(count):
+        truth = _random_truth(rng)
+        corpus.append((_photograph(_draw_card(truth, rng), rng), truth))
+    return corpus
+
+
+def save_corpus(corpus, directory):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "truth.jsonl"), "w", encoding="utf-8") as manifest:
+        for index, (image_bytes, truth) in enumerate(corpus):
+            name = f"license-{index:04d}.jpg"
+            with open(os.path.join(directory, name), "wb") as image_file:
+                image_file.write(image_bytes)
+            manifest.write(json.dumps({"image": name, **truth}) + "\n")
+
+
+def load_corpus(directory):
+    corpus = []
+    with open(os.path.join(directory, "truth.jsonl"), encoding="utf-8") as manifest:
+        for line in manifest:
+            entry = json.loads(line)
+            with open(os.path.join(directory, entry.pop("image")), "rb") as image_file:
+                corpus.append((image_file.read(), entry))
+    return corpus
+
+
+# =============================================================================
+# BENCHMARK
+# =============================================================================
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def _normalize(value):
+    return " ".join(str(value or "").upper().split())
+
+
+def run_benchmark(corpus, max_dimension, timeout, tesseract_cmd):
+    """
+    Run every image through the OCR pipeline in this process.
+
+    Returns ``{'images', 'failures', 'stages': {stage: {mean, p50, p95}}
+    (milliseconds), 'total': {...}, 'fields': {field: accuracy},
+    'exact': accuracy}``; accuracies are fractions of the corpus.
+    """
+    stage_times = {stage: [] for stage in ocr.STAGES}
+    totals = []
+    correct = dict.fromkeys(FIELDS, 0)
+    exact = failures = 0
+
+    for image_bytes, truth in corpus:
+        timings = {}
+        try:
+            fields = ocr.run_ocr(image_bytes, max_dimension, timeout, tesseract_cmd, timings=timings)
+        except ValueError:
+            failures += 1
+            fields = {}
+        for stage, seconds in timings.items():
+            stage_times[stage].append(seconds * 1000)
+        totals.append(sum(timings.values()) * 1000)
+
+        matched = [field for field in FIELDS if _normalize(fields.get(field)) == _normalize(truth[field])]
+        for field in matched:
+            correct[field] += 1
+        exact += len(matched) == len(FIELDS)
+
+    def summary(values):
+        if not values:
+            return {'mean': 0.0, 'p50': 0.0, 'p95': 0.0}
+        return {
+            'mean': statistics.fmean(values),
+            'p50': _percentile(values, 0.5),
+            'p95': _percentile(values, 0.95),
+        }
+
+    images = len(corpus) or 1
+    return {
+        'images': len(corpus),
+        'failures': failures,
+        'stages': {stage: summary(values) for stage, values in stage_times.items()},
+        'total': summary(totals),
+        'fields': {field: correct[field] / images for field in FIELDS},
+        'exact': exact / images,
+    }
@@ -0,0 +1,300 @@
+"""
+QR Code Jobs
+============
+Renders and uploads vehicle QR images outside the request/response cycle.
+
+``Vehicle.save()`` stores ``qr_value`` right away and calls ``enqueue()``.
+A ``QRCodeJob`` row records the pending work, so nothing is lost if the
+process restarts. After the registering transaction commits, the job runs
+on a small in-process thread pool. Failed uploads are retried with
+exponential backoff up to QR_JOBS_MAX_ATTEMPTS. ``qr_code`` is only filled
+in once the image is stored.
+
+The thread pool and retry timers live in process memory only. The web
+process therefore also starts a sweeper thread (``start_sweeper()``, from
+rdfs/asgi.py). It re-runs due and stale jobs at startup and every
+QR_JOBS_SWEEP_SECONDS, so a restart or deploy cannot leave a job pending.
+``python manage.py process_qr_jobs`` drains the queue from a separate
+worker (``--loop``, the Procfile ``worker`` entry). It also runs once on
+each deploy from build.sh.
+"""
+
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+QR_UPLOAD_FOLDER = "vehicles/qrcodes"
+MAX_RETRY_DELAY_SECONDS = 600
+# A job still "running" after this long belonged to a worker that died.
+STALE_RUNNING_SECONDS = 300
+_PUBLIC_ID_UNSAFE_RE = re.compile(r"[^A-Za-z0-9_-]")
+
+_executor = None
+_executor_lock = threading.Lock()
+_sweeper = None
+
+
+# =============================================================================
+# RENDER / UPLOAD
+# =============================================================================
+def render_png(qr_value):
+    import qrcode
+
+    buffer = BytesIO()
+    qrcode.make(qr_value).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def qr_public_id(vehicle_id, qr_value):
+    """
+    Image name per QR value, so a slow upload for an old plate cannot
+    overwrite the image of the vehicle's current value.
+    """
+    return f"vehicle_{vehicle_id}_qr_{_PUBLIC_ID_UNSAFE_RE.sub('_', qr_value)}"
+
+
+def upload_png(vehicle_id, qr_value, png):
+    """Upload to Cloudinary and return the stored public_id."""
+    import cloudinary.uploader
+
+    result = cloudinary.uploader.upload(
+        png,
+        folder=QR_UPLOAD_FOLDER,
+        public_id=qr_public_id(vehicle_id, qr_value),
+        overwrite=True,
+        resource_type="image",
+        format="png",
+    )
+    return result.get("public_id")
+
+
+# =============================================================================
+# QUEUE
+# =============================================================================
+def enqueue(vehicle, schedule=True):
+    """Record (or replace) the vehicle's pending QR job and schedule it."""
+    from .models import QRCodeJob
+
+    job, _ = QRCodeJob.objects.update_or_create(
+        vehicle_id=vehicle.pk,
+        defaults={
+            "qr_value": vehicle.qr_value,
+            "status": QRCodeJob.STATUS_PENDING,
+            "attempts": 0,
+            "last_error": "",
+            "next_attempt_at": timezone.now(),
+        },
+    )
+    if schedule and settings.QR_JOBS_RUN_IN_PROCESS:
+        transaction.on_commit(lambda: _submit(job.pk))
+    return job
+
+
+def enqueue_many(vehicles, schedule=True):
+    """Bulk variant of enqueue() for freshly created vehicles (fleet import)."""
+    from .models import QRCodeJob
+
+    jobs = QRCodeJob.objects.bulk_create(
+        [QRCodeJob(vehicle=vehicle, qr_value=vehicle.qr_value) for vehicle in vehicles],
+        batch_size=500,
+    )
+    if schedule and settings.QR_JOBS_RUN_IN_PROCESS:
+        job_ids = [job.pk for job in jobs]
+        transaction.on_commit(lambda: [_submit(job_id) for job_id in job_ids])
+    return jobs
+
+
+def retry_delay(attempts):
+    base = settings.QR_JOBS_RETRY_BASE_SECONDS
+    return min(base * 2 ** max(attempts - 1, 0), MAX_RETRY_DELAY_SECONDS)
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.QR_JOBS_WORKERS,
+                thread_name_prefix="qr-jobs",
+            )
+        return _executor
+
+
+def _submit(job_id, delay=0):
+    if delay:
+        timer = threading.Timer(delay, _submit, args=(job_id,))
+        timer.daemon = True
+        timer.start()
+        return
+    _get_executor().submit(_run_in_thread, job_id)
+
+
+def _run_in_thread(job_id):
+    close_old_connections()
+    retry_in = None
+    try:
+        retry_in = run_job(job_id)
+    except Exception:
+        logger.exception("QR job %s crashed", job_id)
+    finally:
+        close_old_connections()
+    if retry_in is not None:
+        _submit(job_id, retry_in)
+
+
+# =============================================================================
+# WORKER
+# =============================================================================
+def run_job(job_id, png=None):
+    """
+    Claim and run one due job. Returns the seconds until its retry, or None
+    when it finished, failed for good, or was not due / claimed elsewhere.
+    ``png`` may carry an image already rendered for the job's qr_value.
+    """
+    from .models import QRCodeJob, Vehicle
+
+    now = timezone.now()
+    claimed = QRCodeJob.objects.filter(
+        pk=job_id,
+        status=QRCodeJob.STATUS_PENDING,
+        next_attempt_at__lte=now,
+    ).update(status=QRCodeJob.STATUS_RUNNING, attempts=F("attempts") + 1, updated_at=now)
+    if not claimed:
+        return None
+
+    job = QRCodeJob.objects.get(pk=job_id)
+    running = QRCodeJob.objects.filter(
+        pk=job.pk, status=QRCodeJob.STATUS_RUNNING, qr_value=job.qr_value
+    )
+    try:
+        if png is None:
+            png = render_png(job.qr_value)
+        public_id = upload_png(job.vehicle_id, job.qr_value, png)
+    except Exception as exc:
+        error = f"{exc.__class__.__name__}: {exc}"[:1000]
+        if job.attempts >= settings.QR_JOBS_MAX_ATTEMPTS:
+            running.update(status=QRCodeJob.STATUS_FAILED, last_error=error)
+            logger.error("QR job for vehicle %s failed after %s attempts: %s",
+                         job.vehicle_id, job.attempts, error)
+            return None
+        delay = retry_delay(job.attempts)
+        running.update(
+            status=QRCodeJob.STATUS_PENDING,
+            last_error=error,
+            next_attempt_at=timezone.now() + timedelta(seconds=delay),
+        )
+        logger.warning("QR job for vehicle %s failed (attempt %s), retrying in %ss: %s",
+                       job.vehicle_id, job.attempts, delay, error)
+        return delay
+
+    # Skip the write if the plate changed while uploading; the newer job wins.
+    Vehicle.objects.filter(pk=job.vehicle_id, qr_value=job.qr_value).update(qr_code=public_id)
+    running.update(status=QRCodeJob.STATUS_DONE, last_error="")
+    return None
+
+
+def process_due(limit=None):
+    """Run every due job in this thread (management command / recovery)."""
+    from .models import QRCodeJob
+
+    now = timezone.now()
+    QRCodeJob.objects.filter(
+        status=QRCodeJob.STATUS_RUNNING,
+        updated_at__lt=now - timedelta(seconds=STALE_RUNNING_SECONDS),
+    ).update(status=QRCodeJob.STATUS_PENDING, next_attempt_at=now)
+
+    due = (
+        QRCodeJob.objects
+        .filter(status=QRCodeJob.STATUS_PENDING, next_attempt_at__lte=now)
+        .order_by("next_attempt_at")
+        .values_list("pk", flat=True)
+    )
+    if limit:
+        due = due[:limit]
+
+    processed = 0
+    for job_id in list(due):
+        run_job(job_id)
+        processed += 1
+    return processed
+
+
+def start_sweeper():
+    """Start this process's sweeper thread (once); see the module docstring."""
+    global _sweeper
+    with _executor_lock:
+        if _sweeper is None:
+            _sweeper = threading.Thread(target=_sweep_forever, name="qr-jobs-sweeper", daemon=True)
+            _sweeper.start()
+    return _sweeper
+
+
+def _sweep_forever():
+    while True:
+        close_old_connections()
+        try:
+            process_due()
+        except Exception:
+            logger.exception("QR job sweep failed")
+        finally:
+            close_old_connections()
+        time.sleep(settings.QR_JOBS_SWEEP_SECONDS)
+
+
+def run_many(job_ids, processes=None):
+    """
+    Run a batch of jobs now: render the PNGs across a process pool (CPU
+    bound), then upload them from a thread pool (I/O bound). Jobs that fail
+    are left pending with their retry time, as with run_job().
+    """
+    from .models import QRCodeJob
+
+    jobs = dict(
+        QRCodeJob.objects
+        .filter(pk__in=job_ids, status=QRCodeJob.STATUS_PENDING)
+        .values_list("pk", "qr_value")
+    )
+    if not jobs:
+        return 0
+
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        pngs = dict(zip(jobs, pool.map(render_png, jobs.values(), chunksize=16)))
+
+    def upload(job_id):
+        close_old_connections()
+        try:
+            return run_job(job_id, pngs[job_id])
+        finally:
+            close_old_connections()
+
+    with ThreadPoolExecutor(max_workers=settings.QR_JOBS_WORKERS, thread_name_prefix="qr-upload") as uploads:
+        list(uploads.map(upload, jobs))
+    return len(jobs)
+
+
+def enqueue_missing(schedule=True):
+    """Queue vehicles that have a qr_value but no image and no open job."""
+    from .models import QRCodeJob, Vehicle
+
+    vehicles = (
+        Vehicle.objects
+        .filter(qr_value__isnull=False)
+        .filter(Q(qr_code__isnull=True) | Q(qr_code=""))
+        .exclude(qr_job__status__in=[QRCodeJob.STATUS_PENDING, QRCodeJob.STATUS_RUNNING])
+    )
+    count = 0
+    for vehicle in vehicles.only("pk", "qr_value"):
+        enqueue(vehicle, schedule=schedule)
+        count += 1
+    return count
@@ -0,0 +1,193 @@
+"""
+Local QR Rendering
+==================
+Renders vehicle QR codes on the server instead of fetching the uploaded
+image from Cloudinary, so list, detail and print pages need no outside
+round trip.
+
+``qr_value`` (``VEH-{id}-{plate}``) fully determines the image, so the
+rendered bytes are cached per ``(qr_value, format, size)`` in a
+size-bounded LRU. The ETag is derived from the same key, which lets the
+view answer ``If-None-Match`` with 304 before rendering anything.
+"""
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+from django.conf import settings
+
+FORMATS = {
+    "svg": "image/svg+xml",
+    "png": "image/png",
+}
+DEFAULT_FORMAT = "svg"
+DEFAULT_SIZE = 256
+MIN_SIZE = 64
+MAX_SIZE = 2048
+QUIET_ZONE_MODULES = 4
+# Bump when the rendering changes so cached copies are not reused.
+RENDER_VERSION = 1
+
+QR_VALUE_RE = re.compile(r"^VEH-\d+-[A-Z0-9\-]+$")
+
+
+# =============================================================================
+# PARAMETERS
+# =============================================================================
+def is_valid_qr_value(qr_value):
+    return bool(qr_value) and len(qr_value) <= 255 and QR_VALUE_RE.match(qr_value) is not None
+
+
+def clamp_size(size):
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        return DEFAULT_SIZE
+    return max(MIN_SIZE, min(MAX_SIZE, size))
+
+
+def etag(qr_value, fmt, size):
+    key = f"{RENDER_VERSION}|{qr_value}|{fmt}|{size}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+# =============================================================================
+# RENDERING
+# =============================================================================
+def _matrix(qr_value):
+    import qrcode
+
+    qr = qrcode.QRCode(
+        error_correction=qrcode.constants.ERROR_CORRECT_M,
+        border=QUIET_ZONE_MODULES,
+    )
+    qr.add_data(qr_value)
+    qr.make(fit=True)
+    return qr.get_matrix()
+
+
+def render_svg(qr_value, size):
+    """One path of horizontal module runs; scales crisply at any print size."""
+    matrix = _matrix(qr_value)
+    modules = len(matrix)
+    path = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < modules:
+            if not row[x]:
+                x += 1
+                continue
+            start = x
+            while x < modules and row[x]:
+                x += 1
+            path.append(f"M{start} {y}h{x - start}v1h-{x - start}z")
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{size}" height="{size}" '
+        f'viewBox="0 0 {modules} {modules}" shape-rendering="crispEdges">'
+        f'<rect width="{modules}" height="{modules}" fill="#fff"/>'
+        f'<path fill="#000" d="{"".join(path)}"/></svg>'
+    ).encode("utf-8")
+
+
+def render_png(qr_value, size):
+    """Whole-pixel modules, centred on a ``size`` x ``size`` white canvas."""
+    from PIL import Image
+
+    matrix = _matrix(qr_value)
+    modules = len(matrix)
+    image = Image.new("1", (modules, modules), 1)
+    image.putdata([0 if dark else 1 for row in matrix for dark in row])
+
+    scale = max(1, size // modules)
+    image = image.resize((modules * scale, modules * scale), Image.NEAREST)
+    if image.width != size:
+        canvas = Image.new("1", (max(size, image.width),) * 2, 1)
+        offset = (canvas.width - image.width) // 2
+        canvas.paste(image, (offset, offset))
+        image = canvas
+
+    buffer = BytesIO()
+    image.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+
+_RENDERERS = {
+    "svg": render_svg,
+    "png": render_png,
+}
+
+
+# =============================================================================
+# LRU CACHE
+# =============================================================================
+class RenderCache:
+    """Thread-safe LRU of rendered images bounded by total bytes."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            data = self._items.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._items.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._items[key] = data
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    @property
+    def size_bytes(self):
+        return self._bytes
+
+    def __len__(self):
+        return len(self._items)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = RenderCache(settings.QR_RENDER_CACHE_MAX_BYTES)
+        return _cache
+
+
+def render(qr_value, fmt=DEFAULT_FORMAT, size=DEFAULT_SIZE):
+    """Rendered image bytes for ``qr_value``, served from the LRU when possible."""
+    key = (qr_value, fmt, size)
+    cache = get_cache()
+    data = cache.get(key)
+    if data is None:
+        data = _RENDERERS[fmt](qr_value, size)
+        cache.put(key, data)
+    return data
@@ -0,0 +1,495 @@
+"""
+Printable QR Sheets
+===================
+Lays out many vehicle QR stickers on a grid of printable pages, for a whole
+route, a list of drivers or a list of vehicles. Used by the "QR sheet"
+endpoint (``/vehicles/qr-sheet/``) and ``python manage.py print_qr_sheet``.
+
+Pages are rendered in parallel across a process pool, a few pages per
+worker at a time, and written out as soon as they are ready. Vehicles are
+read from the database in chunks. Memory therefore stays bounded by a
+window of pages whatever the sheet size.
+
+The web server shares one "spawn" pool (QR_SHEETS_PROCESSES workers)
+across requests, as ``ocr`` does, and streams the sheet through
+``astream()`` so daphne sends each chunk as it is produced.
+
+Formats:
+
+- ``pdf``: one PDF. The QR modules are vector rectangles, so stickers print
+  sharp at any size, and each page is a small compressed content stream.
+- ``png``: a ZIP archive holding one PNG per page, at ``PNG_DPI``.
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+import zlib
+import zipfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+
+from .qr_render import _matrix
+
+FORMATS = {
+    "pdf": "application/pdf",
+    "png": "application/zip",
+}
+DEFAULT_FORMAT = "pdf"
+
+# Page sizes in PDF points (1/72 inch).
+PAGE_SIZES = {
+    "a4": (595, 842),
+    "letter": (612, 792),
+}
+DEFAULT_PAGE = "a4"
+DEFAULT_COLUMNS = 4
+DEFAULT_ROWS = 5
+MAX_COLUMNS = 8
+MAX_ROWS = 10
+MARGIN = 28
+PADDING = 8
+LABEL_HEIGHT = 26
+PNG_DPI = 150
+
+# Pages handed to the pool per worker before their output is written.
+PAGES_PER_WORKER = 2
+VEHICLE_CHUNK_SIZE = 500
+
+Sticker = namedtuple("Sticker", "qr_value plate caption")
+
+
+# =============================================================================
+# SELECTION
+# =============================================================================
+def select_stickers(route_id=None, driver_ids=(), vehicle_ids=()):
+    """
+    Vehicles matching any of the given route / drivers / vehicles, ordered
+    by plate, as a lazily streamed queryset of ``(qr_value, plate, first,
+    last)`` rows. Vehicles that have no ``qr_value`` yet are skipped.
+    """
+    from .models import Vehicle
+
+    selection = Q()
+    if route_id:
+        selection |= Q(route_id=route_id)
+    if driver_ids:
+        selection |= Q(assigned_driver_id__in=list(driver_ids))
+    if vehicle_ids:
+        selection |= Q(pk__in=list(vehicle_ids))
+    if not selection:
+        raise ValueError("Choose a route, drivers or vehicles to print.")
+
+    return (
+        Vehicle.objects
+        .filter(selection)
+        .exclude(Q(qr_value__isnull=True) | Q(qr_value=""))
+        .order_by("license_plate", "pk")
+        .values_list(
+            "qr_value",
+            "license_plate",
+            "assigned_driver__first_name",
+            "assigned_driver__last_name",
+        )
+    )
+
+
+def iter_stickers(queryset):
+    for qr_value, plate, first_name, last_name in queryset.iterator(chunk_size=VEHICLE_CHUNK_SIZE):
+        caption = " ".join(part for part in (first_name, last_name) if part)
+        yield Sticker(qr_value, plate, caption)
+
+
+# =============================================================================
+# LAYOUT
+# =============================================================================
+class SheetLayout(namedtuple("SheetLayout", "page columns rows")):
+    """Grid geometry in PDF points; PNG pages scale it by ``PNG_DPI / 72``."""
+
+    @classmethod
+    def build(cls, page=DEFAULT_PAGE, columns=DEFAULT_COLUMNS, rows=DEFAULT_ROWS):
+        if page not in PAGE_SIZES:
+            raise ValueError(f"Unknown page size: {page}")
+        columns = max(1, min(MAX_COLUMNS, int(columns)))
+        rows = max(1, min(MAX_ROWS, int(rows)))
+        return cls(page, columns, rows)
+
+    @property
+    def size(self):
+        return PAGE_SIZES[self.page]
+
+    @property
+    def per_page(self):
+        return self.columns * self.rows
+
+    @property
+    def cell(self):
+        width, height = self.size
+        return (width - 2 * MARGIN) / self.columns, (height - 2 * MARGIN) / self.rows
+
+    @property
+    def qr_side(self):
+        cell_width, cell_height = self.cell
+        return max(0, min(cell_width - 2 * PADDING, cell_height - 2 * PADDING - LABEL_HEIGHT))
+
+    def origin(self, index):
+        """Top-left corner of cell ``index`` (top-down coordinates)."""
+        cell_width, cell_height = self.cell
+        row, column = divmod(index, self.columns)
+        return MARGIN + column * cell_width, MARGIN + row * cell_height
+
+
+def _runs(matrix):
+    """Horizontal runs of dark modules as ``(x, y, length)``."""
+    runs = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < len(row):
+            if not row[x]:
+                x += 1
+                continue
+            start = x
+            while x < len(row) and row[x]:
+                x += 1
+            runs.append((start, y, x - start))
+    return runs
+
+
+# =============================================================================
+# PAGE RENDERING (runs in the worker processes)
+# =============================================================================
+def _pdf_text(text, limit=40):
+    text = (text or "")[:limit]
+    text = text.encode("latin-1", "replace").decode("latin-1")
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _pdf_page(layout, stickers):
+    """Compressed PDF content stream for one page."""
+    _, page_height = layout.size
+    cell_width, cell_height = layout.cell
+    side = layout.qr_side
+    ops = ["0.8 G 0.5 w [3 3] 0 d"]
+
+    for index, sticker in enumerate(stickers):
+        left, top = layout.origin(index)
+        # Dashed cut lines around each sticker.
+        ops.append(f"{left:.2f} {page_height - top - cell_height:.2f} {cell_width:.2f} {cell_height:.2f} re S")
+
+        matrix = _matrix(sticker.qr_value)
+        module = side / len(matrix)
+        qr_left = left + (cell_width - side) / 2
+        qr_top = top + PADDING
+        ops.append("0 g")
+        for x, y, length in _runs(matrix):
+            ops.append(
+                f"{qr_left + x * module:.2f} {page_height - qr_top - (y + 1) * module:.2f} "
+                f"{length * module:.2f} {module:.2f} re"
+            )
+        ops.append("f")
+
+        # Helvetica glyphs average ~0.6 em for plates; good enough to centre.
+        baseline = page_height - qr_top - side - 12
+        for font, font_size, text in (("F2", 11, sticker.plate), ("F1", 7, sticker.caption)):
+            if text:
+                text = _pdf_text(text)
+                text_left = left + (cell_width - len(text) * font_size * 0.6) / 2
+                ops.append(f"BT /{font} {font_size} Tf {text_left:.2f} {baseline:.2f} Td ({text}) Tj ET")
+            baseline -= font_size + 2
+
+    return zlib.compress("\n".join(ops).encode("latin-1"))
+
+
+def _png_page(layout, stickers):
+    """PNG bytes for one page."""
+    from PIL import Image, ImageDraw, ImageFont
+
+    scale = PNG_DPI / 72
+    width, height = (round(value * scale) for value in layout.size)
+    cell_width, cell_height = (value * scale for value in layout.cell)
+    side = int(layout.qr_side * scale)
+    page = Image.new("L", (width, height), 255)
+    draw = ImageDraw.Draw(page)
+    plate_font = ImageFont.load_default(size=round(11 * scale))
+    caption_font = ImageFont.load_default(size=round(7 * scale))
+
+    for index, sticker in enumerate(stickers):
+        left, top = (value * scale for value in layout.origin(index))
+        draw.rectangle([left, top, left + cell_width, top + cell_height], outline=200)
+
+        matrix = _matrix(sticker.qr_value)
+        modules = len(matrix)
+        tile = Image.new("L", (modules, modules), 255)
+        tile.putdata([0 if dark else 255 for row in matrix for dark in row])
+        module = max(1, side // modules)
+        tile = tile.resize((modules * module, modules * module), Image.NEAREST)
+        qr_left = round(left + (cell_width - tile.width) / 2)
+        qr_top = round(top + PADDING * scale + (side - tile.width) / 2)
+        page.paste(tile, (qr_left, qr_top))
+
+        text_top = top + PADDING * scale + side + 2 * scale
+        for font, text in ((plate_font, sticker.plate), (caption_font, sticker.caption)):
+            if text:
+                draw.text((left + cell_width / 2, text_top), text[:40], fill=0, font=font, anchor="ma")
+            text_top += font.size + 2 * scale
+
+    buffer = BytesIO()
+    page.save(buffer, format="PNG", dpi=(PNG_DPI, PNG_DPI))
+    return buffer.getvalue()
+
+
+_PAGE_RENDERERS = {
+    "pdf": _pdf_page,
+    "png": _png_page,
+}
+
+
+def render_page(task):
+    fmt, layout, stickers = task
+    return _PAGE_RENDERERS[fmt](SheetLayout(*layout), [Sticker(*sticker) for sticker in stickers])
+
+
+# =============================================================================
+# STREAMING WRITERS
+# =============================================================================
+class PdfWriter:
+    """
+    Minimal streaming PDF: pages are written as they arrive; the page tree,
+    catalog and cross-reference table follow at the end.
+    """
+
+    CATALOG, PAGES, FONT_REGULAR, FONT_BOLD = 1, 2, 3, 4
+
+    def __init__(self, layout):
+        self.layout = layout
+        self.offset = 0
+        self.offsets = {}
+        self.kids = []
+        self.next_id = 5
+
+    def _chunk(self, data):
+        self.offset += len(data)
+        return data
+
+    def _object(self, number, body, stream=None):
+        self.offsets[number] = self.offset
+        parts = [f"{number} 0 obj\n".encode("ascii"), body.encode("ascii")]
+        if stream is not None:
+            parts += [b"\nstream\n", stream, b"\nendstream"]
+        parts.append(b"\nendobj\n")
+        return self._chunk(b"".join(parts))
+
+    def start(self):
+        return b"".join([
+            self._chunk(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"),
+            self._object(self.FONT_REGULAR, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica "
+                                            "/Encoding /WinAnsiEncoding >>"),
+            self._object(self.FONT_BOLD, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold "
+                                         "/Encoding /WinAnsiEncoding >>"),
+        ])
+
+    def page(self, content):
+        content_id, page_id = self.next_id, self.next_id + 1
+        self.next_id += 2
+        self.kids.append(page_id)
+        width, height = self.layout.size
+        return b"".join([
+            self._object(content_id, f"<< /Length {len(content)} /Filter /FlateDecode >>", content),
+            self._object(
+                page_id,
+                f"<< /Type /Page /Parent {self.PAGES} 0 R /MediaBox [0 0 {width} {height}] "
+                f"/Resources << /Font << /F1 {self.FONT_REGULAR} 0 R /F2 {self.FONT_BOLD} 0 R >> >> "
+                f"/Contents {content_id} 0 R >>",
+            ),
+        ])
+
+    def finish(self):
+        kids = " ".join(f"{kid} 0 R" for kid in self.kids)
+        body = b"".join([
+            self._object(self.PAGES, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.kids)} >>"),
+            self._object(self.CATALOG, f"<< /Type /Catalog /Pages {self.PAGES} 0 R >>"),
+        ])
+        xref_offset = self.offset
+        lines = [f"xref\n0 {self.next_id}\n", "0000000000 65535 f \n"]
+        for number in range(1, self.next_id):
+            lines.append(f"{self.offsets[number]:010d} 00000 n \n")
+        lines.append(
+            f"trailer\n<< /Size {self.next_id} /Root {self.CATALOG} 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n"
+        )
+        return body + self._chunk("".join(lines).encode("ascii"))
+
+
+class _Sink:
+    """Write-only file object; ZipFile streams into it (no seek/tell)."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class PngZipWriter:
+    def __init__(self, layout):
+        self.sink = _Sink()
+        self.archive = zipfile.ZipFile(self.sink, "w", compression=zipfile.ZIP_STORED)
+        self.pages = 0
+
+    def start(self):
+        return b""
+
+    def page(self, content):
+        self.pages += 1
+        # Fixed timestamp: identical selections give identical archives.
+        info = zipfile.ZipInfo(f"qr-sheet-{self.pages:04d}.png", date_time=(2000, 1, 1, 0, 0, 0))
+        self.archive.writestr(info, content)
+        return self.sink.drain()
+
+    def finish(self):
+        self.archive.close()
+        return self.sink.drain()
+
+
+_WRITERS = {
+    "pdf": PdfWriter,
+    "png": PngZipWriter,
+}
+
+
+# =============================================================================
+# PROCESS POOL
+# =============================================================================
+_executor = None
+_lock = threading.Lock()
+
+
+def default_processes():
+    return settings.QR_SHEETS_PROCESSES or os.cpu_count() or 1
+
+
+def _new_executor(processes):
+    # "spawn": workers must not inherit the web server's threads/sockets.
+    return ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"))
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = _new_executor(default_processes())
+        return _executor
+
+
+def _reset_executor(executor):
+    global _executor
+    with _lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+# =============================================================================
+# PUBLIC API
+# =============================================================================
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def generate(stickers, fmt=DEFAULT_FORMAT, layout=None, processes=None, stats=None):
+    """
+    Yield the sheet's bytes in chunks as pages are rendered.
+
+    ``stickers`` is any iterable of ``Sticker`` (see ``iter_stickers``).
+    ``processes`` None renders on the shared pool; otherwise a pool of that
+    size is started for this sheet, and <= 1 renders in-process. ``stats``,
+    if given, is a dict filled with ``pages``, ``stickers`` and ``seconds``
+    when done.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported sheet format: {fmt}")
+    layout = layout or SheetLayout.build()
+    if processes is None:
+        processes = default_processes()
+        pool = _get_executor() if processes > 1 else None
+        shared = True
+    else:
+        pool = _new_executor(processes) if processes > 1 else None
+        shared = False
+    writer = _WRITERS[fmt](layout)
+    started = time.monotonic()
+    page_count = sticker_count = 0
+
+    pages = (
+        (fmt, tuple(layout), [tuple(sticker) for sticker in page])
+        for page in _batches(stickers, layout.per_page)
+    )
+    futures = []
+    try:
+        yield writer.start()
+        for window in _batches(pages, max(1, processes) * PAGES_PER_WORKER):
+            if pool:
+                futures = [pool.submit(render_page, task) for task in window]
+                rendered = (future.result() for future in futures)
+            else:
+                rendered = map(render_page, window)
+            for task, content in zip(window, rendered):
+                page_count += 1
+                sticker_count += len(task[2])
+                yield writer.page(content)
+        if not page_count:
+            # An empty PDF is invalid; emit one blank page instead.
+            yield writer.page(_PAGE_RENDERERS[fmt](layout, []))
+        yield writer.finish()
+    except BrokenProcessPool:
+        if shared:
+            _reset_executor(pool)
+        raise
+    finally:
+        # An abandoned download must not leave its pages queued on the pool.
+        for future in futures:
+            future.cancel()
+        if pool and not shared:
+            pool.shutdown(cancel_futures=True)
+
+    if stats is not None:
+        stats.update(pages=page_count, stickers=sticker_count, seconds=time.monotonic() - started)
+
+
+async def astream(chunks):
+    """
+    Async iterator over a ``generate()`` stream, for StreamingHttpResponse
+    under ASGI: a sync iterator would be read to the end into memory first.
+    Each chunk is produced on the thread the sync ORM calls run on.
+    """
+    chunks = iter(chunks)
+    produce = sync_to_async(next)
+    try:
+        while True:
+            chunk = await produce(chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        await sync_to_async(chunks.close)()
@@ -0,0 +1,320 @@
+"""
+Fleet Search
+============
+One search API for every screen that looks up vehicles, drivers, wallets or
+deposits by plate, VIN, name, license number or driver ID.
+
+Each ``Vehicle`` and ``Driver`` carries a denormalized ``search_document``:
+the searchable fields lower-cased, accent-stripped and split into words, with
+separator-free variants of plates and IDs ("abc 123 abc123"). The documents
+are kept current by ``vehicles.signals`` and can be rebuilt with
+``python manage.py rebuild_search_index``.
+
+PostgreSQL: the documents carry ``pg_trgm`` GIN indexes (migration 0022), so
+``LIKE '%term%'`` is an index scan and results are ranked by trigram word
+similarity. Other backends: a compact in-process trigram index is built from
+the documents and reused until a document changes or it expires. Changes
+made in this process show at once; changes made by other worker processes
+show within SEARCH_NGRAM_INDEX_TTL_SECONDS (default 60).
+"""
+
+import re
+import time
+import unicodedata
+
+from django.conf import settings
+from django.db import connection
+
+NGRAM_SIZE = 3
+DEFAULT_LIMIT = 20
+
+_NON_WORD_RE = re.compile(r"[^a-z0-9]+")
+
+# Vehicle fields that feed vehicle_document(); saves touching none of them
+# leave the search documents alone.
+VEHICLE_DOCUMENT_FIELDS = frozenset({"license_plate", "vin_number", "vehicle_name", "assigned_driver"})
+
+
+# =============================================================================
+# NORMALIZATION / DOCUMENTS
+# =============================================================================
+def normalize(text):
+    """Lower-case, strip accents and collapse everything else to single spaces."""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return _NON_WORD_RE.sub(" ", text.lower()).strip()
+
+
+def _compact(text):
+    return normalize(text).replace(" ", "")
+
+
+def _document(parts, identifiers=()):
+    words = [normalize(part) for part in parts if part]
+    for identifier in identifiers:
+        compact = _compact(identifier)
+        if compact and compact != normalize(identifier):
+            words.append(compact)
+    return " ".join(word for word in words if word)
+
+
+def vehicle_document(vehicle):
+    driver = getattr(vehicle, "assigned_driver", None) if vehicle.assigned_driver_id else None
+    driver_parts = []
+    driver_ids = []
+    if driver:
+        driver_parts = [driver.first_name, driver.middle_name, driver.last_name,
+                        driver.license_number, driver.driver_id]
+        driver_ids = [driver.license_number, driver.driver_id]
+    return _document(
+        [vehicle.license_plate, vehicle.vin_number, vehicle.vehicle_name] + driver_parts,
+        identifiers=[vehicle.license_plate, vehicle.vin_number] + driver_ids,
+    )
+
+
+def driver_document(driver, plates=None):
+    if plates is None:
+        plates = (
+            list(driver.vehicles.values_list("license_plate", flat=True)) if driver.pk else []
+        )
+    return _document(
+        [driver.first_name, driver.middle_name, driver.last_name, driver.suffix,
+         driver.license_number, driver.driver_id, driver.mobile_number, driver.email] + list(plates),
+        identifiers=[driver.license_number, driver.driver_id] + list(plates),
+    )
+
+
+# =============================================================================
+# QUERY PARSING / RANKING
+# =============================================================================
+def query_terms(query):
+    """Normalized search terms; every term must appear in a matching document."""
+    return normalize(query).split()
+
+
+def _score(document, terms):
+    """Exact word > word prefix > substring, shorter documents first on ties."""
+    words = document.split()
+    score = 0.0
+    for term in terms:
+        if term in words:
+            score += 3
+        elif any(word.startswith(term) for word in words):
+            score += 2
+        else:
+            score += 1
+    return score - len(document) / 10000.0
+
+
+def _grams(text):
+    text = f" {text} "
+    return {text[i:i + NGRAM_SIZE] for i in range(len(text) - NGRAM_SIZE + 1)}
+
+
+# =============================================================================
+# IN-PROCESS N-GRAM INDEX (non-PostgreSQL fallback)
+# =============================================================================
+class NgramIndex:
+    """Trigram -> ids postings over the search documents of one model."""
+
+    def __init__(self, documents):
+        self.documents = documents
+        self.postings = {}
+        for pk, document in documents.items():
+            for gram in _grams(document):
+                self.postings.setdefault(gram, set()).add(pk)
+        self.built_at = time.monotonic()
+
+    def candidates(self, term):
+        # Interior trigrams of the term only: it may sit mid-word.
+        grams = {term[i:i + NGRAM_SIZE] for i in range(len(term) - NGRAM_SIZE + 1)}
+        if not grams:
+            return None
+        result = None
+        for gram in grams:
+            ids = self.postings.get(gram, set())
+            result = ids if result is None else result & ids
+            if not result:
+                return set()
+        return result
+
+    def search(self, terms):
+        pool = None
+        for term in terms:
+            ids = self.candidates(term)
+            if ids is not None:
+                pool = ids if pool is None else pool & ids
+        pool = self.documents.keys() if pool is None else pool
+
+        matches = []
+        for pk in pool:
+            document = self.documents[pk]
+            if all(term in document for term in terms):
+                matches.append((_score(document, terms), pk))
+        matches.sort(key=lambda item: (-item[0], -item[1]))
+        return [pk for _, pk in matches]
+
+
+_ngram_indexes = {}
+_ngram_version = 0
+
+
+def invalidate():
+    """Called whenever a search document changes (see vehicles.signals)."""
+    global _ngram_version
+    _ngram_version += 1
+
+
+def get_ngram_index_ttl():
+    """
+    Seconds an in-process index is reused. ``invalidate()`` only reaches this
+    process, so this bounds how stale results are after another worker's write.
+    """
+    return int(getattr(settings, "SEARCH_NGRAM_INDEX_TTL_SECONDS", 60))
+
+
+def _ngram_index(model):
+    key = model._meta.label
+    cached = _ngram_indexes.get(key)
+    if (
+        cached
+        and cached[0] == _ngram_version
+        and time.monotonic() - cached[1].built_at < get_ngram_index_ttl()
+    ):
+        return cached[1]
+    index = NgramIndex(dict(model.objects.values_list("pk", "search_document")))
+    _ngram_indexes[key] = (_ngram_version, index)
+    return index
+
+
+# =============================================================================
+# POSTGRESQL
+# =============================================================================
+_trigram_available = {}
+
+
+def _use_postgres():
+    return connection.vendor == "postgresql"
+
+
+def _has_trigram():
+    alias = connection.alias
+    if alias not in _trigram_available:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            _trigram_available[alias] = cursor.fetchone() is not None
+    return _trigram_available[alias]
+
+
+# =============================================================================
+# PUBLIC API
+# =============================================================================
+def _model(kind):
+    from vehicles.models import Driver, Vehicle
+
+    models = {"vehicle": Vehicle, "driver": Driver}
+    if kind not in models:
+        raise ValueError(f"Unknown search kind: {kind}")
+    return models[kind]
+
+
+def filter_queryset(kind, query, queryset=None):
+    """
+    Restrict ``queryset`` (default: all rows of ``kind``) to matches for
+    ``query``. Ordering is left to the caller. Use it directly, or as a
+    subquery, e.g. ``wallets.filter(vehicle__in=filter_queryset("vehicle", q))``.
+    """
+    model = _model(kind)
+    queryset = model.objects.all() if queryset is None else queryset
+    terms = query_terms(query)
+    if not terms:
+        return queryset
+
+    if _use_postgres():
+        for term in terms:
+            queryset = queryset.filter(search_document__contains=term)
+        return queryset
+    return queryset.filter(pk__in=_ngram_index(model).search(terms))
+
+
+def search(kind, query, limit=DEFAULT_LIMIT, queryset=None):
+    """Best matches for ``query`` as a ranked list of model instances."""
+    model = _model(kind)
+    terms = query_terms(query)
+    if not terms:
+        return []
+
+    if _use_postgres():
+        matches = filter_queryset(kind, query, queryset)
+        if _has_trigram():
+            from django.contrib.postgres.search import TrigramWordSimilarity
+
+            matches = matches.annotate(
+                rank=TrigramWordSimilarity(" ".join(terms), "search_document")
+            ).order_by("-rank", "-pk")
+        else:
+            matches = matches.order_by("-pk")
+        return list(matches[:limit])
+
+    ranked_ids = _ngram_index(model).search(terms)
+    if queryset is not None:
+        allowed = set(queryset.filter(pk__in=ranked_ids).values_list("pk", flat=True))
+        ranked_ids = [pk for pk in ranked_ids if pk in allowed]
+    ranked_ids = ranked_ids[:limit]
+    objects = (queryset if queryset is not None else model.objects).in_bulk(ranked_ids)
+    return [objects[pk] for pk in ranked_ids if pk in objects]
+
+
+# =============================================================================
+# MAINTENANCE
+# =============================================================================
+def refresh_vehicle_documents(vehicles):
+    """Recompute and store documents for ``vehicles`` without calling save()."""
+    from vehicles.models import Vehicle
+
+    changed = []
+    for vehicle in vehicles:
+        document = vehicle_document(vehicle)
+        if document != vehicle.search_document:
+            vehicle.search_document = document
+            changed.append(vehicle)
+    if changed:
+        Vehicle.objects.bulk_update(changed, ["search_document"], batch_size=500)
+        invalidate()
+    return len(changed)
+
+
+def refresh_driver_documents(drivers):
+    from vehicles.models import Driver
+
+    changed = []
+    for driver in drivers:
+        document = driver_document(driver, [vehicle.license_plate for vehicle in driver.vehicles.all()])
+        if document != driver.search_document:
+            driver.search_document = document
+            changed.append(driver)
+    if changed:
+        Driver.objects.bulk_update(changed, ["search_document"], batch_size=500)
+        invalidate()
+    return len(changed)
+
+
+def rebuild_all(batch_size=1000):
+    """Recompute every document (after bulk imports or raw SQL updates)."""
+    from vehicles.models import Driver, Vehicle
+
+    updated = 0
+    for queryset, refresh in (
+        (Vehicle.objects.select_related("assigned_driver"), refresh_vehicle_documents),
+        (Driver.objects.prefetch_related("vehicles"), refresh_driver_documents),
+    ):
+        last_pk = 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk).order_by("pk")[:batch_size])
+            if not batch:
+                break
+            updated += refresh(batch)
+            last_pk = batch[-1].pk
+    return updated
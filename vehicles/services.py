@@ -0,0 +1,102 @@
+"""
+Vehicle Registration Service
+============================
+Creates and edits vehicles with a known, small number of statements.
+
+``register_vehicle()`` writes a new vehicle together with its wallet and
+terminal fee balance in one transaction:
+
+    INSERT vehicle, UPDATE its qr_value, INSERT wallet, INSERT fee balance,
+    upsert its QR job, refresh the driver's search document.
+
+The wallet and fee balance come from ``post_save`` receivers that act on
+creation only, so vehicles saved any other way (admin, shell, fixtures) get
+them too; later saves no longer run a ``get_or_create`` lookup each.
+Bulk creates skip the receivers (see ``fleet_import``).
+
+``update_vehicle()`` writes an edited vehicle's changed columns (plus its
+QR value, search document and ``last_updated``) as a single UPDATE. QR
+jobs and driver search documents are only touched when the plate or the
+driver actually changed.
+"""
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import identifiers, qr_jobs, search
+
+
+def register_vehicle(vehicle):
+    """Save a new vehicle with its wallet and fee balance, all or nothing."""
+    if vehicle.pk is not None:
+        raise ValueError("register_vehicle() is for new vehicles; use update_vehicle().")
+
+    with transaction.atomic():
+        # The post_save receivers add the wallet and fee balance
+        vehicle.save()
+    return vehicle
+
+
+def changed_fields(vehicle):
+    """Names of concrete fields that differ from the values loaded from the database."""
+    loaded = getattr(vehicle, "_loaded_values", None)
+    if loaded is None:
+        raise ValueError("Vehicle was not loaded from the database.")
+    return [
+        field.name
+        for field in vehicle._meta.concrete_fields
+        if not field.primary_key
+        and field.attname in loaded
+        and getattr(vehicle, field.attname) != loaded[field.attname]
+    ]
+
+
+def update_vehicle(vehicle, fields=None):
+    """
+    Write ``fields`` (default: every changed field) of an existing vehicle
+    with one UPDATE. Returns the names of the columns written.
+    """
+    from .models import Driver, Vehicle
+
+    fields = set(changed_fields(vehicle) if fields is None else fields)
+    if not fields:
+        return []
+
+    previous = getattr(vehicle, "_loaded_values", {})
+    qr_value = vehicle.build_qr_value()
+    qr_changed = qr_value != vehicle.qr_value
+    if qr_changed:
+        vehicle.qr_value = qr_value
+        fields.add("qr_value")
+
+    document_changed = bool(fields & search.VEHICLE_DOCUMENT_FIELDS)
+    if document_changed:
+        vehicle.search_document = search.vehicle_document(vehicle)
+        fields.add("search_document")
+
+    vehicle.last_updated = timezone.now()
+    fields.add("last_updated")
+
+    values = {}
+    for name in fields:
+        field = vehicle._meta.get_field(name)
+        values[field.attname] = getattr(vehicle, field.attname)
+
+    with transaction.atomic():
+        Vehicle.objects.filter(pk=vehicle.pk).update(**values)
+        if qr_changed:
+            qr_jobs.enqueue(vehicle)
+        if fields & {"assigned_driver", "license_plate"}:
+            # Driver documents list their plates.
+            driver_ids = {vehicle.assigned_driver_id, previous.get("assigned_driver_id")}
+            search.refresh_driver_documents(
+                Driver.objects.filter(pk__in=[pk for pk in driver_ids if pk]).prefetch_related("vehicles")
+            )
+    if document_changed:
+        search.invalidate()
+    if not fields.isdisjoint(identifiers.UNIQUE_FIELDS["vehicle"]):
+        identifiers.invalidate()
+
+    if hasattr(vehicle, "_loaded_values"):
+        vehicle._loaded_values.update(values)
+    return sorted(fields)
@@ -0,0 +1,93 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import identifiers, search
+from .models import Driver, Vehicle, Wallet
+
+
+@receiver(post_save, sender=Vehicle)
+def create_wallet_for_vehicle(sender, instance, created, raw=False, **kwargs):
+    """Every vehicle has a wallet, however it was created (see vehicles.services)."""
+    if created and not raw:
+        Wallet.objects.create(vehicle=instance)
+
+
+def _touches_document(update_fields):
+    return update_fields is None or not search.VEHICLE_DOCUMENT_FIELDS.isdisjoint(update_fields)
+
+
+@receiver(pre_save, sender=Vehicle)
+def set_vehicle_search_document(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Compute the vehicle's search document and remember its previous driver."""
+    if raw or not _touches_document(update_fields):
+        return
+    instance.search_document = search.vehicle_document(instance)
+    loaded = getattr(instance, "_loaded_values", {})
+    if "assigned_driver_id" in loaded:
+        instance._search_previous_driver_id = loaded["assigned_driver_id"]
+    elif instance._state.adding:
+        instance._search_previous_driver_id = None
+    else:
+        # Only instances loaded with the driver deferred get here
+        instance._search_previous_driver_id = (
+            Vehicle.objects.filter(pk=instance.pk).values_list("assigned_driver_id", flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Vehicle)
+def refresh_driver_search_on_vehicle_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Drivers list their plates, so the old and new driver documents follow the vehicle."""
+    if raw or not _touches_document(update_fields):
+        return
+    driver_ids = {instance.assigned_driver_id, getattr(instance, "_search_previous_driver_id", None)}
+    search.refresh_driver_documents(
+        Driver.objects.filter(pk__in=[pk for pk in driver_ids if pk]).prefetch_related("vehicles")
+    )
+    search.invalidate()
+    if hasattr(instance, "_loaded_values"):
+        instance._loaded_values["assigned_driver_id"] = instance.assigned_driver_id
+
+
+@receiver(post_delete, sender=Vehicle)
+def refresh_driver_search_on_vehicle_delete(sender, instance, **kwargs):
+    search.refresh_driver_documents(
+        Driver.objects.filter(pk=instance.assigned_driver_id).prefetch_related("vehicles")
+    )
+    search.invalidate()
+
+
+@receiver(pre_save, sender=Driver)
+def set_driver_search_document(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    instance.search_document = search.driver_document(instance)
+
+
+@receiver(post_save, sender=Driver)
+def refresh_vehicle_search_on_driver_save(sender, instance, created, raw=False, **kwargs):
+    """Vehicle documents include the driver's names and IDs."""
+    if raw:
+        return
+    if not created:
+        search.refresh_vehicle_documents(instance.vehicles.select_related("assigned_driver"))
+    search.invalidate()
+
+
+@receiver(post_delete, sender=Driver)
+def invalidate_search_on_driver_delete(sender, instance, **kwargs):
+    search.invalidate()
+
+
+@receiver(post_save, sender=Vehicle)
+@receiver(post_save, sender=Driver)
+def invalidate_identifiers_on_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Keeps the live "already registered?" check (vehicles.identifiers) current."""
+    kind = 'vehicle' if sender is Vehicle else 'driver'
+    if update_fields is None or not set(identifiers.UNIQUE_FIELDS[kind]).isdisjoint(update_fields):
+        identifiers.invalidate()
+
+
+@receiver(post_delete, sender=Vehicle)
+@receiver(post_delete, sender=Driver)
+def invalidate_identifiers_on_delete(sender, instance, **kwargs):
+    identifiers.invalidate()
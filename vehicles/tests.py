@@ -1,3 +1,197 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from terminal.models import EntryLog, SystemSettings, TerminalFeeBalance, VehiclePresence
+from vehicles import qr_jobs, search, services, views
+from vehicles.models import Driver, QRCodeJob, Vehicle, Wallet
+
+
+def create_vehicle(suffix="1"):
+    driver = Driver.objects.create(first_name="Ana", last_name="Cruz", license_number=f"N01-23-45678{suffix}")
+    return Vehicle.objects.create(
+        vehicle_type="van",
+        assigned_driver=driver,
+        cr_number=f"1234567{suffix}",
+        or_number=f"8765432{suffix}",
+        vin_number=f"1HGCM82633A00435{suffix}",
+        year_model=2020,
+        registration_number=f"REG-000{suffix}",
+        license_plate=f"ABC 123{suffix}",
+    )
+
+
+class LegacyQREntryTests(TestCase):
+    """The vehicles ``qr_entry`` endpoint goes through the charged queue entry."""
+
+    @classmethod
+    def setUpTestData(cls):
+        SystemSettings.objects.update_or_create(id=1, defaults={
+            "terminal_fee": Decimal("50.00"), "min_deposit_amount": Decimal("100.00"), "entry_cooldown_minutes": 5,
+        })
+        cls.staff = CustomUser.objects.create_user(
+            "staff", email="staff@example.com", password="unused", role="staff_admin",
+        )
+        cls.other = CustomUser.objects.create_user("other", email="other@example.com", password="unused", role="")
+        cls.vehicle = create_vehicle()
+        Wallet.objects.update_or_create(vehicle=cls.vehicle, defaults={"balance": Decimal("500.00")})
+
+    def post(self, user, client=None):
+        client = client or Client()
+        client.force_login(user)
+        return client.post(reverse("vehicles:qr_entry"), {"qr_value": self.vehicle.qr_value})
+
+    def test_staff_entry_is_charged(self):
+        # The view body runs on the DB thread pool; call it directly so it
+        # shares the test transaction.
+        request = RequestFactory().post(reverse("vehicles:qr_entry"), {"qr_value": self.vehicle.qr_value})
+        request.user = self.staff
+        response = views._qr_entry(request)
+
+        self.assertTrue(json.loads(response.content)["success"])
+        self.assertEqual(Wallet.objects.get(vehicle=self.vehicle).balance, Decimal("450.00"))
+        self.assertIsNotNone(VehiclePresence.objects.get(vehicle=self.vehicle).active_entry_id)
+
+    def test_requires_staff_role(self):
+        response = self.post(self.other)
+
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(EntryLog.objects.exists())
+
+    def test_requires_csrf_token(self):
+        response = self.post(self.staff, Client(enforce_csrf_checks=True))
+
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(EntryLog.objects.exists())
+
+
+@mock.patch.object(qr_jobs, "render_png", return_value=b"png")
+@mock.patch.object(qr_jobs, "upload_png", side_effect=lambda vehicle_id, qr_value, png: f"qr/{vehicle_id}")
+class QRJobRecoveryTests(TestCase):
+    """Jobs whose in-memory schedule was lost (restart, deploy) still run."""
+
+    def setUp(self):
+        # on_commit never fires inside TestCase: the job is left pending
+        # exactly as a restart between commit and submit would leave it.
+        self.vehicle = create_vehicle()
+
+    def job(self):
+        return QRCodeJob.objects.get(vehicle=self.vehicle)
+
+    def test_sweep_runs_pending_and_stale_jobs(self, upload, render):
+        other = create_vehicle("2")
+        QRCodeJob.objects.filter(vehicle=other).update(
+            status=QRCodeJob.STATUS_RUNNING,
+            updated_at=timezone.now() - timedelta(seconds=qr_jobs.STALE_RUNNING_SECONDS + 1),
+        )
+
+        self.assertEqual(qr_jobs.process_due(), 2)
+
+        self.assertEqual(QRCodeJob.objects.filter(status=QRCodeJob.STATUS_DONE).count(), 2)
+        self.assertEqual(Vehicle.objects.get(pk=other.pk).qr_code.public_id, f"qr/{other.pk}")
+
+    def test_sweep_leaves_live_and_future_jobs(self, upload, render):
+        QRCodeJob.objects.filter(vehicle=self.vehicle).update(next_attempt_at=timezone.now() + timedelta(minutes=1))
+        other = create_vehicle("2")
+        QRCodeJob.objects.filter(vehicle=other).update(status=QRCodeJob.STATUS_RUNNING, updated_at=timezone.now())
+
+        self.assertEqual(qr_jobs.process_due(), 0)
+        upload.assert_not_called()
+
+    def test_backfill_requeues_failed_jobs(self, upload, render):
+        QRCodeJob.objects.filter(vehicle=self.vehicle).update(status=QRCodeJob.STATUS_FAILED)
+
+        call_command("process_qr_jobs", "--backfill", stdout=mock.MagicMock())
+
+        self.assertEqual(self.job().status, QRCodeJob.STATUS_DONE)
+        self.assertEqual(Vehicle.objects.get(pk=self.vehicle.pk).qr_code.public_id, f"qr/{self.vehicle.pk}")
+
+
+class SearchDocumentTests(TestCase):
+    """Search documents follow a vehicle to its new driver."""
+
+    def setUp(self):
+        self.vehicle = create_vehicle()
+        self.old_driver = self.vehicle.assigned_driver
+        self.new_driver = Driver.objects.create(first_name="Ben", last_name="Reyes", license_number="N02-23-456789")
+
+    def assertReassigned(self):
+        self.old_driver.refresh_from_db()
+        self.new_driver.refresh_from_db()
+        self.vehicle.refresh_from_db()
+        self.assertNotIn("abc1231", self.old_driver.search_document)
+        self.assertIn("abc1231", self.new_driver.search_document)
+        self.assertIn("reyes", self.vehicle.search_document)
+        self.assertNotIn("cruz", self.vehicle.search_document)
+        self.assertEqual(search.search("driver", "ABC 1231"), [self.new_driver])
+        self.assertEqual(search.search("vehicle", "ana cruz"), [])
+        self.assertEqual(search.search("vehicle", "ben reyes"), [self.vehicle])
+
+    def test_full_save(self):
+        vehicle = Vehicle.objects.get(pk=self.vehicle.pk)
+        vehicle.assigned_driver = self.new_driver
+        vehicle.save()
+
+        self.assertReassigned()
+
+    def test_update_fields_save(self):
+        vehicle = Vehicle.objects.get(pk=self.vehicle.pk)
+        vehicle.assigned_driver = self.new_driver
+        vehicle.save(update_fields=["assigned_driver"])
+
+        self.assertReassigned()
+
+    def test_driver_deferred_on_load(self):
+        vehicle = Vehicle.objects.defer("assigned_driver").get(pk=self.vehicle.pk)
+        vehicle.assigned_driver = self.new_driver
+        vehicle.save(update_fields=["assigned_driver"])
+
+        self.assertReassigned()
+
+    @override_settings(SEARCH_NGRAM_INDEX_TTL_SECONDS=0)
+    def test_writes_from_other_processes_show_after_the_ttl(self):
+        search.search("vehicle", "abc")
+        # A write that never reaches this process's invalidate()
+        Vehicle.objects.filter(pk=self.vehicle.pk).update(search_document="zzz 9999")
+
+        self.assertEqual(search.search("vehicle", "zzz"), [self.vehicle])
+
+
+class VehicleBalancesTests(TestCase):
+    """Every vehicle gets a wallet and a fee balance, whichever way it is created."""
+
+    def assertHasBalances(self, vehicle):
+        self.assertEqual(Wallet.objects.filter(vehicle=vehicle).count(), 1)
+        self.assertEqual(TerminalFeeBalance.objects.filter(vehicle=vehicle).count(), 1)
+
+    def test_plain_create(self):
+        self.assertHasBalances(create_vehicle())
+
+    def test_register_vehicle(self):
+        driver = Driver.objects.create(first_name="Ben", last_name="Reyes", license_number="N02-23-456789")
+        vehicle = services.register_vehicle(Vehicle(
+            vehicle_type="van",
+            assigned_driver=driver,
+            cr_number="22222222",
+            or_number="33333333",
+            vin_number="1HGCM82633A009999",
+            year_model=2021,
+            registration_number="REG-0002",
+            license_plate="XYZ 9876",
+        ))
+
+        self.assertHasBalances(vehicle)
+
+    def test_later_saves_leave_balances_alone(self):
+        vehicle = create_vehicle()
+        vehicle.vehicle_name = "Renamed"
+        vehicle.save()
+
+        self.assertHasBalances(vehicle)
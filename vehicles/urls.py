@@ -19,14 +19,20 @@ urlpatterns = [
 
     # ✅ QR / printable page (staff-only)
     path('vehicle/<int:vehicle_id>/qr/', views.vehicle_qr_view, name='vehicle_qr'),
+    path('qr/<str:qr_value>/', views.qr_image, name='qr_image'),
+    path('qr-sheet/', views.qr_sheet, name='qr_sheet'),
 
     # ✅ AJAX / backend helpers
     path('ocr-process/', views.ocr_process, name='ocr_process'),
+    path('ocr/jobs/', views.ocr_submit, name='ocr_submit'),
+    path('ocr/jobs/<str:job_id>/', views.ocr_job_status, name='ocr_job_status'),
     path('ajax-register-driver/', views.ajax_register_driver, name='ajax_register_driver'),
     path('ajax-register-vehicle/', views.ajax_register_vehicle, name='ajax_register_vehicle'),
     path('get-wallet-balance/<int:driver_id>/', views.get_wallet_balance, name='get_wallet_balance'),
     path('ajax-deposit/', views.ajax_deposit, name='ajax_deposit'),
     path('get-by-driver/<int:driver_id>/', views.get_vehicles_by_driver, name='get_vehicles_by_driver'),
+    path('api/search/', views.search_api, name='search_api'),
+    path('api/check-identifier/', views.check_identifier, name='check_identifier'),
 
     path('drivers/edit-form/<int:driver_id>/', views.driver_edit_form, name='driver_edit_form'),
     path('drivers/edit/<int:driver_id>/', views.edit_driver, name='edit_driver'),
@@ -1,31 +1,41 @@
 # vehicles/views.py
-import base64
-import cv2
-import numpy as np
-import pytesseract
-import re
+import asyncio
 import json
 from decimal import Decimal
+from asgiref.sync import sync_to_async
 from django.db import IntegrityError
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.views.decorators.cache import never_cache
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.core.exceptions import ValidationError
-from django.core.paginator import Paginator
-from django.db.models import Q, Sum
+from django.db.models import Sum
+from django.db.models.functions import Lower
 from django.utils import timezone
 from django.template.loader import render_to_string
-
-from accounts.utils import is_staff_admin_or_admin, is_admin
+from django.urls import reverse
+
+from accounts.utils import async_login_required, async_user_passes_test, is_staff_admin_or_admin, is_admin
+from terminal.async_db import run_db
+from terminal.pagination import estimated_count, paginate_keyset
+from terminal.services import QueueService
+from . import identifiers, ocr, qr_render, qr_sheets, search, services
+from .expiry_utils import (
+    EXPIRY_SORT_ORDERINGS,
+    annotate_drivers_with_expiry,
+    annotate_vehicles_with_expiry,
+    expiry_annotations,
+)
 from .models import Driver, Vehicle, Wallet, Deposit, QueueHistory
 from .forms import DriverRegistrationForm, DriverEditForm, VehicleRegistrationForm
-
-# ✅ Path for your installed Tesseract OCR (adjust if needed)
-pytesseract.pytesseract.tesseract_cmd = r"C:\\Program Files\\Tesseract-OCR\\tesseract.exe"
+from .validation_rules import DRIVER_VALIDATION_RULES
+from .vehicle_validation_rules import VEHICLE_VALIDATION_RULES
 
 DRIVER_EDIT_FIELD_ORDER = [
     'first_name', 'middle_name', 'last_name', 'suffix',
@@ -231,53 +241,84 @@ def handle_vehicle_validation_errors(request, form, validation_error):
     else:
         messages.error(request, f"❌ Validation Error: {str(validation_error)}")
 # -------------------------
-# OCR ENDPOINT
+# OCR ENDPOINTS
 # -------------------------
-@login_required
+# Async views: waiting on the OCR pool must not hold daphne's shared
+# sync-view thread (see vehicles.ocr).
+def _ocr_busy_response():
+    response = JsonResponse(
+        {'success': False, 'message': 'License scanner is busy. Please try again in a moment.'},
+        status=429,
+    )
+    response['Retry-After'] = '2'
+    return response
+
+
+async def _submit_ocr(request):
+    """Returns ``(job, error_response)``."""
+    try:
+        data = json.loads(request.body)
+        image_bytes = ocr.decode_image_data(data.get('image_data', ''))
+    except (ValueError, AttributeError) as e:
+        return None, JsonResponse({'success': False, 'error': str(e), 'message': str(e)}, status=400)
+
+    user = await request.auser()
+    job = ocr.submit(image_bytes, owner_id=user.pk)
+    if job is None:
+        return None, _ocr_busy_response()
+    return job, None
+
+
+@async_login_required
 @csrf_exempt
 @require_POST
-def ocr_process(request):
-    """OCR endpoint for license scanning."""
+async def ocr_process(request):
+    """OCR endpoint for license scanning: submits the scan and waits for its fields."""
+    job, error_response = await _submit_ocr(request)
+    if error_response:
+        return error_response
     try:
-        data = json.loads(request.body)
-        image_data = data.get('image_data', '')
-
-        if not image_data:
-            return JsonResponse({'error': 'No image data provided.'})
-
-        format, imgstr = image_data.split(';base64,')
-        nparr = np.frombuffer(base64.b64decode(imgstr), np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        gray = cv2.bilateralFilter(gray, 11, 17, 17)
-        _, thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY)
-
-        raw_text = pytesseract.image_to_string(thresh)
-        print("🧾 OCR RAW TEXT:", raw_text)
-        text = re.sub(r'[^A-Za-z0-9\s:/-]', ' ', raw_text).upper()
-
-        license_number = re.search(r'([A-Z]{1,2}\d{2,3}-\d{2}-\d{6,7})', text)
-        if not license_number:
-            license_number = re.search(r'(?:[A-Z]{3}-?\d{6,7})', text)
-
-        name_match = re.search(r'([A-Z]+),\s*([A-Z]+)\s*([A-Z]*)', text)
-        birthdate = re.search(r'(\d{4}/\d{2}/\d{2})', text)
-        expiry = re.search(r'(\d{4}/\d{2}/\d{2})', text)
-
-        result = {
-            'license_number': license_number.group(0) if license_number else '',
-            'last_name': name_match.group(1).title() if name_match else '',
-            'first_name': name_match.group(2).title() if name_match else '',
-            'middle_name': name_match.group(3).title() if name_match and name_match.group(3) else '',
-            'birth_date': birthdate.group(0) if birthdate else '',
-            'license_expiry': expiry.group(0) if expiry else '',
-        }
+        result = await asyncio.wait_for(
+            asyncio.wrap_future(job.future),
+            timeout=settings.OCR_TIMEOUT_SECONDS + 5,
+        )
+    except asyncio.TimeoutError:
+        return JsonResponse({'error': 'OCR timed out. Please try again.'}, status=504)
+    except Exception:
+        return JsonResponse({'error': ocr.error_message(job.future)})
+    return JsonResponse(result)
 
-        return JsonResponse(result)
 
-    except Exception as e:
-        return JsonResponse({'error': str(e)})
+@async_login_required
+@csrf_exempt
+@require_POST
+async def ocr_submit(request):
+    """Queue a license scan; poll ``poll_url`` for its fields."""
+    job, error_response = await _submit_ocr(request)
+    if error_response:
+        return error_response
+    return JsonResponse(
+        {
+            'success': True,
+            'job_id': job.id,
+            'status': job.status,
+            'poll_url': reverse('vehicles:ocr_job_status', args=[job.id]),
+        },
+        status=202,
+    )
+
+
+@async_login_required
+@never_cache
+async def ocr_job_status(request, job_id):
+    """Status of a queued scan: pending, running, done (with ``result``) or failed."""
+    user = await request.auser()
+    job = ocr.get_job(job_id, owner_id=user.pk)
+    if job is None:
+        return JsonResponse({'success': False, 'message': 'Scan not found or expired.'}, status=404)
+    data = job.as_dict()
+    data['success'] = data['status'] != ocr.STATUS_FAILED
+    return JsonResponse(data)
 
 
 # -------------------------
@@ -318,8 +359,9 @@ def staff_dashboard(request):
                         if field in cd:
                             setattr(vehicle, field, cd.get(field) or getattr(vehicle, field))
 
-                    vehicle.full_clean()
-                    vehicle.save()
+                    # The form already checked the identifiers (one query).
+                    vehicle.full_clean(validate_unique=False)
+                    services.register_vehicle(vehicle)
                     messages.success(request, f"✅ Vehicle '{vehicle.vehicle_name}' registered successfully!")
                     # Redirect based on user role
                     if request.user.role == 'admin':
@@ -369,8 +411,9 @@ def vehicle_registration(request):
                     if field in cd:
                         setattr(vehicle, field, cd.get(field) or getattr(vehicle, field))
 
-                vehicle.full_clean()
-                vehicle.save()
+                # The form already checked the identifiers (one query).
+                vehicle.full_clean(validate_unique=False)
+                services.register_vehicle(vehicle)
                 messages.success(request, f"✅ Vehicle '{vehicle.vehicle_name}' registered successfully!")
                 return redirect('vehicles:register_vehicle')
             except ValidationError as ve:
@@ -426,8 +469,9 @@ def ajax_register_vehicle(request):
                     if field in cd:
                         setattr(vehicle, field, cd.get(field) or getattr(vehicle, field))
 
-                vehicle.full_clean()
-                vehicle.save()
+                # The form already checked the identifiers (one query).
+                vehicle.full_clean(validate_unique=False)
+                services.register_vehicle(vehicle)
                 return JsonResponse({'success': True, 'message': f"✅ Vehicle '{vehicle.vehicle_name}' registered successfully!"})
             except ValidationError as ve:
                 return JsonResponse({'success': False, 'errors': ve.message_dict})
@@ -628,7 +672,7 @@ def register_vehicle(request):
                 if cd.get('route'):
                     vehicle.route = cd['route']
 
-                vehicle.save()
+                services.register_vehicle(vehicle)
                 messages.success(
                     request,
                     f"✅ Vehicle '{vehicle.vehicle_name}' registered successfully! "
@@ -726,8 +770,8 @@ def edit_vehicle(request, vehicle_id):
     if form.is_valid():
         updated_vehicle = form.save(commit=False)
         try:
-            updated_vehicle.full_clean()
-            updated_vehicle.save()
+            # The form already ran full_clean(); write only the changed columns.
+            services.update_vehicle(updated_vehicle)
         except IntegrityError as ie:
             form.add_error(None, str(ie))
         except ValidationError as ve:
@@ -770,6 +814,89 @@ def vehicle_qr_view(request, vehicle_id):
     return render(request, 'vehicles/qr_detail.html', {'vehicle': vehicle})
 
 
+@login_required(login_url='accounts:login')
+def qr_image(request, qr_value):
+    """
+    Locally rendered QR image for a vehicle's qr_value.
+    GET ?format=svg|png&size=<px>. The URL fully determines the image, so it
+    is cached for a long time and revalidated by ETag.
+    """
+    fmt = request.GET.get('format', qr_render.DEFAULT_FORMAT).lower()
+    size = qr_render.clamp_size(request.GET.get('size', qr_render.DEFAULT_SIZE))
+    if fmt not in qr_render.FORMATS:
+        return HttpResponseBadRequest("Unsupported QR image format.")
+    if not qr_render.is_valid_qr_value(qr_value):
+        raise Http404("Unknown QR value.")
+
+    etag = quote_etag(qr_render.etag(qr_value, fmt, size))
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(qr_render.render(qr_value, fmt, size), content_type=qr_render.FORMATS[fmt])
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, max_age=settings.QR_RENDER_CACHE_SECONDS, immutable=True)
+    response.cacheable = True  # keep SessionSecurityMiddleware from adding no-store
+    return response
+
+
+def _id_list(request, name):
+    """Integer ids from repeated and/or comma separated ?name= parameters."""
+    ids = []
+    for value in request.GET.getlist(name):
+        for part in value.split(','):
+            part = part.strip()
+            if not part:
+                continue
+            if not part.isdigit():
+                raise ValueError(f"Invalid {name} id: {part}")
+            ids.append(int(part))
+    return ids
+
+
+@login_required(login_url='accounts:login')
+@user_passes_test(is_staff_admin_or_admin, login_url='accounts:login')
+def qr_sheet(request):
+    """
+    Printable grid of QR stickers for a route, drivers or vehicles.
+    GET ?route=<id>&driver=<id,...>&vehicle=<id,...>&format=pdf|png
+        &page=a4|letter&columns=<n>&rows=<n>
+    The sheet is streamed while its pages are rendered (see qr_sheets).
+    """
+    fmt = request.GET.get('format', qr_sheets.DEFAULT_FORMAT).lower()
+    if fmt not in qr_sheets.FORMATS:
+        return HttpResponseBadRequest("Unsupported sheet format.")
+    try:
+        route_id = _id_list(request, 'route')[:1]
+        layout = qr_sheets.SheetLayout.build(
+            page=request.GET.get('page', qr_sheets.DEFAULT_PAGE).lower(),
+            columns=request.GET.get('columns', qr_sheets.DEFAULT_COLUMNS),
+            rows=request.GET.get('rows', qr_sheets.DEFAULT_ROWS),
+        )
+        selection = qr_sheets.select_stickers(
+            route_id=route_id[0] if route_id else None,
+            driver_ids=_id_list(request, 'driver'),
+            vehicle_ids=_id_list(request, 'vehicle'),
+        )
+    except ValueError as exc:
+        return HttpResponseBadRequest(str(exc))
+
+    total = selection.count()
+    if not total:
+        raise Http404("No vehicles with QR codes match this selection.")
+    if total > settings.QR_SHEETS_MAX_VEHICLES:
+        return HttpResponseBadRequest(
+            f"Too many vehicles ({total}). Print at most {settings.QR_SHEETS_MAX_VEHICLES} per sheet."
+        )
+
+    response = StreamingHttpResponse(
+        qr_sheets.astream(qr_sheets.generate(qr_sheets.iter_stickers(selection), fmt, layout)),
+        content_type=qr_sheets.FORMATS[fmt],
+    )
+    extension = 'pdf' if fmt == 'pdf' else 'zip'
+    disposition = 'inline' if fmt == 'pdf' else 'attachment'
+    response['Content-Disposition'] = f'{disposition}; filename="qr-sheet-{timezone.localdate():%Y%m%d}.{extension}"'
+    return response
+
+
 @login_required
 @csrf_exempt
 def ajax_deposit(request):
@@ -798,192 +925,192 @@ def ajax_deposit(request):
 # -------------------------
 # REGISTERED VEHICLES / DRIVERS
 # -------------------------
+REGISTERED_LIST_PAGE_SIZE = 50
+
+# Keyset orderings per sort mode; each ends in id so every page is stable.
+VEHICLE_SORT_ORDERINGS = {
+    'newest': ['-date_registered', '-id'],
+    'oldest': ['date_registered', 'id'],
+    'name-asc': ['name_sort', 'id'],
+    'name-desc': ['-name_sort', '-id'],
+    **EXPIRY_SORT_ORDERINGS,
+}
+
+DRIVER_SORT_ORDERINGS = {
+    'name-asc': ['first_name_sort', 'last_name_sort', 'id'],
+    'name-desc': ['-first_name_sort', '-last_name_sort', '-id'],
+    'newest': ['-id'],
+    'oldest': ['id'],
+    **EXPIRY_SORT_ORDERINGS,
+}
+
+
 @login_required
 @user_passes_test(is_staff_admin_or_admin)
 def registered_vehicles(request):
     """
     Display list of all registered vehicles with auto-filtering search and sorting.
     Read-only view - all edits/deletes happen in detail page.
+    Sorting (including the expiry modes) runs in SQL; one keyset page is rendered.
     """
-    from .expiry_utils import annotate_vehicles_with_expiry
-    from datetime import date
-    
     query = request.GET.get('q', '').strip()
     sort_by = request.GET.get('sort', 'newest')
+    ordering = VEHICLE_SORT_ORDERINGS.get(sort_by, VEHICLE_SORT_ORDERINGS['newest'])
 
     # Optimize query with select_related
     vehicle_qs = (
         Vehicle.objects
         .select_related('assigned_driver', 'route')
+        .annotate(name_sort=Lower('vehicle_name'), **expiry_annotations('registration_expiry'))
     )
 
     # Apply search filter
     if query:
-        vehicle_qs = vehicle_qs.filter(
-            Q(vehicle_name__icontains=query) |
-            Q(license_plate__icontains=query) |
-            Q(vin_number__icontains=query) |
-            Q(assigned_driver__first_name__icontains=query) |
-            Q(assigned_driver__last_name__icontains=query)
-        )
+        vehicle_qs = search.filter_queryset('vehicle', query, vehicle_qs)
 
-    # Annotate with expiry information before sorting
-    vehicles = annotate_vehicles_with_expiry(vehicle_qs)
-    
-    # Convert to list for custom sorting
-    vehicles_list = list(vehicles)
-    today = date.today()
-
-    # Apply sorting
-    if sort_by == 'oldest':
-        vehicles_list.sort(key=lambda v: v.date_registered)
-    elif sort_by == 'name-asc':
-        vehicles_list.sort(key=lambda v: v.vehicle_name.lower())
-    elif sort_by == 'name-desc':
-        vehicles_list.sort(key=lambda v: v.vehicle_name.lower(), reverse=True)
-    elif sort_by == 'expiry-near':
-        # Near expiry first (expired or expiring within 30 days)
-        def near_expiry_key(v):
-            if not v.expiry_info['expiry_date']:
-                return (2, None)  # No expiry date - last
-            days = v.expiry_info['days_remaining']
-            if days is None or days < 0:
-                return (0, days if days else 0)  # Expired - first
-            elif days <= 30:
-                return (0, days)  # Near expiry - first, sorted by days
-            else:
-                return (1, days)  # Not near expiry - middle
-        vehicles_list.sort(key=near_expiry_key)
-    elif sort_by == 'expiry-expired':
-        # Already expired first
-        def expired_key(v):
-            if not v.expiry_info['expiry_date']:
-                return (2, None)
-            days = v.expiry_info['days_remaining']
-            if days is None or days < 0:
-                return (0, days if days else 0)  # Expired first
-            else:
-                return (1, days)  # Not expired last
-        vehicles_list.sort(key=expired_key)
-    elif sort_by == 'expiry-longest':
-        # Longest time remaining first
-        def longest_key(v):
-            if not v.expiry_info['expiry_date']:
-                return -999999  # No expiry - last
-            days = v.expiry_info['days_remaining']
-            return days if days is not None else -999999
-        vehicles_list.sort(key=longest_key, reverse=True)
-    elif sort_by == 'expiry-shortest':
-        # Shortest time remaining first (including expired)
-        def shortest_key(v):
-            if not v.expiry_info['expiry_date']:
-                return 999999  # No expiry - last
-            days = v.expiry_info['days_remaining']
-            return days if days is not None else 999999
-        vehicles_list.sort(key=shortest_key)
-    else:  # newest (default)
-        vehicles_list.sort(key=lambda v: v.date_registered, reverse=True)
+    page = paginate_keyset(vehicle_qs, ordering, request.GET.get('cursor'), REGISTERED_LIST_PAGE_SIZE)
+    total_count, total_is_estimate = estimated_count(vehicle_qs)
 
     context = {
-        'vehicles': vehicles_list,
+        'vehicles': annotate_vehicles_with_expiry(page),
+        'vehicles_page': page,
+        'total_count': total_count,
+        'total_is_estimate': total_is_estimate,
+        'next_query': page.next_query(request),
+        'first_query': page.first_query(request),
     }
 
     return render(request, 'vehicles/registered_vehicles.html', context)
 
 
 
+
 @login_required
 @user_passes_test(is_staff_admin_or_admin)
 def registered_drivers(request):
     """
     Display list of all registered drivers with auto-filtering search and sorting.
     Read-only view - all edits/deletes happen in detail page.
+    Sorting (including the expiry modes) runs in SQL; one keyset page is rendered.
     """
-    from .expiry_utils import annotate_drivers_with_expiry
-    from datetime import date
-    
     query = request.GET.get('q', '').strip()
     sort_by = request.GET.get('sort', 'name-asc')
+    ordering = DRIVER_SORT_ORDERINGS.get(sort_by, DRIVER_SORT_ORDERINGS['name-asc'])
 
-    # Optimize query with prefetch
-    driver_qs = Driver.objects.prefetch_related('vehicles')
+    driver_qs = Driver.objects.annotate(
+        first_name_sort=Lower('first_name'),
+        last_name_sort=Lower('last_name'),
+        **expiry_annotations('license_expiry'),
+    )
 
     # Apply search filter
     if query:
-        driver_qs = driver_qs.filter(
-            Q(first_name__icontains=query) |
-            Q(last_name__icontains=query) |
-            Q(middle_name__icontains=query) |
-            Q(license_number__icontains=query) |
-            Q(mobile_number__icontains=query) |
-            Q(email__icontains=query)
-        )
+        driver_qs = search.filter_queryset('driver', query, driver_qs)
 
-    # Annotate with expiry information before sorting
-    drivers = annotate_drivers_with_expiry(driver_qs)
-    
-    # Convert to list for custom sorting
-    drivers_list = list(drivers)
-    today = date.today()
-
-    # Apply sorting
-    if sort_by == 'name-desc':
-        drivers_list.sort(key=lambda d: (d.first_name.lower(), d.last_name.lower()), reverse=True)
-    elif sort_by == 'newest':
-        drivers_list.sort(key=lambda d: d.id, reverse=True)
-    elif sort_by == 'oldest':
-        drivers_list.sort(key=lambda d: d.id)
-    elif sort_by == 'expiry-near':
-        # Near expiry first (expired or expiring within 30 days)
-        def near_expiry_key(d):
-            if not d.expiry_info['expiry_date']:
-                return (2, None)  # No expiry date - last
-            days = d.expiry_info['days_remaining']
-            if days is None or days < 0:
-                return (0, days if days else 0)  # Expired - first
-            elif days <= 30:
-                return (0, days)  # Near expiry - first, sorted by days
-            else:
-                return (1, days)  # Not near expiry - middle
-        drivers_list.sort(key=near_expiry_key)
-    elif sort_by == 'expiry-expired':
-        # Already expired first
-        def expired_key(d):
-            if not d.expiry_info['expiry_date']:
-                return (2, None)
-            days = d.expiry_info['days_remaining']
-            if days is None or days < 0:
-                return (0, days if days else 0)  # Expired first
-            else:
-                return (1, days)  # Not expired last
-        drivers_list.sort(key=expired_key)
-    elif sort_by == 'expiry-longest':
-        # Longest time remaining first
-        def longest_key(d):
-            if not d.expiry_info['expiry_date']:
-                return -999999  # No expiry - last
-            days = d.expiry_info['days_remaining']
-            return days if days is not None else -999999
-        drivers_list.sort(key=longest_key, reverse=True)
-    elif sort_by == 'expiry-shortest':
-        # Shortest time remaining first (including expired)
-        def shortest_key(d):
-            if not d.expiry_info['expiry_date']:
-                return 999999  # No expiry - last
-            days = d.expiry_info['days_remaining']
-            return days if days is not None else 999999
-        drivers_list.sort(key=shortest_key)
-    else:  # name-asc (default)
-        drivers_list.sort(key=lambda d: (d.first_name.lower(), d.last_name.lower()))
+    page = paginate_keyset(driver_qs, ordering, request.GET.get('cursor'), REGISTERED_LIST_PAGE_SIZE)
+    total_count, total_is_estimate = estimated_count(driver_qs)
 
     context = {
-        'drivers': drivers_list,
+        'drivers': annotate_drivers_with_expiry(page),
+        'drivers_page': page,
+        'total_count': total_count,
+        'total_is_estimate': total_is_estimate,
+        'next_query': page.next_query(request),
+        'first_query': page.first_query(request),
         'today': timezone.now().date(),
     }
 
     return render(request, 'vehicles/registered_drivers.html', context)
 
 
+SEARCH_API_MAX_LIMIT = 50
+
+
+@login_required(login_url='accounts:login')
+@user_passes_test(is_staff_admin_or_admin)
+@never_cache
+def search_api(request):
+    """
+    Shared ranked search over vehicles or drivers (see vehicles.search).
+    GET ?q=<text>&type=vehicle|driver&limit=<n>
+    """
+    query = request.GET.get('q', '').strip()
+    kind = request.GET.get('type', 'vehicle')
+    if kind not in ('vehicle', 'driver'):
+        return JsonResponse({'success': False, 'message': 'Invalid search type.'}, status=400)
+    try:
+        limit = max(1, min(int(request.GET.get('limit', search.DEFAULT_LIMIT)), SEARCH_API_MAX_LIMIT))
+    except ValueError:
+        limit = search.DEFAULT_LIMIT
+
+    results = []
+    if kind == 'vehicle':
+        matches = search.search('vehicle', query, limit, Vehicle.objects.select_related('assigned_driver'))
+        for vehicle in matches:
+            driver = vehicle.assigned_driver
+            driver_name = f"{driver.first_name} {driver.last_name}" if driver else ''
+            results.append({
+                'id': vehicle.id,
+                'vehicle_id': vehicle.id,
+                'license_plate': vehicle.license_plate,
+                'vehicle_name': vehicle.vehicle_name,
+                'driver_name': driver_name,
+                'license_number': (driver.license_number or driver.driver_id or '') if driver else '',
+                'display': f"{driver_name} · {vehicle.license_plate}" if driver_name else vehicle.license_plate,
+                'url': reverse('vehicles:vehicle_detail', args=[vehicle.id]),
+            })
+    else:
+        for driver in search.search('driver', query, limit, Driver.objects.prefetch_related('vehicles')):
+            driver_name = f"{driver.first_name} {driver.last_name}"
+            results.append({
+                'id': driver.id,
+                'driver_name': driver_name,
+                'license_number': driver.license_number or driver.driver_id or '',
+                'plates': [vehicle.license_plate for vehicle in driver.vehicles.all()],
+                'display': driver_name,
+                'url': reverse('vehicles:driver_detail', args=[driver.id]),
+            })
+
+    return JsonResponse({'success': True, 'query': query, 'type': kind, 'results': results})
+
+
+@async_login_required
+@never_cache
+async def check_identifier(request):
+    """
+    Live "already registered?" check for the registration forms, answered
+    from the in-process identifier registry (see vehicles.identifiers).
+    GET ?type=vehicle|driver&field=<unique field>&value=<text>[&exclude=<pk>]
+    """
+    user = await request.auser()
+    if not is_staff_admin_or_admin(user):
+        return JsonResponse({'success': False, 'message': 'Not allowed.'}, status=403)
+
+    kind = request.GET.get('type', 'vehicle')
+    field = request.GET.get('field', '')
+    if field not in identifiers.UNIQUE_FIELDS.get(kind, ()):
+        return JsonResponse({'success': False, 'message': 'Invalid identifier field.'}, status=400)
+    value = identifiers.normalize(request.GET.get('value'))
+    try:
+        exclude_pk = int(request.GET['exclude']) if request.GET.get('exclude') else None
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Invalid exclude id.'}, status=400)
+
+    registry = identifiers.cached_registry(kind)
+    if registry is None:
+        registry = await sync_to_async(identifiers.registry)(kind)
+    taken = bool(value) and identifiers.is_taken(kind, field, value, exclude_pk, current=registry)
+
+    rules = VEHICLE_VALIDATION_RULES if kind == 'vehicle' else DRIVER_VALIDATION_RULES
+    return JsonResponse({
+        'success': True,
+        'field': field,
+        'value': value,
+        'available': not taken,
+        'message': rules[field]['error_messages']['unique'] if taken else '',
+    })
+
+
 @login_required
 @user_passes_test(is_staff_admin_or_admin)
 def driver_detail(request, driver_id):
@@ -1103,13 +1230,20 @@ def delete_vehicle(request, vehicle_id):
 # -------------------------
 # QR ENTRY & EXIT HANDLERS
 # -------------------------
-@login_required
-@csrf_exempt
-def qr_entry(request):
+@async_login_required
+@async_user_passes_test(is_staff_admin_or_admin)
+@require_POST
+async def qr_entry(request):
+    return await run_db(_qr_entry, request)
+
+
+def _qr_entry(request):
     """
     Triggered when vehicle QR is scanned on ENTRY.
-    Sets status to 'boarding', computes departure_time (+30 mins default),
-    and logs QueueHistory.
+    Same transition as the terminal gate scan (QueueService.process_entry),
+    so Vehicle.status and the queue cannot disagree: the terminal fee is
+    charged and the cooldown and minimum-deposit rules apply. Staff only,
+    CSRF-protected like the terminal scan views.
     """
     qr_value = request.POST.get('qr_value')
     if not qr_value:
@@ -1117,31 +1251,27 @@ def qr_entry(request):
 
     try:
         vehicle = get_object_or_404(Vehicle, qr_value=qr_value)
-        now = timezone.now()
-        vehicle.status = 'boarding'
-        vehicle.last_enter_time = now
-        vehicle.departure_time = now + timezone.timedelta(minutes=30)  # default waiting time
-        vehicle.save(update_fields=['status', 'last_enter_time', 'departure_time'])
-
-        QueueHistory.objects.create(
-            vehicle=vehicle,
-            driver=vehicle.assigned_driver,
-            action='enter',
-            departure_time_snapshot=vehicle.departure_time,
-            wallet_balance_snapshot=vehicle.wallet.balance,
-            fee_charged=vehicle.route.base_fare if vehicle.route else None,
-        )
-        return JsonResponse({'success': True, 'message': f"{vehicle.license_plate} entered terminal.", 'departure_time': vehicle.departure_time})
+        success, message, entry_log = QueueService.process_entry(vehicle, staff_user=request.user)
+        if not success:
+            return JsonResponse({'success': False, 'message': message})
+
+        departure_time = entry_log.created_at + timezone.timedelta(minutes=QueueService.get_departure_duration())
+        return JsonResponse({'success': True, 'message': f"{vehicle.license_plate} entered terminal.", 'departure_time': departure_time})
     except Exception as e:
         return JsonResponse({'success': False, 'message': str(e)})
 
 
-@login_required
-@csrf_exempt
-def qr_exit(request):
+@async_login_required
+@async_user_passes_test(is_staff_admin_or_admin)
+@require_POST
+async def qr_exit(request):
+    return await run_db(_qr_exit, request)
+
+
+def _qr_exit(request):
     """
     Triggered when vehicle QR is scanned on EXIT.
-    Sets status to 'departed', keeps it for 10 mins, logs QueueHistory.
+    Same transition as the terminal exit scan (QueueService.process_exit).
     """
     qr_value = request.POST.get('qr_value')
     if not qr_value:
@@ -1149,18 +1279,9 @@ def qr_exit(request):
 
     try:
         vehicle = get_object_or_404(Vehicle, qr_value=qr_value)
-        now = timezone.now()
-        vehicle.status = 'departed'
-        vehicle.last_exit_time = now
-        vehicle.save(update_fields=['status', 'last_exit_time'])
-
-        QueueHistory.objects.create(
-            vehicle=vehicle,
-            driver=vehicle.assigned_driver,
-            action='exit',
-            departure_time_snapshot=vehicle.departure_time,
-            wallet_balance_snapshot=vehicle.wallet.balance,
-        )
+        success, message, _ = QueueService.process_exit(vehicle, staff_user=request.user)
+        if not success:
+            return JsonResponse({'success': False, 'message': message})
 
         return JsonResponse({'success': True, 'message': f"{vehicle.license_plate} departed terminal."})
     except Exception as e:
@@ -1234,8 +1355,6 @@ def admin_dashboard_data(request):
 @login_required
 @user_passes_test(is_admin)
 def queue_history(request):
-    history = QueueHistory.objects.select_related('vehicle', 'driver').order_by('-timestamp')
-    paginator = Paginator(history, 20)
-    page = paginator.get_page(request.GET.get('page'))
+    # Queue history is shown on the transactions page; nothing to load here.
     return redirect('terminal:transactions')
 